@@ -0,0 +1,143 @@
+# Load test for the JSON API (src/api.py): serves the app on a local port from a copy of a
+# benchmark fixture database and fires requests at it from several client threads, then
+# reports requests/s and latency percentiles (overall and per kind of request). The server runs in
+# a process of its own, so the clients do not compete with it for the GIL.
+#
+#   => python -m benchmarks.api_load
+#   => python -m benchmarks.api_load --size 100000 --clients 16 --requests 20000
+#   => python -m benchmarks.api_load --no-cache --write-share 0.05
+
+import contextlib
+import io
+import json
+import logging
+import multiprocessing
+import os
+import random
+import shutil
+import statistics
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+import click
+from werkzeug.serving import make_server
+
+from benchmarks.suite import DEFAULT_FIXTURE_DIR, Fixture, build_fixture
+from src import database
+
+
+def percentile(values, share):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(share * len(ordered)))]
+
+
+def request_mix(fixture, rng, write_share):
+    """One request: (kind, method, path, JSON body). Reads favour a hot set, the way a UI revisits pages."""
+    if rng.random() < write_share:
+        start = datetime(2031, 1, 6, 9) + timedelta(days=rng.randrange(365), minutes=30 * rng.randrange(16))
+        return ('book', 'POST', '/api/appointments',
+                {'patient_id': rng.randint(1, fixture.size), 'doctor_id': rng.randint(1, fixture.doctors),
+                 'appointment_datetime': start.isoformat(timespec='seconds')})
+    hot = rng.random() < 0.8
+    kind = rng.choice(('patients page', 'doctor', 'doctor agenda', 'patient records'))
+    if kind == 'patients page':
+        after_id = 50 * rng.randrange(20 if hot else max(1, fixture.size // 50))
+        return kind, 'GET', f"/api/patients?limit=50&after_id={after_id}", None
+    if kind == 'doctor':
+        return kind, 'GET', f"/api/doctors/{rng.randint(1, 10 if hot else fixture.doctors)}", None
+    if kind == 'doctor agenda':
+        return kind, 'GET', f"/api/appointments?doctor_id={rng.randint(1, 10 if hot else fixture.doctors)}&limit=100", None
+    return kind, 'GET', f"/api/medical-records?patient_id={rng.randint(1, 100 if hot else fixture.size)}", None
+
+
+def serve(database_path, cache, ports):
+    # Server process: the app on a free local port, which is reported back through `ports`.
+    from src.api import ResponseCache, create_app
+
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    database.init_engine(f"sqlite:///{database_path}", 'prod')
+    app = create_app(ResponseCache() if cache else ResponseCache(ttl=0))
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    ports.put(server.server_port)
+    server.serve_forever()
+
+
+def client(base_url, fixture, count, seed, write_share, results):
+    rng = random.Random(seed)
+    for _ in range(count):
+        kind, method, path, body = request_mix(fixture, rng, write_share)
+        data = json.dumps(body).encode() if body is not None else None
+        req = urllib.request.Request(base_url + path, data=data, method=method,
+                                     headers={'Content-Type': 'application/json'} if data else {})
+        started = time.perf_counter()
+        try:
+            with urllib.request.urlopen(req) as response:
+                response.read()
+                status = response.status
+        except urllib.error.HTTPError as e:
+            e.read()
+            status = e.code
+        results.append((kind, status, time.perf_counter() - started))
+
+
+@click.command()
+@click.option('--size', default=10000, show_default=True, help='Fixture size in patients (see benchmarks/suite.py).')
+@click.option('--clients', default=8, show_default=True, help='Concurrent client threads.')
+@click.option('--requests', 'total', default=5000, show_default=True, help='Requests in total, shared by the clients.')
+@click.option('--write-share', default=0.02, show_default=True, help='Share of requests that book an appointment.')
+@click.option('--cache/--no-cache', default=True, show_default=True, help='Serve GETs through the response cache.')
+@click.option('--fixture-dir', default=DEFAULT_FIXTURE_DIR, show_default=True)
+def main(size, clients, total, write_share, cache, fixture_dir):
+    """Load-test the JSON API against a local SQLite file."""
+    fixture_path = build_fixture(size, fixture_dir)
+    with tempfile.TemporaryDirectory() as workdir:
+        working_copy = os.path.join(workdir, 'hospital.db')
+        shutil.copyfile(fixture_path, working_copy)
+        database.init_engine(f"sqlite:///{working_copy}", 'prod')
+        with contextlib.redirect_stdout(io.StringIO()):
+            database.create_tables()
+        database.engine.dispose()
+        ports = multiprocessing.Queue()
+        server = multiprocessing.Process(target=serve, args=(working_copy, cache, ports), daemon=True)
+        server.start()
+        base_url = f"http://127.0.0.1:{ports.get(timeout=60)}"
+
+        fixture = Fixture(size, workdir)
+        results = []
+        threads = [threading.Thread(target=client, args=(base_url, fixture, total // clients, seed, write_share, results))
+                   for seed in range(clients)]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+        with urllib.request.urlopen(f"{base_url}/api/health") as response:
+            stats = json.load(response)['cache']
+        server.terminate()
+        server.join()
+
+    latencies = [seconds for _, _, seconds in results]
+    click.echo(f"{len(results)} requests from {clients} clients in {elapsed:.2f}s: {len(results) / elapsed:,.0f} requests/s, "
+               f"p50 {statistics.median(latencies) * 1000:.1f} ms, p99 {percentile(latencies, 0.99) * 1000:.1f} ms")
+    by_kind = defaultdict(list)
+    statuses = defaultdict(lambda: defaultdict(int))
+    for kind, status, seconds in results:
+        by_kind[kind].append(seconds)
+        statuses[kind][status] += 1
+    click.echo(f"{'request':<16} {'count':>7} {'p50 ms':>8} {'p99 ms':>8}  statuses")
+    for kind, values in sorted(by_kind.items()):
+        codes = ', '.join(f"{status}: {count}" for status, count in sorted(statuses[kind].items()))
+        click.echo(f"{kind:<16} {len(values):>7} {statistics.median(values) * 1000:>8.1f} "
+                   f"{percentile(values, 0.99) * 1000:>8.1f}  {codes}")
+    if cache:
+        click.echo(f"cache: {stats['hits']} hits, {stats['misses']} misses, {stats['invalidations']} entries invalidated")
+
+
+if __name__ == '__main__':
+    main()
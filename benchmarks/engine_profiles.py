@@ -0,0 +1,91 @@
+# Compares write/read throughput of the engine profiles in src/database.py
+# against the engine we used to build (plain create_engine, SQLite defaults).
+#
+#   => python -m benchmarks.engine_profiles
+#   => python -m benchmarks.engine_profiles --writes 5000 --reads 20000
+
+import os
+import random
+import tempfile
+import time
+from datetime import date
+
+import click
+from sqlalchemy import create_engine, insert, select
+from sqlalchemy.orm import sessionmaker
+
+from src.database import Base, make_engine
+from src.models import MedicalRecord
+
+
+def legacy_engine(url):
+    # What src/database.py used to do, minus echo=True (which would drown out everything else).
+    return create_engine(url)
+
+
+def run_writes(engine, count):
+    """One committed INSERT per transaction, the way each CLI `add` invocation writes."""
+    table = MedicalRecord.__table__
+    start = time.perf_counter()
+    for i in range(count):
+        with engine.begin() as conn:
+            conn.execute(insert(table).values(
+                patient_id=1 + i % 100,
+                doctor_id=1 + i % 10,
+                record_date=date(2024, 1, 1),
+                diagnosis=f"Diagnosis {i}",
+                treatment="Rest and fluids",
+            ))
+    return count / (time.perf_counter() - start)
+
+
+def run_reads(engine, count, max_id):
+    """Point lookups by primary key, each in its own short-lived session."""
+    Session = sessionmaker(bind=engine)
+    rng = random.Random(42)
+    start = time.perf_counter()
+    for _ in range(count):
+        with Session() as session:
+            session.execute(select(MedicalRecord.diagnosis).where(MedicalRecord.id == rng.randint(1, max_id))).scalar()
+    return count / (time.perf_counter() - start)
+
+
+def run_scan(engine):
+    start = time.perf_counter()
+    with engine.connect() as conn:
+        rows = len(conn.execute(select(MedicalRecord.id, MedicalRecord.diagnosis, MedicalRecord.treatment)).all())
+    return rows / (time.perf_counter() - start)
+
+
+@click.command()
+@click.option('--writes', default=2000, show_default=True, help='Number of single-row write transactions.')
+@click.option('--reads', default=10000, show_default=True, help='Number of primary-key lookups.')
+def main(writes, reads):
+    """Benchmark engine profiles against the legacy engine settings."""
+    candidates = {
+        'legacy': legacy_engine,
+        'prod': lambda url: make_engine(url, 'prod'),
+        'bench': lambda url: make_engine(url, 'bench'),
+    }
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, factory in candidates.items():
+            url = f"sqlite:///{os.path.join(tmp, name + '.db')}"
+            engine = factory(url)
+            Base.metadata.create_all(engine)
+            results[name] = (
+                run_writes(engine, writes),
+                run_reads(engine, reads, writes),
+                run_scan(engine),
+            )
+            engine.dispose()
+
+    base_w, base_r, base_s = results['legacy']
+    click.echo(f"{'profile':<8} {'writes/s':>12} {'reads/s':>12} {'scan rows/s':>14}")
+    for name, (w, r, s) in results.items():
+        click.echo(f"{name:<8} {w:>12,.0f} {r:>12,.0f} {s:>14,.0f}   "
+                   f"(x{w / base_w:.1f} writes, x{r / base_r:.1f} reads, x{s / base_s:.1f} scan)")
+
+
+if __name__ == '__main__':
+    main()
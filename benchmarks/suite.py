@@ -0,0 +1,384 @@
+# Benchmark suite: times every CLI command (and the menu.py listings) against
+# generated fixture databases of several sizes, saves the results as JSON and
+# compares them with a stored baseline.
+#
+#   => python -m benchmarks.suite run --sizes 1000,100000 --output results.json
+#   => python -m benchmarks.suite run --sizes 1000 --baseline benchmarks/baseline.json
+#   => python -m benchmarks.suite compare results.json benchmarks/baseline.json --threshold 0.25
+#
+# A case missing from the baseline fails the comparison: a change that adds a case, or changes
+# what one does, refreshes the baseline in the same commit (run --sizes 1000,100000 --save-baseline).
+#
+# Sizes are patient counts; each patient brings 3 appointments and 1 medical record,
+# and there is one doctor per 500 patients (at least 10).
+
+import contextlib
+import io
+import json
+import os
+import platform
+import shutil
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta, time as dt_time
+
+import click
+from sqlalchemy import insert
+
+from src import database
+from src.models import Department, DoctorShift
+from src.profiler import QueryProfiler
+
+DEFAULT_SIZES = (1000, 100000, 1000000)
+DEFAULT_FIXTURE_DIR = os.path.join(os.path.dirname(__file__), 'fixtures')
+DEFAULT_BASELINE = os.path.join(os.path.dirname(__file__), 'baseline.json')
+DEFAULT_THRESHOLD = 0.25   # 25% slower than baseline counts as a regression...
+DEFAULT_MIN_DELTA = 0.005  # ...but only if it is also at least 5 ms slower (noise floor)
+APPOINTMENTS_PER_PATIENT = 3
+RECORDS_PER_PATIENT = 1
+SEED = 42
+
+
+def doctors_for(size):
+    return max(10, size // 500)
+
+
+class Fixture:
+    """IDs available in a generated database of a given size."""
+
+    def __init__(self, size, workdir):
+        self.size = size
+        self.doctors = doctors_for(size)
+        self.appointments = size * APPOINTMENTS_PER_PATIENT
+        self.records = size * RECORDS_PER_PATIENT
+        self.workdir = workdir
+
+    def add_department(self):
+        with database.engine.begin() as conn:
+            return conn.execute(insert(Department.__table__).values(name=f"Bench {time.perf_counter_ns()}")).inserted_primary_key[0]
+
+    def assign_head(self, department_id, doctor_id):
+        with database.engine.begin() as conn:
+            conn.execute(Department.__table__.update().where(Department.__table__.c.id == department_id)
+                         .values(head_doctor_id=doctor_id))
+        return department_id
+
+    def add_shift(self):
+        with database.engine.begin() as conn:
+            return conn.execute(insert(DoctorShift.__table__).values(doctor_id=1, weekday=5, start_time=dt_time(9),
+                                                                     end_time=dt_time(13))).inserted_primary_key[0]
+
+    def import_file(self):
+        path = os.path.join(self.workdir, 'import.csv')
+        if not os.path.exists(path):
+            with open(path, 'w', encoding='utf-8') as handle:
+                handle.write("name,dob,contact,type,room,admission,discharge,last_visit\n")
+                for i in range(1000):
+                    handle.write(f"Import {i},1980-01-01,import{i}@example.com,outpatient,,,,2024-01-01\n")
+        return path
+
+
+# name => function(fixture, repetition) -> CLI arguments. Write commands use a different
+# row on each repetition so that every run does the same amount of work.
+CLI_CASES = {
+    # patient_commands
+    'patient add': lambda f, r: ['patient', 'add', '--name', 'Bench Patient', '--dob', '1990-01-01', '--contact', 'bench@example.com',
+                                 '--type', 'outpatient', '--last_visit', '2024-01-01'],
+    'patient list': lambda f, r: ['patient', 'list'],
+    'patient list --limit 100': lambda f, r: ['patient', 'list', '--limit', '100', '--after-id', str(f.size // 2)],
+    'patient update': lambda f, r: ['patient', 'update', str(1 + r), '--contact', f"updated{r}@example.com"],
+    'patient delete': lambda f, r: ['patient', 'delete', str(f.size - r)],
+    'patient delete --chunk-size': lambda f, r: ['patient', 'delete', str(f.size - 10 - r), '--chunk-size', '5000'],
+    'patient add-record': lambda f, r: ['patient', 'add-record', '1', '--doctor_id', '1', '--diagnosis', 'Bench',
+                                        '--treatment', 'Bench', '--record_date', '2024-01-01'],
+    'patient list-records': lambda f, r: ['patient', 'list-records'],
+    'patient list-records --patient-id': lambda f, r: ['patient', 'list-records', '--patient-id', str(1 + r)],
+    'patient show': lambda f, r: ['patient', 'show', str(1 + r)],
+    'patient timeline': lambda f, r: ['patient', 'timeline', str(1 + r), '--upcoming'],
+    'patient timeline --before': lambda f, r: ['patient', 'timeline', str(1 + r), '--before', '2020-01-01'],
+    'patient delete-record': lambda f, r: ['patient', 'delete-record', str(f.records - 10 - r)],
+    'patient find': lambda f, r: ['patient', 'find', 'john smith'],
+    'patient find --contact': lambda f, r: ['patient', 'find', f"{f.size // 2}@example"],
+    'patient find (typeahead)': lambda f, r: ['patient', 'find', 'Jo'],
+    'patient search-records': lambda f, r: ['patient', 'search-records', 'chest pain'],
+    'patient search-records --patient-id': lambda f, r: ['patient', 'search-records', 'hyper*', '--patient-id', str(1 + r)],
+    'patient rebuild-search-index': lambda f, r: ['patient', 'rebuild-search-index'],
+    'patient import (1k rows)': lambda f, r: ['patient', 'import', f.import_file(), '--restart'],
+    # doctor_commands
+    'doctor add': lambda f, r: ['doctor', 'add', '--name', 'Dr. Bench', '--specialization', 'Surgeon',
+                                '--contact_info', 'bench@hospital.example', '--department_id', '1'],
+    'doctor update': lambda f, r: ['doctor', 'update', str(1 + r), '--name', f"Dr. Updated {r}", '--specialization', 'Surgeon'],
+    'doctor list': lambda f, r: ['doctor', 'list'],
+    'doctor filter': lambda f, r: ['doctor', 'filter', 'Cardiologist'],
+    # The deletes take the highest ids, alternating, clear of doctors 1-4 that later cases use.
+    'doctor delete': lambda f, r: ['doctor', 'delete', str(f.doctors - 2 * r)],
+    'doctor delete --chunk-size': lambda f, r: ['doctor', 'delete', str(f.doctors - 1 - 2 * r), '--chunk-size', '5000'],
+    'doctor reassign --dry-run': lambda f, r: ['doctor', 'reassign', '1', '--dry-run'],
+    'doctor reassign': lambda f, r: ['doctor', 'reassign', str(f.doctors // 4 + r)],
+    'doctor add-shift': lambda f, r: ['doctor', 'add-shift', str(2 + r), '--day', 'sat', '--start', '09:00', '--end', '13:00'],
+    'doctor list-shifts': lambda f, r: ['doctor', 'list-shifts', '2'],
+    'doctor delete-shift': lambda f, r: ['doctor', 'delete-shift', str(f.add_shift())],
+    # department_commands
+    'department add': lambda f, r: ['department', 'add', '--name', f"Bench Department {r}", '--specialty', 'Bench'],
+    'department list': lambda f, r: ['department', 'list'],
+    'department show': lambda f, r: ['department', 'show', '1'],
+    'department overview': lambda f, r: ['department', 'overview'],
+    'department update': lambda f, r: ['department', 'update', '1', '--specialty', f"Specialty {r}"],
+    'department delete': lambda f, r: ['department', 'delete', str(f.add_department())],
+    'department assign-head': lambda f, r: ['department', 'assign-head', '2', str(2 + r)],
+    'department unassign-head': lambda f, r: ['department', 'unassign-head', str(f.assign_head(3, 3))],
+    'department staff-list': lambda f, r: ['department', 'staff-list', '1'],
+    'department assign-dept-specialty': lambda f, r: ['department', 'assign-dept-specialty', '1', 'Cardiologist'],
+    'department list-dept-specialty-doctors': lambda f, r: ['department', 'list-dept-specialty-doctors', '1'],
+    # appointment_commands
+    'appointment add': lambda f, r: ['appointment', 'add', '--patient-id', '1', '--doctor-id', '1',
+                                     '--datetime', f"2030-01-{1 + r // 16:02d} {8 + r % 16 // 2:02d}:{r % 2 * 30:02d}", '--reason', 'Bench'],
+    'appointment next-slot': lambda f, r: ['appointment', 'next-slot', '--doctor-id', '1', '--after', '2024-01-01 09:00'],
+    'appointment book-any': lambda f, r: ['appointment', 'book-any', '--patient-id', '1', '--department-id', '2'],
+    'appointment list': lambda f, r: ['appointment', 'list'],
+    'appointment list --doctor-id': lambda f, r: ['appointment', 'list', '--doctor-id', '1'],
+    'appointment list --with-names --limit 100': lambda f, r: ['appointment', 'list', '--with-names', '--limit', '100'],
+    'appointment update': lambda f, r: ['appointment', 'update', str(1 + r), '--reason', f"Updated {r}"],
+    'appointment delete': lambda f, r: ['appointment', 'delete', str(f.appointments - 10 - r)],
+    'appointment bulk-update --dry-run': lambda f, r: ['appointment', 'bulk-update', '--set-status', 'cancelled',
+                                                       '--doctor-id', '1', '--dry-run'],
+    'appointment bulk-update': lambda f, r: ['appointment', 'bulk-update', '--set-status', 'cancelled',
+                                             '--doctor-id', str(3 + r), '--from', '2024-01-01', '--to', '2024-02-01'],
+    'appointment sweep --dry-run': lambda f, r: ['appointment', 'sweep', '--dry-run'],
+    'appointment sweep': lambda f, r: ['appointment', 'sweep', '--before', f"2020-{1 + r % 12:02d}-01 00:00"],
+    # db_commands
+    'db backup': lambda f, r: ['db', 'backup', os.path.join(f.workdir, 'backups')],
+    'db verify': lambda f, r: ['db', 'verify', os.path.join(f.workdir, 'backups')],
+    'db reconcile': lambda f, r: ['db', 'reconcile'],
+    # inpatient_commands
+    'inpatient register-rooms': lambda f, r: ['inpatient', 'register-rooms'],
+    'inpatient free-rooms': lambda f, r: ['inpatient', 'free-rooms', '--on', f"{date.today() - timedelta(days=30 * r):%Y-%m-%d}"],
+    # Synthetic stays overlap in one-bed rooms; a stay before the first admission is the one that fits.
+    'inpatient check': lambda f, r: ['inpatient', 'check', f"{1 + r}01A", '--from', f"{date.today() - timedelta(days=400):%Y-%m-%d}",
+                                     '--to', f"{date.today() - timedelta(days=396):%Y-%m-%d}"],
+    # archive_commands: last, as archiving moves most of the history out of the working set.
+    'archive --dry-run': lambda f, r: ['archive', '--before', f"{date.today() - timedelta(days=730):%Y-%m-%d}", '--dry-run'],
+    'archive': lambda f, r: ['archive', '--before', f"{date.today() - timedelta(days=730 - 30 * r):%Y-%m-%d}"],
+    'patient timeline --include-archive': lambda f, r: ['patient', 'timeline', str(1 + r), '--before', '2020-01-01',
+                                                        '--include-archive'],
+    'patient search-records --include-archive': lambda f, r: ['patient', 'search-records', 'chest pain', '--include-archive'],
+}
+
+MENU_CASES = ['list_patients', 'list_doctors', 'list_departments', 'list_appointments', 'list_medical_records']
+
+
+def build_fixture(size, fixture_dir):
+    """
+    Returns the path of a generated database with `size` patients, creating it on first use.
+    """
+    from src.database import create_tables
+    from src.seed import generate_synthetic_data
+
+    os.makedirs(fixture_dir, exist_ok=True)
+    path = os.path.join(fixture_dir, f"hms-{size}-s{SEED}.db")
+    if os.path.exists(path):
+        # Bring fixtures built by older code up to the current schema once, not on every run.
+        database.init_engine(f"sqlite:///{path}", 'bench')
+        with contextlib.redirect_stdout(io.StringIO()):
+            create_tables()
+        database.engine.dispose()
+        with sqlite3.connect(path) as conn:
+            conn.execute("PRAGMA journal_mode=DELETE")
+        return path
+    building = f"{path}.building"
+    if os.path.exists(building):
+        os.remove(building)
+    database.init_engine(f"sqlite:///{building}", 'bench')
+    with contextlib.redirect_stdout(io.StringIO()):
+        create_tables()
+    click.echo(f"Building fixture with {size} patients...", err=True)
+    generate_synthetic_data(size, doctors_for(size), APPOINTMENTS_PER_PATIENT, RECORDS_PER_PATIENT, seed=SEED)
+    database.engine.dispose()
+    # Fold the WAL back into the main file so the fixture is a single self-contained file.
+    with sqlite3.connect(building) as conn:
+        conn.execute("PRAGMA journal_mode=DELETE")
+    os.replace(building, path)
+    return path
+
+
+def _time(func, repeat, prepare=None):
+    """
+    Runs func(prepare(rep)) `repeat` times with stdout discarded. Setup done in prepare()
+    (building arguments, inserting rows a case consumes) is not timed.
+    """
+    timings, statements, errors = [], [], []
+    for rep in range(repeat):
+        args = prepare(rep) if prepare else rep
+        stderr = io.StringIO()
+        with QueryProfiler() as profiler, contextlib.redirect_stdout(open(os.devnull, 'w')) as devnull, \
+                contextlib.redirect_stderr(stderr):
+            started = time.perf_counter()
+            try:
+                func(args)
+            except SystemExit:
+                pass
+            except Exception as e:
+                stderr.write(f"Error: {e}")
+            elapsed = time.perf_counter() - started
+            devnull.close()
+        timings.append(elapsed)
+        statements.append(profiler.statement_count)
+        if 'error' in stderr.getvalue().lower():
+            errors.append(stderr.getvalue().strip()[:300])
+    return {
+        'median_s': statistics.median(timings),
+        'min_s': min(timings),
+        'runs': repeat,
+        'statements': max(statements),
+        'errors': errors,
+    }
+
+
+def run_size(size, repeat, fixture_dir, cases=None, progress=None):
+    """
+    Times every case against a fresh working copy of the fixture for `size`.
+    """
+    from src.cli import cli
+
+    fixture_path = build_fixture(size, fixture_dir)
+    results = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        working_copy = os.path.join(workdir, 'hospital.db')
+        shutil.copyfile(fixture_path, working_copy)
+        database.init_engine(f"sqlite:///{working_copy}", 'prod')
+        # Fixtures may predate newer columns or indexes; create_tables() brings them up to date.
+        with contextlib.redirect_stdout(io.StringIO()):
+            database.create_tables()
+        fixture = Fixture(size, workdir)
+
+        for name, argv in CLI_CASES.items():
+            if cases and name not in cases:
+                continue
+            results[name] = _time(lambda args: cli.main(args=args, prog_name='cli', standalone_mode=False), repeat,
+                                  prepare=lambda rep: argv(fixture, rep))
+            if progress:
+                progress(size, name, results[name])
+
+        try:
+            import menu
+        except ImportError as e:
+            menu = None
+            click.echo(f"Skipping menu.py listings: {e}", err=True)
+        for name in MENU_CASES:
+            key = f"menu.{name}"
+            if menu is None or (cases and key not in cases):
+                continue
+            results[key] = _time(lambda _: getattr(menu, name)(), repeat)
+            if progress:
+                progress(size, key, results[key])
+        database.engine.dispose()
+    return results
+
+
+def run_suite(sizes, repeat=3, fixture_dir=DEFAULT_FIXTURE_DIR, cases=None, progress=None):
+    return {
+        'meta': {
+            'created': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'platform': platform.platform(),
+            'repeat': repeat,
+        },
+        'results': {str(size): run_size(size, repeat, fixture_dir, cases, progress) for size in sizes},
+    }
+
+
+def compare(current, baseline, threshold=DEFAULT_THRESHOLD, min_delta=DEFAULT_MIN_DELTA):
+    """
+    Returns [(size, case, baseline_s, current_s)] for every case whose median got slower than
+    baseline * (1 + threshold) by at least min_delta seconds. Cases missing on either side are
+    skipped here; missing_from_baseline() lists the ones the baseline lacks.
+    """
+    regressions = []
+    for size, cases in current['results'].items():
+        for name, result in cases.items():
+            reference = baseline.get('results', {}).get(size, {}).get(name)
+            if not reference:
+                continue
+            before, after = reference['median_s'], result['median_s']
+            if after > before * (1 + threshold) and after - before >= min_delta:
+                regressions.append((size, name, before, after))
+    return regressions
+
+
+def missing_from_baseline(current, baseline):
+    """[(size, case)] of the cases in `current` that the baseline has no timing for (so compare() cannot check them)."""
+    return [(size, name) for size, cases in current['results'].items() for name in cases
+            if name not in baseline.get('results', {}).get(size, {})]
+
+
+def _echo_result(size, name, result):
+    status = f"  ERROR: {result['errors'][0]}" if result['errors'] else ''
+    click.echo(f"[{size:>8}] {name:<45} {result['median_s'] * 1000:10.1f} ms  {result['statements']:>5} stmts{status}")
+
+
+def _report(regressions, threshold, missing=()):
+    if missing:
+        # A case without a baseline is never checked: refresh the baseline along with the case.
+        click.echo(f"{len(missing)} case(s) missing from the baseline (refresh it with --save-baseline):")
+        for size, name in missing:
+            click.echo(f"  [{size}] {name}")
+    if not regressions:
+        click.echo(f"No regressions beyond {threshold:.0%}.")
+        return 1 if missing else 0
+    click.echo(f"{len(regressions)} regression(s) beyond {threshold:.0%}:")
+    for size, name, before, after in regressions:
+        click.echo(f"  [{size}] {name}: {before * 1000:.1f} ms -> {after * 1000:.1f} ms (x{after / before:.2f})")
+    return 1
+
+
+@click.group()
+def main():
+    """HMS benchmark suite."""
+    pass
+
+
+@main.command('run')
+@click.option('--sizes', default=','.join(map(str, DEFAULT_SIZES)), show_default=True, help='Comma-separated patient counts.')
+@click.option('--repeat', default=3, show_default=True, type=click.IntRange(min=1), help='Runs per case (median is reported).')
+@click.option('--case', 'cases', multiple=True, help='Only run these cases (repeatable).')
+@click.option('--fixture-dir', default=DEFAULT_FIXTURE_DIR, show_default=True, help='Where generated fixture databases are cached.')
+@click.option('--output', default=None, help='Write results JSON here.')
+@click.option('--baseline', default=None, help='Compare against this baseline JSON; exit 1 on regressions.')
+@click.option('--threshold', default=DEFAULT_THRESHOLD, show_default=True, help='Allowed slowdown as a fraction.')
+@click.option('--save-baseline', is_flag=True, help=f'Also write the results to {DEFAULT_BASELINE}.')
+def run_command(sizes, repeat, cases, fixture_dir, output, baseline, threshold, save_baseline):
+    """Run the benchmarks."""
+    results = run_suite([int(size) for size in sizes.split(',')], repeat, fixture_dir, set(cases), _echo_result)
+    for path in filter(None, [output, DEFAULT_BASELINE if save_baseline else None]):
+        with open(path, 'w', encoding='utf-8') as handle:
+            json.dump(results, handle, indent=2)
+        click.echo(f"Results written to {path}")
+    failed = any(result['errors'] for cases_ in results['results'].values() for result in cases_.values())
+    if baseline:
+        with open(baseline, encoding='utf-8') as handle:
+            baseline_results = json.load(handle)
+        failed = _report(compare(results, baseline_results, threshold), threshold,
+                         missing_from_baseline(results, baseline_results)) or failed
+    sys.exit(1 if failed else 0)
+
+
+@main.command('compare')
+@click.argument('current', type=click.Path(exists=True))
+@click.argument('baseline', type=click.Path(exists=True), default=DEFAULT_BASELINE)
+@click.option('--threshold', default=DEFAULT_THRESHOLD, show_default=True, help='Allowed slowdown as a fraction.')
+def compare_command(current, baseline, threshold):
+    """Compare a results file with a baseline."""
+    with open(current, encoding='utf-8') as handle:
+        current_results = json.load(handle)
+    with open(baseline, encoding='utf-8') as handle:
+        baseline_results = json.load(handle)
+    sys.exit(_report(compare(current_results, baseline_results, threshold), threshold,
+                     missing_from_baseline(current_results, baseline_results)))
+
+
+if __name__ == '__main__':
+    main()
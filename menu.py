@@ -1,11 +1,49 @@
 from InquirerPy import inquirer
 from InquirerPy.base import Choice
-from datetime import datetime
+from datetime import date, datetime
+from prompt_toolkit.completion import Completer, Completion
+from sqlalchemy.orm import joinedload
 from src.database import get_db
+from src.pagination import keyset, stream
+from src.search import find_patients
+from src.refcache import cached_all
+from src.rooms import check_admission
+from src.scheduling import BookingConflict, DEFAULT_DURATION, MAX_DURATION, book, check_available, next_slot
 from src.models import Patient, InPatient, OutPatient, Doctor, Department, Appointment, MedicalRecord, PatientType, AppointmentStatus
 import sys
 
 
+class PatientCompleter(Completer):
+    """Typeahead for patient prompts: suggests matches for a name, DOB or contact fragment and inserts the ID."""
+
+    def __init__(self, db):
+        self.db = db
+
+    def get_completions(self, document, complete_event):
+        query = document.text.strip()
+        if not query or query.isdigit():
+            return
+        for p in find_patients(self.db, query):
+            yield Completion(str(p.id), start_position=-len(document.text),
+                             display=f"{p.name} ({p.date_of_birth})", display_meta=f"ID {p.id} · {p.contact_info or ''}")
+
+
+def pick_patient(message):
+    """Asks for a patient by ID or, via typeahead, by name/DOB/contact; returns the chosen ID."""
+    db = next(get_db())
+    try:
+        return inquirer.text(
+            message=message,
+            completer=PatientCompleter(db),
+            instruction="(type a name, DOB or phone/email and pick a match, or enter the ID)",
+            validate=lambda text: text.strip().isdigit() and int(text) > 0,
+            invalid_message="Pick a patient from the list or enter a numeric ID",
+            filter=int,
+        ).execute()
+    finally:
+        db.close()
+
+
 def main_menu():
     while True:
         choice = inquirer.select(
@@ -86,14 +124,18 @@ def add_patient():
     try:
         dob_date = datetime.strptime(dob, '%Y-%m-%d').date()
         if patient_type.startswith("inpatient"):
+            admission_date = datetime.strptime(admission, '%Y-%m-%d').date() if admission else date.today()
+            discharge_date = datetime.strptime(discharge, '%Y-%m-%d').date() if discharge else None
+            # Refuses the admission if the room has no free bed for the stay, like `patient add`.
+            check_admission(db, room, admission_date, discharge_date)
             patient = InPatient(
                 name=name,
                 date_of_birth=dob_date,
                 contact_info=contact,
                 patient_type=PatientType.INPATIENT,
                 room_number=room,
-                admission_date=datetime.strptime(admission, '%Y-%m-%d') if admission else None,
-                discharge_date=datetime.strptime(discharge, '%Y-%m-%d') if discharge else None,
+                admission_date=admission_date,
+                discharge_date=discharge_date,
             )
         else:
             patient = OutPatient(
@@ -118,18 +160,18 @@ def add_patient():
 def list_patients():
     db = next(get_db())
     try:
-        patients = db.query(Patient).all()
-        if not patients:
-            print("ℹ️ No patients found.")
-            return
-        for p in patients:
+        shown = 0
+        for p in stream(keyset(db.query(Patient), Patient.id)):
             print(f"ID: {p.id}, Name: {p.name}, Type: {p.patient_type.value}, DOB: {p.date_of_birth}")
+            shown += 1
+        if not shown:
+            print("ℹ️ No patients found.")
     finally:
         db.close()
 
 
 def update_patient():
-    patient_id = inquirer.number(message="🆔 Enter Patient ID to update:", min_allowed=1).execute()
+    patient_id = pick_patient("🆔 Patient to update:")
     name = inquirer.text(message="New name (leave blank to skip):", default="").execute()
     dob = inquirer.text(message="New DOB (YYYY-MM-DD) (leave blank to skip):", default="").execute()
     contact = inquirer.text(message="New contact info (leave blank to skip):", default="").execute()
@@ -165,6 +207,8 @@ def update_patient():
                 patient.admission_date = datetime.strptime(admission, '%Y-%m-%d')
             if discharge:
                 patient.discharge_date = datetime.strptime(discharge, '%Y-%m-%d')
+            if room is not None or admission or discharge:
+                check_admission(db, patient.room_number, patient.admission_date, patient.discharge_date, patient.id)
         else:
             last_visit = inquirer.text(message="New last visit date (YYYY-MM-DD) (leave blank to skip):", default="").execute()
             if last_visit:
@@ -180,7 +224,7 @@ def update_patient():
 
 
 def delete_patient():
-    patient_id = inquirer.number(message="🆔 Enter Patient ID to delete:", min_allowed=1).execute()
+    patient_id = pick_patient("🆔 Patient to delete:")
     confirm = inquirer.confirm(message=f"⚠️ Are you sure you want to delete patient ID {patient_id}?", default=False).execute()
     if not confirm:
         print("❎ Delete cancelled.")
@@ -235,7 +279,7 @@ def add_doctor():
 
     db = next(get_db())
     try:
-        departments = db.query(Department).all()
+        departments = cached_all(db, Department)
         if not departments:
             print("⚠️ No departments found. Please create a department first.")
             return
@@ -272,13 +316,13 @@ def add_doctor():
 def list_doctors():
     db = next(get_db())
     try:
-        doctors = db.query(Doctor).all()
-        if not doctors:
-            print("ℹ️ No doctors found.")
-            return
-        for d in doctors:
+        shown = 0
+        for d in stream(keyset(db.query(Doctor).options(joinedload(Doctor.department)), Doctor.id)):
             dept_name = d.department.name if d.department else "N/A"
             print(f"ID: {d.id}, Name: {d.name}, Specialization: {d.specialization}, Dept: {dept_name}")
+            shown += 1
+        if not shown:
+            print("ℹ️ No doctors found.")
     finally:
         db.close()
 
@@ -297,7 +341,7 @@ def update_doctor():
             return
 
         # Build choices and default
-        departments = db.query(Department).all()
+        departments = cached_all(db, Department)
         dept_choices = [(f"{d.name} (ID {d.id})", d.id) for d in departments]
         current_dept = doctor.department_id
         default_label = next((label for label, value in dept_choices if value == current_dept), None)
@@ -391,7 +435,7 @@ def add_department():
 
         specialty = inquirer.text(message="🩺 Enter specialty (optional):", default="").execute()
 
-        doctors = db.query(Doctor).all()
+        doctors = cached_all(db, Doctor)
         head_doctor_id = None
 
         if doctors:
@@ -462,7 +506,7 @@ def update_department():
         head_doctor_id = dept.head_doctor_id  # keep current head doctor by default
         change_head = inquirer.confirm(message="👑 Change Head Doctor?", default=False).execute()
         if change_head:
-            doctors = db.query(Doctor).all()
+            doctors = cached_all(db, Doctor)
             if doctors:
                 # Create a mapping of display strings to doctor IDs
                 doctor_choices_map = {f"{doc.name} (ID: {doc.id})": doc.id for doc in doctors}
@@ -544,7 +588,7 @@ def medical_record_menu():
 def add_medical_record():
     db = next(get_db())
     try:
-        patient_id = inquirer.number(message="🆔 Patient ID:", min_allowed=1).execute()
+        patient_id = pick_patient("🆔 Patient:")
         doctor_id = inquirer.number(message="🆔 Doctor ID:", min_allowed=1).execute()
         record_date_str = inquirer.text(
             message="📅 Record Date (YYYY-MM-DD) [leave blank for today]:",
@@ -583,13 +627,13 @@ def add_medical_record():
 def list_medical_records():
     db = next(get_db())
     try:
-        records = db.query(MedicalRecord).all()
-        if not records:
-            print("ℹ️ No medical records found.")
-            return
-        for r in records:
+        shown = 0
+        for r in stream(keyset(db.query(MedicalRecord), MedicalRecord.id)):
             print(f"🩺 ID: {r.id}, Patient ID: {r.patient_id}, Doctor ID: {r.doctor_id}, "
                   f"Date: {r.record_date}, Diagnosis: {r.diagnosis}, Treatment: {r.treatment[:30]}...")
+            shown += 1
+        if not shown:
+            print("ℹ️ No medical records found.")
     finally:
         db.close()
 
@@ -693,10 +737,12 @@ def appointment_menu():
 def add_appointment():
     db = next(get_db())
     try:
-        patient_id = inquirer.number(message="🆔 Patient ID:", min_allowed=1).execute()
+        patient_id = pick_patient("🆔 Patient:")
         doctor_id = inquirer.number(message="🆔 Doctor ID:", min_allowed=1).execute()
         date_str = inquirer.text(message="🗓️ Appointment Date (YYYY-MM-DD):").execute()
         time_str = inquirer.text(message="⏰ Appointment Time (HH:MM, 24h):").execute()
+        duration = inquirer.number(message="⏱️ Duration (minutes):", min_allowed=1, max_allowed=MAX_DURATION,
+                                   default=DEFAULT_DURATION).execute()
         reason = inquirer.text(message="📝 Reason for Appointment:").execute()
         status = inquirer.select(
             message="📌 Status:",
@@ -717,11 +763,18 @@ def add_appointment():
             patient_id=patient_id,
             doctor_id=doctor_id,
             appointment_datetime=appointment_datetime,
+            duration_minutes=int(duration),
             reason=reason,
             status=AppointmentStatus(status)
         )
-        db.add(appointment)
-        db.commit()
+        try:
+            book(db, appointment)
+        except BookingConflict as e:
+            print(f"❌ {e}")
+            slot = next_slot(db, doctor_id, appointment_datetime, int(duration))
+            if slot:
+                print(f"ℹ️ Next free slot: {slot.strftime('%Y-%m-%d %H:%M')}")
+            return
         print(f"✅ Appointment added successfully!")
     except Exception as e:
         db.rollback()
@@ -732,13 +785,13 @@ def add_appointment():
 def list_appointments():
     db = next(get_db())
     try:
-        appointments = db.query(Appointment).all()
-        if not appointments:
-            print("ℹ️ No appointments found.")
-            return
-        for a in appointments:
+        shown = 0
+        for a in stream(keyset(db.query(Appointment), Appointment.id)):
             print(f"ID: {a.id}, Patient ID: {a.patient_id}, Doctor ID: {a.doctor_id}, "
                   f"Date: {a.appointment_datetime}, Reason: {a.reason}, Status: {a.status.value}")
+            shown += 1
+        if not shown:
+            print("ℹ️ No appointments found.")
     finally:
         db.close()
 
@@ -784,6 +837,14 @@ def update_appointment():
 
         appointment.status = AppointmentStatus(status)
 
+        if appointment.status != AppointmentStatus.CANCELLED:
+            try:
+                check_available(db, appointment.doctor_id, appointment.appointment_datetime,
+                                appointment.duration_minutes, ignore_id=appointment.id)
+            except BookingConflict as e:
+                print(f"❌ {e}")
+                return
+
         db.commit()
         print(f"✅ Appointment ID {appointment_id} updated.")
     except Exception as e:
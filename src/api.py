@@ -0,0 +1,421 @@
+import enum
+import hashlib
+import json
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from datetime import date, datetime
+
+from flask import Flask, Response, g, request
+from sqlalchemy import event, inspect
+from werkzeug.exceptions import HTTPException
+
+from src import database
+from src.exporter import EXPORTS
+from src.models import Patient, InPatient, OutPatient, Doctor, Appointment, MedicalRecord
+from src.models import AppointmentStatus, PatientType
+from src.pagination import keyset
+from src.refcache import reference_cache
+from src.rooms import RoomFull, check_admission
+from src.scheduling import BookingConflict, DEFAULT_DURATION, MAX_DURATION, book, check_available, next_slot
+
+# flask-cors is optional; without it the frontend has to be served from the same origin.
+try:
+    from flask_cors import CORS
+except ImportError:
+    CORS = None
+
+# JSON API over the models for frontend-hms. Run it with `python -m src.api` or `flask --app src.api run`.
+# The server is threaded: every request runs on its own thread with its own session from the
+# shared engine pool (prod profile: 5 connections plus 10 overflow), and SQLite in WAL mode lets
+# readers run next to the writer, so a slow query only holds up the client that asked for it.
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+CACHE_ENTRIES = 1024
+# Writes through this process invalidate the cache at once; the TTL bounds how long a write made
+# elsewhere (the CLI, another server process) can go unseen.
+CACHE_TTL = 5.0
+
+_patients = Patient.__table__
+_doctors = Doctor.__table__
+_appointments = Appointment.__table__
+_records = MedicalRecord.__table__
+
+# Resource => (exporter.EXPORTS table, query-string filters {parameter: column}, tables its responses read).
+# Reads use the exporter's Core queries (patients come with their subtype columns flattened in):
+# plain rows, without building and tracking an ORM object per row.
+RESOURCES = {
+    'patients': ('patients', {'type': _patients.c.patient_type}, ('patients', 'inpatients', 'outpatients')),
+    'doctors': ('doctors', {'department_id': _doctors.c.department_id, 'specialization': _doctors.c.specialization},
+                ('doctors',)),
+    'departments': ('departments', {}, ('departments',)),
+    'appointments': ('appointments', {'patient_id': _appointments.c.patient_id, 'doctor_id': _appointments.c.doctor_id,
+                                      'status': _appointments.c.status}, ('appointments',)),
+    'medical-records': ('medical_records', {'patient_id': _records.c.patient_id, 'doctor_id': _records.c.doctor_id},
+                        ('medical_records',)),
+}
+
+
+class ResponseCache:
+    """
+    LRU of serialised GET responses and their ETags, each tagged with the tables it was read
+    from. invalidate(tables) drops the entries that read any of them. Thread-safe.
+    """
+
+    def __init__(self, max_entries=CACHE_ENTRIES, ttl=CACHE_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()   # key => (body, etag, tables, expires)
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.invalidations = 0
+        _CACHES.add(self)
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[3] < time.monotonic():
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0], entry[1]
+
+    def put(self, key, body, etag, tables):
+        with self._lock:
+            self._entries[key] = (body, etag, frozenset(tables), time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, tables):
+        with self._lock:
+            stale = [key for key, entry in self._entries.items() if entry[2] & tables]
+            for key in stale:
+                del self._entries[key]
+            self.invalidations += len(stale)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {'entries': len(self._entries), 'hits': self.hits, 'misses': self.misses,
+                    'invalidations': self.invalidations}
+
+
+_CACHES = weakref.WeakSet()
+
+
+def _affected_tables(tables):
+    # A write to a table also changes the rows that ON DELETE CASCADE (or a subtype join) ties to it.
+    affected = set(tables)
+    for table in database.Base.metadata.tables.values():
+        if any(fk.column.table.name in tables for fk in table.foreign_keys):
+            affected.add(table.name)
+    return affected
+
+
+@event.listens_for(database.Session, 'after_flush')
+def _collect_written_tables(session, flush_context):
+    written = session.info.setdefault('written_tables', set())
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        written.update(table.name for table in inspect(obj).mapper.tables)
+
+
+@event.listens_for(database.Session, 'after_commit')
+def _invalidate_written_tables(session):
+    written = session.info.pop('written_tables', None)
+    if written:
+        affected = _affected_tables(written)
+        for cache in list(_CACHES):
+            cache.invalidate(affected)
+
+
+@event.listens_for(database.Session, 'after_rollback')
+def _forget_written_tables(session):
+    session.info.pop('written_tables', None)
+
+
+def _plain(value):
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    if isinstance(value, enum.Enum):
+        return value.value
+    return value
+
+
+def _resource_tables(resource, row_id=None):
+    return RESOURCES[resource][2] if resource in RESOURCES else ()
+
+
+def fetch_rows(session, resource, filters=(), after_id=None, limit=None):
+    """A resource's rows as JSON-ready dicts, in id order (keyset-paged like the CLI listings)."""
+    build_query, id_column = EXPORTS[RESOURCES[resource][0]]
+    query = keyset(build_query().where(*filters), id_column, after_id, limit)
+    return [{key: _plain(value) for key, value in row.items()} for row in session.execute(query).mappings()]
+
+
+def fetch_row(session, resource, row_id):
+    rows = fetch_rows(session, resource, [EXPORTS[RESOURCES[resource][0]][1] == row_id])
+    if not rows:
+        raise ApiError(404, f"{resource} {row_id} not found.")
+    return rows[0]
+
+
+class ApiError(HTTPException):
+    def __init__(self, code, message, **extra):
+        super().__init__(message)
+        self.code = code
+        self.extra = extra
+
+
+def _session():
+    if 'session' not in g:
+        g.session = database.Session()
+    return g.session
+
+
+def _int_arg(name, default=None, low=None, high=None):
+    value = request.args.get(name)
+    if value is None:
+        return default
+    try:
+        value = int(value)
+    except ValueError:
+        raise ApiError(400, f"'{name}' must be an integer.")
+    if (low is not None and value < low) or (high is not None and value > high):
+        raise ApiError(400, f"'{name}' must be between {low} and {high}.")
+    return value
+
+
+def _filter_value(column, raw):
+    if column.type.python_type is int:
+        try:
+            return int(raw)
+        except ValueError:
+            raise ApiError(400, f"'{column.key}' must be an integer.")
+    enum_class = getattr(column.type, 'enum_class', None)
+    if enum_class is not None:
+        try:
+            return enum_class(raw)
+        except ValueError:
+            raise ApiError(400, f"'{raw}' is not one of: {', '.join(member.value for member in enum_class)}.")
+    return raw
+
+
+def _json_body(*required):
+    body = request.get_json(silent=True)
+    if not isinstance(body, dict):
+        raise ApiError(400, "Expected a JSON object.")
+    missing = [name for name in required if body.get(name) in (None, '')]
+    if missing:
+        raise ApiError(400, f"Missing: {', '.join(missing)}.")
+    return body
+
+
+# Dates and times go both ways in ISO 8601, as _plain() writes them: '2025-01-31' and
+# '2025-01-31T09:30:00' (requests may also write '2025-01-31 09:30').
+def _parse_datetime(value, name):
+    if value in (None, ''):
+        return None
+    try:
+        parsed = datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        raise ApiError(400, f"'{name}' must be an ISO 8601 date and time, like 2025-01-31T09:30:00.")
+    if parsed.tzinfo is not None:
+        raise ApiError(400, f"'{name}' must be a local time, without a time zone.")
+    return parsed
+
+
+def _parse_date(value, name):
+    if value in (None, ''):
+        return None
+    try:
+        return date.fromisoformat(value)
+    except (TypeError, ValueError):
+        raise ApiError(400, f"'{name}' must be an ISO 8601 date, like 2025-01-31.")
+
+
+def _json_response(payload, status=200):
+    return Response(json.dumps(payload), status=status, mimetype='application/json')
+
+
+def cached(tables):
+    """
+    Serves a GET view from the app's ResponseCache, with an ETag and conditional GET: a client
+    sending back a current ETag (If-None-Match) gets 304 and no body. The view returns the
+    payload to serialise; `tables` are what its response is invalidated by.
+    """
+    def decorate(view):
+        def wrapper(*args, **kwargs):
+            cache = g.cache
+            key = request.full_path
+            hit = cache.get(key)
+            if hit is None:
+                body = json.dumps(view(*args, **kwargs)).encode()
+                etag = hashlib.sha1(body).hexdigest()
+                cache.put(key, body, etag, tables(**kwargs) if callable(tables) else tables)
+            else:
+                body, etag = hit
+            response = Response(body, mimetype='application/json')
+            response.set_etag(etag)
+            response.headers['Cache-Control'] = 'no-cache'   # browsers may keep it, but must revalidate
+            return response.make_conditional(request)
+        wrapper.__name__ = view.__name__
+        return wrapper
+    return decorate
+
+
+def create_app(cache=None):
+    """
+    Builds the Flask app. Sessions come from src.database (its engine and pool are shared by
+    every request); each request gets its own session, closed when the request ends.
+    """
+    app = Flask(__name__)
+    app.extensions['response_cache'] = cache or ResponseCache()
+    if CORS is not None:
+        CORS(app)
+
+    @app.before_request
+    def attach_cache():
+        g.cache = app.extensions['response_cache']
+
+    @app.teardown_appcontext
+    def close_session(exception):
+        session = g.pop('session', None)
+        if session is not None:
+            session.close()
+
+    @app.errorhandler(HTTPException)
+    def json_error(error):
+        return _json_response({'error': error.description, **getattr(error, 'extra', {})}, error.code)
+
+    @app.get('/api/health')
+    def health():
+        return _json_response({'status': 'ok', 'cache': app.extensions['response_cache'].stats(),
+                               'reference_cache': reference_cache.stats()})
+
+    @app.get('/api/<resource>')
+    @cached(_resource_tables)
+    def list_resource(resource):
+        """A page of rows in id order: ?limit= (default 50, at most 500) and ?after_id= the last id seen."""
+        if resource not in RESOURCES:
+            raise ApiError(404, f"Unknown resource '{resource}'.")
+        limit = _int_arg('limit', DEFAULT_PAGE_SIZE, 1, MAX_PAGE_SIZE)
+        filters = [column == _filter_value(column, request.args[name])
+                   for name, column in RESOURCES[resource][1].items() if name in request.args]
+        items = fetch_rows(_session(), resource, filters, _int_arg('after_id'), limit)
+        # A full page may have more after it; the client passes next_after_id back as after_id.
+        return {'items': items, 'next_after_id': items[-1]['id'] if len(items) == limit else None}
+
+    @app.get('/api/<resource>/<int:row_id>')
+    @cached(_resource_tables)
+    def get_resource(resource, row_id):
+        if resource not in RESOURCES:
+            raise ApiError(404, f"Unknown resource '{resource}'.")
+        return fetch_row(_session(), resource, row_id)
+
+    @app.post('/api/patients')
+    def add_patient():
+        body = _json_body('name', 'date_of_birth', 'type')
+        dob = _parse_date(body['date_of_birth'], 'date_of_birth')
+        if body['type'] == 'inpatient':
+            patient = InPatient(name=body['name'], date_of_birth=dob, contact_info=body.get('contact_info'),
+                                patient_type=PatientType.INPATIENT, room_number=body.get('room_number'),
+                                admission_date=_parse_date(body.get('admission_date'), 'admission_date') or date.today(),
+                                discharge_date=_parse_date(body.get('discharge_date'), 'discharge_date'))
+        elif body['type'] == 'outpatient':
+            patient = OutPatient(name=body['name'], date_of_birth=dob, contact_info=body.get('contact_info'),
+                                 patient_type=PatientType.OUTPATIENT,
+                                 last_visit_date=_parse_date(body.get('last_visit_date'), 'last_visit_date'))
+        else:
+            raise ApiError(400, "'type' must be inpatient or outpatient.")
+        session = _session()
+        if isinstance(patient, InPatient):
+            try:
+                check_admission(session, patient.room_number, patient.admission_date, patient.discharge_date)
+            except RoomFull as e:
+                raise ApiError(409, str(e), occupants=e.occupants)
+        session.add(patient)
+        session.commit()
+        return _json_response(fetch_row(session, 'patients', patient.id), 201)
+
+    @app.post('/api/appointments')
+    def add_appointment():
+        body = _json_body('patient_id', 'doctor_id', 'appointment_datetime')
+        session = _session()
+        for model, key in ((Patient, 'patient_id'), (Doctor, 'doctor_id')):
+            if model.find_by_id(session, body[key]) is None:
+                raise ApiError(404, f"{model.__name__} {body[key]} not found.")
+        start = _parse_datetime(body['appointment_datetime'], 'appointment_datetime')
+        duration = body.get('duration_minutes') or DEFAULT_DURATION
+        if not isinstance(duration, int) or not 1 <= duration <= MAX_DURATION:
+            raise ApiError(400, f"'duration_minutes' must be between 1 and {MAX_DURATION}.")
+        appointment = Appointment(patient_id=body['patient_id'], doctor_id=body['doctor_id'], appointment_datetime=start,
+                                  duration_minutes=duration, reason=body.get('reason', ''),
+                                  status=AppointmentStatus.SCHEDULED)
+        try:
+            book(session, appointment)
+        except BookingConflict as e:
+            slot = next_slot(session, body['doctor_id'], start, duration)
+            raise ApiError(409, str(e), next_slot=_plain(slot))
+        return _json_response(fetch_row(session, 'appointments', appointment.id), 201)
+
+    @app.patch('/api/appointments/<int:appointment_id>')
+    def update_appointment(appointment_id):
+        body = _json_body()
+        session = _session()
+        appointment = session.get(Appointment, appointment_id)
+        if appointment is None:
+            raise ApiError(404, f"appointments {appointment_id} not found.")
+        previous, previous_start = appointment.status, appointment.appointment_datetime
+        if 'status' in body:
+            appointment.status = _filter_value(Appointment.status, body['status'])
+        if 'reason' in body:
+            appointment.reason = body['reason']
+        if body.get('appointment_datetime') not in (None, ''):
+            appointment.appointment_datetime = _parse_datetime(body['appointment_datetime'], 'appointment_datetime')
+        # Putting a cancelled appointment back on the agenda, or moving a scheduled one, needs the slot to be free.
+        moved = appointment.appointment_datetime != previous_start
+        if appointment.status == AppointmentStatus.SCHEDULED and (previous != AppointmentStatus.SCHEDULED or moved):
+            try:
+                check_available(session, appointment.doctor_id, appointment.appointment_datetime,
+                                appointment.duration_minutes, ignore_id=appointment.id)
+            except BookingConflict as e:
+                session.rollback()
+                raise ApiError(409, str(e))
+        session.commit()
+        return _json_response(fetch_row(session, 'appointments', appointment_id))
+
+    @app.delete('/api/appointments/<int:appointment_id>')
+    def delete_appointment(appointment_id):
+        session = _session()
+        appointment = session.get(Appointment, appointment_id)
+        if appointment is None:
+            raise ApiError(404, f"appointments {appointment_id} not found.")
+        session.delete(appointment)
+        session.commit()
+        return Response(status=204)
+
+    return app
+
+
+if __name__ == '__main__':
+    create_app().run(threaded=True)
+
+
+# -------------------- REQUESTS --------------------
+# python -m src.api                      (listens on http://127.0.0.1:5000)
+#         => GET    /api/patients?limit=50                       => {"items": [...], "next_after_id": 50}
+#         => GET    /api/patients?limit=50&after_id=50           (the next page)
+#         => GET    /api/appointments?doctor_id=3&status=scheduled
+#         => GET    /api/doctors/3
+#         => POST   /api/patients      {"name": "Ada", "date_of_birth": "1990-04-01", "type": "outpatient"}
+#         => POST   /api/appointments  {"patient_id": 1, "doctor_id": 3, "appointment_datetime": "2025-07-01T10:00:00"}
+#         => PATCH  /api/appointments/12  {"status": "cancelled"}
+#         => PATCH  /api/appointments/12  {"appointment_datetime": "2025-07-02T09:30:00"}
+# Dates and times are ISO 8601 both ways ("2025-07-01T10:00:00"; "2025-07-01 10:00" is accepted too).
+#         => DELETE /api/appointments/12
+# GET responses carry an ETag: send it back as If-None-Match to get 304 Not Modified when nothing changed.
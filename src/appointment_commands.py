@@ -1,15 +1,13 @@
 import click
+from src import database
 from src.database import get_db
+from src.bulk_updates import DEFAULT_CHUNK_SIZE as DEFAULT_BULK_CHUNK_SIZE, appointment_filter, bulk_set_status, preview
 from src.models import Appointment, Patient, Doctor, Department, AppointmentStatus
+from src.pagination import pagination_options, keyset, stream, echo_next_page_hint
+from src.availability import book_first_available
+from src.scheduling import BookingConflict, DEFAULT_DURATION, MAX_DURATION, SEARCH_DAYS, book, check_available, next_slot
 from datetime import datetime
 
-import sys
-import os
-
-# Add the root project directory (one level up from 'src/') to sys.path
-sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
-from config.settings import DATABASE_URL
-
 
 @click.group()
 def appointment():
@@ -20,9 +18,10 @@ def appointment():
 @click.option('--patient-id', required=True, type=int, help='ID of the patient.')
 @click.option('--doctor-id', required=True, type=int, help='ID of the doctor.')
 @click.option('--datetime', 'appointment_datetime', required=True, help="Appointment datetime in 'YYYY-MM-DD HH:MM' format.")
+@click.option('--duration', default=DEFAULT_DURATION, show_default=True, type=click.IntRange(1, MAX_DURATION), help='Length in minutes.')
 @click.option('--reason', default='', help='Reason for the appointment.')
 @click.option('--status', default='scheduled', type=click.Choice([status.value for status in AppointmentStatus]), help='Appointment status.')
-def add_appointment(patient_id, doctor_id, appointment_datetime, reason, status):
+def add_appointment(patient_id, doctor_id, appointment_datetime, duration, reason, status):
     """Add a new appointment."""
     session = next(get_db())
     try:
@@ -46,11 +45,18 @@ def add_appointment(patient_id, doctor_id, appointment_datetime, reason, status)
             patient_id=patient_id,
             doctor_id=doctor_id,
             appointment_datetime=dt,
+            duration_minutes=duration,
             reason=reason,
             status=AppointmentStatus(status)
         )
-        session.add(appointment)
-        session.commit()
+        try:
+            book(session, appointment)
+        except BookingConflict as e:
+            click.echo(f"Cannot book: {e}", err=True)
+            slot = next_slot(session, doctor_id, dt, duration)
+            if slot:
+                click.echo(f"Next free slot for doctor {doctor_id}: {slot.strftime('%Y-%m-%d %H:%M')}", err=True)
+            return
         click.echo(f"Appointment ID {appointment.id} added successfully.")
     except Exception as e:
         click.echo(f"Error adding appointment: {e}", err=True)
@@ -61,25 +67,40 @@ def add_appointment(patient_id, doctor_id, appointment_datetime, reason, status)
 @appointment.command('list')
 @click.option('--patient-id', type=int, help='Filter appointments by patient ID.')
 @click.option('--doctor-id', type=int, help='Filter appointments by doctor ID.')
-def list_appointments(patient_id, doctor_id):
+@click.option('--with-names', is_flag=True, help='Show patient and doctor names (resolved in the same query).')
+@pagination_options
+def list_appointments(patient_id, doctor_id, with_names, limit, after_id):
     """List appointments. Can filter by patient or doctor."""
     session = next(get_db())
     try:
-        query = session.query(Appointment)
+        if with_names:
+            query = (session.query(Appointment, Patient.name, Doctor.name)
+                     .join(Patient, Appointment.patient_id == Patient.id)
+                     .join(Doctor, Appointment.doctor_id == Doctor.id))
+        else:
+            query = session.query(Appointment)
         if patient_id:
             query = query.filter(Appointment.patient_id == patient_id)
         if doctor_id:
             query = query.filter(Appointment.doctor_id == doctor_id)
 
-        appointments = query.all()
-        if not appointments:
-            click.echo("No appointments found.")
-            return
-
-        for appt in appointments:
-            click.echo(f"ID: {appt.id} | Patient ID: {appt.patient_id} | Doctor ID: {appt.doctor_id} | "
+        shown, last_id = 0, None
+        for row in stream(keyset(query, Appointment.id, after_id, limit)):
+            if with_names:
+                appt, patient_name, doctor_name = row
+                who = (f"Patient: {patient_name} (ID {appt.patient_id}) | "
+                       f"Doctor: {doctor_name} (ID {appt.doctor_id}) | ")
+            else:
+                appt = row
+                who = f"Patient ID: {appt.patient_id} | Doctor ID: {appt.doctor_id} | "
+            click.echo(f"ID: {appt.id} | {who}"
                        f"Date: {appt.appointment_datetime.strftime('%Y-%m-%d %H:%M')} | Reason: {appt.reason} | "
                        f"Status: {appt.status.value}")
+            shown, last_id = shown + 1, appt.id
+        if not shown:
+            click.echo("No appointments found.")
+            return
+        echo_next_page_hint(shown, limit, last_id)
     except Exception as e:
         click.echo(f"Error listing appointments: {e}", err=True)
     finally:
@@ -91,9 +112,10 @@ def list_appointments(patient_id, doctor_id):
 @click.option('--patient-id', type=int, help='New patient ID.')
 @click.option('--doctor-id', type=int, help='New doctor ID.')
 @click.option('--datetime', 'appointment_datetime', help="New appointment datetime in 'YYYY-MM-DD HH:MM' format.")
+@click.option('--duration', type=click.IntRange(1, MAX_DURATION), help='New length in minutes.')
 @click.option('--reason', help='New reason.')
 @click.option('--status', type=click.Choice([status.value for status in AppointmentStatus]), help='New status.')
-def update_appointment(appointment_id, patient_id, doctor_id, appointment_datetime, reason, status):
+def update_appointment(appointment_id, patient_id, doctor_id, appointment_datetime, duration, reason, status):
     """Update an appointment by ID."""
     session = next(get_db())
     try:
@@ -124,12 +146,23 @@ def update_appointment(appointment_id, patient_id, doctor_id, appointment_dateti
                 click.echo("Invalid datetime format. Use 'YYYY-MM-DD HH:MM'", err=True)
                 return
 
+        if duration is not None:
+            appt.duration_minutes = duration
+
         if reason is not None:
             appt.reason = reason
         
         if status is not None:
             appt.status = AppointmentStatus(status)
 
+        # Moving, lengthening or re-activating an appointment must not double-book the doctor.
+        if (doctor_id or appointment_datetime or duration or status) and appt.status != AppointmentStatus.CANCELLED:
+            try:
+                check_available(session, appt.doctor_id, appt.appointment_datetime, appt.duration_minutes, ignore_id=appt.id)
+            except BookingConflict as e:
+                click.echo(f"Cannot update: {e}", err=True)
+                return
+
         session.commit()
         click.echo(f"Appointment ID {appointment_id} updated successfully.")
     except Exception as e:
@@ -156,6 +189,130 @@ def delete_appointment(appointment_id):
     finally:
         session.close()
 
+@appointment.command('next-slot')
+@click.option('--doctor-id', required=True, type=int, help='ID of the doctor.')
+@click.option('--after', default=None, help="Earliest start, 'YYYY-MM-DD HH:MM' (default: now).")
+@click.option('--duration', default=DEFAULT_DURATION, show_default=True, type=click.IntRange(1, MAX_DURATION), help='Length in minutes.')
+@click.option('--within-days', default=SEARCH_DAYS, show_default=True, type=click.IntRange(min=1), help='How far ahead to look.')
+def next_slot_command(doctor_id, after, duration, within_days):
+    """Find a doctor's earliest free slot within their working hours."""
+    session = next(get_db())
+    try:
+        if not Doctor.find_by_id(session, doctor_id):
+            click.echo(f"Doctor with ID {doctor_id} not found.", err=True)
+            return
+        try:
+            start = datetime.strptime(after, '%Y-%m-%d %H:%M') if after else datetime.now()
+        except ValueError:
+            click.echo("Invalid datetime format. Use 'YYYY-MM-DD HH:MM'", err=True)
+            return
+
+        slot = next_slot(session, doctor_id, start, duration, within_days)
+        if slot is None:
+            click.echo(f"No free {duration}-minute slot for doctor {doctor_id} in the next {within_days} days.")
+            return
+        click.echo(f"Next free slot for doctor {doctor_id}: {slot.strftime('%Y-%m-%d %H:%M')} ({duration} min)")
+    except Exception as e:
+        click.echo(f"Error finding a free slot: {e}", err=True)
+    finally:
+        session.close()
+
+@appointment.command('book-any')
+@click.option('--patient-id', required=True, type=int, help='ID of the patient.')
+@click.option('--department-id', type=int, help='Any doctor of this department.')
+@click.option('--specialization', help='Any doctor with this specialization.')
+@click.option('--after', default=None, help="Earliest start, 'YYYY-MM-DD HH:MM' (default: now).")
+@click.option('--duration', default=DEFAULT_DURATION, show_default=True, type=click.IntRange(1, MAX_DURATION), help='Length in minutes.')
+@click.option('--reason', default='', help='Reason for the appointment.')
+@click.option('--within-days', default=30, show_default=True, type=click.IntRange(min=1), help='How far ahead to look.')
+def book_any_command(patient_id, department_id, specialization, after, duration, reason, within_days):
+    """Book the first free doctor of a department and/or specialization."""
+    if department_id is None and specialization is None:
+        click.echo("Give --department-id and/or --specialization.", err=True)
+        return
+    session = next(get_db())
+    try:
+        if not Patient.find_by_id(session, patient_id):
+            click.echo(f"Patient with ID {patient_id} not found.", err=True)
+            return
+        try:
+            start = datetime.strptime(after, '%Y-%m-%d %H:%M') if after else datetime.now()
+        except ValueError:
+            click.echo("Invalid datetime format. Use 'YYYY-MM-DD HH:MM'", err=True)
+            return
+
+        appt = book_first_available(session, patient_id, duration, start, department_id, specialization, reason, within_days)
+        if appt is None:
+            click.echo(f"No matching doctor has a free {duration}-minute slot in the next {within_days} days.")
+            return
+        click.echo(f"Appointment ID {appt.id} booked with {appt.doctor.name} (Doctor ID {appt.doctor_id}) "
+                   f"on {appt.appointment_datetime.strftime('%Y-%m-%d %H:%M')} ({duration} min).")
+    except Exception as e:
+        click.echo(f"Error booking appointment: {e}", err=True)
+    finally:
+        session.close()
+
+DATETIME_FORMATS = ['%Y-%m-%d %H:%M', '%Y-%m-%d']
+
+
+def _run_bulk_update(new_status, where, params, chunk_size, dry_run):
+    if dry_run:
+        with database.engine.connect() as conn:
+            found = preview(conn, where, params)
+        detail = ", ".join(f"{count} {status.value}" for status, count in sorted(found.items(), key=lambda item: item[0].name))
+        click.echo(f"Dry run: {sum(found.values())} appointments would be set to {new_status.value}"
+                   + (f" ({detail})." if detail else "."))
+        return
+
+    def progress(updated):
+        click.echo(f"... {updated} appointments updated")
+
+    result = bulk_set_status(database.engine, new_status, where, params, chunk_size, progress)
+    click.echo(f"Updated {result['updated']} appointments to {new_status.value} in {result['chunks']} chunks "
+               f"({result['seconds']:.2f}s).")
+
+
+@appointment.command('bulk-update')
+@click.option('--set-status', 'new_status', required=True, type=click.Choice([status.value for status in AppointmentStatus]),
+              help='Status to give every matching appointment.')
+@click.option('--doctor-id', type=int, help="Only this doctor's appointments.")
+@click.option('--patient-id', type=int, help="Only this patient's appointments.")
+@click.option('--from', 'date_from', type=click.DateTime(DATETIME_FORMATS), help='Starting at or after this date/time.')
+@click.option('--to', 'date_to', type=click.DateTime(DATETIME_FORMATS), help='Starting before this date/time (exclusive).')
+@click.option('--status', 'statuses', multiple=True, type=click.Choice([status.value for status in AppointmentStatus]),
+              help='Only appointments currently in this status (repeatable).')
+@click.option('--chunk-size', default=DEFAULT_BULK_CHUNK_SIZE, show_default=True, type=click.IntRange(min=1),
+              help='Appointments per transaction.')
+@click.option('--dry-run', is_flag=True, help='Only report how many appointments would change.')
+def bulk_update(new_status, doctor_id, patient_id, date_from, date_to, statuses, chunk_size, dry_run):
+    """Change the status of many appointments at once (chunked, set-based)."""
+    if doctor_id is None and patient_id is None and date_from is None and date_to is None and not statuses:
+        click.echo("Give at least one filter (--doctor-id, --patient-id, --from, --to or --status).", err=True)
+        return
+    try:
+        new_status = AppointmentStatus(new_status)
+        where, params = appointment_filter(new_status, doctor_id, patient_id, date_from, date_to,
+                                           [AppointmentStatus(status) for status in statuses])
+        _run_bulk_update(new_status, where, params, chunk_size, dry_run)
+    except Exception as e:
+        click.echo(f"Error updating appointments: {e}", err=True)
+
+
+@appointment.command('sweep')
+@click.option('--before', type=click.DateTime(DATETIME_FORMATS), default=None,
+              help='Complete scheduled appointments that ended by this date/time (default: now).')
+@click.option('--chunk-size', default=DEFAULT_BULK_CHUNK_SIZE, show_default=True, type=click.IntRange(min=1),
+              help='Appointments per transaction.')
+@click.option('--dry-run', is_flag=True, help='Only report how many appointments would change.')
+def sweep(before, chunk_size, dry_run):
+    """Mark every scheduled appointment that is over as completed (the nightly job)."""
+    try:
+        where, params = appointment_filter(AppointmentStatus.COMPLETED, statuses=[AppointmentStatus.SCHEDULED],
+                                           ended_before=before or datetime.now())
+        _run_bulk_update(AppointmentStatus.COMPLETED, where, params, chunk_size, dry_run)
+    except Exception as e:
+        click.echo(f"Error sweeping appointments: {e}", err=True)
+
 if __name__ == '__main__':
     appointment()
 # This code defines a command-line interface (CLI) for managing appointments in a hospital management system.
@@ -166,6 +323,16 @@ if __name__ == '__main__':
 # To add a appointment
 #         => python -m src.cli appointment add --patient-id 1 --doctor-id 2 --datetime "2025-06-10 14:00" --reason "Checkup" --status scheduled
 
+# Bookings are checked against the doctor's other appointments; an overlap is refused and the next free slot suggested
+#         => python -m src.cli appointment add --patient-id 1 --doctor-id 2 --datetime "2025-06-10 14:00" --duration 45
+
+# To find a doctor's earliest free slot
+#         => python -m src.cli appointment next-slot --doctor-id 2 --after "2025-06-10 09:00" --duration 30
+
+# To book whichever doctor of a department (or specialization) is free first, within their shifts
+#         => python -m src.cli appointment book-any --patient-id 1 --department-id 2 --after "2025-06-10 09:00"
+#         => python -m src.cli appointment book-any --patient-id 1 --specialization Cardiologist --duration 45
+
 # To list appointments
 #         => python -m src.cli appointment list
 
@@ -175,8 +342,22 @@ if __name__ == '__main__':
 # To list specific doctor appointments
 #         => python -m src.cli appointment list --doctor-id 1
 
+# To list appointments with patient and doctor names
+#         => python -m src.cli appointment list --with-names
+
+# To page through appointments (keyset pagination on ID)
+#         => python -m src.cli appointment list --limit 100 --after-id 4200
+
 # To update a appointment
 #         => python -m src.cli appointment update 3 --patient-id 2 --doctor-id 4 --datetime "2025-06-15 09:00" --reason "Follow-up" --status completed
 
 # To delete a appointment 
-#         => python -m src.cli appointment delete <appointment_id>
\ No newline at end of file
+#         => python -m src.cli appointment delete <appointment_id>
+
+# To change many appointments at once (chunked UPDATEs; --dry-run only counts them)
+#         => python -m src.cli appointment bulk-update --set-status cancelled --doctor-id 4 --from 2025-07-01 --to 2025-07-15
+#         => python -m src.cli appointment bulk-update --set-status completed --patient-id 12 --status scheduled --dry-run
+
+# Nightly job: every scheduled appointment that is over becomes completed
+#         => python -m src.cli appointment sweep
+#         => python -m src.cli appointment sweep --before "2025-06-30 23:59" --dry-run
\ No newline at end of file
@@ -0,0 +1,223 @@
+import os
+import time
+from contextlib import contextmanager
+
+from sqlalchemy import Column, Index, MetaData, Table, delete, func, insert, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.schema import CreateColumn
+
+from src import counters, database, patient_summary
+from src.models import Appointment, AppointmentStatus, MedicalRecord
+from src.search import create_record_index
+
+# Old appointments and medical records move to a second SQLite file (`archive` command), attached
+# as schema 'archive' only by the reads that ask for it (--include-archive). The everyday tables,
+# their indexes and the search index then hold just the working set.
+# The file defaults to <database>_archive.db next to the database; HMS_ARCHIVE_PATH overrides it.
+ARCHIVE_SCHEMA = 'archive'
+DEFAULT_CHUNK_SIZE = 5000
+
+_archive_metadata = MetaData(schema=ARCHIVE_SCHEMA)
+
+
+def _mirror(table, *indexes):
+    # Same columns and types, no foreign keys: SQLite cannot point them at another database.
+    # Archived rows of a deleted patient or doctor are removed by delete_archived() instead.
+    columns = [Column(column.name, column.type, primary_key=column.primary_key) for column in table.columns]
+    return Table(table.name, _archive_metadata, *columns,
+                 *(Index(f"ix_{table.name}_{'_'.join(names)}", *names) for names in indexes))
+
+
+# Archived table => (main table, its date column, archive table)
+ARCHIVED = {
+    'appointments': (Appointment.__table__, Appointment.__table__.c.appointment_datetime,
+                     _mirror(Appointment.__table__, ('patient_id', 'appointment_datetime'),
+                             ('doctor_id', 'appointment_datetime'))),
+    'medical_records': (MedicalRecord.__table__, MedicalRecord.__table__.c.record_date,
+                        _mirror(MedicalRecord.__table__, ('patient_id', 'record_date'), ('doctor_id', 'record_date'))),
+}
+
+
+def archive_path(engine=None):
+    engine = engine or database.engine
+    return archive_file_for(engine.url.database)
+
+
+def archive_file_for(database_file, configured=True):
+    """The archive of a database file; configured=False ignores HMS_ARCHIVE_PATH (e.g. for a restored copy)."""
+    if configured and os.getenv("HMS_ARCHIVE_PATH"):
+        return os.getenv("HMS_ARCHIVE_PATH")
+    if not database_file or database_file == ':memory:':
+        raise RuntimeError("An in-memory database has no archive file; set HMS_ARCHIVE_PATH.")
+    stem, extension = os.path.splitext(database_file)
+    return f"{stem}_archive{extension or '.db'}"
+
+
+def has_archive(engine=None):
+    return os.path.exists(archive_path(engine))
+
+
+@contextmanager
+def attached(connection, path=None):
+    """Attaches the archive file to this connection for the duration of the block."""
+    connection.exec_driver_sql(f"ATTACH DATABASE ? AS {ARCHIVE_SCHEMA}", (path or archive_path(connection.engine),))
+    try:
+        yield connection
+    finally:
+        connection.rollback()
+        connection.exec_driver_sql(f"DETACH DATABASE {ARCHIVE_SCHEMA}")
+
+
+@contextmanager
+def reading(session, include_archive):
+    """
+    Yields the schemas a read should cover: ('main',), or ('main', 'archive') with the archive
+    attached to the session's connection when include_archive is set and an archive exists.
+    """
+    if not include_archive or not has_archive(session.get_bind()):
+        yield ('main',)
+        return
+    connection = session.connection()
+    connection.exec_driver_sql(f"ATTACH DATABASE ? AS {ARCHIVE_SCHEMA}", (archive_path(session.get_bind()),))
+    try:
+        yield ('main', ARCHIVE_SCHEMA)
+    finally:
+        connection.exec_driver_sql(f"DETACH DATABASE {ARCHIVE_SCHEMA}")
+
+
+def ensure_archive(connection):
+    """Creates the archive tables, indexes and search index, and adds columns the models gained since."""
+    # Same journal as the main database: in WAL mode a backup's read of the archive does not block the archive.
+    if connection.exec_driver_sql("PRAGMA main.journal_mode").scalar().lower() == 'wal':
+        connection.exec_driver_sql(f"PRAGMA {ARCHIVE_SCHEMA}.journal_mode=WAL")
+    _archive_metadata.create_all(connection)
+    for _, _, table in ARCHIVED.values():
+        existing = {row[1] for row in connection.exec_driver_sql(f"PRAGMA {ARCHIVE_SCHEMA}.table_info({table.name})")}
+        for column in table.columns:
+            if column.name not in existing:
+                ddl = CreateColumn(column).compile(dialect=connection.dialect)
+                connection.exec_driver_sql(f"ALTER TABLE {ARCHIVE_SCHEMA}.{table.name} ADD COLUMN {ddl}")
+    create_record_index(connection, ARCHIVE_SCHEMA)
+
+
+def _reserve_ids(connection):
+    # Moves the main tables' AUTOINCREMENT sequences past the highest archived id, so a new row
+    # never takes the id of an archived one (which would then collide when it is archived in turn).
+    # Tables created before they used AUTOINCREMENT have no sequence; create_tables() rebuilds them.
+    if connection.exec_driver_sql("SELECT 1 FROM main.sqlite_master WHERE name = 'sqlite_sequence'").first() is None:
+        return
+    for name, (_, _, archive_table) in ARCHIVED.items():
+        top = connection.execute(select(func.max(archive_table.c.id))).scalar()
+        if top is None:
+            continue
+        connection.exec_driver_sql("UPDATE main.sqlite_sequence SET seq = ? WHERE name = ? AND seq < ?", (top, name, top))
+        connection.exec_driver_sql(
+            "INSERT INTO main.sqlite_sequence (name, seq) SELECT ?, ? "
+            "WHERE NOT EXISTS (SELECT 1 FROM main.sqlite_sequence WHERE name = ?)", (name, top, name))
+
+
+def reserve_archived_ids(engine):
+    """Keeps new appointment and record ids above the archived ones (create_tables runs this)."""
+    if engine.dialect.name != 'sqlite':
+        return
+    try:
+        if not has_archive(engine):
+            return
+    except RuntimeError:   # in-memory database: no archive
+        return
+    with engine.connect() as conn, attached(conn):
+        ensure_archive(conn)
+        _reserve_ids(conn)
+        conn.commit()
+
+
+def _old_rows(name, cutoff):
+    main_table, date_column, _ = ARCHIVED[name]
+    conditions = [date_column < cutoff]
+    if name == 'appointments':
+        # Still-scheduled appointments are open business (appointment sweep closes them), not history.
+        conditions.append(main_table.c.status != AppointmentStatus.SCHEDULED)
+    return conditions
+
+
+def count_archivable(engine, cutoff):
+    """{table: rows older than cutoff that archive_rows() would move} (the dry run)."""
+    with engine.connect() as conn:
+        return {name: conn.execute(select(func.count()).select_from(main_table).where(*_old_rows(name, cutoff))).scalar()
+                for name, (main_table, _, _) in ARCHIVED.items()}
+
+
+def archive_rows(engine, cutoff, chunk_size=DEFAULT_CHUNK_SIZE, progress=None, path=None):
+    """
+    Moves appointments (except still-scheduled ones) and medical records dated before cutoff
+    into the archive, chunk_size rows per transaction. Chunks follow the primary key, so the
+    table is read once from start to end, however many chunks it takes. Each chunk is copied,
+    checked and only then deleted. Rows the archive already holds unchanged are not copied
+    again: if a crash leaves a chunk in both files (a commit spans two databases), running the
+    archive again finishes the move. A row whose id the archive holds with other contents
+    raises RuntimeError and its chunk is rolled back, so nothing is deleted that is not archived.
+    Returns {'appointments': rows, 'medical_records': rows, 'chunks': transactions, 'seconds': elapsed}.
+    """
+    started = time.perf_counter()
+    result = {'chunks': 0}
+    with engine.connect() as conn, attached(conn, path):
+        ensure_archive(conn)
+        _reserve_ids(conn)
+        conn.commit()
+        for name, (main_table, _, archive_table) in ARCHIVED.items():
+            key = main_table.c.id
+            result[name], last_id = 0, 0
+            columns = [column.name for column in main_table.columns]
+            while True:
+                chunk = select(key).where(key > last_id, *_old_rows(name, cutoff)).order_by(key).limit(chunk_size)
+                upto = conn.execute(select(func.max(chunk.subquery().c.id))).scalar()
+                if upto is None:
+                    break
+                in_chunk = [key > last_id, key <= upto, *_old_rows(name, cutoff)]
+                # Counters count what is left in the main database.
+                moving = counters.tally(conn, main_table, *in_chunk)
+                patients = patient_summary.patients_of(conn, main_table, *in_chunk)
+                rows = select(*main_table.columns).where(*in_chunk)
+                # The chunk's rows that the archive does not already hold unchanged.
+                missing = rows.except_(select(*archive_table.columns).where(archive_table.c.id > last_id,
+                                                                            archive_table.c.id <= upto))
+                expected = conn.execute(select(func.count()).select_from(rows.subquery())).scalar()
+                try:
+                    conn.execute(insert(archive_table).from_select(columns, missing))
+                except IntegrityError:
+                    conn.rollback()
+                    raise RuntimeError(f"{name} {last_id + 1}-{upto}: the archive already holds a different row "
+                                       f"with the same id; nothing was moved.")
+                left = conn.execute(select(func.count()).select_from(missing.subquery())).scalar()
+                moved = conn.execute(delete(main_table).where(*in_chunk)).rowcount
+                if left or moved != expected:
+                    conn.rollback()
+                    raise RuntimeError(f"{name} {last_id + 1}-{upto}: {expected - left} of {expected} rows archived, "
+                                       f"{moved} about to be deleted; nothing was moved.")
+                counters.add(conn, main_table, moving, sign=-1)
+                patient_summary.refresh(conn, patients)
+                conn.commit()
+                result[name] += moved
+                result['chunks'] += 1
+                last_id = upto
+                if progress:
+                    progress(name, result[name])
+    result['seconds'] = time.perf_counter() - started
+    return result
+
+
+def delete_archived(engine, table, row_id):
+    """
+    Removes a deleted patient's or doctor's archived rows (`table` is patients or doctors);
+    in the main database ON DELETE CASCADE does this. Returns the number of rows removed.
+    """
+    if not has_archive(engine):
+        return 0
+    removed = 0
+    with engine.connect() as conn, attached(conn):
+        for main_table, _, archive_table in ARCHIVED.values():
+            for fk in main_table.foreign_keys:
+                if fk.column.table is table:
+                    removed += conn.execute(delete(archive_table).where(archive_table.c[fk.parent.name] == row_id)).rowcount
+        conn.commit()
+    return removed
@@ -0,0 +1,45 @@
+import click
+from datetime import date
+
+from src import database
+from src.archive import DEFAULT_CHUNK_SIZE, archive_path, archive_rows, count_archivable
+
+
+@click.command()
+@click.option('--before', 'cutoff', required=True, type=click.DateTime(['%Y-%m-%d']),
+              help='Move appointments and medical records dated before this day (YYYY-MM-DD).')
+@click.option('--chunk-size', default=DEFAULT_CHUNK_SIZE, show_default=True, type=click.IntRange(min=1),
+              help='Rows moved per transaction.')
+@click.option('--dry-run', is_flag=True, help='Only count the rows that would move.')
+def archive(cutoff, chunk_size, dry_run):
+    """Move old appointments and medical records into the archive database."""
+    if cutoff.date() > date.today():
+        click.echo("--before cannot be in the future: only history is archived.", err=True)
+        return
+    try:
+        path = archive_path(database.engine)
+        if dry_run:
+            counts = count_archivable(database.engine, cutoff)
+            click.echo(f"Dry run: {counts['appointments']} appointments and {counts['medical_records']} medical records "
+                       f"before {cutoff:%Y-%m-%d} would move to {path}.")
+            return
+
+        def progress(table, moved):
+            click.echo(f"... {moved} {table} archived")
+
+        result = archive_rows(database.engine, cutoff, chunk_size, progress)
+        click.echo(f"Archived {result['appointments']} appointments and {result['medical_records']} medical records "
+                   f"before {cutoff:%Y-%m-%d} into {path} in {result['chunks']} chunks ({result['seconds']:.2f}s).")
+    except Exception as e:
+        click.echo(f"Error archiving: {e}", err=True)
+
+
+# -------------------- COMMANDS TO RUN --------------------
+# To move history older than a date into <database>_archive.db (HMS_ARCHIVE_PATH sets another file)
+#         => python -m src.cli archive --before 2023-01-01 --dry-run
+#         => python -m src.cli archive --before 2023-01-01
+#         => python -m src.cli archive --before 2023-01-01 --chunk-size 20000
+# Scheduled appointments are never archived. Reads that should see archived rows take --include-archive:
+#         => python -m src.cli patient timeline 12 --include-archive
+#         => python -m src.cli patient search-records "asthma" --include-archive
+#         => python -m src.cli export all ./export --include-archive
@@ -0,0 +1,374 @@
+import math
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+
+from sqlalchemy import delete, event, inspect, insert, select
+from sqlalchemy.orm import object_session
+
+from src.database import Session
+from src.models import Appointment, AppointmentStatus, Doctor, DoctorDaySlots, DoctorShift, Patient
+
+# A day is split into 15-minute slots; a doctor's day is two 96-bit integers:
+#   working  => slots inside one of the doctor's shifts (from doctor_shifts, per weekday)
+#   busy     => slots touched by an active appointment (stored in doctor_day_slots)
+# A doctor can take an appointment of k slots starting at slot i when bits i..i+k-1 of
+# working & ~busy are all set.
+SLOT_MINUTES = 15
+SLOTS_PER_DAY = 24 * 60 // SLOT_MINUTES
+_BITMAP_BYTES = SLOTS_PER_DAY // 8
+_FULL_DAY = (1 << SLOTS_PER_DAY) - 1
+_MAX_SPAN = timedelta(hours=12)  # matches scheduling.MAX_DURATION
+_SEARCH_CHUNK_DAYS = 7
+
+WEEKDAYS = ('mon', 'tue', 'wed', 'thu', 'fri', 'sat', 'sun')
+# Doctors without configured shifts work Monday to Friday, 09:00-17:00.
+DEFAULT_SHIFTS = [(weekday, time(9), time(17)) for weekday in range(5)]
+
+_slots_table = DoctorDaySlots.__table__
+
+
+def to_bytes(bitmap):
+    return bitmap.to_bytes(_BITMAP_BYTES, 'little')
+
+
+def from_bytes(blob):
+    return int.from_bytes(blob, 'little') if blob else 0
+
+
+def _slot_range(first, last):
+    # Bits first..last-1.
+    return ((1 << last) - 1) ^ ((1 << first) - 1) if last > first else 0
+
+
+def _minutes(moment):
+    return moment.hour * 60 + moment.minute + moment.second / 60
+
+
+def span_bits(start, minutes):
+    """
+    Yields (day, bitmap) for every day the interval [start, start + minutes) touches,
+    with the bits of each slot it overlaps even partly.
+    """
+    end = start + timedelta(minutes=minutes)
+    day = start.date()
+    while datetime.combine(day, time.min) < end:
+        day_start = datetime.combine(day, time.min)
+        first = max(0, int((start - day_start).total_seconds() // 60) // SLOT_MINUTES)
+        last = min(SLOTS_PER_DAY, math.ceil((end - day_start).total_seconds() / 60 / SLOT_MINUTES))
+        yield day, _slot_range(first, last)
+        day += timedelta(days=1)
+
+
+def weekly_masks(shifts):
+    """
+    Working-slot bitmaps for Monday..Sunday from (weekday, start_time, end_time) shifts.
+    Shifts ending at or before their start continue on the next day.
+    """
+    masks = [0] * 7
+    for weekday, start, end in shifts:
+        first = math.ceil(_minutes(start) / SLOT_MINUTES)
+        last = int(_minutes(end) // SLOT_MINUTES)
+        if last > first:
+            masks[weekday] |= _slot_range(first, last)
+        else:
+            masks[weekday] |= _slot_range(first, SLOTS_PER_DAY)
+            masks[(weekday + 1) % 7] |= _slot_range(0, last)
+    return masks
+
+
+def run_starts(free, slots):
+    """Bits at which `slots` consecutive free slots begin."""
+    starts = free
+    for shift in range(1, slots):
+        starts &= free >> shift
+    return starts
+
+
+def working_periods(masks, after, until):
+    """
+    Yields (start, end) of the working time in weekly_masks() `masks` that ends after `after`
+    and starts before `until`, in time order. A period running past midnight is yielded whole.
+    """
+    day = after.date() - timedelta(days=1)   # a night shift may have started the day before
+    pending = None
+    while datetime.combine(day, time.min) < until:
+        bits = masks[day.weekday()]
+        while bits:
+            first = (bits & -bits).bit_length() - 1
+            run = bits >> first
+            last = first + ((run + 1) & ~run).bit_length() - 1
+            bits &= ~_slot_range(first, last)
+            start = datetime.combine(day, time.min) + timedelta(minutes=first * SLOT_MINUTES)
+            end = datetime.combine(day, time.min) + timedelta(minutes=last * SLOT_MINUTES)
+            if pending and pending[1] == start:
+                pending = (pending[0], end)
+                continue
+            if pending and pending[1] > after and pending[0] < until:
+                yield pending
+            pending = (start, end)
+        day += timedelta(days=1)
+    if pending and pending[1] > after and pending[0] < until:
+        yield pending
+
+
+# --- Keeping doctor_day_slots up to date ---
+
+def _store(connection, doctor_id, day, bitmap):
+    connection.execute(delete(_slots_table).where(_slots_table.c.doctor_id == doctor_id, _slots_table.c.day == day))
+    if bitmap:
+        connection.execute(insert(_slots_table).values(doctor_id=doctor_id, day=day, busy=to_bytes(bitmap)))
+
+
+def mark_busy(connection, doctor_id, start, minutes):
+    """Sets the bits of one new booking (an OR into the existing bitmaps)."""
+    for day, bits in span_bits(start, minutes):
+        current = connection.execute(
+            select(_slots_table.c.busy).where(_slots_table.c.doctor_id == doctor_id, _slots_table.c.day == day)
+        ).scalar()
+        _store(connection, doctor_id, day, from_bytes(current) | bits)
+
+
+def rebuild_days(connection, doctor_id, days):
+    """
+    Recomputes one doctor's bitmaps for the given days from the appointments table. Used when
+    bookings move or disappear: clearing bits in place could free a slot a neighbour still touches.
+    """
+    days = sorted(set(days))
+    if not days:
+        return
+    low = datetime.combine(days[0], time.min) - _MAX_SPAN
+    high = datetime.combine(days[-1], time.min) + timedelta(days=1)
+    rows = connection.execute(
+        select(Appointment.appointment_datetime, Appointment.duration_minutes)
+        .where(Appointment.doctor_id == doctor_id,
+               Appointment.appointment_datetime >= low,
+               Appointment.appointment_datetime < high,
+               Appointment.status != AppointmentStatus.CANCELLED)
+    )
+    bitmaps = dict.fromkeys(days, 0)
+    for start, minutes in rows:
+        for day, bits in span_bits(start, minutes or 30):
+            if day in bitmaps:
+                bitmaps[day] |= bits
+    # One DELETE and one batched INSERT, however many days (a reassignment can touch thousands).
+    connection.execute(delete(_slots_table).where(_slots_table.c.doctor_id == doctor_id, _slots_table.c.day.in_(days)))
+    rows = [{'doctor_id': doctor_id, 'day': day, 'busy': to_bytes(bitmap)} for day, bitmap in bitmaps.items() if bitmap]
+    if rows:
+        connection.execute(insert(_slots_table), rows)
+
+
+def rebuild_all(engine):
+    """
+    Recomputes every bitmap from scratch, for data loaded without the ORM (bulk seed/import).
+    Reads appointments with the raw driver; type processing would cost more than the bit work.
+    Returns the number of (doctor, day) bitmaps written.
+    """
+    bitmaps = defaultdict(int)
+    with engine.begin() as conn:
+        conn.execute(delete(_slots_table))
+        rows = conn.exec_driver_sql(
+            "SELECT doctor_id, appointment_datetime, duration_minutes FROM appointments WHERE status != ?",
+            (AppointmentStatus.CANCELLED.name,)
+        )
+        for doctor_id, start, minutes in rows:
+            minutes = minutes or 30
+            # Fast path straight off the stored 'YYYY-MM-DD HH:MM:SS.ffffff' text for the usual
+            # whole-minute appointment that ends the same day; span_bits() handles the rest.
+            first_minute = int(start[11:13]) * 60 + int(start[14:16])
+            if first_minute + minutes <= 24 * 60 and start[17:19] in ('', '00') and not start[20:].strip('0'):
+                last = -(-(first_minute + minutes) // SLOT_MINUTES)
+                bitmaps[doctor_id, start[:10]] |= _slot_range(first_minute // SLOT_MINUTES, last)
+                continue
+            for day, bits in span_bits(datetime.fromisoformat(start), minutes):
+                bitmaps[doctor_id, day.isoformat()] |= bits
+        if bitmaps:
+            conn.exec_driver_sql(
+                "INSERT INTO doctor_day_slots (doctor_id, day, busy) VALUES (?, ?, ?)",
+                [(doctor_id, day, to_bytes(bitmap)) for (doctor_id, day), bitmap in bitmaps.items()]
+            )
+    return len(bitmaps)
+
+
+def _days_of(start, minutes):
+    return [day for day, _ in span_bits(start, minutes or 30)] if start else []
+
+
+@event.listens_for(Appointment, 'after_insert')
+def _appointment_inserted(mapper, connection, target):
+    if target.status != AppointmentStatus.CANCELLED:
+        mark_busy(connection, target.doctor_id, target.appointment_datetime, target.duration_minutes or 30)
+
+
+@event.listens_for(Appointment, 'after_update')
+def _appointment_updated(mapper, connection, target):
+    state = inspect(target)
+    watched = ('doctor_id', 'appointment_datetime', 'duration_minutes', 'status')
+    if not any(state.attrs[name].history.has_changes() for name in watched):
+        return
+
+    def before(name):
+        history = state.attrs[name].history
+        return history.deleted[0] if history.deleted else getattr(target, name)
+
+    old_doctor = before('doctor_id')
+    old_days = _days_of(before('appointment_datetime'), before('duration_minutes'))
+    new_days = _days_of(target.appointment_datetime, target.duration_minutes)
+    if old_doctor == target.doctor_id:
+        rebuild_days(connection, target.doctor_id, old_days + new_days)
+    else:
+        rebuild_days(connection, old_doctor, old_days)
+        rebuild_days(connection, target.doctor_id, new_days)
+
+
+@event.listens_for(Session, 'before_flush')
+def _note_deleted_doctors(session, flush_context, instances):
+    session.info['hms_deleted_doctors'] = {obj.id for obj in session.deleted if isinstance(obj, Doctor)}
+
+
+@event.listens_for(Appointment, 'after_delete')
+def _appointment_deleted(mapper, connection, target):
+    session = object_session(target)
+    if session is not None and target.doctor_id in session.info.get('hms_deleted_doctors', ()):
+        return  # the doctor's bitmaps all go at once, by ON DELETE CASCADE
+    rebuild_days(connection, target.doctor_id, _days_of(target.appointment_datetime, target.duration_minutes))
+
+
+# A deleted doctor's bitmaps go with them (doctor_day_slots.doctor_id is ON DELETE CASCADE).
+# A deleted patient's appointments are removed by the database too, without ORM events, so
+# the days they occupied are looked up first and rebuilt once the rows are gone.
+
+def patient_bookings(connection, patient_id):
+    """{doctor_id: days} touched by the patient's active appointments."""
+    rows = connection.execute(
+        select(Appointment.doctor_id, Appointment.appointment_datetime, Appointment.duration_minutes)
+        .where(Appointment.patient_id == patient_id, Appointment.status != AppointmentStatus.CANCELLED)
+    )
+    days = defaultdict(set)
+    for doctor_id, start, minutes in rows:
+        days[doctor_id].update(_days_of(start, minutes))
+    return days
+
+
+def release_bookings(connection, bookings):
+    """Rebuilds the bitmaps of the days patient_bookings() returned, after the appointments are deleted."""
+    for doctor_id, days in bookings.items():
+        rebuild_days(connection, doctor_id, days)
+
+
+@event.listens_for(Patient, 'before_delete', propagate=True)
+def _patient_deleting(mapper, connection, target):
+    inspect(target).info['hms_bookings'] = patient_bookings(connection, target.id)
+
+
+@event.listens_for(Patient, 'after_delete', propagate=True)
+def _patient_deleted(mapper, connection, target):
+    release_bookings(connection, inspect(target).info.pop('hms_bookings', {}))
+
+
+# --- Finding the first free doctor ---
+
+def working_masks(session, doctor_ids):
+    """{doctor_id: weekly_masks()} for the given doctors, from one query over their shifts."""
+    shifts = defaultdict(list)
+    for doctor_id, weekday, start, end in session.execute(
+            select(DoctorShift.doctor_id, DoctorShift.weekday, DoctorShift.start_time, DoctorShift.end_time)
+            .where(DoctorShift.doctor_id.in_(doctor_ids))):
+        shifts[doctor_id].append((weekday, start, end))
+    default_masks = weekly_masks(DEFAULT_SHIFTS)
+    return {doctor_id: weekly_masks(shifts[doctor_id]) if doctor_id in shifts else default_masks
+            for doctor_id in doctor_ids}
+
+
+def _doctor_filter(department_id=None, specialization=None):
+    conditions = []
+    if department_id is not None:
+        conditions.append(Doctor.department_id == department_id)
+    if specialization is not None:
+        conditions.append(Doctor.specialization == specialization)
+    return conditions
+
+
+def first_available(session, duration, after, department_id=None, specialization=None, within_days=30, exclude=()):
+    """
+    Finds the earliest slot boundary >= after at which some doctor of the department and/or
+    specialization is working and free for `duration` minutes, without a query per doctor:
+    one query for the candidates' shifts and one per week for their busy bitmaps. Each day is
+    answered with bit operations: per doctor working & ~busy, then the run-start bits of all
+    doctors OR-ed together; the lowest set bit is the earliest slot. Ties go to the doctor
+    with the fewest booked slots that day, then the lowest ID.
+    Returns (doctor_id, start) or None. `exclude` holds (doctor_id, start) pairs to skip.
+    """
+    conditions = _doctor_filter(department_id, specialization)
+    doctor_ids = session.scalars(select(Doctor.id).where(*conditions).order_by(Doctor.id)).all()
+    if not doctor_ids:
+        return None
+
+    masks = working_masks(session, doctor_ids)
+
+    slots = math.ceil(duration / SLOT_MINUTES)
+    first_day = after.date()
+    # Slots starting before `after` on the first day are not bookable.
+    not_before = _slot_range(0, math.ceil(_minutes(after) / SLOT_MINUTES))
+    excluded = defaultdict(int)
+    for doctor_id, start in exclude:
+        excluded[doctor_id, start.date()] |= 1 << int(_minutes(start) // SLOT_MINUTES)
+
+    for offset in range(0, within_days, _SEARCH_CHUNK_DAYS):
+        low = first_day + timedelta(days=offset)
+        high = first_day + timedelta(days=min(offset + _SEARCH_CHUNK_DAYS, within_days))
+        busy = defaultdict(dict)
+        for doctor_id, day, bitmap in session.execute(
+                select(DoctorDaySlots.doctor_id, DoctorDaySlots.day, DoctorDaySlots.busy)
+                .join(Doctor, Doctor.id == DoctorDaySlots.doctor_id)
+                .where(*conditions, DoctorDaySlots.day >= low, DoctorDaySlots.day < high)):
+            busy[day][doctor_id] = from_bytes(bitmap)
+
+        day = low
+        while day < high:
+            busy_today = busy.get(day, {})
+            starts = {}
+            any_start = 0
+            for doctor_id in doctor_ids:
+                free = masks[doctor_id][day.weekday()] & ~busy_today.get(doctor_id, 0) & _FULL_DAY
+                if day == first_day:
+                    free &= ~not_before
+                doctor_starts = run_starts(free, slots) & ~excluded.get((doctor_id, day), 0)
+                if doctor_starts:
+                    starts[doctor_id] = doctor_starts
+                    any_start |= doctor_starts
+            if any_start:
+                slot = (any_start & -any_start).bit_length() - 1
+                # Least-booked doctor first (bin().count rather than int.bit_count, which needs 3.10).
+                chosen = min((doctor_id for doctor_id, bits in starts.items() if bits >> slot & 1),
+                             key=lambda doctor_id: (bin(busy_today.get(doctor_id, 0)).count('1'), doctor_id))
+                return chosen, datetime.combine(day, time.min) + timedelta(minutes=slot * SLOT_MINUTES)
+            day += timedelta(days=1)
+    return None
+
+
+def book_first_available(session, patient_id, duration, after, department_id=None, specialization=None,
+                         reason='', within_days=30, attempts=5):
+    """
+    Books the patient with the first free doctor (see first_available). The booking still goes
+    through scheduling.book(), so a stale bitmap (rows written without the ORM) can never cause a
+    double booking: on a conflict the doctor's bitmaps are rebuilt and the search runs again.
+    Returns the new Appointment, or None if nobody is free within `within_days`.
+    """
+    from src.scheduling import BookingConflict, book
+
+    tried = []
+    for _ in range(attempts):
+        found = first_available(session, duration, after, department_id, specialization, within_days, tried)
+        if found is None:
+            return None
+        doctor_id, start = found
+        appointment = Appointment(patient_id=patient_id, doctor_id=doctor_id, appointment_datetime=start,
+                                  duration_minutes=duration, reason=reason, status=AppointmentStatus.SCHEDULED)
+        try:
+            return book(session, appointment)
+        except BookingConflict:
+            session.rollback()
+            rebuild_days(session.connection(), doctor_id, _days_of(start, duration))
+            session.commit()
+            tried.append(found)
+    return None
@@ -0,0 +1,287 @@
+import hashlib
+import json
+import os
+import sqlite3
+import tempfile
+import time
+from datetime import datetime
+
+from src import database
+from src.archive import ARCHIVE_SCHEMA, archive_file_for
+
+# A backup directory holds:
+#   chunks/ab/<sha256>        => pieces of database files, named by their checksum and stored once
+#   snapshots/<id>.json       => one manifest per snapshot: its chunks in order, sizes and checksums,
+#                                and the same for the archive database under 'archive' when one exists
+# A snapshot only stores the chunks the previous ones do not already have, so a backup of a large
+# database that changed a little writes little. Manifests are written last: a snapshot is listed
+# only once all its chunks are on disk. The database and its archive (src/archive.py) are copied,
+# verified and restored together: archived history is only in the archive file.
+CHUNK_BYTES = 4 * 1024 * 1024
+DEFAULT_STEP_PAGES = 1024     # pages copied per backup step (4 MiB with 4 KiB pages)
+DEFAULT_SLEEP = 0.01          # seconds between steps, for other connections to get their turn
+
+
+class BackupError(RuntimeError):
+    """Raised when a snapshot is missing, damaged or cannot be restored."""
+
+
+def database_path(engine=None):
+    engine = engine or database.engine
+    if engine.dialect.name != 'sqlite' or not engine.url.database or engine.url.database == ':memory:':
+        raise BackupError("Only an SQLite database file can be backed up.")
+    return engine.url.database
+
+
+def online_copy(source_path, target_path, step_pages=DEFAULT_STEP_PAGES, sleep=DEFAULT_SLEEP, progress=None,
+                archive=None):
+    """
+    Copies a live database with the SQLite online backup API, step_pages pages per step and
+    a pause between steps. In WAL mode (the prod profile) the copy reads one snapshot held open
+    by a read transaction: writers carry on as usual, and the copy never restarts because
+    of them. Without WAL, each step takes a shared lock of its own and a write between steps
+    makes the copy start over. progress(copied pages, total pages) follows every step.
+    archive=(archive file, its target) also copies the archive, attached and read in the same
+    transaction, so a row being archived meanwhile is in exactly one of the two copies.
+    """
+    source = sqlite3.connect(source_path, isolation_level=None, timeout=30)
+    copies = [('main', target_path)]
+    try:
+        if archive:
+            source.execute(f"ATTACH DATABASE ? AS {ARCHIVE_SCHEMA}", (archive[0],))
+            copies.append((ARCHIVE_SCHEMA, archive[1]))
+        pinned = source.execute("PRAGMA journal_mode").fetchone()[0].lower() == 'wal'
+        if pinned:
+            source.execute("BEGIN")
+            source.execute(" UNION ALL ".join(f"SELECT count(*) FROM {name}.sqlite_master" for name, _ in copies)).fetchall()
+        for name, path in copies:
+            target = sqlite3.connect(path)
+            try:
+                source.backup(target, pages=step_pages, sleep=sleep, name=name,
+                              progress=(lambda status, remaining, total: progress(total - remaining, total))
+                              if progress else None)
+                # The copy is a single self-contained file, not a WAL database waiting for its -wal.
+                target.execute("PRAGMA journal_mode=DELETE")
+            finally:
+                target.close()
+        if pinned:
+            source.execute("COMMIT")
+    finally:
+        source.close()
+
+
+def _chunk_path(dest, digest):
+    return os.path.join(dest, 'chunks', digest[:2], digest)
+
+
+def _write_atomically(path, data, mode='wb'):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temporary = f"{path}.tmp"
+    with open(temporary, mode) as handle:
+        handle.write(data)
+        handle.flush()
+        os.fsync(handle.fileno())
+    os.replace(temporary, path)
+
+
+def _new_snapshot_id(dest):
+    snapshot_id = datetime.now().strftime('%Y%m%d-%H%M%S')
+    suffix = 1
+    while os.path.exists(os.path.join(dest, 'snapshots', f"{snapshot_id}.json")):
+        suffix += 1
+        snapshot_id = f"{datetime.now():%Y%m%d-%H%M%S}-{suffix}"
+    return snapshot_id
+
+
+def _store_file(dest, path, chunk_bytes):
+    # Cuts a file into chunks and stores the new ones. Returns ({'chunks', 'bytes', 'sha256'}, new chunks, bytes stored).
+    part = {'chunks': []}
+    new_chunks = stored = 0
+    whole = hashlib.sha256()
+    with open(path, 'rb') as handle:
+        while True:
+            data = handle.read(chunk_bytes)
+            if not data:
+                break
+            whole.update(data)
+            digest = hashlib.sha256(data).hexdigest()
+            part['chunks'].append({'sha256': digest, 'bytes': len(data)})
+            if not os.path.exists(_chunk_path(dest, digest)):
+                _write_atomically(_chunk_path(dest, digest), data)
+                new_chunks, stored = new_chunks + 1, stored + len(data)
+    part['bytes'] = sum(chunk['bytes'] for chunk in part['chunks'])
+    part['sha256'] = whole.hexdigest()
+    return part, new_chunks, stored
+
+
+def backup_database(dest, source_path=None, step_pages=DEFAULT_STEP_PAGES, sleep=DEFAULT_SLEEP,
+                    chunk_bytes=CHUNK_BYTES, keep=None, progress=None):
+    """
+    Takes a snapshot of the database, and of its archive if it has one, into the backup directory
+    `dest`: an online copy into temporary files (see online_copy), cut into chunk_bytes pieces
+    of which only the new ones are stored. keep=N then removes all but the N newest snapshots
+    and the chunks only they used.
+    Returns the snapshot's manifest, with 'new_chunks', 'stored_bytes' and 'seconds' added.
+    """
+    started = time.perf_counter()
+    source_path = source_path or database_path()
+    archive_source = archive_file_for(source_path)
+    if not os.path.exists(archive_source):
+        archive_source = None
+    os.makedirs(os.path.join(dest, 'snapshots'), exist_ok=True)
+    manifest = {'id': _new_snapshot_id(dest), 'created': datetime.now().isoformat(timespec='seconds'),
+                'source': os.path.abspath(source_path), 'chunk_bytes': chunk_bytes}
+    with tempfile.TemporaryDirectory(dir=dest) as workdir:
+        copy_path, archive_copy = os.path.join(workdir, 'snapshot.db'), os.path.join(workdir, 'archive.db')
+        online_copy(source_path, copy_path, step_pages, sleep, progress,
+                    archive=(archive_source, archive_copy) if archive_source else None)
+        part, new_chunks, stored = _store_file(dest, copy_path, chunk_bytes)
+        manifest.update(part)
+        if archive_source:
+            part, archive_new, archive_stored = _store_file(dest, archive_copy, chunk_bytes)
+            manifest['archive'] = {'source': os.path.abspath(archive_source), **part}
+            new_chunks, stored = new_chunks + archive_new, stored + archive_stored
+    _write_atomically(os.path.join(dest, 'snapshots', f"{manifest['id']}.json"), json.dumps(manifest, indent=2), 'w')
+    if keep:
+        prune(dest, keep)
+    return {**manifest, 'new_chunks': new_chunks, 'stored_bytes': stored, 'seconds': time.perf_counter() - started}
+
+
+def list_snapshots(dest):
+    """Manifests in the backup directory, oldest first."""
+    folder = os.path.join(dest, 'snapshots')
+    if not os.path.isdir(folder):
+        return []
+    manifests = []
+    for name in sorted(os.listdir(folder)):
+        if name.endswith('.json'):
+            with open(os.path.join(folder, name), encoding='utf-8') as handle:
+                manifests.append(json.load(handle))
+    return sorted(manifests, key=lambda manifest: (manifest['created'], manifest['id']))
+
+
+def get_snapshot(dest, snapshot_id=None):
+    """One snapshot's manifest; the newest when snapshot_id is None."""
+    snapshots = list_snapshots(dest)
+    if snapshot_id is None:
+        if not snapshots:
+            raise BackupError(f"No snapshots in {dest}.")
+        return snapshots[-1]
+    for manifest in snapshots:
+        if manifest['id'] == snapshot_id:
+            return manifest
+    raise BackupError(f"Snapshot {snapshot_id} not found in {dest}.")
+
+
+def prune(dest, keep):
+    """Keeps the `keep` newest snapshots and deletes the chunks no remaining snapshot uses. Returns the snapshots removed."""
+    snapshots = list_snapshots(dest)
+    removed = snapshots[:-keep] if keep < len(snapshots) else []
+    for manifest in removed:
+        os.remove(os.path.join(dest, 'snapshots', f"{manifest['id']}.json"))
+    used = {chunk['sha256'] for manifest in snapshots[len(removed):] for _, part in _parts(manifest)
+            for chunk in part['chunks']}
+    chunks = os.path.join(dest, 'chunks')
+    for folder, _, names in os.walk(chunks):
+        for name in names:
+            if name not in used:
+                os.remove(os.path.join(folder, name))
+    return [manifest['id'] for manifest in removed]
+
+
+def _parts(manifest):
+    # (name, part) of each file in a snapshot: the database itself, then its archive if it was backed up.
+    yield 'database', manifest
+    if manifest.get('archive'):
+        yield 'archive', manifest['archive']
+
+
+def _read_chunks(dest, manifest, part=None):
+    # Yields one file of a snapshot chunk by chunk, checking every checksum on the way.
+    part = part or manifest
+    label = manifest['id'] if part is manifest else f"{manifest['id']} (archive)"
+    whole = hashlib.sha256()
+    for index, chunk in enumerate(part['chunks']):
+        path = _chunk_path(dest, chunk['sha256'])
+        if not os.path.exists(path):
+            raise BackupError(f"Snapshot {label}: chunk {index} ({chunk['sha256'][:12]}) is missing.")
+        with open(path, 'rb') as handle:
+            data = handle.read()
+        if len(data) != chunk['bytes'] or hashlib.sha256(data).hexdigest() != chunk['sha256']:
+            raise BackupError(f"Snapshot {label}: chunk {index} ({chunk['sha256'][:12]}) is damaged.")
+        whole.update(data)
+        yield data
+    if whole.hexdigest() != part['sha256']:
+        raise BackupError(f"Snapshot {label}: checksum of the whole file does not match.")
+
+
+def _assemble(dest, manifest, workdir):
+    # Rebuilds and checks every file of a snapshot in workdir. Returns {part name: path}.
+    paths = {}
+    for name, part in _parts(manifest):
+        paths[name] = os.path.join(workdir, f"{name}.db")
+        with open(paths[name], 'wb') as handle:
+            for data in _read_chunks(dest, manifest, part):
+                handle.write(data)
+        ok, messages = _integrity_check(paths[name])
+        if not ok:
+            label = manifest['id'] if name == 'database' else f"{manifest['id']} (archive)"
+            raise BackupError(f"Snapshot {label}: integrity check failed: {'; '.join(messages[:5])}")
+    return paths
+
+
+def _integrity_check(path):
+    connection = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        result = [row[0] for row in connection.execute("PRAGMA integrity_check")]
+    finally:
+        connection.close()
+    return result == ['ok'], result
+
+
+def verify_snapshot(dest, manifest, integrity=False):
+    """
+    Checks a snapshot's chunk and whole-file checksums; integrity=True also rebuilds the file and
+    runs SQLite's integrity_check on it. Raises BackupError on the first problem.
+    """
+    if not integrity:
+        for _, part in _parts(manifest):
+            for _ in _read_chunks(dest, manifest, part):
+                pass
+        return
+    with tempfile.TemporaryDirectory(dir=dest) as workdir:
+        _assemble(dest, manifest, workdir)
+
+
+def restore_snapshot(dest, manifest, target_path=None, step_pages=DEFAULT_STEP_PAGES, sleep=DEFAULT_SLEEP):
+    """
+    Restores a snapshot over target_path (default: the configured database) and its archive
+    (the configured archive, or the one next to target_path). Every file is rebuilt and checked
+    first (checksums and integrity_check); each is then copied in with the backup API, which
+    takes the database's locks like any writer, so other connections see either the old or the
+    restored file, never a half-written one. An archive file the snapshot did not have is moved
+    aside to <archive>.replaced-<time>, so that its rows do not show up next to the restored ones.
+    Returns {'archive': archive restored or None, 'set_aside': path of the archive moved aside or None}.
+    """
+    archive_target = archive_file_for(target_path or database_path(), configured=target_path is None)
+    target_path = target_path or database_path()
+    result = {'archive': None, 'set_aside': None}
+    with tempfile.TemporaryDirectory(dir=dest) as workdir:
+        paths = _assemble(dest, manifest, workdir)
+        targets = {'database': target_path, 'archive': archive_target}
+        for name, path in paths.items():
+            source = sqlite3.connect(path)
+            target = sqlite3.connect(targets[name], timeout=30)
+            try:
+                source.backup(target, pages=step_pages, sleep=sleep)
+            finally:
+                target.close()
+                source.close()
+    if 'archive' in paths:
+        result['archive'] = archive_target
+    elif os.path.exists(archive_target):
+        result['set_aside'] = f"{archive_target}.replaced-{datetime.now():%Y%m%d-%H%M%S}"
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(archive_target + suffix):
+                os.replace(archive_target + suffix, result['set_aside'] + suffix)
+    return result
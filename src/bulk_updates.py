@@ -0,0 +1,119 @@
+import time
+from collections import defaultdict
+from datetime import datetime
+
+from sqlalchemy import text
+
+from src import counters, patient_summary
+from src.availability import release_bookings, span_bits
+from src.models import Appointment, AppointmentStatus
+from src.scheduling import forget
+
+# Appointments updated per transaction by `appointment bulk-update` / `sweep`.
+DEFAULT_CHUNK_SIZE = 5000
+
+
+def _storage(moment):
+    return moment.strftime('%Y-%m-%d %H:%M:%S.%f')
+
+
+def appointment_filter(new_status, doctor_id=None, patient_id=None, date_from=None, date_to=None, statuses=(),
+                       ended_before=None):
+    """
+    SQL condition and parameters for the appointments a bulk status change applies to:
+    optional doctor, patient, start in [date_from, date_to), current status in `statuses`
+    and, for sweep, appointments over (start + duration) by `ended_before`.
+    Rows already in new_status are left alone, and cancelled appointments are only ever
+    cancelled: re-activating them in bulk could double-book a doctor (use appointment update).
+    """
+    conditions, params = [], {}
+    if doctor_id is not None:
+        conditions.append("doctor_id = :doctor_id")
+        params['doctor_id'] = doctor_id
+    if patient_id is not None:
+        conditions.append("patient_id = :patient_id")
+        params['patient_id'] = patient_id
+    if date_from is not None:
+        conditions.append("appointment_datetime >= :date_from")
+        params['date_from'] = _storage(date_from)
+    if date_to is not None:
+        conditions.append("appointment_datetime < :date_to")
+        params['date_to'] = _storage(date_to)
+    if ended_before is not None:
+        conditions.append("appointment_datetime < :ended_before "
+                          "AND datetime(appointment_datetime, '+' || duration_minutes || ' minutes') <= :ended_before")
+        params['ended_before'] = _storage(ended_before)
+    allowed = set(statuses or AppointmentStatus) - {new_status}
+    if new_status != AppointmentStatus.CANCELLED:
+        allowed.discard(AppointmentStatus.CANCELLED)
+    # Status names are written into the SQL (they come from the enum, never from input) so that
+    # "status = 'SCHEDULED'" can use the partial index ix_appointments_scheduled (SQLite only
+    # matches the index's own term, not an equivalent one-element IN list).
+    names = sorted(status.name for status in allowed)
+    if len(names) == 1:
+        conditions.append(f"status = '{names[0]}'")
+    else:
+        conditions.append(f"status IN ({', '.join(repr(name) for name in names)})" if names else "0")
+    return ' AND '.join(conditions), params
+
+
+def preview(connection, where, params):
+    """{current status: appointments} a bulk update would change (the dry run)."""
+    rows = connection.execute(text(f"SELECT status, count(*) FROM appointments WHERE {where} GROUP BY status"), params)
+    return {AppointmentStatus[status]: count for status, count in rows}
+
+
+def bulk_set_status(engine, new_status, where, params, chunk_size=DEFAULT_CHUNK_SIZE, progress=None):
+    """
+    Sets the status of every appointment matching `where`, chunk_size rows per transaction.
+    Chunks follow (appointment_datetime, id) order with a keyset, so each one starts where
+    the previous ended instead of re-reading updated rows. Cancelling frees the slots:
+    the doctors' bitmaps for the affected days are rebuilt in the same transaction, and so are
+    the appointment counters (the chunk's rows are tallied by old status before the UPDATE)
+    and the summaries of the chunk's patients.
+    Returns {'updated': rows, 'chunks': transactions, 'seconds': elapsed}.
+    """
+    started = time.perf_counter()
+    frees_slots = new_status == AppointmentStatus.CANCELLED
+    chunk = f"""
+        SELECT id FROM appointments
+        WHERE {where} AND (appointment_datetime, id) > (:last_at, :last_id)
+        ORDER BY appointment_datetime, id
+        LIMIT :chunk_size
+    """
+    before = text(f"SELECT doctor_id, status, count(*) FROM appointments WHERE id IN ({chunk}) GROUP BY doctor_id, status")
+    statement = text(f"""
+        UPDATE appointments SET status = :new_status
+        WHERE id IN ({chunk})
+        RETURNING id, patient_id, doctor_id, appointment_datetime, duration_minutes
+    """)
+    last_at, last_id = '', 0
+    updated = chunks = 0
+    while True:
+        with engine.begin() as conn:
+            chunk_params = {**params, 'last_at': last_at, 'last_id': last_id, 'chunk_size': chunk_size}
+            old = {(doctor_id, AppointmentStatus[status]): count
+                   for doctor_id, status, count in conn.execute(before, chunk_params)}
+            rows = conn.execute(statement, {**chunk_params, 'new_status': new_status.name}).all()
+            new = defaultdict(int)
+            for row in rows:
+                new[row.doctor_id, new_status] += 1
+            counters.add(conn, Appointment.__table__, old, sign=-1)
+            counters.add(conn, Appointment.__table__, new)
+            patient_summary.refresh(conn, (row.patient_id for row in rows))
+            if rows and frees_slots:
+                days = defaultdict(set)
+                for row in rows:
+                    start = datetime.fromisoformat(row.appointment_datetime)
+                    days[row.doctor_id].update(day for day, _ in span_bits(start, row.duration_minutes or 30))
+                release_bookings(conn, days)
+                forget(conn, *days)
+        if not rows:
+            break
+        updated, chunks = updated + len(rows), chunks + 1
+        last_at, last_id = max((row.appointment_datetime, row.id) for row in rows)
+        if progress:
+            progress(updated)
+        if len(rows) < chunk_size:
+            break
+    return {'updated': updated, 'chunks': chunks, 'seconds': time.perf_counter() - started}
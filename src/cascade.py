@@ -0,0 +1,93 @@
+import click
+from sqlalchemy import delete, inspect, select, tuple_
+
+from src import counters, database, patient_summary
+from src.archive import delete_archived
+from src.availability import patient_bookings, release_bookings
+from src.models import Patient
+
+# Dependent rows removed per transaction by `delete --chunk-size`.
+DEFAULT_CHUNK_SIZE = 5000
+
+
+def dependants(table):
+    """
+    (child table, foreign key column) pairs that ON DELETE CASCADE empties when a row of
+    `table` goes. Joined-inheritance rows (inpatients, outpatients) are left to the ORM,
+    which deletes them itself.
+    """
+    found = []
+    for child in database.Base.metadata.tables.values():
+        for fk in child.foreign_key_constraints:
+            if fk.referred_table is not table or (fk.ondelete or '').upper() != 'CASCADE':
+                continue
+            columns = list(fk.columns)
+            if set(columns) == set(child.primary_key.columns):
+                continue
+            found.append((child, columns[0]))
+    return found
+
+
+def delete_dependants(engine, table, row_id, chunk_size=DEFAULT_CHUNK_SIZE, progress=None):
+    """
+    Deletes the rows that depend on `table` row `row_id`, chunk_size rows per transaction,
+    so the write lock is released between chunks and nothing is held in memory.
+    Each chunk is found through the foreign key's index, and the counters and patient
+    summaries of the rows it removes are brought up to date in the same transaction. Returns {child table name: rows deleted}.
+    """
+    counts = {}
+    counted = {counter.source.name for counter in counters.COUNTERS.values()}
+    for child, column in dependants(table):
+        if child.name in counters.COUNTERS:
+            continue  # a few rows, removed with the doctor or department itself
+        key = tuple_(*child.primary_key.columns)
+        chunk = select(*child.primary_key.columns).where(column == row_id).limit(chunk_size)
+        counts[child.name] = 0
+        while True:
+            with engine.begin() as conn:
+                removing = counters.tally(conn, child, key.in_(chunk)) if child.name in counted else {}
+                # A deleted patient's summary goes with them; a doctor's patients keep theirs.
+                patients = (patient_summary.patients_of(conn, child, key.in_(chunk))
+                            if 'patient_id' in child.c and table is not Patient.__table__ else ())
+                deleted = conn.execute(delete(child).where(key.in_(chunk))).rowcount
+                counters.add(conn, child, removing, sign=-1)
+                patient_summary.refresh(conn, patients)
+            counts[child.name] += deleted
+            if progress:
+                progress(child.name, counts[child.name])
+            if deleted < chunk_size:
+                break
+    return counts
+
+
+def delete_with_dependants(session, obj, chunk_size=None, progress=None):
+    """
+    Deletes a doctor or patient and everything that depends on them, then commits; their
+    archived appointments and records go too. Without chunk_size, the database cascades in
+    the same transaction as the delete itself. With chunk_size, dependent rows go in chunks
+    first (see delete_dependants).
+    Returns {child table name: rows deleted in chunks} (empty without chunk_size).
+    """
+    counts, bookings = {}, {}
+    engine = session.get_bind()
+    # The base table (patients, not inpatients) is the one the cascades hang off.
+    table = inspect(obj).mapper.base_mapper.local_table
+    row_id = obj.id
+    if chunk_size:
+        if isinstance(obj, Patient):
+            # Their appointments vanish without ORM events; free the doctors' slots afterwards.
+            with engine.begin() as conn:
+                bookings = patient_bookings(conn, row_id)
+        counts = delete_dependants(engine, table, row_id, chunk_size, progress)
+    session.delete(obj)
+    session.commit()
+    if bookings:
+        with engine.begin() as conn:
+            release_bookings(conn, bookings)
+    delete_archived(engine, table, row_id)
+    return counts
+
+
+def echo_chunked_counts(counts):
+    if counts:
+        click.echo("Removed in chunks: " + ", ".join(f"{rows} {table}" for table, rows in counts.items()) + ".")
@@ -0,0 +1,180 @@
+from collections import namedtuple
+
+from sqlalchemy import delete, event, func, inspect, select
+from sqlalchemy.dialects.sqlite import insert
+
+from src.database import Base
+from src.models import (Appointment, Department, DepartmentCounts, Doctor, DoctorAppointmentCounts,
+                        DoctorRecordCounts, MedicalRecord, Patient)
+
+# Counter tables, so overview screens read one row per department or doctor instead of
+# counting doctors, appointments and records:
+#   department_counts          => doctors per department
+#   doctor_appointment_counts  => appointments per doctor and status
+#   doctor_record_counts       => medical records per doctor
+# ORM writes adjust them by +/-1 in the flush that changes the rows (same transaction). Core
+# writes that bypass the ORM (bulk status updates, reassignment, archive, chunked deletes) pass
+# their tally() through add() themselves; bulk loads (seed) and `db reconcile` rebuild them whole.
+# Rows of a deleted doctor or department go with them (ON DELETE CASCADE).
+
+Counter = namedtuple('Counter', 'table column source keys')
+
+COUNTERS = {
+    'department_counts': Counter(DepartmentCounts.__table__, 'doctors', Doctor.__table__, ('department_id',)),
+    'doctor_appointment_counts': Counter(DoctorAppointmentCounts.__table__, 'appointments', Appointment.__table__,
+                                         ('doctor_id', 'status')),
+    'doctor_record_counts': Counter(DoctorRecordCounts.__table__, 'records', MedicalRecord.__table__, ('doctor_id',)),
+}
+_BY_SOURCE = {counter.source.name: counter for counter in COUNTERS.values()}
+
+
+def _grouped(counter, *conditions):
+    keys = [counter.source.c[name] for name in counter.keys]
+    # Only keys whose doctor or department exists (a legacy database may hold orphans).
+    parent = next(iter(counter.table.c[counter.keys[0]].foreign_keys)).column
+    return (select(*keys, func.count())
+            .where(*(key.is_not(None) for key in keys), keys[0].in_(select(parent)), *conditions)
+            .group_by(*keys))
+
+
+def tally(connection, source, *conditions):
+    """{key: rows} of `source` (doctors, appointments or medical_records) matching the conditions, per counter key."""
+    return {tuple(row[:-1]): row[-1] for row in connection.execute(_grouped(_BY_SOURCE[source.name], *conditions))}
+
+
+def add(connection, source, changes, sign=1):
+    """
+    Adds {key: rows} (times sign) to the counters of `source` with one batched UPSERT.
+    Keys with a missing part (a doctor without a department) are not counted.
+    """
+    if not changes:
+        return
+    counter = _BY_SOURCE[source.name]
+    rows = [{**dict(zip(counter.keys, key)), counter.column: sign * rows}
+            for key, rows in changes.items() if rows and None not in key]
+    if not rows:
+        return
+    statement = insert(counter.table)
+    statement = statement.on_conflict_do_update(
+        index_elements=list(counter.keys),
+        set_={counter.column: counter.table.c[counter.column] + statement.excluded[counter.column]}
+    )
+    connection.execute(statement, rows)
+
+
+def rebuild(connection, counter):
+    """Replaces one counter table with a fresh count (one DELETE, one INSERT ... SELECT ... GROUP BY)."""
+    connection.execute(delete(counter.table))
+    connection.execute(insert(counter.table).from_select([*counter.keys, counter.column], _grouped(counter)))
+
+
+def reconcile(engine):
+    """
+    Rebuilds every counter table from the rows it counts, in one transaction.
+    Returns {counter table: keys whose stored count was wrong} (all zeros when nothing had drifted).
+    """
+    drift = {}
+    with engine.begin() as conn:
+        for name, counter in COUNTERS.items():
+            expected = tally(conn, counter.source)
+            keys = [counter.table.c[key] for key in counter.keys]
+            stored = {tuple(row[:-1]): row[-1]
+                      for row in conn.execute(select(*keys, counter.table.c[counter.column]))}
+            drift[name] = sum(1 for key in expected.keys() | stored.keys() if expected.get(key, 0) != stored.get(key, 0))
+            rebuild(conn, counter)
+    return drift
+
+
+@event.listens_for(Base.metadata, 'after_create')
+def fill_new_counters(target, connection, tables=(), **kw):
+    """Counter tables created next to existing rows (an older database) start out filled."""
+    for counter in COUNTERS.values():
+        if counter.table in tables:
+            rebuild(connection, counter)
+
+
+# --- ORM writes ---
+
+def _key(target, counter, state=None, before=False):
+    def value(name):
+        if before:
+            history = state.attrs[name].history
+            if history.deleted:
+                return history.deleted[0]
+        return getattr(target, name)
+    return tuple(value(name) for name in counter.keys)
+
+
+def _inserted(mapper, connection, target):
+    counter = _BY_SOURCE[mapper.local_table.name]
+    add(connection, counter.source, {_key(target, counter): 1})
+
+
+def _updated(mapper, connection, target):
+    counter = _BY_SOURCE[mapper.local_table.name]
+    state = inspect(target)
+    if not any(state.attrs[name].history.has_changes() for name in counter.keys):
+        return
+    old, new = _key(target, counter, state, before=True), _key(target, counter)
+    if old != new:
+        add(connection, counter.source, {old: -1})
+        add(connection, counter.source, {new: 1})
+
+
+def _deleted(mapper, connection, target):
+    counter = _BY_SOURCE[mapper.local_table.name]
+    add(connection, counter.source, {_key(target, counter): -1})
+
+
+for _model in (Doctor, Appointment, MedicalRecord):
+    event.listen(_model, 'after_insert', _inserted)
+    event.listen(_model, 'after_update', _updated)
+    event.listen(_model, 'after_delete', _deleted)
+
+
+# A deleted patient's appointments and records are removed by ON DELETE CASCADE, without ORM
+# events: they are tallied just before the patient's DELETE and taken off just after it.
+_PATIENT_ROWS = (Appointment.__table__, MedicalRecord.__table__)
+
+
+@event.listens_for(Patient, 'before_delete', propagate=True)
+def _patient_deleting(mapper, connection, target):
+    inspect(target).info['hms_counted'] = [(source, tally(connection, source, source.c.patient_id == target.id))
+                                           for source in _PATIENT_ROWS]
+
+
+@event.listens_for(Patient, 'after_delete', propagate=True)
+def _patient_deleted(mapper, connection, target):
+    for source, changes in inspect(target).info.pop('hms_counted', ()):
+        add(connection, source, changes, sign=-1)
+
+
+# --- Overview ---
+
+def department_overview(session):
+    """
+    One row per department, read from the counters only: (id, name, head doctor name, doctors,
+    {status: appointments}, records). Cost follows the number of departments and doctors, not appointments.
+    """
+    appointments = DoctorAppointmentCounts.__table__
+    records = DoctorRecordCounts.__table__
+    doctors = Doctor.__table__
+    by_status = {}
+    for department_id, status, count in session.execute(
+            select(doctors.c.department_id, appointments.c.status, func.sum(appointments.c.appointments))
+            .join(doctors, doctors.c.id == appointments.c.doctor_id)
+            .group_by(doctors.c.department_id, appointments.c.status)):
+        by_status.setdefault(department_id, {})[status] = count
+    record_totals = dict(session.execute(
+        select(doctors.c.department_id, func.sum(records.c.records))
+        .join(doctors, doctors.c.id == records.c.doctor_id)
+        .group_by(doctors.c.department_id)).all())
+    head = Doctor.__table__.alias('head')
+    rows = session.execute(
+        select(Department.id, Department.name, head.c.name, func.coalesce(DepartmentCounts.doctors, 0))
+        .outerjoin(head, head.c.id == Department.head_doctor_id)
+        .outerjoin(DepartmentCounts, DepartmentCounts.department_id == Department.id)
+        .order_by(Department.id))
+    return [(department_id, name, head_name, doctor_count, by_status.get(department_id, {}),
+             record_totals.get(department_id, 0))
+            for department_id, name, head_name, doctor_count in rows]
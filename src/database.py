@@ -1,38 +1,261 @@
 # src/database.py
 
+import os
 import sys # Needed for sys.stderr and sys.exit
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event, inspect
+from sqlalchemy.schema import CreateColumn, CreateTable
+from sqlalchemy.engine import make_url
 from sqlalchemy.orm import sessionmaker, declarative_base
 
-# For now, DATABASE_URL is hardcoded for debugging.
-DATABASE_URL = "sqlite:///hospital.db" # This will create hospital.db in your project root
+# Add the root project directory (one level up from 'src/') to sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
-try:
-    # Added explicit flush=True to ensure immediate printing
-    print("DEBUG: Attempting to create engine...", file=sys.stdout, flush=True)
-    engine = create_engine(DATABASE_URL, echo=True)
-    print("DEBUG: Engine created successfully.", file=sys.stdout, flush=True)
-except Exception as e:
-    # This print statement should be seen if any error occurs during engine creation
-    print(f"FATAL ERROR: Failed to create SQLAlchemy engine: {e}", file=sys.stderr, flush=True)
-    import traceback # Ensure this is imported for the traceback
-    traceback.print_exc(file=sys.stderr) # Prints full traceback
-    sys.exit(1) # Forces the script to exit with an error code
+# Engine profiles, selected with HMS_DB_PROFILE=dev|prod|bench (default: prod).
+#   dev   => echoes every SQL statement and keeps SQLite's stock settings (what we used while debugging)
+#   prod  => WAL journaling + tuned pragmas, explicit pool sizing, silent
+#   bench => prod settings with synchronous=OFF; only for throwaway benchmark databases
+ENGINE_PROFILES = {
+    'dev': {
+        'echo': True,
+        'pragmas': {},
+        'pool': {},
+    },
+    'prod': {
+        'echo': False,
+        'pragmas': {
+            'journal_mode': 'WAL',      # readers no longer block the writer (and vice versa)
+            'synchronous': 'NORMAL',    # safe with WAL, fsyncs only at checkpoints
+            'mmap_size': 268435456,     # 256 MiB memory-mapped reads
+            'cache_size': -65536,       # 64 MiB page cache (negative means KiB)
+            'busy_timeout': 5000,       # wait up to 5s for a lock instead of failing straight away
+            'temp_store': 'MEMORY',     # sorts and temp indexes stay off disk
+        },
+        'pool': {
+            'pool_size': 5,
+            'max_overflow': 10,
+            'pool_timeout': 30,
+            'pool_pre_ping': True,
+        },
+    },
+    'bench': {
+        'echo': False,
+        'pragmas': {
+            'journal_mode': 'WAL',
+            'synchronous': 'OFF',
+            'mmap_size': 268435456,
+            'cache_size': -65536,
+            'busy_timeout': 5000,
+            'temp_store': 'MEMORY',
+        },
+        'pool': {
+            'pool_size': 5,
+            'max_overflow': 10,
+            'pool_timeout': 30,
+            'pool_pre_ping': True,
+        },
+    },
+}
 
-# Create a session class to interact with the database.
-Session = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+DB_PROFILE = os.getenv("HMS_DB_PROFILE", "prod")
+
+
+def _is_sqlite(url):
+    return url.get_backend_name() == 'sqlite'
+
+
+def _is_memory_sqlite(url):
+    return _is_sqlite(url) and url.database in (None, '', ':memory:')
+
+
+def apply_sqlite_pragmas(engine, pragmas):
+    """
+    Registers a connect-event hook that runs the given PRAGMAs on every new DBAPI connection.
+    """
+    @event.listens_for(engine, "connect")
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
+
+
+def configured_url():
+    """DATABASE_URL from config/settings.py (which reads .env); imported only when an engine is built."""
+    from config.settings import DATABASE_URL
+    return DATABASE_URL
+
+
+def make_engine(database_url=None, profile=DB_PROFILE):
+    """
+    Builds an engine for the given URL (default: configured_url()) using one of the ENGINE_PROFILES.
+    """
+    database_url = database_url or configured_url()
+    if profile not in ENGINE_PROFILES:
+        raise ValueError(f"Unknown database profile '{profile}'. Choose from: {', '.join(ENGINE_PROFILES)}")
+    settings = ENGINE_PROFILES[profile]
+    url = make_url(database_url)
+
+    engine_kwargs = {'echo': settings['echo']}
+    # In-memory SQLite uses a single-connection pool, so pool sizing does not apply there.
+    if not _is_memory_sqlite(url):
+        engine_kwargs.update(settings['pool'])
+
+    new_engine = create_engine(url, **engine_kwargs)
+    if _is_sqlite(url):
+        # Foreign keys are a correctness setting, not tuning: every profile enforces them, and
+        # ON DELETE CASCADE (doctor/patient delete) only works with them on.
+        apply_sqlite_pragmas(new_engine, {'foreign_keys': 'ON', **settings['pragmas']})
+    return new_engine
+
+
+class _LazySessionmaker(sessionmaker):
+    # Binds to the module engine on the first Session(), creating the engine then if needed.
+    def __call__(self, **local_kw):
+        if self.kw.get('bind') is None and local_kw.get('bind') is None:
+            get_engine()
+        return super().__call__(**local_kw)
+
+
+# Create a session class to interact with the database. It is bound to the engine on first use.
+Session = _LazySessionmaker(autocommit=False, autoflush=False)
 
 # Create a declarative base class for ORM models to inherit from.
 Base = declarative_base()
 
+
+# The module engine is created on first use (database.engine, get_engine() or the first Session()),
+# not at import: commands that never touch the database, like --help, do not pay for it.
+def get_engine():
+    """
+    Returns the module engine, creating it from configured_url() and DB_PROFILE the first time.
+    """
+    global engine
+    if 'engine' not in globals():
+        try:
+            engine = make_engine()
+        except Exception as e:
+            # This print statement should be seen if any error occurs during engine creation
+            print(f"FATAL ERROR: Failed to create SQLAlchemy engine: {e}", file=sys.stderr, flush=True)
+            import traceback # Ensure this is imported for the traceback
+            traceback.print_exc(file=sys.stderr) # Prints full traceback
+            sys.exit(1) # Forces the script to exit with an error code
+        Session.configure(bind=engine)
+    return engine
+
+
+def __getattr__(name):
+    # `database.engine` before anything created it (module-level __getattr__ only sees missing names).
+    if name == 'engine':
+        return get_engine()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def init_engine(database_url=None, profile=DB_PROFILE):
+    """
+    Replaces the module engine (e.g. to point tests or benchmarks at another database)
+    and rebinds the Session factory to it.
+    """
+    global engine
+    old_engine = globals().get('engine')
+    engine = make_engine(database_url, profile)
+    Session.configure(bind=engine)
+    if old_engine is not None:
+        old_engine.dispose()
+    return engine
+
+def add_missing_columns(engine):
+    """
+    Adds model columns that an existing table does not have yet (create_all never alters
+    tables). New columns must be nullable or carry a server_default for this to work.
+    """
+    inspector = inspect(engine)
+    with engine.begin() as conn:
+        for table in Base.metadata.tables.values():
+            if not inspector.has_table(table.name):
+                continue
+            existing = {column['name'] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in existing:
+                    ddl = CreateColumn(column).compile(dialect=engine.dialect)
+                    conn.exec_driver_sql(f"ALTER TABLE {table.name} ADD COLUMN {ddl}")
+
+def _foreign_keys(foreign_keys):
+    return {(tuple(columns), referred, (ondelete or 'NO ACTION').upper()) for columns, referred, ondelete in foreign_keys}
+
+
+def upgrade_foreign_keys(engine):
+    """
+    Rebuilds existing SQLite tables whose foreign keys or AUTOINCREMENT differ from the model
+    (e.g. a new ON DELETE CASCADE): SQLite cannot alter a constraint in place, so the table is
+    recreated under the new definition, its rows copied over, and its indexes recreated. Triggers
+    on a rebuilt table go with the old one; create_all() puts them back. Returns the tables rebuilt.
+    """
+    if engine.dialect.name != 'sqlite':
+        return []
+    inspector = inspect(engine)
+    stale = []
+    for table in Base.metadata.tables.values():
+        if not inspector.has_table(table.name):
+            continue
+        existing = _foreign_keys((fk['constrained_columns'], fk['referred_table'], fk.get('options', {}).get('ondelete'))
+                                 for fk in inspector.get_foreign_keys(table.name))
+        wanted = _foreign_keys(([element.parent.name for element in fk.elements], fk.referred_table.name, fk.ondelete)
+                               for fk in table.foreign_key_constraints)
+        with engine.connect() as conn:
+            sql = conn.exec_driver_sql("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?",
+                                       (table.name,)).scalar() or ''
+        autoincrement = 'AUTOINCREMENT' in sql.upper()
+        if existing != wanted or autoincrement != table.dialect_options['sqlite']['autoincrement']:
+            stale.append((table, {column['name'] for column in inspector.get_columns(table.name)}))
+    if not stale:
+        return []
+    with engine.connect() as conn:
+        # Must be switched off outside a transaction, or dropping the old tables would cascade.
+        conn.exec_driver_sql("PRAGMA foreign_keys=OFF")
+        try:
+            for table, old_columns in stale:
+                rebuilt = f"_rebuild_{table.name}"
+                columns = ', '.join(column.name for column in table.columns if column.name in old_columns)
+                ddl = str(CreateTable(table).compile(dialect=engine.dialect))
+                conn.exec_driver_sql(f"DROP TABLE IF EXISTS {rebuilt}")
+                conn.exec_driver_sql(ddl.replace(f"CREATE TABLE {table.name} (", f"CREATE TABLE {rebuilt} (", 1))
+                conn.exec_driver_sql(f"INSERT INTO {rebuilt} ({columns}) SELECT {columns} FROM {table.name}")
+                conn.exec_driver_sql(f"DROP TABLE {table.name}")
+                conn.exec_driver_sql(f"ALTER TABLE {rebuilt} RENAME TO {table.name}")
+                for index in table.indexes:
+                    index.create(conn)
+                conn.commit()
+        finally:
+            conn.exec_driver_sql("PRAGMA foreign_keys=ON")
+    return [table.name for table, _ in stale]
+
 def create_tables():
     """
     Creates all database tables defined in the ORM models.
     """
-    print(f"Attempting to create tables in the database at URL: {DATABASE_URL}...", file=sys.stdout, flush=True)
+    engine = get_engine()
+    print(f"Attempting to create tables in the database at URL: {engine.url}...", file=sys.stdout, flush=True)
+    upgrade_foreign_keys(engine)
     Base.metadata.create_all(engine)
+    add_missing_columns(engine)
+    # create_all skips tables that already exist, so add any index they are still missing.
+    for table in Base.metadata.tables.values():
+        for index in table.indexes:
+            index.create(engine, checkfirst=True)
+    # Imported here: src.archive imports this module.
+    from src.archive import reserve_archived_ids
+    reserve_archived_ids(engine)
     print("Tables created successfully.", file=sys.stdout, flush=True)
 
+def bulk_insert(conn, table, columns, rows):
+    """
+    Inserts rows (tuples already in storage form, in `columns` order) with a single
+    DBAPI executemany(). Skips SQLAlchemy's per-value type processing, which costs
+    more than the INSERT itself for bulk loads.
+    """
+    placeholders = ', '.join('?' * len(columns))
+    conn.exec_driver_sql(f"INSERT INTO {table.name} ({', '.join(columns)}) VALUES ({placeholders})", rows)
+
 # Helper function to get a new database session instance.
 def get_db():
     """
@@ -59,4 +282,4 @@ def get_db_context():
         session.rollback()
         raise
     finally:
-        session.close()
\ No newline at end of file
+        session.close()
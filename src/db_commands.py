@@ -0,0 +1,150 @@
+import click
+
+from src import database
+from src.backup import (BackupError, DEFAULT_SLEEP, DEFAULT_STEP_PAGES, backup_database, get_snapshot, list_snapshots,
+                        restore_snapshot, verify_snapshot)
+from src.counters import reconcile as reconcile_counters
+from src.patient_summary import rebuild as rebuild_summaries
+
+
+@click.group()
+def db():
+    """Database maintenance: online backups and counters."""
+    pass
+
+
+def _size(num_bytes):
+    return f"{num_bytes / 1024 / 1024:.1f} MiB"
+
+
+def _with_archive(manifest):
+    return f" + archive {_size(manifest['archive']['bytes'])}" if manifest.get('archive') else ''
+
+
+def step_options(command):
+    command = click.option('--sleep-ms', default=int(DEFAULT_SLEEP * 1000), show_default=True, type=click.IntRange(min=0),
+                           help='Pause between steps, so other connections get the database in between.')(command)
+    command = click.option('--step-pages', default=DEFAULT_STEP_PAGES, show_default=True, type=click.IntRange(min=1),
+                           help='Database pages copied per step.')(command)
+    return command
+
+
+@db.command('backup')
+@click.argument('dest', type=click.Path(file_okay=False))
+@step_options
+@click.option('--keep', type=click.IntRange(min=1), default=None, help='Keep only this many newest snapshots.')
+def backup(dest, step_pages, sleep_ms, keep):
+    """Snapshot the live database into the backup directory DEST (only changed chunks are stored)."""
+    last = {'shown': 0}
+
+    def progress(copied, total):
+        # About every tenth of the way, not every step.
+        if copied == total or copied - last['shown'] >= max(total // 10, 1):
+            last['shown'] = copied
+            click.echo(f"... {copied}/{total} pages copied")
+
+    try:
+        result = backup_database(dest, step_pages=step_pages, sleep=sleep_ms / 1000, keep=keep, progress=progress)
+    except Exception as e:
+        click.echo(f"Error backing up: {e}", err=True)
+        return
+    chunks = len(result['chunks']) + len(result.get('archive', {}).get('chunks', []))
+    click.echo(f"Snapshot {result['id']} written to {dest}: {_size(result['bytes'])}{_with_archive(result)} in {chunks} chunks, "
+               f"{result['new_chunks']} new ({_size(result['stored_bytes'])} stored), {result['seconds']:.2f}s.")
+
+
+@db.command('snapshots')
+@click.argument('dest', type=click.Path(file_okay=False))
+def snapshots(dest):
+    """List the snapshots in DEST, oldest first."""
+    found = list_snapshots(dest)
+    if not found:
+        click.echo("No snapshots found.")
+        return
+    for manifest in found:
+        click.echo(f"{manifest['id']}  {manifest['created']}  {_size(manifest['bytes'])}{_with_archive(manifest)}  "
+                   f"sha256 {manifest['sha256'][:16]}")
+
+
+@db.command('verify')
+@click.argument('dest', type=click.Path(file_okay=False))
+@click.option('--snapshot', 'snapshot_id', default=None, help='Only this snapshot (default: all).')
+@click.option('--integrity', is_flag=True, help="Also rebuild each snapshot and run SQLite's integrity_check on it.")
+def verify(dest, snapshot_id, integrity):
+    """Check the checksums of the snapshots in DEST."""
+    try:
+        manifests = [get_snapshot(dest, snapshot_id)] if snapshot_id else list_snapshots(dest)
+    except BackupError as e:
+        click.echo(f"Error: {e}", err=True)
+        return
+    if not manifests:
+        click.echo("No snapshots found.")
+        return
+    failed = 0
+    for manifest in manifests:
+        try:
+            verify_snapshot(dest, manifest, integrity)
+            click.echo(f"{manifest['id']}: OK")
+        except BackupError as e:
+            failed += 1
+            click.echo(f"{manifest['id']}: FAILED - {e}", err=True)
+    if failed:
+        click.echo(f"{failed} of {len(manifests)} snapshots failed verification.", err=True)
+
+
+@db.command('restore')
+@click.argument('dest', type=click.Path(file_okay=False))
+@click.option('--snapshot', 'snapshot_id', default=None, help='Snapshot to restore (default: the newest).')
+@click.option('--to', 'target', default=None, type=click.Path(dir_okay=False),
+              help='Restore into this file instead of the configured database.')
+@step_options
+@click.option('--yes', is_flag=True, help='Do not ask for confirmation.')
+def restore(dest, snapshot_id, target, step_pages, sleep_ms, yes):
+    """Restore a snapshot from DEST (checked before anything is overwritten)."""
+    try:
+        manifest = get_snapshot(dest, snapshot_id)
+        if not yes and not click.confirm(f"Replace {target or 'the database'} with snapshot {manifest['id']}?"):
+            click.echo("Restore cancelled.")
+            return
+        result = restore_snapshot(dest, manifest, target, step_pages, sleep_ms / 1000)
+    except Exception as e:
+        click.echo(f"Error restoring: {e}", err=True)
+        return
+    click.echo(f"Snapshot {manifest['id']} restored ({_size(manifest['bytes'])}{_with_archive(manifest)}).")
+    if result['set_aside']:
+        click.echo(f"The snapshot has no archive; the archive file found was moved to {result['set_aside']}.")
+
+
+@db.command('reconcile')
+def reconcile():
+    """Rebuild the counters and patient summaries from the rows they are derived from."""
+    try:
+        engine = database.get_engine()
+        drift = reconcile_counters(engine)
+        with engine.begin() as conn:
+            summaries = rebuild_summaries(conn)
+    except Exception as e:
+        click.echo(f"Error reconciling counters: {e}", err=True)
+        return
+    for table, wrong in drift.items():
+        click.echo(f"{table}: {'OK' if not wrong else f'{wrong} counts corrected'}")
+    click.echo(f"patient_summary: {summaries} rows rebuilt")
+
+
+# -------------------- COMMANDS TO RUN --------------------
+# To back up the live database (safe while others use it; repeated backups only store what changed)
+#         => python -m src.cli db backup ./backups
+#         => python -m src.cli db backup ./backups --keep 14 --step-pages 512 --sleep-ms 20
+
+# To list and check snapshots
+#         => python -m src.cli db snapshots ./backups
+#         => python -m src.cli db verify ./backups
+#         => python -m src.cli db verify ./backups --snapshot 20250630-020000 --integrity
+
+# To restore (the newest snapshot unless --snapshot is given; the archive database is backed up and restored with it)
+#         => python -m src.cli db restore ./backups
+#         => python -m src.cli db restore ./backups --snapshot 20250630-020000 --to ./restored.db --yes
+
+# To rebuild the counters behind `department overview` and the summaries behind `patient show`
+# (after writing to the database outside this CLI)
+#         => python -m src.cli db reconcile
@@ -1,6 +1,8 @@
 import click
+from sqlalchemy.orm import joinedload, selectinload
 from src.database import get_db # Import the session helper
-from src.models import Department, Doctor # Import Department and Doctor models
+from src.models import AppointmentStatus, Department, Doctor # Import Department and Doctor models
+from src.counters import department_overview
 
 @click.group()
 def department():
@@ -33,12 +35,9 @@ def list_departments():
     """Lists all departments."""
     session = next(get_db())
     try:
-        print("DEBUG: Inside list_departments command")
         departments = Department.get_all(session)
-        print(f"DEBUG: Number of Departments found by query")
         if not departments:
             click.echo("No departments found.")
-            print(f"DEBUG: 'No departments found' path taken")
             return
 
         click.echo("--- Departments ---")
@@ -50,10 +49,29 @@ def list_departments():
         click.echo("-------------------")
     except Exception as e:
         click.echo(f"Error listing departments: {e}", err=True)
-        print(f"Debug: Exception caught: {e}")
     finally:
         session.close()
-        print('Debug: Session closed,')
+
+@department.command('overview')
+def overview():
+    """Shows every department with its doctor, appointment and record counts."""
+    session = next(get_db())
+    try:
+        rows = department_overview(session)
+        if not rows:
+            click.echo("No departments found.")
+            return
+
+        click.echo(f"{'ID':>4}  {'Department':<20} {'Head':<22} {'Doctors':>7} {'Scheduled':>9} {'Completed':>9} "
+                   f"{'Cancelled':>9} {'Records':>8}")
+        for department_id, name, head_name, doctors, appointments, records in rows:
+            counts = [appointments.get(status, 0) for status in AppointmentStatus]
+            click.echo(f"{department_id:>4}  {name:<20} {head_name or 'None':<22} {doctors:>7} "
+                       + " ".join(f"{count:>9}" for count in counts) + f" {records:>8}")
+    except Exception as e:
+        click.echo(f"Error showing department overview: {e}", err=True)
+    finally:
+        session.close()
 
 @department.command('show')
 @click.argument('department_id', type=int)
@@ -61,13 +79,13 @@ def show_department(department_id):
     """Shows details for a specific department, including staff."""
     session = next(get_db())
     try:
-        dept = Department.find_by_id(session, department_id)
+        dept = Department.find_by_id(session, department_id, joinedload(Department.head_doctor), selectinload(Department.doctors))
         if not dept:
             click.echo(f"Department with ID {department_id} not found.", err=True)
             return
 
         head_name = dept.head_doctor.name if dept.head_doctor else "None"
-        staff_count = dept.get_staff_count()
+        staff_count = dept.get_staff_count(session)
         dept_specialty = dept.specialty if dept.specialty else "None" # Display specialty
 
         click.echo(f"--- Department Details (ID: {dept.id}) ---")
@@ -191,7 +209,7 @@ def list_department_staff(department_id):
     """Lists all doctors (staff) belonging to a specific department."""
     session = next(get_db())
     try:
-        dept = Department.find_by_id(session, department_id)
+        dept = Department.find_by_id(session, department_id, selectinload(Department.doctors))
         if not dept:
             click.echo(f"Department with ID {department_id} not found.", err=True)
             return
@@ -271,6 +289,9 @@ def list_department_specialty_doctors_command(department_id):
 # To list the departments available
 #         => python -m src.cli department list
 
+# To see every department with its doctor, appointment and record counts (read from counters, not counted)
+#         => python -m src.cli department overview
+
 # To update a department 
 #         => python -m src.cli department update 1 --name "New Name" --specialty "New Specialty" --head-doctor-id 2
 
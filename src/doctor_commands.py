@@ -1,13 +1,13 @@
 import click
+from sqlalchemy.orm import joinedload
 from src.database import get_db
-from src.models import Doctor, Department, Patient, Appointment
-
-import sys
-import os
-
-# Add the root project directory (one level up from 'src/') to sys.path
-sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
-from config.settings import DATABASE_URL
+from src.models import Doctor, Department, Patient, Appointment, DoctorShift
+from src.pagination import pagination_options, keyset, stream, echo_next_page_hint
+from src.availability import WEEKDAYS, DEFAULT_SHIFTS
+from src.cascade import delete_with_dependants, echo_chunked_counts
+from src.reassignment import ReassignmentConflict, apply_reassignment, colleagues, plan_reassignment
+from collections import defaultdict
+from datetime import datetime
 
 
 
@@ -67,17 +67,21 @@ def update(doctor_id, name, specialization, department_id):
     
 
 @doctor.command()
-def list():
+@pagination_options
+def list(limit, after_id):
     """List all doctors"""
     db = next(get_db())
     try:
-        doctors = db.query(Doctor).all()
-        if not doctors:
+        query = keyset(db.query(Doctor).options(joinedload(Doctor.department)), Doctor.id, after_id, limit)
+        shown, last_id = 0, None
+        for doc in stream(query):
+            dept_name = doc.department.name if doc.department else "N/A"
+            click.echo(f'{doc.id}: {doc.name} ({doc.specialization}) - Department: {dept_name}')
+            shown, last_id = shown + 1, doc.id
+        if not shown:
             click.echo("No doctors found.")
             return
-        for doc in doctors:
-            dept_name = db.query(Department.name).filter(Department.id == doc.department_id).scalar() if doc.department_id else "N/A"
-            click.echo(f'{doc.id}: {doc.name} ({doc.specialization}) - Department: {dept_name}')
+        echo_next_page_hint(shown, limit, last_id)
     except Exception as e:
         click.echo(f"Error listing doctors: {e}", err=True)
     finally:
@@ -85,7 +89,9 @@ def list():
 
 @doctor.command()
 @click.argument('doctor_id', type=int)
-def delete(doctor_id):
+@click.option('--chunk-size', type=click.IntRange(min=1), default=None,
+              help='Delete dependent rows this many per transaction first (for very long histories).')
+def delete(doctor_id, chunk_size):
     """Delete a doctor (also deletes appointments and records)"""
     db = next(get_db())
     try:
@@ -94,12 +100,9 @@ def delete(doctor_id):
             click.echo("Doctor not found.")
             return
 
-        # Delete associated appointments and records if necessary
-        # Assuming you have an Appointment model with a foreign key to Doctor
-        # db.query(Appointment).filter(Appointment.doctor_id == doctor_id).delete()
-
-        db.delete(doc)
-        db.commit()
+        # Appointments, records, shifts and slot bitmaps go by ON DELETE CASCADE, never loaded.
+        counts = delete_with_dependants(db, doc, chunk_size)
+        echo_chunked_counts(counts)
         click.echo(f'Doctor ID {doctor_id} deleted.')
     except Exception as e:
         db.rollback()
@@ -113,12 +116,12 @@ def filter(specialization):
     """Filter doctors by specialization"""
     db = next(get_db())
     try:
-        doctors = db.query(Doctor).filter(Doctor.specialization == specialization).all()
+        doctors = db.query(Doctor).options(joinedload(Doctor.department)).filter(Doctor.specialization == specialization).all()
         if not doctors:
             click.echo(f"No doctors found with specialization '{specialization}'.")
             return
         for doc in doctors:
-            dept_name = db.query(Department.name).filter(Department.id == doc.department_id).scalar() if doc.department_id else "N/A"
+            dept_name = doc.department.name if doc.department else "N/A"
             click.echo(f'{doc.id}: {doc.name} ({doc.specialization}) - Department: {dept_name}')
     except Exception as e:
         click.echo(f"Error filtering doctors: {e}", err=True)
@@ -126,6 +129,124 @@ def filter(specialization):
         db.close()
 
 
+@doctor.command('add-shift')
+@click.argument('doctor_id', type=int)
+@click.option('--day', 'days', multiple=True, required=True, type=click.Choice(WEEKDAYS), help='Weekday (repeatable).')
+@click.option('--start', required=True, help="Start time 'HH:MM'.")
+@click.option('--end', required=True, help="End time 'HH:MM' (at or before --start means the shift runs past midnight).")
+def add_shift(doctor_id, days, start, end):
+    """Add weekly working hours for a doctor"""
+    db = next(get_db())
+    try:
+        if not db.get(Doctor, doctor_id):
+            click.echo("Doctor not found.")
+            return
+        try:
+            start_time = datetime.strptime(start, '%H:%M').time()
+            end_time = datetime.strptime(end, '%H:%M').time()
+        except ValueError:
+            click.echo("Invalid time format. Use 'HH:MM'", err=True)
+            return
+        db.add_all([DoctorShift(doctor_id=doctor_id, weekday=WEEKDAYS.index(day), start_time=start_time, end_time=end_time)
+                    for day in days])
+        db.commit()
+        click.echo(f"Added {len(days)} shift(s) {start}-{end} for doctor ID {doctor_id}.")
+    except Exception as e:
+        db.rollback()
+        click.echo(f"Error adding shift: {e}", err=True)
+    finally:
+        db.close()
+
+@doctor.command('list-shifts')
+@click.argument('doctor_id', type=int)
+def list_shifts(doctor_id):
+    """Show a doctor's weekly working hours"""
+    db = next(get_db())
+    try:
+        doc = db.get(Doctor, doctor_id)
+        if not doc:
+            click.echo("Doctor not found.")
+            return
+        if not doc.shifts:
+            hours = ', '.join(f"{WEEKDAYS[day]} {start:%H:%M}-{end:%H:%M}" for day, start, end in DEFAULT_SHIFTS)
+            click.echo(f"No shifts set; default working hours apply: {hours}")
+            return
+        for shift in doc.shifts:
+            click.echo(f"Shift ID {shift.id}: {WEEKDAYS[shift.weekday]} {shift.start_time:%H:%M}-{shift.end_time:%H:%M}")
+    except Exception as e:
+        click.echo(f"Error listing shifts: {e}", err=True)
+    finally:
+        db.close()
+
+@doctor.command('delete-shift')
+@click.argument('shift_id', type=int)
+def delete_shift(shift_id):
+    """Delete one shift"""
+    db = next(get_db())
+    try:
+        shift = db.get(DoctorShift, shift_id)
+        if not shift:
+            click.echo("Shift not found.")
+            return
+        db.delete(shift)
+        db.commit()
+        click.echo(f"Shift ID {shift_id} deleted.")
+    except Exception as e:
+        db.rollback()
+        click.echo(f"Error deleting shift: {e}", err=True)
+    finally:
+        db.close()
+
+@doctor.command('reassign')
+@click.argument('doctor_id', type=int)
+@click.option('--after', default=None, help="Move appointments starting at or after this, 'YYYY-MM-DD HH:MM' (default: now).")
+@click.option('--dry-run', is_flag=True, help='Only show who would take over what.')
+def reassign(doctor_id, after, dry_run):
+    """Share a departing doctor's scheduled appointments among their colleagues"""
+    db = next(get_db())
+    try:
+        doc = db.get(Doctor, doctor_id)
+        if not doc:
+            click.echo("Doctor not found.")
+            return
+        try:
+            start = datetime.strptime(after, '%Y-%m-%d %H:%M') if after else datetime.now()
+        except ValueError:
+            click.echo("Invalid datetime format. Use 'YYYY-MM-DD HH:MM'", err=True)
+            return
+
+        others = colleagues(db, doc)
+        names = {other.id: other.name for other in others}
+        plan = plan_reassignment(db, doctor_id, [other.id for other in others], start)
+        if not plan['moves'] and not plan['unplaced']:
+            click.echo(f"Doctor ID {doctor_id} has no scheduled appointments to reassign.")
+            return
+        if not others:
+            click.echo(f"No other {doc.specialization} in doctor ID {doctor_id}'s department to take over.", err=True)
+        moved = len(plan['moves']) if dry_run else apply_reassignment(db, doctor_id, plan)
+
+        given = defaultdict(int)
+        for _, new_doctor_id in plan['moves']:
+            given[new_doctor_id] += 1
+        verb = "would be reassigned" if dry_run else "reassigned"
+        click.echo(f"{moved} appointments of {doc.name} (Doctor ID {doctor_id}) {verb}:")
+        for other_id, name in names.items():
+            click.echo(f"  {name} (Doctor ID {other_id}): +{given[other_id]} appointments, "
+                       f"{plan['load'][other_id]} min booked from {start:%Y-%m-%d %H:%M}")
+        if plan['unplaced']:
+            click.echo(f"{len(plan['unplaced'])} appointments could not be placed (no colleague working and free); "
+                       f"they stay with doctor ID {doctor_id}:")
+            for appointment_id, when in plan['unplaced']:
+                click.echo(f"  Appointment ID {appointment_id} on {when:%Y-%m-%d %H:%M}")
+    except ReassignmentConflict as e:
+        click.echo(f"Error reassigning appointments: {e}", err=True)
+    except Exception as e:
+        db.rollback()
+        click.echo(f"Error reassigning appointments: {e}", err=True)
+    finally:
+        db.close()
+
+
 if __name__ == '__main__':
     doctor()
 # This code defines a CLI for managing doctors in a hospital management system.
@@ -139,9 +260,22 @@ if __name__ == '__main__':
 
 # To list doctors
 #         => python -m src.cli doctor list
+#         => python -m src.cli doctor list --limit 50 --after-id 200
 
 # To update a doctor
 #         => python -m src.cli doctor update <doctor_id>
 
 # To delete a doctor 
-#         => python -m src.cli doctor delete <doctor_id>
\ No newline at end of file
+#         => python -m src.cli doctor delete <doctor_id>
+#         => python -m src.cli doctor delete <doctor_id> --chunk-size 5000    (appointments/records removed 5000 rows per transaction)
+
+# To hand a departing doctor's upcoming appointments to colleagues (same department and specialization)
+#         => python -m src.cli doctor reassign <doctor_id> --dry-run
+#         => python -m src.cli doctor reassign <doctor_id>
+#         => python -m src.cli doctor reassign <doctor_id> --after "2025-07-01 00:00"
+
+# To set working hours (doctors without shifts work Mon-Fri 09:00-17:00)
+#         => python -m src.cli doctor add-shift <doctor_id> --day mon --day tue --start 08:00 --end 14:00
+#         => python -m src.cli doctor add-shift <doctor_id> --day fri --start 22:00 --end 06:00
+#         => python -m src.cli doctor list-shifts <doctor_id>
+#         => python -m src.cli doctor delete-shift <shift_id>
\ No newline at end of file
@@ -0,0 +1,66 @@
+import click
+
+from src.exporter import export_tables, EXPORTS, FORMATS, COMPRESSIONS, DEFAULT_SHARD_ROWS
+
+
+@click.group()
+def export():
+    """Export data to JSONL/CSV files."""
+    pass
+
+
+def export_options(command):
+    command = click.option('--include-archive', is_flag=True,
+                           help='Also export archived appointments and medical records.')(command)
+    command = click.option('--shard-rows', default=DEFAULT_SHARD_ROWS, show_default=True, type=click.IntRange(min=1),
+                           help='IDs per output file; shards are exported in parallel.')(command)
+    command = click.option('--workers', default=1, show_default=True, type=click.IntRange(min=1),
+                           help='Worker processes.')(command)
+    command = click.option('--compress', type=click.Choice(COMPRESSIONS), default='none', show_default=True,
+                           help='Compress each output file.')(command)
+    command = click.option('--format', 'file_format', type=click.Choice(FORMATS), default='jsonl', show_default=True,
+                           help='Output format.')(command)
+    return command
+
+
+def _run_export(out_dir, tables, file_format, compress, workers, shard_rows, include_archive):
+    try:
+        totals = export_tables(out_dir, tables, file_format=file_format, compress=compress,
+                               workers=workers, shard_rows=shard_rows, include_archive=include_archive)
+    except Exception as e:
+        click.echo(f"Error exporting data: {e}", err=True)
+        return
+    for table, count in totals.items():
+        click.echo(f"{table}: {count} rows")
+    click.echo(f"Export written to {out_dir} (see manifest.json).")
+
+
+@export.command('all')
+@click.argument('out_dir', type=click.Path(file_okay=False))
+@export_options
+def export_all(out_dir, file_format, compress, workers, shard_rows, include_archive):
+    """Export every table into OUT_DIR."""
+    _run_export(out_dir, None, file_format, compress, workers, shard_rows, include_archive)
+
+
+@export.command('table')
+@click.argument('table', type=click.Choice(list(EXPORTS)))
+@click.argument('out_dir', type=click.Path(file_okay=False))
+@export_options
+def export_table(table, out_dir, file_format, compress, workers, shard_rows, include_archive):
+    """Export one table into OUT_DIR."""
+    _run_export(out_dir, [table], file_format, compress, workers, shard_rows, include_archive)
+
+
+# -------------------- COMMANDS TO RUN --------------------
+# To export everything as JSONL
+#         => python -m src.cli export all ./export
+
+# To export gzip-compressed CSV using 4 processes, 250k ids per file
+#         => python -m src.cli export all ./export --format csv --compress gzip --workers 4 --shard-rows 250000
+
+# To export a single table
+#         => python -m src.cli export table medical_records ./export --compress zstd
+
+# To include rows moved to the archive (python -m src.cli archive)
+#         => python -m src.cli export table appointments ./export --include-archive
@@ -0,0 +1,180 @@
+import csv
+import enum
+import gzip
+import io
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime
+
+from sqlalchemy import func, literal_column, select, union_all
+
+from src import archive, database
+from src.models import Patient, InPatient, OutPatient, Doctor, Department, Appointment, MedicalRecord
+
+# zstandard is optional; only --compress zstd needs it.
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+FORMATS = ('jsonl', 'csv')
+COMPRESSIONS = ('none', 'gzip', 'zstd')
+DEFAULT_SHARD_ROWS = 100000
+STREAM_BATCH_SIZE = 5000
+
+_patients = Patient.__table__
+_inpatients = InPatient.__table__
+_outpatients = OutPatient.__table__
+
+
+def _patients_query():
+    # Patients with their subtype columns flattened into one row.
+    return (
+        select(
+            _patients,
+            _inpatients.c.room_number,
+            _inpatients.c.admission_date,
+            _inpatients.c.discharge_date,
+            _outpatients.c.last_visit_date,
+        )
+        .select_from(_patients)
+        .outerjoin(_inpatients, _inpatients.c.id == _patients.c.id)
+        .outerjoin(_outpatients, _outpatients.c.id == _patients.c.id)
+    )
+
+
+# Table name => (query builder, id column used for sharding and ordering)
+EXPORTS = {
+    'patients': (_patients_query, _patients.c.id),
+    'doctors': (lambda: select(Doctor.__table__), Doctor.__table__.c.id),
+    'departments': (lambda: select(Department.__table__), Department.__table__.c.id),
+    'appointments': (lambda: select(Appointment.__table__), Appointment.__table__.c.id),
+    'medical_records': (lambda: select(MedicalRecord.__table__), MedicalRecord.__table__.c.id),
+}
+
+
+def _plain(value):
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    if isinstance(value, enum.Enum):
+        return value.value
+    return value
+
+
+def _open_output(path, compress):
+    if compress == 'gzip':
+        return gzip.open(path, 'wt', encoding='utf-8', newline='')
+    if compress == 'zstd':
+        raw = open(path, 'wb')
+        return io.TextIOWrapper(zstandard.ZstdCompressor().stream_writer(raw), encoding='utf-8', newline='')
+    return open(path, 'w', encoding='utf-8', newline='')
+
+
+def shard_path(out_dir, table, index, file_format, compress):
+    suffix = {'none': '', 'gzip': '.gz', 'zstd': '.zst'}[compress]
+    return os.path.join(out_dir, table, f"part-{index:05d}.{file_format}{suffix}")
+
+
+def _archived(table, archive_path):
+    # The archive's copy of the table, when this export includes it.
+    return archive.ARCHIVED[table][2] if archive_path and table in archive.ARCHIVED else None
+
+
+def plan_shards(engine, table, shard_rows=DEFAULT_SHARD_ROWS, archive_path=None):
+    """
+    Splits a table into [low, high] id ranges of at most shard_rows ids each.
+    With archive_path, the ranges also cover the table's archived rows (which keep their ids).
+    """
+    _, id_column = EXPORTS[table]
+    archived = _archived(table, archive_path)
+    with engine.connect() as conn:
+        low, high = conn.execute(select(func.min(id_column), func.max(id_column))).one()
+        if archived is not None:
+            with archive.attached(conn, archive_path):
+                archived_low, archived_high = conn.execute(select(func.min(archived.c.id), func.max(archived.c.id))).one()
+            if archived_low is not None:
+                low = archived_low if low is None else min(low, archived_low)
+                high = archived_high if high is None else max(high, archived_high)
+    if low is None:
+        return []
+    return [(start, min(start + shard_rows - 1, high)) for start in range(low, high + 1, shard_rows)]
+
+
+def export_shard(database_url, profile, table, low, high, path, file_format, compress, archive_path=None):
+    """
+    Writes the rows of one id range to one file, streaming from the cursor.
+    Runs in a worker process, so it opens its own engine (and attaches the archive itself).
+    """
+    engine = database.make_engine(database_url, profile)
+    build_query, id_column = EXPORTS[table]
+    query = build_query().where(id_column.between(low, high))
+    archived = _archived(table, archive_path)
+    if archived is None:
+        query = query.order_by(id_column)
+    else:
+        query = union_all(query, select(archived).where(archived.c.id.between(low, high))).order_by(literal_column('id'))
+    count = 0
+    try:
+        with engine.connect() as conn, _open_output(path, compress) as out:
+            if archived is not None:
+                conn.exec_driver_sql(f"ATTACH DATABASE ? AS {archive.ARCHIVE_SCHEMA}", (archive_path,))
+            result = conn.execution_options(stream_results=True, yield_per=STREAM_BATCH_SIZE).execute(query)
+            columns = list(result.keys())
+            writer = None
+            if file_format == 'csv':
+                writer = csv.writer(out)
+                writer.writerow(columns)
+            for row in result:
+                values = [_plain(value) for value in row]
+                if writer:
+                    writer.writerow(values)
+                else:
+                    out.write(json.dumps(dict(zip(columns, values))))
+                    out.write('\n')
+                count += 1
+    finally:
+        engine.dispose()
+    return count
+
+
+def export_tables(out_dir, tables=None, file_format='jsonl', compress='none', workers=1,
+                  shard_rows=DEFAULT_SHARD_ROWS, engine=None, profile=None, include_archive=False):
+    """
+    Exports the given tables (default: all) into out_dir/<table>/part-NNNNN.<format>[.gz|.zst],
+    one file per id range, spreading the shards over a process pool. include_archive adds the
+    archived appointments and medical records, in id order among the others.
+    Writes out_dir/manifest.json and returns {table: row count}.
+    """
+    if compress == 'zstd' and zstandard is None:
+        raise RuntimeError("zstd compression needs the 'zstandard' package (pip install zstandard).")
+    engine = engine or database.engine
+    profile = profile or database.DB_PROFILE
+    database_url = engine.url.render_as_string(hide_password=False)
+    tables = tables or list(EXPORTS)
+    archive_path = archive.archive_path(engine) if include_archive and archive.has_archive(engine) else None
+
+    jobs = []
+    for table in tables:
+        os.makedirs(os.path.join(out_dir, table), exist_ok=True)
+        for index, (low, high) in enumerate(plan_shards(engine, table, shard_rows, archive_path), start=1):
+            path = shard_path(out_dir, table, index, file_format, compress)
+            jobs.append((database_url, profile, table, low, high, path, file_format, compress,
+                         archive_path if _archived(table, archive_path) is not None else None))
+
+    if workers > 1 and len(jobs) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            counts = list(pool.map(export_shard, *zip(*jobs)))
+    else:
+        counts = [export_shard(*job) for job in jobs]
+
+    totals = {table: 0 for table in tables}
+    shards = []
+    for (_, _, table, low, high, path, _, _, _), count in zip(jobs, counts):
+        totals[table] += count
+        shards.append({'table': table, 'first_id': low, 'last_id': high, 'rows': count,
+                       'file': os.path.relpath(path, out_dir)})
+    with open(os.path.join(out_dir, 'manifest.json'), 'w', encoding='utf-8') as handle:
+        json.dump({'format': file_format, 'compression': compress, 'include_archive': archive_path is not None,
+                   'tables': totals, 'shards': shards}, handle, indent=2)
+    return totals
@@ -0,0 +1,163 @@
+import click
+from datetime import date
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+
+from src.database import get_db
+from src.models import Department, Room
+from src.rooms import check_admission, free_rooms, register_rooms, room_occupancy
+
+
+@click.group()
+def inpatient():
+    """Rooms, beds and inpatient stays."""
+    pass
+
+
+@inpatient.command('add-room')
+@click.argument('number')
+@click.option('--beds', default=1, show_default=True, type=click.IntRange(min=1), help='Number of beds in the room.')
+@click.option('--department-id', type=int, default=None, help='Department the room belongs to.')
+def add_room(number, beds, department_id):
+    """Register a room and its number of beds."""
+    session = next(get_db())
+    try:
+        if department_id is not None and session.get(Department, department_id) is None:
+            click.echo(f"Department with ID {department_id} not found.", err=True)
+            return
+        room = Room(number=number, beds=beds, department_id=department_id)
+        session.add(room)
+        session.commit()
+        click.echo(f"Room {room.number} (ID: {room.id}) registered with {room.beds} bed(s).")
+    except IntegrityError:
+        session.rollback()
+        click.echo(f"Room {number} is already registered.", err=True)
+    except Exception as e:
+        session.rollback()
+        click.echo(f"Error registering room: {e}", err=True)
+    finally:
+        session.close()
+
+
+@inpatient.command('update-room')
+@click.argument('number')
+@click.option('--beds', type=click.IntRange(min=1), default=None, help='New number of beds.')
+@click.option('--department-id', type=int, default=None, help='New department.')
+def update_room(number, beds, department_id):
+    """Change a registered room's number of beds or department."""
+    session = next(get_db())
+    try:
+        room = session.scalars(select(Room).where(Room.number == number)).first()
+        if room is None:
+            click.echo(f"Room {number} is not registered.", err=True)
+            return
+        if department_id is not None and session.get(Department, department_id) is None:
+            click.echo(f"Department with ID {department_id} not found.", err=True)
+            return
+        if beds is not None:
+            room.beds = beds
+        if department_id is not None:
+            room.department_id = department_id
+        session.commit()
+        click.echo(f"Room {room.number} updated: {room.beds} bed(s).")
+    except Exception as e:
+        session.rollback()
+        click.echo(f"Error updating room: {e}", err=True)
+    finally:
+        session.close()
+
+
+@inpatient.command('register-rooms')
+@click.option('--beds', default=1, show_default=True, type=click.IntRange(min=1),
+              help='Beds given to each room registered.')
+def register_rooms_command(beds):
+    """Register every room number existing stays use that is not registered yet."""
+    session = next(get_db())
+    try:
+        added = register_rooms(session.connection(), beds)
+        session.commit()
+        click.echo(f"{added} room(s) registered.")
+    except Exception as e:
+        session.rollback()
+        click.echo(f"Error registering rooms: {e}", err=True)
+    finally:
+        session.close()
+
+
+@inpatient.command('rooms')
+@click.option('--on', 'on_day', type=click.DateTime(['%Y-%m-%d']), default=None, help='Day to show (default: today).')
+@click.option('--department-id', type=int, default=None, help='Only rooms of this department.')
+def rooms(on_day, department_id):
+    """List registered rooms with their beds and occupancy."""
+    on_day = on_day.date() if on_day else date.today()
+    session = next(get_db())
+    try:
+        rows = room_occupancy(session, on_day, department_id)
+        if not rows:
+            click.echo("No rooms registered.")
+            return
+        click.echo(f"--- Rooms on {on_day} ---")
+        for room, occupied in rows:
+            click.echo(f"Room {room.number}: {occupied}/{room.beds} beds occupied")
+    except Exception as e:
+        click.echo(f"Error listing rooms: {e}", err=True)
+    finally:
+        session.close()
+
+
+@inpatient.command('free-rooms')
+@click.option('--on', 'on_day', type=click.DateTime(['%Y-%m-%d']), default=None, help='Day to check (default: today).')
+@click.option('--department-id', type=int, default=None, help='Only rooms of this department.')
+def free_rooms_command(on_day, department_id):
+    """List the rooms with a free bed on a day."""
+    on_day = on_day.date() if on_day else date.today()
+    session = next(get_db())
+    try:
+        rows = free_rooms(session, on_day, department_id)
+        if not rows:
+            click.echo(f"No free beds on {on_day}.")
+            return
+        click.echo(f"--- Free rooms on {on_day} ---")
+        for room, free in rows:
+            click.echo(f"Room {room.number}: {free} of {room.beds} beds free")
+    except Exception as e:
+        click.echo(f"Error finding free rooms: {e}", err=True)
+    finally:
+        session.close()
+
+
+@inpatient.command('check')
+@click.argument('number')
+@click.option('--from', 'admission', required=True, type=click.DateTime(['%Y-%m-%d']), help='Admission day.')
+@click.option('--to', 'discharge', type=click.DateTime(['%Y-%m-%d']), default=None,
+              help='Discharge day (default: open-ended).')
+def check(number, admission, discharge):
+    """Check whether a room has a bed for a stay, without admitting anyone."""
+    session = next(get_db())
+    try:
+        if session.scalars(select(Room).where(Room.number == number)).first() is None:
+            click.echo(f"Room {number} is not registered.", err=True)
+            return
+        check_admission(session, number, admission.date(), discharge.date() if discharge else None)
+        click.echo(f"Room {number} has a free bed for the whole stay.")
+    except ValueError as e:
+        click.echo(f"Error: {e}", err=True)
+    except Exception as e:
+        click.echo(f"Error checking room: {e}", err=True)
+    finally:
+        session.close()
+
+
+# -------------------- COMMANDS TO RUN --------------------
+# To register rooms (inpatients are admitted by room number; a room holds as many stays at once as it has beds)
+#         => python -m src.cli inpatient add-room 101A --beds 2 --department-id 1
+#         => python -m src.cli inpatient update-room 101A --beds 3
+#         => python -m src.cli inpatient register-rooms      (every room number existing stays use, 1 bed each)
+
+# To see occupancy and free beds (one index search, however many stays are recorded)
+#         => python -m src.cli inpatient rooms
+#         => python -m src.cli inpatient free-rooms --on 2025-07-01
+#         => python -m src.cli inpatient free-rooms --on 2025-07-01 --department-id 2
+
+# To check a room before admitting (patient add/update refuse an admission into a full room)
+#         => python -m src.cli inpatient check 101A --from 2025-07-01 --to 2025-07-05
@@ -1,7 +1,7 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, Date, DateTime, Text, Enum as SQLEnum
+from sqlalchemy import Column, Integer, String, ForeignKey, Date, DateTime, Time, Text, Index, LargeBinary, Enum as SQLEnum, inspect, text
 from src.database import Base
-from sqlalchemy.orm import relationship
-from datetime import datetime, date
+from sqlalchemy.orm import relationship, joinedload
+from datetime import datetime, date, timedelta
 
 import enum
 
@@ -24,8 +24,12 @@ class Patient(Base):
     contact_info = Column(String)
     patient_type = Column(SQLEnum(PatientType), nullable=False)
 
-    medical_records = relationship("MedicalRecord", back_populates="patient", cascade="all, delete-orphan")
-    appointments = relationship("Appointment", back_populates="patient", cascade="all, delete-orphan")
+    # passive_deletes: deleting a patient leaves the rows to ON DELETE CASCADE instead of loading them first.
+    medical_records = relationship("MedicalRecord", back_populates="patient", cascade="all, delete-orphan", passive_deletes=True)
+    appointments = relationship("Appointment", back_populates="patient", cascade="all, delete-orphan", passive_deletes=True)
+    __table_args__ = (
+        Index('ix_patients_name', 'name'),
+    )
     __mapper_args__ = {
         'polymorphic_on': patient_type,
         'polymorphic_identity': 'patient'
@@ -42,11 +46,15 @@ class Patient(Base):
 # --- InPatient Model ---
 class InPatient(Patient):
     __tablename__ = 'inpatients'
-    id = Column(Integer, ForeignKey("patients.id"), primary_key=True)
+    id = Column(Integer, ForeignKey("patients.id", ondelete='CASCADE'), primary_key=True)
     room_number = Column(String)
     admission_date = Column(Date, default=date.today)
     discharge_date = Column(Date)
 
+    __table_args__ = (
+        # A room's stays in date order (registering a room indexes its existing stays through here).
+        Index('ix_inpatients_room_admission', 'room_number', 'admission_date'),
+    )
     __mapper_args__ = {
         'polymorphic_identity': PatientType.INPATIENT
     }
@@ -58,7 +66,7 @@ class InPatient(Patient):
 # --- OutPatient Model ---
 class OutPatient(Patient):
     __tablename__ = 'outpatients'
-    id = Column(Integer, ForeignKey("patients.id"), primary_key=True)
+    id = Column(Integer, ForeignKey("patients.id", ondelete='CASCADE'), primary_key=True)
     last_visit_date = Column(Date)
 
     __mapper_args__ = {
@@ -79,21 +87,32 @@ class Doctor(Base):
     department_id = Column(Integer, ForeignKey('departments.id')) # Foreign key to link to Department
     # Relationships
     department = relationship("Department", back_populates="doctors", foreign_keys=[department_id]) 
-    appointments = relationship("Appointment", back_populates="doctor", cascade="all, delete-orphan")
-    medical_records = relationship("MedicalRecord", back_populates="doctor", cascade="all, delete-orphan")
+    # Like Patient: ON DELETE CASCADE removes these in the database, without loading them.
+    appointments = relationship("Appointment", back_populates="doctor", cascade="all, delete-orphan", passive_deletes=True)
+    medical_records = relationship("MedicalRecord", back_populates="doctor", cascade="all, delete-orphan", passive_deletes=True)
 
     department_headed = relationship(
         "Department",
         back_populates="head_doctor",
         foreign_keys="[Department.head_doctor_id]"
     )
+    shifts = relationship("DoctorShift", back_populates="doctor", cascade="all, delete-orphan", passive_deletes=True,
+                          order_by="(DoctorShift.weekday, DoctorShift.start_time)")
+
+    __table_args__ = (
+        # Staff of a department, optionally narrowed to one specialization (Department.specialty_doctors).
+        Index('ix_doctors_department_specialization', 'department_id', 'specialization'),
+        # doctor filter <specialization> across all departments.
+        Index('ix_doctors_specialization', 'specialization'),
+    )
 
     def __repr__(self):
         return f"<Doctor(id={self.id}, name='{self.name}', spec='{self.specialization}')>"
 
     @classmethod
     def find_by_id(cls, session, doctor_id):
-        return session.query(cls).filter_by(id=doctor_id).first()
+        # Served from the reference-data cache (src/refcache.py) when it has the doctor.
+        return refcache.cached_get(session, cls, doctor_id)
 
 
 # --- Department Model ---
@@ -129,8 +148,12 @@ class Department(Base):
         return department
 
     @classmethod
-    def find_by_id(cls, session, department_id):
-        return session.query(cls).filter_by(id=department_id).first()
+    def find_by_id(cls, session, department_id, *options):
+        # Pass loader options (e.g. selectinload(Department.doctors)) to fetch related rows up front.
+        # Without them the department comes from the reference-data cache (src/refcache.py).
+        if not options:
+            return refcache.cached_get(session, cls, department_id)
+        return session.query(cls).options(*options).filter_by(id=department_id).first()
 
     @classmethod
     def find_by_name(cls, session, name):
@@ -138,7 +161,8 @@ class Department(Base):
 
     @classmethod
     def get_all(cls, session):
-        return session.query(cls).all()
+        # Listings always show the head doctor, so load it in the same query instead of once per row.
+        return session.query(cls).options(joinedload(cls.head_doctor)).all()
 
     @classmethod
     def delete_by_id(cls, session, department_id):
@@ -173,7 +197,11 @@ class Department(Base):
         session.commit()
 
     def get_staff_count(self, session):
-        return len(self.doctors)
+        if 'doctors' not in inspect(self).unloaded:
+            return len(self.doctors)
+        # The counter kept by src/counters.py, so no doctor rows are read.
+        count = session.get(DepartmentCounts, self.id)
+        return count.doctors if count else 0
 
     def assign_specialty(self, session, specialty):
         self.specialty = specialty
@@ -187,15 +215,34 @@ class Department(Base):
 class Appointment(Base):
     __tablename__ = 'appointments'
     id = Column(Integer, primary_key=True)
-    patient_id = Column(Integer, ForeignKey('patients.id'), nullable=False)
-    doctor_id = Column(Integer, ForeignKey('doctors.id'), nullable=False)
+    patient_id = Column(Integer, ForeignKey('patients.id', ondelete='CASCADE'), nullable=False)
+    doctor_id = Column(Integer, ForeignKey('doctors.id', ondelete='CASCADE'), nullable=False)
     appointment_datetime = Column(DateTime, nullable=False, default=datetime.now)
+    duration_minutes = Column(Integer, nullable=False, default=30, server_default=text('30'))
     reason = Column(String)
     status = Column(SQLEnum(AppointmentStatus), default=AppointmentStatus.SCHEDULED)
 
     patient = relationship("Patient", back_populates="appointments")
     doctor = relationship("Doctor", back_populates="appointments")
 
+    __table_args__ = (
+        # A doctor's agenda: appointments of one doctor in a time window, already in time order.
+        Index('ix_appointments_doctor_datetime', 'doctor_id', 'appointment_datetime'),
+        # A patient's appointment history, same idea.
+        Index('ix_appointments_patient_datetime', 'patient_id', 'appointment_datetime'),
+        # Date-range jobs across all doctors (e.g. everything scheduled for tomorrow).
+        Index('ix_appointments_datetime', 'appointment_datetime'),
+        # Only the still-scheduled appointments (a small share of the table): `appointment sweep`
+        # walks these instead of the whole history.
+        Index('ix_appointments_scheduled', 'appointment_datetime', sqlite_where=text("status = 'SCHEDULED'")),
+        # Ids are never handed out twice: an archived appointment keeps its id in the archive database.
+        {'sqlite_autoincrement': True},
+    )
+
+    @property
+    def end_datetime(self):
+        return self.appointment_datetime + timedelta(minutes=self.duration_minutes or 30)
+
     def __repr__(self):
         return f"<Appointment(id={self.id}, patient_id={self.patient_id}, doctor_id={self.doctor_id}, date='{self.appointment_datetime.strftime('%Y-%m-%d %H:%M')}')>"
 
@@ -203,8 +250,8 @@ class Appointment(Base):
 class MedicalRecord(Base):
     __tablename__ = 'medical_records'
     id = Column(Integer, primary_key=True)
-    patient_id = Column(Integer, ForeignKey('patients.id'), nullable=False)
-    doctor_id = Column(Integer, ForeignKey('doctors.id'), nullable=False)
+    patient_id = Column(Integer, ForeignKey('patients.id', ondelete='CASCADE'), nullable=False)
+    doctor_id = Column(Integer, ForeignKey('doctors.id', ondelete='CASCADE'), nullable=False)
     record_date = Column(Date, default=date.today)
     diagnosis = Column(String)
     treatment = Column(Text)
@@ -212,6 +259,156 @@ class MedicalRecord(Base):
     patient = relationship("Patient", back_populates="medical_records")
     doctor = relationship("Doctor", back_populates="medical_records")
 
+    __table_args__ = (
+        # A patient's history, newest first.
+        Index('ix_medical_records_patient_date', 'patient_id', 'record_date'),
+        # Records written by a doctor (doctor delete cascades through here).
+        Index('ix_medical_records_doctor_date', 'doctor_id', 'record_date'),
+        # Ids are never handed out twice, as for appointments.
+        {'sqlite_autoincrement': True},
+    )
+
     def __repr__(self):
         return f"<MedicalRecord(id={self.id}, patient_id={self.patient_id}, diagnosis='{self.diagnosis[:20]}...')>"
 
+
+
+# --- Doctor availability ---
+class DoctorShift(Base):
+    """A weekly working period, e.g. Mondays 09:00-17:00. An end at or before the start runs past midnight."""
+    __tablename__ = 'doctor_shifts'
+    id = Column(Integer, primary_key=True)
+    doctor_id = Column(Integer, ForeignKey('doctors.id', ondelete='CASCADE'), nullable=False)
+    weekday = Column(Integer, nullable=False)  # 0 = Monday ... 6 = Sunday
+    start_time = Column(Time, nullable=False)
+    end_time = Column(Time, nullable=False)
+
+    doctor = relationship("Doctor", back_populates="shifts")
+
+    __table_args__ = (
+        Index('ix_doctor_shifts_doctor_weekday', 'doctor_id', 'weekday'),
+    )
+
+    def __repr__(self):
+        return f"<DoctorShift(id={self.id}, doctor_id={self.doctor_id}, weekday={self.weekday}, {self.start_time:%H:%M}-{self.end_time:%H:%M})>"
+
+
+class DoctorDaySlots(Base):
+    """
+    Busy bitmap of one doctor's day: bit i is set when an active appointment touches the
+    i-th slot (see src/availability.py). Derived from appointments; days without bookings have no row.
+    """
+    __tablename__ = 'doctor_day_slots'
+    doctor_id = Column(Integer, ForeignKey('doctors.id', ondelete='CASCADE'), primary_key=True)
+    day = Column(Date, primary_key=True)
+    busy = Column(LargeBinary, nullable=False)
+
+    def __repr__(self):
+        return f"<DoctorDaySlots(doctor_id={self.doctor_id}, day='{self.day}')>"
+
+
+# --- Rooms ---
+class Room(Base):
+    """
+    A room inpatients are admitted to (matched on InPatient.room_number) and how many beds it has.
+    Stays in registered rooms are indexed by date in stay_index (see src/rooms.py).
+    """
+    __tablename__ = 'rooms'
+    id = Column(Integer, primary_key=True)
+    number = Column(String, nullable=False, unique=True)
+    beds = Column(Integer, nullable=False, default=1, server_default=text('1'))
+    department_id = Column(Integer, ForeignKey('departments.id', ondelete='SET NULL'))
+
+    __table_args__ = (
+        Index('ix_rooms_department', 'department_id'),
+    )
+
+    def __repr__(self):
+        return f"<Room(id={self.id}, number='{self.number}', beds={self.beds})>"
+
+
+# --- Counters (derived, see src/counters.py) ---
+class DepartmentCounts(Base):
+    """Number of doctors in a department. Departments without doctors may have no row."""
+    __tablename__ = 'department_counts'
+    department_id = Column(Integer, ForeignKey('departments.id', ondelete='CASCADE'), primary_key=True)
+    doctors = Column(Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f"<DepartmentCounts(department_id={self.department_id}, doctors={self.doctors})>"
+
+
+class DoctorAppointmentCounts(Base):
+    """Number of a doctor's appointments in one status (archived appointments are not counted)."""
+    __tablename__ = 'doctor_appointment_counts'
+    doctor_id = Column(Integer, ForeignKey('doctors.id', ondelete='CASCADE'), primary_key=True)
+    status = Column(SQLEnum(AppointmentStatus), primary_key=True)
+    appointments = Column(Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f"<DoctorAppointmentCounts(doctor_id={self.doctor_id}, status='{self.status.value}', appointments={self.appointments})>"
+
+
+class DoctorRecordCounts(Base):
+    """Number of medical records a doctor wrote (archived records are not counted)."""
+    __tablename__ = 'doctor_record_counts'
+    doctor_id = Column(Integer, ForeignKey('doctors.id', ondelete='CASCADE'), primary_key=True)
+    records = Column(Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f"<DoctorRecordCounts(doctor_id={self.doctor_id}, records={self.records})>"
+
+
+class PatientSummary(Base):
+    """
+    One patient's chart facts, derived from their appointments, medical records and inpatient
+    stay (see src/patient_summary.py): completed visits, the earliest still-scheduled
+    appointment, the newest record and the open stay, if any. Archived rows are not counted.
+    """
+    __tablename__ = 'patient_summary'
+    patient_id = Column(Integer, ForeignKey('patients.id', ondelete='CASCADE'), primary_key=True)
+    total_visits = Column(Integer, nullable=False, default=0)
+    last_visit = Column(DateTime)
+    next_appointment_id = Column(Integer)
+    next_appointment_at = Column(DateTime)
+    next_doctor_id = Column(Integer)
+    latest_record_id = Column(Integer)
+    latest_record_date = Column(Date)
+    latest_diagnosis = Column(String)
+    admitted_on = Column(Date)      # set while an inpatient stay is open (no discharge date)
+    room_number = Column(String)
+
+    def __repr__(self):
+        return f"<PatientSummary(patient_id={self.patient_id}, total_visits={self.total_visits})>"
+
+
+class ImportProgress(Base):
+    """
+    How far a bulk patient import got (see src/patient_import.py). Written in the same
+    transaction as each batch, so the rows and the resume point are committed together.
+    Progress recorded for another file at the same path is not resumed.
+    """
+    __tablename__ = 'import_progress'
+    checkpoint = Column(String, primary_key=True)    # absolute path of the import's checkpoint
+    source = Column(String)     # size and modification time of the file being imported
+    rows_done = Column(Integer, nullable=False, default=0)
+    imported = Column(Integer, nullable=False, default=0)
+    rejected = Column(Integer, nullable=False, default=0)
+    rejects_bytes = Column(Integer, nullable=False, default=0)   # size of the rejects file at that commit
+
+    def __repr__(self):
+        return f"<ImportProgress(checkpoint='{self.checkpoint}', rows_done={self.rows_done})>"
+
+
+# Keeps doctor_day_slots in step with appointment writes (ORM event listeners).
+from src import availability  # noqa: E402,F401
+# Keeps the counter tables in step with doctor, appointment and record writes.
+from src import counters  # noqa: E402,F401
+# Keeps patient_summary in step with appointment, record and inpatient writes.
+from src import patient_summary  # noqa: E402,F401
+# Creates the medical-record full-text index alongside the tables.
+from src import search  # noqa: E402,F401
+# Creates the stay interval index (R*Tree) and its triggers alongside the tables.
+from src import rooms  # noqa: E402,F401
+# Cache of doctors and departments behind find_by_id, evicted on writes (ORM and Core listeners).
+from src import refcache  # noqa: E402
@@ -0,0 +1,45 @@
+import click
+
+# Rows fetched per round trip when streaming a listing.
+STREAM_BATCH_SIZE = 1000
+
+
+def pagination_options(command):
+    """
+    Adds --limit and --after-id to a list command.
+    """
+    command = click.option('--after-id', type=int, default=None,
+                           help='Only show rows with an ID greater than this (use the last ID of the previous page).')(command)
+    command = click.option('--limit', type=click.IntRange(min=1), default=None,
+                           help='Maximum number of rows to show.')(command)
+    return command
+
+
+def keyset(query, id_column, after_id=None, limit=None):
+    """
+    Orders a query by its id column and applies keyset pagination.
+
+    Unlike OFFSET, "id > after_id" is answered straight from the primary key index,
+    so page 10,000 costs the same as page 1.
+    """
+    query = query.order_by(id_column)
+    if after_id is not None:
+        query = query.filter(id_column > after_id)
+    if limit is not None:
+        query = query.limit(limit)
+    return query
+
+
+def stream(query, batch_size=STREAM_BATCH_SIZE):
+    """
+    Iterates a query in batches on a streaming cursor instead of loading every row first.
+    """
+    return query.yield_per(batch_size)
+
+
+def echo_next_page_hint(shown, limit, last_id):
+    """
+    Tells the user how to fetch the next page when a --limit page came back full.
+    """
+    if limit is not None and shown == limit:
+        click.echo(f"-- More rows available: use --after-id {last_id} --limit {limit} for the next page.")
@@ -1,15 +1,18 @@
 import click
-from datetime import datetime
+from datetime import date, datetime
+from src import database
 from src.database import get_db
 from src.models import Patient, OutPatient, InPatient, MedicalRecord, Doctor
-from src.models import PatientType
-
-import sys
-import os
-
-# Add the root project directory (one level up from 'src/') to sys.path
-sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
-from config.settings import DATABASE_URL
+from src.models import PatientType, AppointmentStatus
+from src.pagination import pagination_options, keyset, stream, echo_next_page_hint
+from src.patient_import import import_patients, DEFAULT_BATCH_SIZE
+from src.cascade import delete_with_dependants, echo_chunked_counts
+from src.timeline import patient_timeline, parse_cursor, format_cursor, END_OF_TIME
+from src.timeline import DEFAULT_LIMIT as TIMELINE_LIMIT
+from src.archive import reading
+from src.patient_summary import patient_chart
+from src.rooms import check_admission
+from src.search import search_records, rebuild_search_index, find_patients, DEFAULT_LIMIT, FIND_LIMIT, PATIENT_FTS_TABLE
 
 @click.group()
 # Defines the group of CLI under patients with (cli) as the entry point of the group
@@ -67,13 +70,17 @@ def add(name, dob, contact, type, room, admission, discharge, last_visit):
 
         dob_date = datetime.strptime(dob, '%Y-%m-%d').date()
         if type == 'inpatient':
+            # A stay without an admission date starts today (the InPatient default).
+            admission_date = datetime.strptime(admission, '%Y-%m-%d').date() if admission else date.today()
+            # Refuses the admission if the room has no free bed for the stay (registered rooms only).
+            check_admission(db, room, admission_date, datetime.strptime(discharge, '%Y-%m-%d') if discharge else None)
             patient = InPatient(
                 name = name,
                 date_of_birth = dob_date,
                 contact_info = contact,
                 patient_type=PatientType.INPATIENT,
                 room_number = room,
-                admission_date = datetime.strptime(admission, '%Y-%m-%d') if admission else None , 
+                admission_date = admission_date,
                 discharge_date = datetime.strptime(discharge, '%Y-%m-%d') if discharge else None,
             )
 
@@ -111,14 +118,18 @@ def add(name, dob, contact, type, room, admission, discharge, last_visit):
 
 
 # This defines the -----LIST COMMAND----- which lists all the patients
+# Rows are streamed as they arrive, so output starts immediately and memory stays flat.
 @patient.command()
-def list():
+@pagination_options
+def list(limit, after_id):
     """List all patients"""
     db = next(get_db())
     try: 
-        patients = db.query(Patient).all()
-        for p in patients:
+        shown, last_id = 0, None
+        for p in stream(keyset(db.query(Patient), Patient.id, after_id, limit)):
             click.echo(f"ID: {p.id}, Name: {p.name}, Type: {p.patient_type.value}, DOB: {p.date_of_birth}" )
+            shown, last_id = shown + 1, p.id
+        echo_next_page_hint(shown, limit, last_id)
     
     finally:
         db.close()
@@ -126,6 +137,104 @@ def list():
 
 
 
+# This defines the -----FIND COMMAND----- which looks patients up by any fragment of their name,
+# date of birth or contact details, so nobody has to know the numeric ID beforehand.
+@patient.command()
+@click.argument('query')
+@click.option('--limit', default=FIND_LIMIT, show_default=True, type=click.IntRange(min=1), help='Maximum number of matches.')
+def find(query, limit):
+    """Find patients by partial name, date of birth or phone/email, best matches first"""
+    db = next(get_db())
+    try:
+        rows = find_patients(db, query, limit)
+        if not rows:
+            click.echo("No matching patients found.")
+            return
+        for r in rows:
+            click.echo(f"ID: {r.id}, Name: {r.name}, Type: {PatientType[r.patient_type].value}, "
+                       f"DOB: {r.date_of_birth}, Contact: {r.contact_info}")
+    except Exception as e:
+        click.echo(f"Error finding patients: {e}", err=True)
+    finally:
+        db.close()
+
+
+
+# This defines the -----SHOW COMMAND----- which prints a patient's chart summary: visits, next
+# appointment, latest diagnosis and open stay come from patient_summary, so it is a single-row read.
+@patient.command()
+@click.argument('patient_id', type=int)
+def show(patient_id):
+    """Show a patient's details and chart summary"""
+    db = next(get_db())
+    try:
+        r = patient_chart(db, patient_id)
+        if r is None:
+            click.echo(f"Patient with ID {patient_id} not found.", err=True)
+            return
+        click.echo(f"--- Patient {r.id}: {r.name} ---")
+        click.echo(f"Type: {r.patient_type.value}, DOB: {r.date_of_birth}, Contact: {r.contact_info or 'None'}")
+        if r.summary_id is None:
+            click.echo("No chart summary yet (run `db reconcile`).")
+            return
+        if r.admitted_on:
+            click.echo(f"Inpatient stay: open since {r.admitted_on}, room {r.room_number or 'not assigned'}")
+        last_visit = r.last_visit.strftime('%Y-%m-%d %H:%M') if r.last_visit else 'None'
+        click.echo(f"Visits: {r.total_visits} (last: {last_visit})")
+        if r.next_appointment_id:
+            overdue = " (overdue)" if r.next_appointment_at < datetime.now() else ""
+            click.echo(f"Next appointment: {r.next_appointment_at:%Y-%m-%d %H:%M}{overdue} with "
+                       f"{r.next_doctor_name} (Appointment ID {r.next_appointment_id})")
+        else:
+            click.echo("Next appointment: None")
+        if r.latest_record_id:
+            click.echo(f"Latest diagnosis: {r.latest_diagnosis} on {r.latest_record_date} (Record ID {r.latest_record_id})")
+        else:
+            click.echo("Latest diagnosis: None")
+    except Exception as e:
+        click.echo(f"Error showing patient: {e}", err=True)
+    finally:
+        db.close()
+
+
+
+# This defines the -----TIMELINE COMMAND----- which shows a patient's appointments and medical records
+# merged newest first, a page at a time (the hint at the end gives the --before for the next page).
+@patient.command()
+@click.argument('patient_id', type=int)
+@click.option('--before', default=None, help="Start before this 'YYYY-MM-DD [HH:MM]' or page token (default: now).")
+@click.option('--upcoming', is_flag=True, help='Start from the latest scheduled appointment instead of now.')
+@click.option('--limit', default=TIMELINE_LIMIT, show_default=True, type=click.IntRange(min=1), help='Entries per page.')
+@click.option('--include-archive', is_flag=True, help='Also show archived appointments and records.')
+def timeline(patient_id, before, upcoming, limit, include_archive):
+    """Show a patient's appointments and medical records, newest first"""
+    db = next(get_db())
+    try:
+        if not db.get(Patient, patient_id):
+            click.echo(f"Patient with ID {patient_id} not found.", err=True)
+            return
+        cursor = parse_cursor(before) if before else (END_OF_TIME, '', 0) if upcoming else None
+        with reading(db, include_archive) as schemas:
+            rows, next_cursor = patient_timeline(db, patient_id, cursor, limit, schemas)
+        if not rows:
+            click.echo("No appointments or medical records found.")
+            return
+        for r in rows:
+            if r.kind == 'appointment':
+                click.echo(f"{r.at[:16]}  Appointment ID {r.id} with {r.doctor_name} (Doctor ID {r.doctor_id}), "
+                           f"{r.duration} min, {AppointmentStatus[r.status].value}: {r.summary}")
+            else:
+                click.echo(f"{r.at[:10]}        Medical record ID {r.id} by {r.doctor_name} (Doctor ID {r.doctor_id}): "
+                           f"{r.summary} - {r.detail}")
+        if next_cursor:
+            click.echo(f"-- More entries available: use --before '{format_cursor(next_cursor)}' for the next page.")
+    except ValueError as e:
+        click.echo(f"Error: {e}", err=True)
+    finally:
+        db.close()
+
+
+
 # This defines the -----DELETE COMMAND----- which deletes all the patients
 @patient.command()
 # @click.argument => This tells Click (the CLI library) that your command will take one required 
@@ -133,9 +242,13 @@ def list():
 #                    *patient_id: an integer*
 #                    This is not optional — it must be passed when running the command.
 @click.argument('patient_id', type = int)
+# --chunk-size => removes the patient's appointments and records that many rows per transaction
+#                 before the patient, so a huge history never holds the write lock for long.
+@click.option('--chunk-size', type=click.IntRange(min=1), default=None,
+              help='Delete dependent rows this many per transaction first (for very long histories).')
 # Defines the actual command logic:
 # The function receives the argument (patient_id)
-def delete(patient_id):
+def delete(patient_id, chunk_size):
     """Delete a patient by ID"""
     # Grabs a session object from your get_db() generator so you can interact with the database.
     db = next(get_db())
@@ -148,8 +261,9 @@ def delete(patient_id):
             click.echo(f"No patient with ID {patient_id} was found")
             return
 
-        db.delete(patient)
-        db.commit()
+        # Appointments and medical records go by ON DELETE CASCADE, without being loaded.
+        counts = delete_with_dependants(db, patient, chunk_size)
+        echo_chunked_counts(counts)
         click.echo(f"Patient with ID {patient_id} deleted.")
 
     except Exception as e:
@@ -201,6 +315,9 @@ def update(patient_id, name, dob, contact, room, admission, discharge, last_visi
             if discharge:
                 patient.discharge_date = datetime.strptime(discharge, '%Y-%m-%d')
 
+            if room is not None or admission or discharge:
+                check_admission(db, patient.room_number, patient.admission_date, patient.discharge_date, patient.id)
+
         elif isinstance(patient, OutPatient):
             if last_visit:
                 patient.last_visit_date = datetime.strptime(last_visit, '%Y-%m-%d')
@@ -218,6 +335,38 @@ def update(patient_id, name, dob, contact, room, admission, discharge, last_visi
 
 
 
+# This defines the -----IMPORT COMMAND----- which bulk-loads patients from a CSV or JSONL file.
+# Columns/keys use the same names as the ADD COMMAND options:
+#   name, dob, contact, type, room, admission, discharge, last_visit
+# Rows are validated, then written in batches (one transaction and one executemany per table per batch).
+# The progress is committed with each batch (import_progress table), so re-running the same command resumes an
+# interrupted import without inserting any row twice.
+@patient.command('import')
+@click.argument('file', type=click.Path(exists=True, dir_okay=False))
+@click.option('--format', 'file_format', type=click.Choice(['csv', 'jsonl']), default=None, help='Input format (default: from the file extension).')
+@click.option('--batch-size', default=DEFAULT_BATCH_SIZE, show_default=True, type=click.IntRange(min=1), help='Rows per transaction.')
+@click.option('--checkpoint', 'checkpoint_path', default=None, help='Checkpoint the progress is recorded under (default: FILE.checkpoint).')
+@click.option('--rejects', 'rejects_path', default=None, help='Rejected-row report, JSONL (default: FILE.rejected.jsonl).')
+@click.option('--restart', is_flag=True, help='Ignore an existing checkpoint and start from the first row.')
+def import_patients_command(file, file_format, batch_size, checkpoint_path, rejects_path, restart):
+    """Bulk import patients from a CSV or JSONL file"""
+    def progress(state):
+        click.echo(f"... {state['rows_done']} rows read, {state['imported']} imported, {state['rejected']} rejected")
+
+    try:
+        state = import_patients(database.engine, file, file_format=file_format, batch_size=batch_size,
+                                checkpoint_path=checkpoint_path, rejects_path=rejects_path,
+                                restart=restart, progress=progress)
+    except Exception as e:
+        click.echo(f"Error importing patients: {e} (re-run the same command to resume from the last checkpoint)", err=True)
+        return
+
+    rate = state['imported_this_run'] / state['seconds'] if state['seconds'] else 0
+    click.echo(f"Imported {state['imported_this_run']} patients in {state['seconds']:.2f}s ({rate:,.0f} rows/s).")
+    if state['rejected']:
+        click.echo(f"{state['rejected']} rows rejected, see {rejects_path or file + '.rejected.jsonl'}")
+
+
 # -------------------- MEDICAL RECORDS COMMANDS --------------------
 # This defines the -----ADD MEDICAL RECORD COMMAND ------ which adds a patients medical record
 @patient.command()
@@ -258,19 +407,67 @@ def add_record(patient_id, doctor_id, diagnosis, treatment, record_date):
 
 # This defines the ----- LIST MEDICAL RECORD COMMAND ------ which lists all patients medical records
 @patient.command()
-def list_records():
-    """List all medical records"""
+@click.option('--patient-id', type=int, help='Only this patient\'s records.')
+@pagination_options
+def list_records(patient_id, limit, after_id):
+    """List medical records, optionally for one patient"""
     db = next(get_db())
     try:
-        records = db.query(MedicalRecord).all()
-        for r in records:
+        query = db.query(MedicalRecord)
+        if patient_id is not None:
+            query = query.filter(MedicalRecord.patient_id == patient_id)
+        shown, last_id = 0, None
+        for r in stream(keyset(query, MedicalRecord.id, after_id, limit)):
             click.echo(f"ID: {r.id}, Patient ID: {r.patient_id}, Diagnosis: {r.diagnosis}, Treatment: {r.treatment}, Date: {r.record_date}")
+            shown, last_id = shown + 1, r.id
+        echo_next_page_hint(shown, limit, last_id)
     finally:
         db.close()
 
 
 
 
+# This defines the ----- SEARCH MEDICAL RECORDS COMMAND ------ which full-text searches diagnoses and treatments
+@patient.command('search-records')
+@click.argument('query')
+@click.option('--patient-id', type=int, help='Only this patient\'s records.')
+@click.option('--doctor-id', type=int, help='Only records written by this doctor.')
+@click.option('--from', 'date_from', type=click.DateTime(['%Y-%m-%d']), help='Records on or after this date (YYYY-MM-DD).')
+@click.option('--to', 'date_to', type=click.DateTime(['%Y-%m-%d']), help='Records on or before this date (YYYY-MM-DD).')
+@click.option('--limit', default=DEFAULT_LIMIT, show_default=True, type=click.IntRange(min=1), help='Maximum number of matches.')
+@click.option('--raw', is_flag=True, help='QUERY is FTS5 syntax (OR, NOT, NEAR, diagnosis:...).')
+@click.option('--include-archive', is_flag=True, help='Also search archived records.')
+def search_records_command(query, patient_id, doctor_id, date_from, date_to, limit, raw, include_archive):
+    """Search medical records by diagnosis/treatment, best matches first (word* for prefixes)"""
+    db = next(get_db())
+    try:
+        with reading(db, include_archive) as schemas:
+            rows = search_records(db, query, patient_id, doctor_id, date_from.date() if date_from else None,
+                                  date_to.date() if date_to else None, limit, raw, schemas)
+        if not rows:
+            click.echo("No matching records found.")
+            return
+        for r in rows:
+            click.echo(f"ID: {r.id}, Patient ID: {r.patient_id}, Doctor ID: {r.doctor_id}, Date: {r.record_date}, "
+                       f"Score: {r.score:.2f}{' (archived)' if r.archived else ''}\n    Diagnosis: {r.diagnosis}\n    Treatment: {r.treatment}")
+    except Exception as e:
+        click.echo(f"Error searching records: {e}", err=True)
+    finally:
+        db.close()
+
+
+@patient.command('rebuild-search-index')
+def rebuild_search_index_command():
+    """Re-index all medical records (search-records) and patients (find)"""
+    try:
+        with database.engine.begin() as conn:
+            count = rebuild_search_index(conn)
+            patients = rebuild_search_index(conn, PATIENT_FTS_TABLE)
+        click.echo(f"Search index rebuilt for {count} medical records and {patients} patients.")
+    except Exception as e:
+        click.echo(f"Error rebuilding search index: {e}", err=True)
+
+
 # This defines the ----- DELETE MEDICAL RECORD COMMAND ------ which deletes all patients medical records
 @patient.command()
 @click.argument('record_id', type=int)
@@ -313,9 +510,33 @@ if __name__ == '__main__':
 #      => python -m src.cli patient update <patient_id> [--name ...] [--dob ...] [--contact ...] [--room ...] [--admission ...] [--discharge ...] [--last_visit ...]
 #      => python -m src.cli patient update 1 --name "Updated Name" --contact "0711223344"
 
+# The IMPORT COMMAND
+#      => python -m src.cli patient import patients.csv
+#      => python -m src.cli patient import patients.jsonl --batch-size 50000
+#      => python -m src.cli patient import patients.csv --restart     (ignore the checkpoint, start over)
+
+# The FIND COMMAND (any 3+ characters of a name, DOB or phone/email; DD/MM/YYYY dates work too)
+#      => python -m src.cli patient find "john"
+#      => python -m src.cli patient find "smith 1985"
+#      => python -m src.cli patient find "0712" --limit 5
+
+# The SHOW COMMAND (visits, next appointment, latest diagnosis and open stay, from one summary row)
+#      => python -m src.cli patient show <patient_id>
+#      => python -m src.cli patient show 12
+
+# The TIMELINE COMMAND (appointments and medical records merged, newest first, with doctor names)
+#      => python -m src.cli patient timeline <patient_id>
+#      => python -m src.cli patient timeline 12 --upcoming --limit 50
+#      => python -m src.cli patient timeline 12 --before 2023-01-01
+#      => python -m src.cli patient timeline 12 --include-archive      (also what `archive` moved out)
+#      => python -m src.cli patient timeline 12 --before '2024-03-05 10:30:00.000000#appointment:881'   (token from the previous page)
+
+# Inpatient rooms and free beds (an add/update into a full registered room is refused): see src/inpatient_commands.py
+
 # The DELETE COMMAND
 #      => python -m src.cli patient delete <patient_id>
 #      => python -m src.cli patient delete 2
+#      => python -m src.cli patient delete 2 --chunk-size 5000     (history removed 5000 rows per transaction)
 
 # To view all available commands
 #      => python -m src.cli --help
@@ -329,6 +550,15 @@ if __name__ == '__main__':
 
 # To list medical records
 #      => python -m src.cli patient list-records
+#      => python -m src.cli patient list-records --limit 100 --after-id 5000
+#      => python -m src.cli patient list-records --patient-id 12
+
+# To search medical records (ranked; word* is a prefix search)
+#      => python -m src.cli patient search-records "chest pain"
+#      => python -m src.cli patient search-records "hypert*" --patient-id 12 --from 2024-01-01
+#      => python -m src.cli patient search-records "asthma OR bronchitis" --raw --doctor-id 3
+#      => python -m src.cli patient search-records "asthma" --include-archive
+#      => python -m src.cli patient rebuild-search-index      (after restoring or bulk-editing records or patients outside the app)
 
 # To delete a medical record
 #      => python -m src.cli patient delete-record <record_id>
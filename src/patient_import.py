@@ -0,0 +1,240 @@
+import csv
+import json
+import os
+import time
+from datetime import date
+from functools import lru_cache
+
+from sqlalchemy import delete, func, select
+from sqlalchemy.dialects.sqlite import insert
+
+from src import patient_summary
+from src.database import bulk_insert
+from src.models import ImportProgress, Patient, InPatient, OutPatient, PatientType
+
+DEFAULT_BATCH_SIZE = 10000
+
+_TYPE_NAMES = {member: member.name for member in PatientType}
+
+@lru_cache(maxsize=65536)
+def parse_date(value):
+    """
+    Validates a YYYY-MM-DD date and returns it in the ISO form SQLite stores.
+    Import files repeat the same dates a lot (admission days, visit days), so results
+    are memoised instead of re-parsed for every row.
+    """
+    return date.fromisoformat(value).isoformat()
+
+
+def _optional_date(row, field):
+    value = row.get(field)
+    if not value:
+        return None
+    try:
+        return parse_date(value)
+    except (TypeError, ValueError):
+        pass
+    # Slow path for padded or non-string values; most rows never get here.
+    value = str(value).strip()
+    if not value:
+        return None
+    try:
+        return parse_date(value)
+    except ValueError:
+        raise ValueError(f"invalid {field} date '{value}' (expected YYYY-MM-DD)")
+
+
+def validate_row(row):
+    """
+    Turns one raw input row into (patient_type, base values, subtype values), with values
+    already in storage form and in PATIENT_COLUMNS / INPATIENT_COLUMNS / OUTPATIENT_COLUMNS
+    order (minus the id). Raises ValueError describing the first problem found.
+    """
+    name = (row.get('name') or '').strip()
+    if not name:
+        raise ValueError("name is required")
+
+    dob = _optional_date(row, 'dob')
+    if dob is None:
+        raise ValueError("dob is required")
+
+    kind = (row.get('type') or '').strip().lower()
+    if kind == 'inpatient':
+        patient_type = PatientType.INPATIENT
+    elif kind == 'outpatient':
+        patient_type = PatientType.OUTPATIENT
+    else:
+        raise ValueError(f"type must be 'inpatient' or 'outpatient', got '{row.get('type')}'")
+
+    # SQLAlchemy's Enum type stores the member name.
+    base = (name, dob, row.get('contact') or None, _TYPE_NAMES[patient_type])
+    if patient_type is PatientType.INPATIENT:
+        admission = _optional_date(row, 'admission')
+        discharge = _optional_date(row, 'discharge')
+        # ISO dates compare correctly as strings.
+        if admission and discharge and discharge < admission:
+            raise ValueError("discharge date is before admission date")
+        room = row.get('room')
+        room = str(room).strip() if room not in (None, '') else None
+        return patient_type, base, (room, admission, discharge)
+
+    return patient_type, base, (_optional_date(row, 'last_visit'),)
+
+
+def read_rows(path, file_format=None):
+    """
+    Yields (line_number, row dict) from a CSV (with header) or JSONL file.
+    """
+    file_format = file_format or ('jsonl' if path.endswith(('.jsonl', '.ndjson')) else 'csv')
+    with open(path, newline='', encoding='utf-8') as handle:
+        if file_format == 'csv':
+            # Line 1 is the header. csv.reader + zip is about twice as fast as csv.DictReader.
+            reader = csv.reader(handle)
+            header = [column.strip() for column in next(reader, [])]
+            for line_number, values in enumerate(reader, start=2):
+                yield line_number, dict(zip(header, values))
+        else:
+            for line_number, line in enumerate(handle, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    row = json.loads(line)
+                except json.JSONDecodeError as e:
+                    row = {'_raw': line.rstrip('\n'), '_error': f"invalid JSON: {e.msg}"}
+                yield line_number, row
+
+
+PROGRESS_COLUMNS = ('rows_done', 'imported', 'rejected', 'rejects_bytes')
+
+
+def source_of(path):
+    """Identifies the file behind a path by size and modification time (a new daily file differs)."""
+    stat = os.stat(path)
+    return f"{stat.st_size}:{stat.st_mtime_ns}"
+
+
+def load_checkpoint(conn, checkpoint, source):
+    """Returns the progress recorded under a checkpoint for this source file, or a fresh state."""
+    table = ImportProgress.__table__
+    row = conn.execute(select(table).where(table.c.checkpoint == checkpoint)).mappings().first()
+    if row is not None:
+        # Rows saved before the source was recorded have none and are resumed.
+        if row['source'] in (None, source):
+            return {column: row[column] for column in PROGRESS_COLUMNS}
+        # Another file now sits at the path: start over, and drop the rejects of the old one.
+        return {'rows_done': 0, 'imported': 0, 'rejected': 0, 'rejects_bytes': 0}
+    state = {'rows_done': 0, 'imported': 0, 'rejected': 0, 'rejects_bytes': None}
+    # A checkpoint file left by an import interrupted before progress moved into the database.
+    if os.path.exists(checkpoint):
+        with open(checkpoint, encoding='utf-8') as handle:
+            state.update(json.load(handle))
+    return state
+
+
+def save_checkpoint(conn, checkpoint, source, state):
+    # Runs in the batch's own transaction: the rows and the resume point commit (or roll back) together.
+    values = {'source': source, **{column: state[column] for column in PROGRESS_COLUMNS}}
+    statement = insert(ImportProgress.__table__).values(checkpoint=checkpoint, **values)
+    conn.execute(statement.on_conflict_do_update(index_elements=['checkpoint'], set_=values))
+
+
+# Column order of the tuples built by validate_row(), with the primary key first.
+PATIENT_COLUMNS = ('id', 'name', 'date_of_birth', 'contact_info', 'patient_type')
+INPATIENT_COLUMNS = ('id', 'room_number', 'admission_date', 'discharge_date')
+OUTPATIENT_COLUMNS = ('id', 'last_visit_date')
+
+
+def insert_batch(conn, batch):
+    """
+    Inserts a batch of validated rows into patients and the matching subtype table
+    with one executemany per table. Primary keys are assigned here so the child rows
+    can reference them without a round trip per patient.
+    """
+    next_id = (conn.execute(select(func.max(Patient.id))).scalar() or 0) + 1
+    patients, inpatients, outpatients = [], [], []
+    for patient_id, (patient_type, base, sub) in enumerate(batch, start=next_id):
+        patients.append((patient_id, *base))
+        (inpatients if patient_type is PatientType.INPATIENT else outpatients).append((patient_id, *sub))
+
+    bulk_insert(conn, Patient.__table__, PATIENT_COLUMNS, patients)
+    if inpatients:
+        bulk_insert(conn, InPatient.__table__, INPATIENT_COLUMNS, inpatients)
+    if outpatients:
+        bulk_insert(conn, OutPatient.__table__, OUTPATIENT_COLUMNS, outpatients)
+    patient_summary.refresh(conn, [row[0] for row in patients])
+
+
+def import_patients(engine, path, file_format=None, batch_size=DEFAULT_BATCH_SIZE,
+                    checkpoint_path=None, rejects_path=None, restart=False, progress=None):
+    """
+    Imports patients from a CSV/JSONL file in batches, one transaction per batch.
+
+    Each batch is committed together with the number of input rows consumed so far, in an
+    import_progress row keyed by the checkpoint path, so an interrupted import resumes
+    right after the last committed batch and never inserts a row twice. The row also
+    records which file was read (size and modification time): a different file imported
+    through the same path later starts from its first row. Invalid rows are
+    appended to the rejects file (JSONL: line, error, row) instead of aborting the run; its
+    size is recorded with each batch, and on resume the rejects of rows that will be read
+    again are cut off. Returns the final checkpoint state plus the elapsed time.
+    """
+    checkpoint = os.path.abspath(checkpoint_path or f"{path}.checkpoint")
+    rejects_path = rejects_path or f"{path}.rejected.jsonl"
+    if restart:
+        with engine.begin() as conn:
+            conn.execute(delete(ImportProgress.__table__).where(ImportProgress.checkpoint == checkpoint))
+        for stale in (checkpoint, rejects_path):
+            if os.path.exists(stale):
+                os.remove(stale)
+
+    source = source_of(path)
+    with engine.connect() as conn:
+        state = load_checkpoint(conn, checkpoint, source)
+    if (state['rejects_bytes'] is not None and os.path.exists(rejects_path)
+            and os.path.getsize(rejects_path) > state['rejects_bytes']):
+        os.truncate(rejects_path, state['rejects_bytes'])
+    skip = state['rows_done']
+    started = time.perf_counter()
+    imported_now = 0
+
+    with open(rejects_path, 'a', encoding='utf-8') as rejects:
+        batch, consumed = [], 0
+
+        def flush():
+            nonlocal batch, imported_now
+            rejects.flush()
+            state['rows_done'] += consumed
+            state['imported'] += len(batch)
+            state['rejects_bytes'] = os.fstat(rejects.fileno()).st_size
+            with engine.begin() as conn:
+                if batch:
+                    insert_batch(conn, batch)
+                save_checkpoint(conn, checkpoint, source, state)
+            imported_now += len(batch)
+            if progress:
+                progress(state)
+            batch = []
+
+        for index, (line_number, row) in enumerate(read_rows(path, file_format)):
+            if index < skip:
+                continue
+            consumed += 1
+            try:
+                if '_error' in row:
+                    raise ValueError(row['_error'])
+                batch.append(validate_row(row))
+            except ValueError as e:
+                state['rejected'] += 1
+                rejects.write(json.dumps({'line': line_number, 'error': str(e), 'row': row}, default=str) + '\n')
+            if consumed == batch_size:
+                flush()
+                consumed = 0
+        flush()
+
+    if os.path.exists(checkpoint):
+        os.remove(checkpoint)
+    if state['rejected'] == 0 and os.path.exists(rejects_path) and os.path.getsize(rejects_path) == 0:
+        os.remove(rejects_path)
+    state['seconds'] = time.perf_counter() - started
+    state['imported_this_run'] = imported_now
+    return state
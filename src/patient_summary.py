@@ -0,0 +1,153 @@
+from sqlalchemy import bindparam, event, inspect, select, text
+from sqlalchemy.orm import object_session
+
+from src.database import Base, Session
+from src.models import Appointment, AppointmentStatus, Doctor, InPatient, MedicalRecord, Patient, PatientSummary
+
+# patient_summary holds what every patient screen shows (visits, next appointment, latest
+# diagnosis, open stay), so `patient show` reads one row instead of scanning the patient's
+# appointments and records. A patient's row is recomputed from their own rows, through the
+# patient indexes, whenever something it depends on changes:
+#   ORM writes   => mapper events note the patients touched, one refresh per flush (same transaction)
+#   Core writes  => bulk status updates, reassignment, archive, chunked deletes and imports call
+#                   refresh() with the patients of each chunk; seed and `db reconcile` rebuild()
+# The row of a deleted patient goes with them (ON DELETE CASCADE).
+
+COLUMNS = ('patient_id', 'total_visits', 'last_visit', 'next_appointment_id', 'next_appointment_at', 'next_doctor_id',
+           'latest_record_id', 'latest_record_date', 'latest_diagnosis', 'admitted_on', 'room_number')
+# Patients refreshed per statement (SQLite limits the number of bound parameters).
+REFRESH_BATCH = 10000
+
+_COMPLETED, _SCHEDULED = AppointmentStatus.COMPLETED.name, AppointmentStatus.SCHEDULED.name
+_STALE = 'hms_summary_stale'
+
+
+def _summary_sql(where):
+    # Every subquery is a range of ix_appointments_patient_datetime / ix_medical_records_patient_date.
+    return f"""
+        INSERT INTO patient_summary ({', '.join(COLUMNS)})
+        SELECT p.id,
+               (SELECT count(*) FROM appointments WHERE patient_id = p.id AND status = '{_COMPLETED}'),
+               (SELECT max(appointment_datetime) FROM appointments WHERE patient_id = p.id AND status = '{_COMPLETED}'),
+               n.id, n.appointment_datetime, n.doctor_id,
+               r.id, r.record_date, r.diagnosis,
+               i.admission_date, i.room_number
+        FROM patients p
+        LEFT JOIN appointments n ON n.id = (
+            SELECT id FROM appointments WHERE patient_id = p.id AND status = '{_SCHEDULED}'
+            ORDER BY appointment_datetime, id LIMIT 1)
+        LEFT JOIN medical_records r ON r.id = (
+            SELECT id FROM medical_records WHERE patient_id = p.id
+            ORDER BY record_date DESC, id DESC LIMIT 1)
+        LEFT JOIN inpatients i ON i.id = p.id AND i.discharge_date IS NULL
+        WHERE {where}
+        ON CONFLICT (patient_id) DO UPDATE SET
+            {', '.join(f"{column} = excluded.{column}" for column in COLUMNS[1:])}
+    """
+
+
+_REFRESH = text(_summary_sql("p.id IN :patient_ids")).bindparams(bindparam('patient_ids', expanding=True))
+_REBUILD = text(_summary_sql("1"))
+
+
+def refresh(connection, patient_ids):
+    """Recomputes the summary rows of the given patients (missing patients are skipped)."""
+    patient_ids = sorted({patient_id for patient_id in patient_ids if patient_id is not None})
+    for start in range(0, len(patient_ids), REFRESH_BATCH):
+        connection.execute(_REFRESH, {'patient_ids': patient_ids[start:start + REFRESH_BATCH]})
+
+
+def patients_of(connection, table, *conditions):
+    """Distinct patient ids of the appointments or medical records matching the conditions."""
+    return connection.execute(select(table.c.patient_id).distinct().where(*conditions)).scalars().all()
+
+
+def rebuild(connection):
+    """Recomputes every patient's summary in one statement. Returns the number of rows."""
+    connection.execute(PatientSummary.__table__.delete())
+    return connection.execute(_REBUILD).rowcount
+
+
+@event.listens_for(Base.metadata, 'after_create')
+def fill_new_summary(target, connection, tables=(), **kw):
+    """A patient_summary table created next to existing patients (an older database) starts out filled."""
+    if PatientSummary.__table__ in tables:
+        rebuild(connection)
+
+
+# --- ORM writes ---
+
+_WATCHED = {
+    Appointment: ('patient_id', 'status', 'appointment_datetime', 'doctor_id'),
+    MedicalRecord: ('patient_id', 'record_date', 'diagnosis'),
+    InPatient: ('admission_date', 'discharge_date', 'room_number'),
+}
+
+
+def _note(target, *patient_ids):
+    object_session(target).info.setdefault(_STALE, set()).update(patient_ids)
+
+
+def _patient_of(target):
+    return target.id if isinstance(target, Patient) else target.patient_id
+
+
+def _written(mapper, connection, target):
+    _note(target, _patient_of(target))
+
+
+def _updated(mapper, connection, target):
+    state = inspect(target)
+    watched = [state.attrs[name].history for name in _WATCHED[mapper.class_]]
+    if not any(history.has_changes() for history in watched):
+        return
+    moved_from = state.attrs.patient_id.history.deleted if 'patient_id' in _WATCHED[mapper.class_] else ()
+    _note(target, _patient_of(target), *moved_from)
+
+
+for _model in (Appointment, MedicalRecord):
+    event.listen(_model, 'after_insert', _written)
+    event.listen(_model, 'after_update', _updated)
+    event.listen(_model, 'after_delete', _written)
+# Every new patient gets a row; an inpatient's stay can open or close.
+event.listen(Patient, 'after_insert', _written, propagate=True)
+event.listen(InPatient, 'after_update', _updated)
+
+
+@event.listens_for(Doctor, 'before_delete')
+def _doctor_deleting(mapper, connection, target):
+    # The doctor's appointments and records go by ON DELETE CASCADE, without ORM events.
+    _note(target, *patients_of(connection, Appointment.__table__, Appointment.doctor_id == target.id),
+          *patients_of(connection, MedicalRecord.__table__, MedicalRecord.doctor_id == target.id))
+
+
+@event.listens_for(Session, 'after_flush')
+def _refresh_stale(session, flush_context):
+    stale = session.info.pop(_STALE, None)
+    if stale:
+        refresh(session.connection(), stale)
+
+
+@event.listens_for(Session, 'after_soft_rollback')
+def _forget_stale(session, previous_transaction):
+    # A failed flush never reaches after_flush.
+    session.info.pop(_STALE, None)
+
+
+# --- Reading ---
+
+def patient_chart(session, patient_id):
+    """
+    The patient and their summary in one query: a row with the patient's columns, the summary's
+    columns and next_doctor_name, or None. The summary columns are None when no row exists yet.
+    """
+    summary = PatientSummary.__table__
+    patients = Patient.__table__
+    return session.execute(
+        select(patients.c.id, patients.c.name, patients.c.date_of_birth, patients.c.contact_info,
+               patients.c.patient_type, summary.c.patient_id.label('summary_id'),
+               *(summary.c[column] for column in COLUMNS[1:]), Doctor.name.label('next_doctor_name'))
+        .outerjoin(summary, summary.c.patient_id == patients.c.id)
+        .outerjoin(Doctor, Doctor.id == summary.c.next_doctor_id)
+        .where(patients.c.id == patient_id)
+    ).first()
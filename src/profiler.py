@@ -0,0 +1,127 @@
+import re
+import time
+from collections import Counter
+
+from sqlalchemy import event
+
+from src import database
+
+# Literals that vary between otherwise identical statements.
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r"\b\d+(?:\.\d+)?\b")
+_IN_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)*\s*\)")
+_WHITESPACE = re.compile(r"\s+")
+
+
+class QueryBudgetExceeded(AssertionError):
+    """Raised when a profiled block runs more statements than it was allowed."""
+
+
+def fingerprint(statement):
+    """
+    Normalises a SQL statement so that the same query with different parameters
+    maps to the same string (literals become '?', IN lists collapse to '(?)').
+    """
+    sql = _STRING_LITERAL.sub('?', statement)
+    sql = _NUMBER_LITERAL.sub('?', sql)
+    sql = _IN_LIST.sub('(?)', sql)
+    return _WHITESPACE.sub(' ', sql).strip()
+
+
+def _percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+class QueryProfiler:
+    """
+    Records every statement an engine executes while the block runs, with its duration.
+
+        with QueryProfiler() as profiler:
+            ...
+        print(profiler.summary())
+
+    Pass max_statements to turn the block into a query-count budget: exceeding it
+    raises QueryBudgetExceeded (an AssertionError, so pytest reports it as a failure).
+    """
+
+    def __init__(self, engine=None, max_statements=None, n_plus_one_threshold=5):
+        self.engine = engine
+        self.max_statements = max_statements
+        self.n_plus_one_threshold = n_plus_one_threshold
+        self.statements = []  # (sql, seconds)
+        self.parameters = []  # the parameters each statement ran with, in the same order
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('hms_profiler_start', []).append(time.perf_counter())
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        started = conn.info['hms_profiler_start'].pop()
+        self.statements.append((statement, time.perf_counter() - started))
+        self.parameters.append(parameters)
+
+    def start(self):
+        # Look the engine up at start time; init_engine() may have replaced it since import.
+        if self.engine is None:
+            self.engine = database.engine
+        event.listen(self.engine, 'before_cursor_execute', self._before_cursor_execute)
+        event.listen(self.engine, 'after_cursor_execute', self._after_cursor_execute)
+        return self
+
+    def stop(self):
+        event.remove(self.engine, 'before_cursor_execute', self._before_cursor_execute)
+        event.remove(self.engine, 'after_cursor_execute', self._after_cursor_execute)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+        if exc_type is None and self.max_statements is not None and self.statement_count > self.max_statements:
+            raise QueryBudgetExceeded(
+                f"Expected at most {self.max_statements} statements, got {self.statement_count}.\n{self.summary()}"
+            )
+        return False
+
+    @property
+    def statement_count(self):
+        return len(self.statements)
+
+    @property
+    def total_time(self):
+        return sum(seconds for _, seconds in self.statements)
+
+    def percentile(self, pct):
+        return _percentile(sorted(seconds for _, seconds in self.statements), pct)
+
+    def slowest(self, limit=5):
+        return sorted(self.statements, key=lambda item: item[1], reverse=True)[:limit]
+
+    def repeated(self):
+        """
+        Fingerprints executed at least n_plus_one_threshold times, most frequent first.
+        A query repeated once per row of an earlier result is the classic N+1 pattern.
+        """
+        counts = Counter(fingerprint(sql) for sql, _ in self.statements)
+        return [(sql, count) for sql, count in counts.most_common() if count >= self.n_plus_one_threshold]
+
+    def summary(self, slowest=5):
+        lines = [
+            "--- SQL profile ---",
+            f"Statements: {self.statement_count}",
+            f"Total SQL time: {self.total_time * 1000:.2f} ms "
+            f"(p50 {self.percentile(50) * 1000:.2f} ms, p95 {self.percentile(95) * 1000:.2f} ms)",
+        ]
+        if self.statements:
+            lines.append(f"Slowest {min(slowest, self.statement_count)}:")
+            for sql, seconds in self.slowest(slowest):
+                lines.append(f"  {seconds * 1000:8.2f} ms  {_WHITESPACE.sub(' ', sql).strip()[:160]}")
+        repeated = self.repeated()
+        if repeated:
+            lines.append("Possible N+1 (same statement repeated):")
+            for sql, count in repeated:
+                lines.append(f"  x{count:<6} {sql[:160]}")
+        lines.append("-------------------")
+        return "\n".join(lines)
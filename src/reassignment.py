@@ -0,0 +1,135 @@
+from collections import defaultdict
+from datetime import timedelta
+
+from sqlalchemy import bindparam, func, select, update
+
+from src import counters, patient_summary
+from src.availability import rebuild_days, span_bits, working_masks
+from src.models import Appointment, AppointmentStatus, Doctor
+from src.scheduling import DEFAULT_DURATION, MAX_DURATION, DoctorSchedule, forget
+
+_appointments = Appointment.__table__
+
+
+class ReassignmentConflict(RuntimeError):
+    """Raised when appointments changed between planning and applying a reassignment."""
+
+
+def colleagues(session, doctor):
+    """Doctors of the same department with the same specialization (the ones who can take over)."""
+    return session.scalars(
+        select(Doctor).where(Doctor.department_id == doctor.department_id,
+                             Doctor.specialization == doctor.specialization,
+                             Doctor.id != doctor.id)
+        .order_by(Doctor.id)
+    ).all()
+
+
+def _future_minutes(session, doctor_ids, after):
+    rows = session.execute(
+        select(Appointment.doctor_id, func.sum(Appointment.duration_minutes))
+        .where(Appointment.doctor_id.in_(doctor_ids),
+               Appointment.appointment_datetime >= after,
+               Appointment.status != AppointmentStatus.CANCELLED)
+        .group_by(Appointment.doctor_id)
+    )
+    load = dict.fromkeys(doctor_ids, 0)
+    load.update({doctor_id: minutes or 0 for doctor_id, minutes in rows})
+    return load
+
+
+def _within_shifts(masks, start, minutes):
+    return all(not bits & ~masks[day.weekday()] for day, bits in span_bits(start, minutes))
+
+
+def plan_reassignment(session, doctor_id, candidate_ids, after):
+    """
+    Shares out doctor_id's scheduled appointments starting at or after `after` among the
+    candidates, in memory. Appointments are taken in time order and each goes to the least
+    loaded candidate (booked minutes from `after` on, counting what they have been given so
+    far) who is working then and free; ties go to the lowest ID. Free means no overlap in the
+    candidate's DoctorSchedule, which is loaded once for the whole period and extended with
+    every assignment, so the plan never double-books anyone.
+    Returns {'moves': [(appointment_id, new_doctor_id)], 'unplaced': [(appointment_id, start)],
+    'load': {candidate_id: minutes after the moves}, 'days': {doctor_id: days touched}}.
+    """
+    appointments = session.execute(
+        select(Appointment.id, Appointment.appointment_datetime, Appointment.duration_minutes)
+        .where(Appointment.doctor_id == doctor_id,
+               Appointment.appointment_datetime >= after,
+               Appointment.status == AppointmentStatus.SCHEDULED)
+        .order_by(Appointment.appointment_datetime, Appointment.id)
+    ).all()
+    plan = {'moves': [], 'unplaced': [], 'load': _future_minutes(session, candidate_ids, after),
+            'days': defaultdict(set)}
+    if not appointments or not candidate_ids:
+        plan['unplaced'] = [(appointment_id, start) for appointment_id, start, _ in appointments]
+        return plan
+
+    low = appointments[0].appointment_datetime - timedelta(minutes=MAX_DURATION)
+    high = appointments[-1].appointment_datetime + timedelta(minutes=MAX_DURATION)
+    schedules = {}
+    for candidate_id in candidate_ids:
+        schedules[candidate_id] = DoctorSchedule(candidate_id)
+        schedules[candidate_id].load(session, low, high)
+    masks = working_masks(session, candidate_ids)
+    load = plan['load']
+
+    for appointment_id, start, minutes in appointments:
+        minutes = minutes or DEFAULT_DURATION
+        end = start + timedelta(minutes=minutes)
+        free = [candidate_id for candidate_id in candidate_ids
+                if _within_shifts(masks[candidate_id], start, minutes)
+                and schedules[candidate_id].conflict(start, end) is None]
+        if not free:
+            plan['unplaced'].append((appointment_id, start))
+            continue
+        chosen = min(free, key=lambda candidate_id: (load[candidate_id], candidate_id))
+        schedules[chosen].add(start, end, appointment_id)
+        load[chosen] += minutes
+        plan['moves'].append((appointment_id, chosen))
+        days = [day for day, _ in span_bits(start, minutes)]
+        plan['days'][doctor_id].update(days)
+        plan['days'][chosen].update(days)
+    return plan
+
+
+def apply_reassignment(session, doctor_id, plan):
+    """
+    Writes a plan in one transaction: a single executemany UPDATE, guarded so that only
+    appointments still scheduled with doctor_id move, then the slot bitmaps of every day
+    touched, the appointment counters and the patients' summaries (their next appointment's
+    doctor). Raises ReassignmentConflict (and writes nothing)
+    if any appointment changed since the plan was made. Returns the number of appointments moved.
+    """
+    if not plan['moves']:
+        return 0
+    statement = (
+        update(_appointments)
+        .where(_appointments.c.id == bindparam('appointment_id'),
+               _appointments.c.doctor_id == doctor_id,
+               _appointments.c.status == AppointmentStatus.SCHEDULED)
+        .values(doctor_id=bindparam('new_doctor_id'))
+    )
+    try:
+        connection = session.connection()
+        moved = connection.execute(statement, [{'appointment_id': appointment_id, 'new_doctor_id': new_doctor_id}
+                                               for appointment_id, new_doctor_id in plan['moves']]).rowcount
+        if moved != len(plan['moves']):
+            raise ReassignmentConflict(f"{len(plan['moves']) - moved} appointments changed while planning; "
+                                       f"nothing was reassigned, try again.")
+        for changed_id, days in plan['days'].items():
+            rebuild_days(connection, changed_id, days)
+        taken = defaultdict(int)
+        for _, new_doctor_id in plan['moves']:
+            taken[new_doctor_id, AppointmentStatus.SCHEDULED] += 1
+        counters.add(connection, _appointments, {(doctor_id, AppointmentStatus.SCHEDULED): moved}, sign=-1)
+        counters.add(connection, _appointments, taken)
+        patient_summary.refresh(connection, patient_summary.patients_of(
+            connection, _appointments, _appointments.c.id.in_([appointment_id for appointment_id, _ in plan['moves']])))
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+    forget(session.get_bind(), *plan['days'])
+    return moved
@@ -0,0 +1,189 @@
+import threading
+import time
+from collections import OrderedDict
+
+from sqlalchemy import event, select
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import make_transient_to_detached
+from sqlalchemy.sql.dml import UpdateBase
+
+from src.database import Session
+from src.models import Department, Doctor
+
+# Doctors and departments are small, read on almost every command (pick lists, find_by_id checks)
+# and rarely written. Long-running processes (menu.py, the API server) keep them here instead of
+# asking the database each time. Entries are detached snapshots: callers get them merged into
+# their own session without a query, as ordinary persistent objects they may read and change.
+#
+# Correctness: a commit that changed a doctor or department (ORM flush, seen through session events)
+# evicts exactly those rows and the lists; a Core INSERT/UPDATE/DELETE on either table (seed, bulk
+# jobs) evicts the whole table, both when it runs and when its transaction ends. Writes made by
+# other processes are only seen once an entry expires, so the TTL bounds that staleness.
+CACHED_MODELS = (Doctor, Department)
+MAX_ENTRIES = 4096
+TTL = 60.0
+
+_ALL = 'all'
+_TABLES = {model.__table__.name: model for model in CACHED_MODELS}
+
+
+class ReferenceCache:
+    """
+    Bounded LRU of reference rows with a time-to-live, keyed by (database URL, model, id or 'all').
+    Counts hits, misses, evictions (writes) and expirations. Thread-safe.
+    """
+
+    def __init__(self, max_entries=MAX_ENTRIES, ttl=TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()   # key => (value, expires)
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.evictions = self.expirations = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] < time.monotonic():
+                del self._entries[key]
+                self.expirations += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def evict(self, url, model, ids=None):
+        """Drops the given rows of a model (all of them when ids is None) and its list."""
+        with self._lock:
+            if ids is None:
+                stale = [key for key in self._entries if key[0] == url and key[1] == model.__name__]
+            else:
+                stale = [key for key in ((url, model.__name__, row_id) for row_id in (*ids, _ALL)) if key in self._entries]
+            for key in stale:
+                del self._entries[key]
+            self.evictions += len(stale)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {'entries': len(self._entries), 'hits': self.hits, 'misses': self.misses,
+                    'hit_rate': self.hits / lookups if lookups else 0.0,
+                    'evictions': self.evictions, 'expirations': self.expirations}
+
+    def summary(self):
+        stats = self.stats()
+        return (f"Reference cache: {stats['hits']} hits, {stats['misses']} misses ({stats['hit_rate']:.0%} hit rate), "
+                f"{stats['evictions']} evicted by writes, {stats['expirations']} expired, {stats['entries']} entries")
+
+
+reference_cache = ReferenceCache()
+# Set while this thread runs an ORM flush, whose statements the Core-write listener leaves alone.
+_flushing = threading.local()
+
+
+def _url(session_or_connection):
+    return str(session_or_connection.get_bind().url if hasattr(session_or_connection, 'get_bind')
+               else session_or_connection.engine.url)
+
+
+def _snapshot(model, row):
+    # A detached copy built from column values: nothing ties it to the session that read it.
+    obj = model(**row)
+    make_transient_to_detached(obj)
+    return obj
+
+
+def cached_get(session, model, row_id):
+    """
+    session.get() for a cached model: the session's own copy if it has one, else the cached
+    snapshot merged in (no query), else one SELECT whose result is cached. Missing rows are not cached.
+    """
+    obj = session.identity_map.get(session.identity_key(model, row_id))
+    if obj is not None:
+        return obj
+    key = (_url(session), model.__name__, row_id)
+    snapshot = reference_cache.get(key)
+    if snapshot is None:
+        table = model.__table__
+        row = session.execute(select(table).where(table.c.id == row_id)).mappings().first()
+        if row is None:
+            return None
+        snapshot = _snapshot(model, row)
+        reference_cache.put(key, snapshot)
+    return session.merge(snapshot, load=False)
+
+
+def cached_all(session, model):
+    """Every row of a cached model in id order (for pick lists), merged into the session."""
+    key = (_url(session), model.__name__, _ALL)
+    snapshots = reference_cache.get(key)
+    if snapshots is None:
+        table = model.__table__
+        snapshots = [_snapshot(model, row) for row in session.execute(select(table).order_by(table.c.id)).mappings()]
+        reference_cache.put(key, snapshots)
+    return [session.merge(snapshot, load=False) for snapshot in snapshots]
+
+
+# ORM writes: collect the changed rows at each flush, evict them once the transaction commits.
+@event.listens_for(Session, 'before_flush')
+def _mark_flushing(session, flush_context, instances):
+    _flushing.active = True
+
+
+@event.listens_for(Session, 'after_flush')
+def _collect_changed(session, flush_context):
+    changed = session.info.setdefault('hms_refcache_changed', set())
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        if isinstance(obj, CACHED_MODELS):
+            changed.add((type(obj), obj.id))
+    _flushing.active = False
+
+
+@event.listens_for(Session, 'after_commit')
+def _evict_changed(session):
+    changed = session.info.pop('hms_refcache_changed', None)
+    if changed:
+        url = _url(session)
+        for model, row_id in changed:
+            reference_cache.evict(url, model, [row_id])
+
+
+@event.listens_for(Session, 'after_soft_rollback')
+def _forget_changed(session, previous_transaction):
+    # Also runs when a flush fails, which never reaches after_flush.
+    if not session.in_transaction():
+        session.info.pop('hms_refcache_changed', None)
+    _flushing.active = False
+
+
+# Core writes (no ORM objects to say which rows): evict the whole table, now and at commit/rollback.
+@event.listens_for(Engine, 'after_execute')
+def _evict_on_core_write(conn, clauseelement, multiparams, params, execution_options, result):
+    if not isinstance(clauseelement, UpdateBase) or clauseelement.table.name not in _TABLES:
+        return
+    if getattr(_flushing, 'active', False):
+        return  # an ORM flush; _collect_changed has the exact rows
+    model = _TABLES[clauseelement.table.name]
+    reference_cache.evict(str(conn.engine.url), model)
+    conn.info.setdefault('hms_refcache_written', set()).add(model)
+
+
+@event.listens_for(Engine, 'commit')
+@event.listens_for(Engine, 'rollback')
+def _evict_at_transaction_end(conn):
+    for model in conn.info.pop('hms_refcache_written', ()):
+        reference_cache.evict(str(conn.engine.url), model)
+
@@ -0,0 +1,168 @@
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import event, select, text
+
+from src.database import Base
+from src.models import Room
+
+# Stay interval index (SQLite R*Tree):
+#   stay_index => one box per inpatient stay in a registered room: (room id, room id) x (first day, last day)
+#
+# A stay occupies a bed from its admission day up to the day before discharge (the bed is free
+# again on the discharge day); an open stay runs to OPEN_END. Finding the stays of a room that
+# touch some days is a tree search, logarithmic in the number of stays, instead of a scan of
+# every inpatient row. Triggers keep the index in step with every write to inpatients and rooms,
+# including bulk loads that bypass the ORM. Stays without an admission date or in rooms that
+# are not registered are not indexed (and not checked).
+STAY_INDEX = 'stay_index'
+OPEN_END = 2 ** 31 - 1   # rtree_i32 coordinates are 32-bit integers
+
+# Days are Julian day numbers, computed by SQLite from the stored 'YYYY-MM-DD' text.
+_JULIAN_OFFSET = 1721425 - 1
+
+
+def day_number(day):
+    """The integer day stay_index stores for a date."""
+    return day.toordinal() + _JULIAN_OFFSET
+
+
+def from_day_number(number):
+    return date.fromordinal(number - _JULIAN_OFFSET)
+
+
+def _stay_box(stay, room_id):
+    # The indexed values of inpatient row `stay` (new./old./i.) in room `room_id`.
+    first = f"CAST(julianday({stay}.admission_date) AS INTEGER)"
+    last = (f"CASE WHEN {stay}.discharge_date IS NULL THEN {OPEN_END} "
+            f"ELSE max({first}, CAST(julianday({stay}.discharge_date) AS INTEGER) - 1) END")
+    return f"{stay}.id, {room_id}, {room_id}, {first}, {last}"
+
+
+_INDEX_NEW_STAY = (f"INSERT INTO {STAY_INDEX} SELECT {_stay_box('new', 'r.id')} FROM rooms r "
+                   f"WHERE r.number = new.room_number AND new.admission_date IS NOT NULL;")
+_INDEX_ROOM_STAYS = (f"INSERT INTO {STAY_INDEX} SELECT {_stay_box('i', 'new.id')} FROM inpatients i "
+                     f"WHERE i.room_number = new.number AND i.admission_date IS NOT NULL;")
+
+_STATEMENTS = [
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {STAY_INDEX} USING rtree_i32(id, room_lo, room_hi, day_lo, day_hi)",
+    f"CREATE TRIGGER IF NOT EXISTS {STAY_INDEX}_stay_insert AFTER INSERT ON inpatients BEGIN {_INDEX_NEW_STAY} END",
+    f"CREATE TRIGGER IF NOT EXISTS {STAY_INDEX}_stay_delete AFTER DELETE ON inpatients "
+    f"BEGIN DELETE FROM {STAY_INDEX} WHERE id = old.id; END",
+    f"CREATE TRIGGER IF NOT EXISTS {STAY_INDEX}_stay_update AFTER UPDATE OF room_number, admission_date, discharge_date "
+    f"ON inpatients BEGIN DELETE FROM {STAY_INDEX} WHERE id = old.id; {_INDEX_NEW_STAY} END",
+    f"CREATE TRIGGER IF NOT EXISTS {STAY_INDEX}_room_insert AFTER INSERT ON rooms BEGIN {_INDEX_ROOM_STAYS} END",
+    f"CREATE TRIGGER IF NOT EXISTS {STAY_INDEX}_room_delete AFTER DELETE ON rooms "
+    f"BEGIN DELETE FROM {STAY_INDEX} WHERE room_lo = old.id; END",
+    f"CREATE TRIGGER IF NOT EXISTS {STAY_INDEX}_room_update AFTER UPDATE OF number ON rooms "
+    f"BEGIN DELETE FROM {STAY_INDEX} WHERE room_lo = old.id; {_INDEX_ROOM_STAYS} END",
+]
+
+
+class RoomFull(ValueError):
+    """Raised when an admission would put more inpatients in a room than it has beds."""
+
+    def __init__(self, room, day, occupants):
+        self.room = room
+        self.day = day
+        self.occupants = occupants
+        super().__init__(
+            f"Room {room.number} has {room.beds} bed{'s' if room.beds != 1 else ''} and is full on {day} "
+            f"(inpatient ID{'s' if len(occupants) != 1 else ''} {', '.join(str(i) for i in occupants)})."
+        )
+
+
+@event.listens_for(Base.metadata, 'after_create')
+def create_stay_index(target, connection, **kw):
+    """Creates stay_index and its triggers (after every create_all); a new index is filled straight away."""
+    if connection.dialect.name != 'sqlite':
+        return
+    existed = connection.exec_driver_sql(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (STAY_INDEX,)
+    ).first() is not None
+    for statement in _STATEMENTS:
+        connection.exec_driver_sql(statement)
+    if not existed:
+        rebuild_stay_index(connection)
+
+
+def rebuild_stay_index(connection):
+    """Re-indexes every stay in a registered room. Returns the number of stays indexed."""
+    connection.exec_driver_sql(f"DELETE FROM {STAY_INDEX}")
+    return connection.exec_driver_sql(
+        f"INSERT INTO {STAY_INDEX} SELECT {_stay_box('i', 'r.id')} FROM inpatients i "
+        f"JOIN rooms r ON r.number = i.room_number WHERE i.admission_date IS NOT NULL"
+    ).rowcount
+
+
+def register_rooms(connection, beds=1):
+    """Adds every room number that stays use but the registry lacks, with `beds` beds. Returns how many."""
+    return connection.execute(text(
+        "INSERT INTO rooms (number, beds) SELECT DISTINCT room_number, :beds FROM inpatients "
+        "WHERE room_number IS NOT NULL AND room_number NOT IN (SELECT number FROM rooms)"
+    ), {'beds': beds}).rowcount
+
+
+def room_stays(connection, room_id, first, last, exclude=None):
+    """[(inpatient id, first day, last day)] of the room's stays touching any day in [first, last]."""
+    rows = connection.execute(text(
+        f"SELECT id, day_lo, day_hi FROM {STAY_INDEX} "
+        f"WHERE room_lo <= :room AND room_hi >= :room AND day_lo <= :last AND day_hi >= :first"
+    ), {'room': room_id, 'first': day_number(first), 'last': day_number(last) if last else OPEN_END}).all()
+    return [(stay_id, first_day, last_day) for stay_id, first_day, last_day in rows if stay_id != exclude]
+
+
+def check_admission(session, room_number, admission, discharge=None, inpatient_id=None):
+    """
+    Raises RoomFull if a stay in room_number from admission until discharge (open when None)
+    would need more beds than the room has on some day. A missing admission is today, as
+    InPatient stores it. inpatient_id is the stay being changed, left out of the count.
+    Rooms that are not registered are not checked.
+    """
+    if room_number is None:
+        return
+    admission = admission or date.today()
+    admission, discharge = (day.date() if isinstance(day, datetime) else day for day in (admission, discharge))
+    room = session.scalars(select(Room).where(Room.number == str(room_number))).first()
+    if room is None:
+        return
+    last = discharge - timedelta(days=1) if discharge else None
+    if last is not None and last < admission:
+        last = admission
+    stays = room_stays(session.connection(), room.id, admission, last, exclude=inpatient_id)
+    if len(stays) < room.beds:
+        return
+    # Sweep the overlapping stays' starts and ends (clipped to the new stay) for the busiest day.
+    first_day = day_number(admission)
+    changes = []
+    for _, stay_first, stay_last in stays:
+        changes.append((max(stay_first, first_day), 1))
+        if stay_last != OPEN_END:
+            changes.append((stay_last + 1, -1))
+    busy = 0
+    for day, change in sorted(changes):
+        busy += change
+        if busy >= room.beds:
+            occupants = sorted(stay_id for stay_id, stay_first, stay_last in stays if stay_first <= day <= stay_last)
+            raise RoomFull(room, from_day_number(max(day, first_day)), occupants)
+
+
+def room_occupancy(session, on_day, department_id=None):
+    """
+    [(room, inpatients staying on on_day)] for every registered room (optionally of one department),
+    in room number order: one search of stay_index for the day and one read of the registry.
+    """
+    day = day_number(on_day)
+    occupied = dict(session.execute(text(
+        f"SELECT room_lo, count(*) FROM {STAY_INDEX} WHERE day_lo <= :day AND day_hi >= :day GROUP BY room_lo"
+    ), {'day': day}).all())
+    query = select(Room).order_by(Room.number)
+    if department_id is not None:
+        query = query.where(Room.department_id == department_id)
+    return [(room, occupied.get(room.id, 0)) for room in session.scalars(query)]
+
+
+def free_rooms(session, on_day, department_id=None):
+    """[(room, free beds)] of the rooms with at least one free bed on on_day."""
+    return [(room, room.beds - occupied) for room, occupied in room_occupancy(session, on_day, department_id)
+            if occupied < room.beds]
+
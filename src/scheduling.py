@@ -0,0 +1,261 @@
+import bisect
+import weakref
+from datetime import datetime, time, timedelta
+
+from sqlalchemy import event, inspect, select
+
+from src.availability import working_masks, working_periods
+from src.models import Appointment, AppointmentStatus, Doctor, Patient
+
+DEFAULT_DURATION = 30       # minutes; same as the Appointment.duration_minutes default
+MAX_DURATION = 12 * 60      # longest bookable appointment, so an overlap never starts more than 12h earlier
+SEARCH_DAYS = 365           # next_slot() gives up after looking this far ahead
+_SEARCH_WINDOW = timedelta(days=7)
+
+
+class BookingConflict(ValueError):
+    """Raised when a booking overlaps another appointment of the same doctor."""
+
+    def __init__(self, doctor_id, clash):
+        start, end, appointment_id = clash
+        self.doctor_id = doctor_id
+        self.clash = clash
+        super().__init__(
+            f"Doctor {doctor_id} is already booked from {start:%Y-%m-%d %H:%M} to {end:%H:%M} "
+            f"(appointment ID {appointment_id})."
+        )
+
+
+def _day_start(moment):
+    return datetime.combine(moment.date(), time.min)
+
+
+def _merge_block(blocks, start, end):
+    # Merges [start, end) into a sorted list of disjoint busy blocks. Touching blocks are
+    # merged too, so back-to-back bookings become one block the gap search skips in one step.
+    i = bisect.bisect_left(blocks, (start,))
+    if i and blocks[i - 1][1] >= start:
+        i -= 1
+    j = i
+    while j < len(blocks) and blocks[j][0] <= end:
+        start, end = min(start, blocks[j][0]), max(end, blocks[j][1])
+        j += 1
+    blocks[i:j] = [(start, end)]
+
+
+def _merge_ranges(ranges):
+    merged = []
+    for low, high in sorted(r for r in ranges if r[0] < r[1]):
+        if merged and low <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(high, merged[-1][1]))
+        else:
+            merged.append((low, high))
+    return merged
+
+
+class DoctorSchedule:
+    """
+    In-process interval index of one doctor's bookings.
+
+    Bookings are kept as a sorted list of (start, end, appointment_id) and read from the
+    database only for the days a check needs (a range scan on ix_appointments_doctor_datetime),
+    so the cost of a conflict check does not depend on how much history the doctor has.
+    The loaded days always form one contiguous range. Cancelled appointments do not block.
+    """
+
+    def __init__(self, doctor_id):
+        self.doctor_id = doctor_id
+        self.bookings = []
+        self.loaded = None   # (first moment, end moment) whose bookings are all in self.bookings
+        self._blocks = None  # merged busy blocks, built on first use
+
+    def _fetch(self, session, low, high):
+        rows = session.execute(
+            select(Appointment.id, Appointment.appointment_datetime, Appointment.duration_minutes)
+            .where(Appointment.doctor_id == self.doctor_id,
+                   Appointment.appointment_datetime >= low,
+                   Appointment.appointment_datetime < high,
+                   Appointment.status != AppointmentStatus.CANCELLED)
+            .order_by(Appointment.appointment_datetime)
+        )
+        return [(start, start + timedelta(minutes=minutes or DEFAULT_DURATION), appointment_id)
+                for appointment_id, start, minutes in rows]
+
+    def _splice(self, session, low, high):
+        i = bisect.bisect_left(self.bookings, (low,))
+        j = bisect.bisect_left(self.bookings, (high,))
+        self.bookings[i:j] = self._fetch(session, low, high)
+
+    def load(self, session, low, high, refresh=False):
+        """
+        Makes sure every booking starting in [low, high) is indexed, reading whole days.
+        refresh=True re-reads that range even if it is already loaded (other processes may have booked).
+        """
+        low, high = _day_start(low), _day_start(high) + timedelta(days=1)
+        ranges = [(low, high)] if refresh or self.loaded is None else []
+        if self.loaded is not None:
+            # Keep the loaded days contiguous: fetch whatever lies between them and [low, high).
+            loaded_low, loaded_high = self.loaded
+            low, high = min(low, loaded_low), max(high, loaded_high)
+            ranges += [(low, loaded_low), (loaded_high, high)]
+        fetched = False
+        for range_low, range_high in _merge_ranges(ranges):
+            self._splice(session, range_low, range_high)
+            fetched = True
+        self.loaded = (low, high)
+        if fetched:
+            self._blocks = None
+
+    def blocks(self):
+        if self._blocks is None:
+            self._blocks = []
+            for start, end, _ in self.bookings:
+                if self._blocks and start <= self._blocks[-1][1]:
+                    self._blocks[-1] = (self._blocks[-1][0], max(end, self._blocks[-1][1]))
+                else:
+                    self._blocks.append((start, end))
+        return self._blocks
+
+    def conflict(self, start, end, ignore_id=None):
+        """
+        First booking overlapping [start, end), or None. The range must be loaded.
+        Only bookings starting within MAX_DURATION before `start` can overlap, so this is a
+        bisect plus a look at the handful of bookings in that window.
+        """
+        i = bisect.bisect_left(self.bookings, (start - timedelta(minutes=MAX_DURATION),))
+        j = bisect.bisect_left(self.bookings, (end,))
+        for booking in self.bookings[i:j]:
+            if booking[1] > start and booking[2] != ignore_id:
+                return booking
+        return None
+
+    def add(self, start, end, appointment_id):
+        bisect.insort(self.bookings, (start, end, appointment_id))
+        if self._blocks is not None:
+            _merge_block(self._blocks, start, end)
+
+    def next_slot(self, session, after, duration=DEFAULT_DURATION, within_days=SEARCH_DAYS, working=None):
+        """
+        Earliest start >= after with `duration` free minutes, or None within `within_days`.
+        With `working` (availability.weekly_masks() of the doctor) the whole appointment must
+        also fall within one working period.
+
+        Bisects into the merged busy blocks and then only steps over gaps that are too short,
+        so a fully booked streak costs one step, not one per appointment. More days are loaded
+        a week at a time, and only when the search runs past what is loaded.
+        """
+        length = timedelta(minutes=duration)
+        candidate = after.replace(second=0, microsecond=0)
+        if candidate < after:
+            candidate += timedelta(minutes=1)
+        give_up = candidate + timedelta(days=within_days)
+        candidate = self._free_from(session, candidate, length, give_up)
+        if working is None or candidate is None:
+            return candidate
+        # The free start found is the earliest one at all: periods ending before it can fit
+        # nothing, and a later period is searched again from its own start.
+        for start, end in working_periods(working, candidate, give_up):
+            if end - length < candidate:
+                continue
+            if start > candidate:
+                candidate = self._free_from(session, start, length, give_up)
+                if candidate is None:
+                    return None
+            if candidate + length <= end:
+                return candidate
+        return None
+
+    def _free_from(self, session, candidate, length, give_up):
+        # Earliest start >= candidate with `length` free, ignoring working hours; None at give_up.
+        window = _SEARCH_WINDOW
+        while candidate < give_up:
+            self.load(session, candidate - timedelta(minutes=MAX_DURATION), candidate + window)
+            loaded_high = self.loaded[1]
+            blocks = self.blocks()
+            i = bisect.bisect_right(blocks, (candidate, datetime.max))
+            if i and blocks[i - 1][1] > candidate:
+                candidate = blocks[i - 1][1]
+            while i < len(blocks) and blocks[i][0] < candidate + length:
+                candidate = max(candidate, blocks[i][1])
+                i += 1
+            if candidate + length <= loaded_high:
+                return candidate if candidate < give_up else None
+            window *= 2
+        return None
+
+
+# Schedules are cached per engine: tests and benchmarks point the app at other databases.
+_schedules = weakref.WeakKeyDictionary()
+
+
+def schedule_for(session, doctor_id):
+    per_engine = _schedules.setdefault(session.get_bind(), {})
+    if doctor_id not in per_engine:
+        per_engine[doctor_id] = DoctorSchedule(doctor_id)
+    return per_engine[doctor_id]
+
+
+def forget(connection, *doctor_ids):
+    per_engine = _schedules.get(connection.engine, {})
+    for doctor_id in doctor_ids:
+        per_engine.pop(doctor_id, None)
+
+
+def check_available(session, doctor_id, start, duration=DEFAULT_DURATION, ignore_id=None):
+    """
+    Raises BookingConflict if the doctor has another active appointment overlapping
+    [start, start + duration). Re-reads the affected days first, so bookings made by
+    other processes since they were cached are seen.
+    """
+    end = start + timedelta(minutes=duration)
+    schedule = schedule_for(session, doctor_id)
+    schedule.load(session, start - timedelta(minutes=MAX_DURATION), end, refresh=True)
+    clash = schedule.conflict(start, end, ignore_id)
+    if clash:
+        raise BookingConflict(doctor_id, clash)
+    return schedule
+
+
+def book(session, appointment):
+    """
+    Adds and commits a new appointment after checking the doctor is free, then records
+    it in the doctor's schedule. Raises BookingConflict (nothing is written) on overlap.
+    """
+    if appointment.duration_minutes is None:
+        appointment.duration_minutes = DEFAULT_DURATION
+    schedule = None
+    if appointment.status != AppointmentStatus.CANCELLED:
+        schedule = check_available(session, appointment.doctor_id, appointment.appointment_datetime,
+                                   appointment.duration_minutes)
+    session.add(appointment)
+    session.commit()
+    if schedule is not None:
+        schedule.add(appointment.appointment_datetime, appointment.end_datetime, appointment.id)
+    return appointment
+
+
+def next_slot(session, doctor_id, after, duration=DEFAULT_DURATION, within_days=SEARCH_DAYS):
+    """The doctor's earliest free start >= after within their shifts (Mon-Fri 09:00-17:00 without any)."""
+    working = working_masks(session, [doctor_id])[doctor_id]
+    return schedule_for(session, doctor_id).next_slot(session, after, duration, within_days, working)
+
+
+# Updates and deletes through the ORM drop the cached schedules they touch; they are
+# re-read (a day or two at a time) on next use. New bookings go through book() instead.
+@event.listens_for(Appointment, 'after_update')
+@event.listens_for(Appointment, 'after_delete')
+def _forget_changed_schedule(mapper, connection, target):
+    history = inspect(target).attrs.doctor_id.history
+    forget(connection, target.doctor_id, *(history.deleted or ()))
+
+
+# Doctor and patient deletes remove appointments in the database (ON DELETE CASCADE), so
+# no Appointment event fires: drop the schedules those appointments may sit in.
+@event.listens_for(Doctor, 'after_delete')
+def _forget_deleted_doctor(mapper, connection, target):
+    forget(connection, target.id)
+
+
+@event.listens_for(Patient, 'after_delete', propagate=True)
+def _forget_all_schedules(mapper, connection, target):
+    _schedules.pop(connection.engine, None)
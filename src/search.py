@@ -0,0 +1,285 @@
+import re
+from contextlib import contextmanager
+
+from sqlalchemy import event, text
+
+from src.database import Base
+
+# Full-text indexes (SQLite FTS5):
+#   medical_records_fts => diagnosis / treatment, word tokens, for patient search-records
+#   patients_fts        => name / date of birth / contact, trigrams, for patient find
+#
+# Both are external-content tables: they store only the index and read the text back from
+# the base table, so nothing is duplicated on disk. Triggers keep them in sync with every
+# write, including bulk loads that bypass the ORM.
+FTS_TABLE = 'medical_records_fts'
+PATIENT_FTS_TABLE = 'patients_fts'
+# bm25 column weights: a hit in the diagnosis counts double a hit in the treatment notes.
+DIAGNOSIS_WEIGHT, TREATMENT_WEIGHT = 2.0, 1.0
+DEFAULT_LIMIT = 20
+FIND_LIMIT = 10
+# Trigram matches ranked per find_patients call: bounds its cost for very common fragments.
+FIND_CANDIDATES = 2000
+
+
+def _sync_triggers(fts_table, base_table, columns, schema='main'):
+    new = ', '.join(f"new.{column}" for column in columns)
+    old = ', '.join(f"old.{column}" for column in columns)
+    names = ', '.join(columns)
+    delete_old = f"INSERT INTO {fts_table}({fts_table}, rowid, {names}) VALUES ('delete', old.id, {old});"
+    insert_new = f"INSERT INTO {fts_table}(rowid, {names}) VALUES (new.id, {new});"
+    return [
+        f"CREATE TRIGGER IF NOT EXISTS {schema}.{fts_table}_insert AFTER INSERT ON {base_table} BEGIN {insert_new} END",
+        f"CREATE TRIGGER IF NOT EXISTS {schema}.{fts_table}_delete AFTER DELETE ON {base_table} BEGIN {delete_old} END",
+        f"CREATE TRIGGER IF NOT EXISTS {schema}.{fts_table}_update AFTER UPDATE OF {names} ON {base_table} "
+        f"BEGIN {delete_old} {insert_new} END",
+    ]
+
+
+def _record_index(schema='main'):
+    # Also created in the attached archive database (src/archive.py), over its own medical_records;
+    # a trigger's statements always refer to tables of the database the trigger lives in.
+    return [
+        f"""CREATE VIRTUAL TABLE IF NOT EXISTS {schema}.{FTS_TABLE} USING fts5(
+            diagnosis, treatment,
+            content='medical_records', content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2',
+            prefix='2 3'
+        )""",
+        *_sync_triggers(FTS_TABLE, 'medical_records', ('diagnosis', 'treatment'), schema),
+    ]
+
+
+# FTS table => (base table, CREATE statements)
+_INDEXES = {
+    FTS_TABLE: ('medical_records', _record_index()),
+    # Trigrams match any substring of 3+ characters, case-insensitively: "ohns" finds Johnson,
+    # "0712" a phone number, "1985-03" a date of birth.
+    PATIENT_FTS_TABLE: ('patients', [
+        f"""CREATE VIRTUAL TABLE IF NOT EXISTS {PATIENT_FTS_TABLE} USING fts5(
+            name, date_of_birth, contact_info,
+            content='patients', content_rowid='id',
+            tokenize='trigram'
+        )""",
+        *_sync_triggers(PATIENT_FTS_TABLE, 'patients', ('name', 'date_of_birth', 'contact_info')),
+    ]),
+}
+
+_TERM = re.compile(r'"[^"]*"\*?|\S+')
+
+
+def is_supported(connection):
+    return connection.dialect.name == 'sqlite'
+
+
+@event.listens_for(Base.metadata, 'after_create')
+def create_search_index(target, connection, **kw):
+    """
+    Creates the FTS tables and their triggers (runs after every create_all). An index that is
+    new while its base table already has rows is filled straight away.
+    """
+    if not is_supported(connection):
+        return
+    for fts_table, (_, statements) in _INDEXES.items():
+        existed = connection.exec_driver_sql(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (fts_table,)
+        ).first() is not None
+        for statement in statements:
+            connection.exec_driver_sql(statement)
+        if not existed:
+            rebuild_search_index(connection, fts_table)
+
+
+def rebuild_search_index(connection, fts_table=FTS_TABLE, schema='main'):
+    """Re-indexes every row of the index's base table (FTS5 'rebuild'). Returns the number of rows."""
+    base_table = _INDEXES[fts_table][0]
+    connection.exec_driver_sql(f"INSERT INTO {schema}.{fts_table}({fts_table}) VALUES ('rebuild')")
+    connection.exec_driver_sql(f"INSERT INTO {schema}.{fts_table}({fts_table}) VALUES ('optimize')")
+    return connection.exec_driver_sql(f"SELECT count(*) FROM {schema}.{base_table}").scalar()
+
+
+def create_record_index(connection, schema):
+    """Creates the medical-record index and its triggers in another attached database (the archive)."""
+    existed = connection.exec_driver_sql(
+        f"SELECT 1 FROM {schema}.sqlite_master WHERE type = 'table' AND name = ?", (FTS_TABLE,)
+    ).first() is not None
+    for statement in _record_index(schema):
+        connection.exec_driver_sql(statement)
+    if not existed:
+        rebuild_search_index(connection, FTS_TABLE, schema)
+
+
+@contextmanager
+def bulk_load(engine):
+    """
+    For loads of many rows at once (seed): the sync triggers are dropped while the block runs
+    and every index is rebuilt once afterwards, which is several times faster than per-row upkeep.
+    """
+    if not is_supported(engine):
+        yield
+        return
+    with engine.begin() as conn:
+        for fts_table in _INDEXES:
+            for kind in ('insert', 'delete', 'update'):
+                conn.exec_driver_sql(f"DROP TRIGGER IF EXISTS {fts_table}_{kind}")
+    try:
+        yield
+    finally:
+        with engine.begin() as conn:
+            for fts_table, (_, statements) in _INDEXES.items():
+                for statement in statements:
+                    conn.exec_driver_sql(statement)
+                rebuild_search_index(conn, fts_table)
+
+
+def to_match_query(query):
+    """
+    Turns what a user types into an FTS5 query: every word must match, words are quoted so
+    punctuation (O'Brien, covid-19) cannot break the syntax, and a trailing * keeps prefix search.
+        chest pa*    =>  "chest" "pa"*
+    """
+    terms = []
+    for term in _TERM.findall(query):
+        prefix = term.endswith('*')
+        word = term.rstrip('*').strip('"').replace('"', '""')
+        if word:
+            terms.append(f'"{word}"' + ('*' if prefix else ''))
+    return ' '.join(terms)
+
+
+def search_records(session, query, patient_id=None, doctor_id=None, date_from=None, date_to=None,
+                   limit=DEFAULT_LIMIT, raw=False, schemas=('main',)):
+    """
+    Ranked medical-record matches (best first, newest first among equals) as rows of
+    (id, patient_id, doctor_id, record_date, diagnosis, treatment_snippet, score, archived).
+    Matched words are wrapped in [brackets]. raw=True passes `query` to FTS5 unchanged
+    (AND/OR/NOT, NEAR, column filters such as diagnosis:asthma).
+    `schemas` lists the databases to search: ('main', 'archive') adds the attached archive
+    (see archive.reading()), each through its own index; archived is 1 for its rows.
+    """
+    match = query if raw else to_match_query(query)
+    if not match:
+        return []
+    conditions, params = [], {'match': match, 'limit': limit}
+    if patient_id is not None:
+        conditions.append("mr.patient_id = :patient_id")
+        params['patient_id'] = patient_id
+    if doctor_id is not None:
+        conditions.append("mr.doctor_id = :doctor_id")
+        params['doctor_id'] = doctor_id
+    if date_from is not None:
+        conditions.append("mr.record_date >= :date_from")
+        params['date_from'] = date_from.isoformat()
+    if date_to is not None:
+        conditions.append("mr.record_date <= :date_to")
+        params['date_to'] = date_to.isoformat()
+    filters = ''.join(f" AND {condition}" for condition in conditions)
+    # One ranked, limited branch per database; the outer query merges them.
+    branches = [f"""
+        SELECT * FROM (
+            SELECT mr.id, mr.patient_id, mr.doctor_id, mr.record_date,
+                   highlight({FTS_TABLE}, 0, '[', ']') AS diagnosis,
+                   snippet({FTS_TABLE}, 1, '[', ']', '...', 12) AS treatment,
+                   -bm25({FTS_TABLE}, {DIAGNOSIS_WEIGHT}, {TREATMENT_WEIGHT}) AS score,
+                   {int(schema != 'main')} AS archived
+            FROM {schema}.{FTS_TABLE}
+            JOIN {schema}.medical_records AS mr ON mr.id = {FTS_TABLE}.rowid
+            WHERE {FTS_TABLE} MATCH :match{filters}
+            ORDER BY bm25({FTS_TABLE}, {DIAGNOSIS_WEIGHT}, {TREATMENT_WEIGHT}), mr.record_date DESC
+            LIMIT :limit
+        )""" for schema in schemas]
+    return session.execute(text(
+        " UNION ALL ".join(branches) + " ORDER BY score DESC, record_date DESC LIMIT :limit"
+    ), params).all()
+
+
+_DAY_FIRST_DATE = re.compile(r'^(\d{1,2})[/.](\d{1,2})[/.](\d{4})$')
+
+
+def _normalise_term(term):
+    # Dates are stored as YYYY-MM-DD; accept the day-first form people write on forms too.
+    found = _DAY_FIRST_DATE.match(term)
+    if found:
+        day, month, year = found.groups()
+        return f"{year}-{int(month):02d}-{int(day):02d}"
+    return term
+
+
+def _escape_like(value):
+    return value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def _name_prefix_ranges(phrase, params):
+    # Index range scans on ix_patients_name for the prefix as typed and capitalised ("al" finds "Alice").
+    ranges = []
+    for i, start in enumerate(dict.fromkeys([phrase, phrase[:1].upper() + phrase[1:]])):
+        params[f'low{i}'], params[f'high{i}'] = start, start[:-1] + chr(ord(start[-1]) + 1)
+        ranges.append(f"(name >= :low{i} AND name < :high{i})")
+    return ' OR '.join(ranges)
+
+
+def find_patients(session, query, limit=FIND_LIMIT):
+    """
+    Patients matching every word of `query` anywhere in their name, date of birth or contact
+    details, best first: exact name, then the query as a whole word of the name, then as the
+    start of a word of the name, then anywhere in the name, then matches spread over the other
+    fields; oldest patient ID first among equals. (No bm25: its IDF pass visits every match of
+    every term, which makes common fragments such as "son" cost O(patients).)
+    Words of 3+ characters go through the trigram index; shorter ones only narrow those matches.
+    A query of only short words (typeahead after one or two keystrokes) is a name-prefix lookup
+    on ix_patients_name. To stay fast however common the fragment, only the first
+    FIND_CANDIDATES trigram matches are ranked, together with the names starting with the
+    query, so the order is exact whenever fewer patients than that match.
+    Returns rows of (id, name, date_of_birth, contact_info, patient_type).
+    """
+    words = [_normalise_term(word) for word in query.split()]
+    if not words:
+        return []
+    phrase = ' '.join(words)
+    like = _escape_like(phrase)
+    params = {'phrase': phrase, 'word_first': like + ' %', 'word_last': '% ' + like, 'word_inner': '% ' + like + ' %',
+              'prefix': like + '%', 'word_prefix': '% ' + like + '%', 'inside': '%' + like + '%',
+              'limit': limit, 'candidates': FIND_CANDIDATES}
+    prefix_ranges = _name_prefix_ranges(phrase, params)
+    long_words = [word for word in words if len(word) >= 3]
+
+    if not long_words:
+        return session.execute(text(f"""
+            SELECT id, name, date_of_birth, contact_info, patient_type
+            FROM patients
+            WHERE {prefix_ranges}
+            ORDER BY name, id
+            LIMIT :limit
+        """), params).all()
+
+    params['match'] = ' '.join('"' + word.replace('"', '""') + '"' for word in long_words)
+    filters = ''
+    for i, word in enumerate(word for word in words if len(word) < 3):
+        params[f'short{i}'] = '%' + _escape_like(word) + '%'
+        filters += (f" AND (p.name LIKE :short{i} ESCAPE '\\' OR p.contact_info LIKE :short{i} ESCAPE '\\'"
+                    f" OR p.date_of_birth LIKE :short{i} ESCAPE '\\')")
+    # Names starting with the query contain every word of it, so they need no extra filtering.
+    return session.execute(text(f"""
+        WITH candidates AS (
+            SELECT * FROM (
+                SELECT p.id
+                FROM {PATIENT_FTS_TABLE}
+                JOIN patients AS p ON p.id = {PATIENT_FTS_TABLE}.rowid
+                WHERE {PATIENT_FTS_TABLE} MATCH :match{filters}
+                LIMIT :candidates
+            )
+            UNION
+            SELECT * FROM (SELECT id FROM patients WHERE {prefix_ranges} LIMIT :limit)
+        )
+        SELECT p.id, p.name, p.date_of_birth, p.contact_info, p.patient_type
+        FROM candidates AS c
+        JOIN patients AS p ON p.id = c.id
+        ORDER BY CASE WHEN p.name = :phrase COLLATE NOCASE THEN 0
+                      WHEN p.name LIKE :word_first ESCAPE '\\' OR p.name LIKE :word_last ESCAPE '\\'
+                           OR p.name LIKE :word_inner ESCAPE '\\' THEN 1
+                      WHEN p.name LIKE :prefix ESCAPE '\\' OR p.name LIKE :word_prefix ESCAPE '\\' THEN 2
+                      WHEN p.name LIKE :inside ESCAPE '\\' THEN 3
+                      ELSE 4 END,
+                 p.id
+        LIMIT :limit
+    """), params).all()
@@ -1,9 +1,19 @@
 # This script is meant to seed the database with initial data.
 
+import random
+import time
 from datetime import date, datetime, timedelta
+from sqlalchemy import delete
 from sqlalchemy.orm import sessionmaker
-from src.database import engine, Base, get_db  # Import engine, Base, and the session helper
+from src import database
+from src.database import Base, get_db, bulk_insert  # Import Base and the session helper (the engine is database.engine, created on first use)
 from src.models import Patient, InPatient, OutPatient, Doctor, Department, Appointment, MedicalRecord # Import all your models
+from src.models import PatientType, AppointmentStatus, DoctorShift, DoctorDaySlots, Room
+from src.availability import rebuild_all
+from src.counters import reconcile
+from src.patient_summary import rebuild as rebuild_summaries
+from src.rooms import register_rooms
+from src.search import bulk_load
 
 def seed_database():
     """
@@ -19,15 +29,7 @@ def seed_database():
         # Clear existing data (optional, but good for fresh seeds)
         # Be careful with this, It deletes all data.
         print("Clearing existing data...")
-        from sqlalchemy import delete
-        session.execute(delete(MedicalRecord))
-        session.execute(delete(Appointment))
-        session.execute(delete(InPatient))
-        session.execute(delete(OutPatient))
-        session.execute(delete(Patient))
-        session.execute(delete(Doctor))
-        session.execute(delete(Department))
-        session.commit()
+        clear_database(session)
         print("Existing data cleared.")
 
        # --- 1. Create Departments ---
@@ -57,7 +59,12 @@ def seed_database():
         session.commit()
         print("Head doctors assigned.")
 
-        # --- 3. Create Patients (InPatient and OutPatient) ---
+        # --- 3. Create Rooms and Patients (InPatient and OutPatient) ---
+        print("Creating Rooms...")
+        session.add_all([Room(number="101A", beds=2, department_id=dept1.id),
+                         Room(number="101B", beds=2, department_id=dept1.id),
+                         Room(number="203B", beds=1, department_id=dept3.id)])
+        session.commit()
         print("Creating Patients...")
         patient1 = InPatient(name="Alice Johnson", date_of_birth=date(1985, 3, 10), contact_info="alice@example.com", admission_date=date(2023, 10, 1), room_number="101A")
         patient2 = OutPatient(name="Bob Williams", date_of_birth=date(1990, 7, 25), contact_info="bob@example.com", last_visit_date=date(2024, 1, 15))
@@ -98,6 +105,197 @@ def seed_database():
     finally:
         session.close() # Always close the session
 
+# --- Synthetic data generator (load testing) ---
+# Builds production-sized databases: deterministic for a given seed, bulk inserted,
+# one transaction per chunk of patients.
+
+FIRST_NAMES = ["James", "Mary", "John", "Patricia", "Robert", "Jennifer", "Michael", "Linda", "William", "Elizabeth",
+               "David", "Barbara", "Richard", "Susan", "Joseph", "Jessica", "Thomas", "Sarah", "Charles", "Karen",
+               "Amina", "Wanjiru", "Otieno", "Achieng", "Kamau", "Njeri", "Mohamed", "Fatuma", "Kipchoge", "Chebet",
+               "Luis", "Sofia", "Mateo", "Camila", "Wei", "Mei", "Hiroshi", "Yuki", "Arjun", "Priya"]
+LAST_NAMES = ["Smith", "Johnson", "Williams", "Brown", "Jones", "Garcia", "Miller", "Davis", "Rodriguez", "Martinez",
+              "Hernandez", "Lopez", "Wilson", "Anderson", "Taylor", "Thomas", "Moore", "Jackson", "Martin", "Lee",
+              "Mwangi", "Odhiambo", "Kariuki", "Wambui", "Kiprop", "Mutua", "Hassan", "Ali", "Chen", "Wang",
+              "Tanaka", "Sato", "Patel", "Sharma", "Okafor", "Mensah", "Silva", "Santos", "Novak", "Dubois"]
+# Department => specializations of the doctors working there
+SPECIALTIES = {
+    "Cardiology": ["Cardiologist", "Cardiac Surgeon"],
+    "Pediatrics": ["Pediatrician", "Neonatologist"],
+    "General Surgery": ["Surgeon", "Anesthesiologist"],
+    "Internal Medicine": ["General Practitioner", "Internist"],
+    "Neurology": ["Neurologist", "Neurosurgeon"],
+    "Orthopedics": ["Orthopedic Surgeon", "Physiotherapist"],
+    "Oncology": ["Oncologist", "Radiologist"],
+    "Emergency": ["Emergency Physician", "Trauma Surgeon"],
+}
+REASONS = ["Routine check-up", "Follow-up", "Flu symptoms", "Chest pain", "Back pain", "Prescription renewal",
+           "Lab results review", "Pre-surgery consultation", "Post-surgery review", "Vaccination", "Headache", "Injury"]
+DIAGNOSES = [("Hypertension", "Medication adjustment"), ("Common Cold", "Rest and fluids"),
+             ("Type 2 Diabetes", "Metformin and diet plan"), ("Asthma", "Inhaled corticosteroids"),
+             ("Fractured wrist", "Cast for six weeks"), ("Migraine", "Triptans as needed"),
+             ("Appendicitis", "Scheduled for appendectomy"), ("Gastritis", "Proton pump inhibitors"),
+             ("Sprained ankle", "RICE and physiotherapy"), ("Bronchitis", "Antibiotics for seven days"),
+             ("Anemia", "Iron supplements"), ("Chest Pain", "ECG and stress test ordered")]
+
+SLOT_MINUTES = 30
+SLOTS_PER_DAY = 16  # 09:00 - 17:00
+DEFAULT_CHUNK_SIZE = 50000
+
+PATIENT_COLUMNS = ('id', 'name', 'date_of_birth', 'contact_info', 'patient_type')
+INPATIENT_COLUMNS = ('id', 'room_number', 'admission_date', 'discharge_date')
+OUTPATIENT_COLUMNS = ('id', 'last_visit_date')
+APPOINTMENT_COLUMNS = ('patient_id', 'doctor_id', 'appointment_datetime', 'reason', 'status')
+RECORD_COLUMNS = ('patient_id', 'doctor_id', 'record_date', 'diagnosis', 'treatment')
+
+
+def _sqlite_datetime(value):
+    # The storage format SQLAlchemy's SQLite DateTime type reads and compares against.
+    return value.strftime('%Y-%m-%d %H:%M:%S.%f')
+
+
+def clear_database(session):
+    """Deletes every row, children first."""
+    for model in (MedicalRecord, Appointment, InPatient, OutPatient, Patient):
+        session.execute(delete(model))
+    session.execute(delete(Room))
+    session.execute(delete(DoctorDaySlots))
+    session.execute(delete(DoctorShift))
+    # Departments and doctors point at each other, so break the cycle first.
+    session.execute(Department.__table__.update().values(head_doctor_id=None))
+    session.execute(delete(Doctor))
+    session.execute(delete(Department))
+    session.commit()
+
+
+def generate_synthetic_data(patients, doctors, appointments_per_patient=3, records_per_patient=1,
+                            seed=0, chunk_size=DEFAULT_CHUNK_SIZE, today=None, progress=None):
+    """
+    Replaces the database contents with generated departments, doctors, patients,
+    appointments and medical records. The same arguments, `today` included (it defaults to
+    the current day), always produce the same rows.
+
+    Appointments are placed on free 30-minute slots of each doctor's working day (no double
+    booking); slots before `today` are completed or cancelled, later ones are scheduled.
+    Returns {table: rows} plus 'seconds'.
+    """
+    rng = random.Random(seed)
+    today = today or date.today()
+    engine = database.engine
+    started = time.perf_counter()
+    counts = {'departments': 0, 'doctors': 0, 'patients': 0, 'appointments': 0, 'medical_records': 0}
+
+    session = next(get_db())
+    try:
+        clear_database(session)
+    finally:
+        session.close()
+
+    # --- Departments and doctors (small, one transaction) ---
+    department_names = list(SPECIALTIES)
+    doctor_rows, doctor_specialty = [], {}
+    for doctor_id in range(1, doctors + 1):
+        department_id = 1 + (doctor_id - 1) % len(department_names)
+        specialization = rng.choice(SPECIALTIES[department_names[department_id - 1]])
+        name = f"Dr. {rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}"
+        doctor_rows.append({'id': doctor_id, 'name': name, 'specialization': specialization,
+                            'contact_info': f"doctor{doctor_id}@hospital.example", 'department_id': department_id})
+        doctor_specialty[doctor_id] = specialization
+    with engine.begin() as conn:
+        conn.execute(Department.__table__.insert(), [
+            {'id': i, 'name': name, 'specialty': SPECIALTIES[name][0]} for i, name in enumerate(department_names, start=1)
+        ])
+        counts['departments'] = len(department_names)
+        if doctor_rows:
+            conn.execute(Doctor.__table__.insert(), doctor_rows)
+            counts['doctors'] = len(doctor_rows)
+            # The first doctor of each department heads it.
+            for department_id in range(1, min(len(department_names), doctors) + 1):
+                conn.execute(Department.__table__.update()
+                             .where(Department.__table__.c.id == department_id)
+                             .values(head_doctor_id=department_id))
+
+    # Each doctor's agenda starts far enough in the past that ~80% of it is history.
+    per_doctor = (patients * appointments_per_patient) / max(doctors, 1)
+    working_days = int(per_doctor * 2 / SLOTS_PER_DAY) + 1  # random gaps average one free slot per booking
+    first_day = today - timedelta(days=int(working_days * 7 / 5 * 0.8))
+    next_slot = {doctor_id: rng.randrange(SLOTS_PER_DAY) for doctor_id in range(1, doctors + 1)}
+
+    first_monday = datetime.combine(first_day - timedelta(days=first_day.weekday()), datetime.min.time())
+
+    def slot_datetime(slot):
+        day, index = divmod(slot, SLOTS_PER_DAY)
+        weeks, weekday = divmod(day, 5)  # Monday-Friday only
+        return first_monday + timedelta(days=weeks * 7 + weekday, hours=9, minutes=index * SLOT_MINUTES)
+
+    # --- Patients and their history, one transaction per chunk ---
+    today_start = datetime.combine(today, datetime.min.time())
+    completed, cancelled, scheduled = (AppointmentStatus.COMPLETED.name, AppointmentStatus.CANCELLED.name,
+                                       AppointmentStatus.SCHEDULED.name)
+    # The search indexes are rebuilt once at the end instead of row by row.
+    with bulk_load(engine):
+        for chunk_start in range(1, patients + 1, chunk_size):
+            chunk_end = min(chunk_start + chunk_size, patients + 1)
+            patient_rows, inpatient_rows, outpatient_rows, appointment_rows, record_rows = [], [], [], [], []
+            for patient_id in range(chunk_start, chunk_end):
+                first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+                dob = date(1930, 1, 1) + timedelta(days=rng.randrange(90 * 365))
+                contact = (f"{first}.{last}{patient_id}@example.com".lower() if rng.random() < 0.6
+                           else f"07{rng.randrange(10**8):08d}")
+                if rng.random() < 0.2:
+                    patient_rows.append((patient_id, f"{first} {last}", dob.isoformat(), contact, PatientType.INPATIENT.name))
+                    admission = today - timedelta(days=rng.randrange(365))
+                    discharge = admission + timedelta(days=rng.randrange(1, 21))
+                    inpatient_rows.append((patient_id, f"{rng.randrange(1, 6)}{rng.randrange(1, 40):02d}{rng.choice('AB')}",
+                                           admission.isoformat(), discharge.isoformat() if discharge < today else None))
+                else:
+                    patient_rows.append((patient_id, f"{first} {last}", dob.isoformat(), contact, PatientType.OUTPATIENT.name))
+                    outpatient_rows.append((patient_id, (today - timedelta(days=rng.randrange(730))).isoformat()))
+
+                for _ in range(appointments_per_patient):
+                    doctor_id = rng.randrange(1, doctors + 1)
+                    slot = next_slot[doctor_id]
+                    next_slot[doctor_id] = slot + 1 + rng.randrange(3)
+                    when = slot_datetime(slot)
+                    if when < today_start:
+                        status = cancelled if rng.random() < 0.1 else completed
+                    else:
+                        status = scheduled
+                    appointment_rows.append((patient_id, doctor_id, _sqlite_datetime(when), rng.choice(REASONS), status))
+
+                for _ in range(records_per_patient):
+                    doctor_id = rng.randrange(1, doctors + 1)
+                    diagnosis, treatment = rng.choice(DIAGNOSES)
+                    record_date = today - timedelta(days=rng.randrange(5 * 365))
+                    record_rows.append((patient_id, doctor_id, record_date.isoformat(), diagnosis, treatment))
+
+            with engine.begin() as conn:
+                bulk_insert(conn, Patient.__table__, PATIENT_COLUMNS, patient_rows)
+                if inpatient_rows:
+                    bulk_insert(conn, InPatient.__table__, INPATIENT_COLUMNS, inpatient_rows)
+                if outpatient_rows:
+                    bulk_insert(conn, OutPatient.__table__, OUTPATIENT_COLUMNS, outpatient_rows)
+                if appointment_rows:
+                    bulk_insert(conn, Appointment.__table__, APPOINTMENT_COLUMNS, appointment_rows)
+                if record_rows:
+                    bulk_insert(conn, MedicalRecord.__table__, RECORD_COLUMNS, record_rows)
+            counts['patients'] += len(patient_rows)
+            counts['appointments'] += len(appointment_rows)
+            counts['medical_records'] += len(record_rows)
+            if progress:
+                progress(counts, time.perf_counter() - started)
+
+    # Bulk inserts bypass the ORM listeners that maintain the availability bitmaps.
+    counts['doctor_day_slots'] = rebuild_all(engine)
+    # ... and the counters and patient summaries.
+    reconcile(engine)
+    with engine.begin() as conn:
+        rebuild_summaries(conn)
+        # A registry entry for every room used (which also indexes its stays).
+        counts['rooms'] = register_rooms(conn)
+    counts['seconds'] = time.perf_counter() - started
+    return counts
+
+
 # This block ensures seed_database() is called only when the script is run directly
 if __name__ == "__main__":
     seed_database()
\ No newline at end of file
@@ -0,0 +1,62 @@
+import click
+from datetime import date
+
+# We are importing a file form database
+#    create_tables => creates the database tables
+from src.database import create_tables
+# Imports the function that fills your database with dummy test data (like fake patients and doctors).
+from src.seed import seed_database, generate_synthetic_data, DEFAULT_CHUNK_SIZE
+
+
+# Registers a new CLI command (in this case, initdb).[It allows us to run *python cli.py getdb*]
+@click.command()
+# This function will create your database tables. initialize the schema
+def createtables():
+    """Initialized Database Tables"""
+    # get_db => Actually runs the logic to create tables using SQLAlchemy.
+    print("DEBUG: Calling create_tables function...")
+    create_tables()
+    # Prints a success message to the terminal.(just like print())
+    click.echo("Database Tables Successfully Created")
+    pass
+
+
+# Follows same structure as the getdb function
+# Without options it loads the small demo data set; with --patients it generates a load-testing database.
+@click.command()
+@click.option('--patients', type=click.IntRange(min=0), default=None, help='Generate this many synthetic patients instead of the demo data.')
+@click.option('--doctors', type=click.IntRange(min=1), default=100, show_default=True, help='Synthetic doctors.')
+@click.option('--appointments-per-patient', type=click.IntRange(min=0), default=3, show_default=True)
+@click.option('--records-per-patient', type=click.IntRange(min=0), default=1, show_default=True)
+@click.option('--seed', 'random_seed', type=int, default=0, show_default=True, help='Random seed; the same seed gives the same data.')
+@click.option('--today', type=click.DateTime(['%Y-%m-%d']), default=None,
+              help='Day the synthetic data is dated around (default: the current day). Pass it with --seed to rebuild a database exactly.')
+@click.option('--chunk-size', type=click.IntRange(min=1), default=DEFAULT_CHUNK_SIZE, show_default=True, help='Patients per transaction.')
+def seed(patients, doctors, appointments_per_patient, records_per_patient, random_seed, today, chunk_size):
+    """Populate Dummy with fake data"""
+    if patients is None:
+        seed_database()
+        click.echo("Dummy data created")
+        return
+
+    def progress(counts, seconds):
+        rows = sum(counts.values())
+        click.echo(f"... {counts['patients']}/{patients} patients, {rows} rows, {rows / seconds:,.0f} rows/s")
+
+    today = today.date() if today else date.today()
+    counts = generate_synthetic_data(patients, doctors, appointments_per_patient, records_per_patient,
+                                     seed=random_seed, chunk_size=chunk_size, today=today, progress=progress)
+    seconds = counts.pop('seconds')
+    rows = sum(counts.values())
+    click.echo(", ".join(f"{table}: {count}" for table, count in counts.items()))
+    click.echo(f"Generated {rows} rows in {seconds:.2f}s ({rows / seconds:,.0f} rows/s)")
+    click.echo(f"Rebuild this exact data with --seed {random_seed} --today {today.isoformat()}")
+
+
+# -------------------- COMMANDS TO RUN --------------------
+# To create the tables (and add columns, indexes and foreign keys the models gained since)
+#         => python -m src.cli createtables
+# To load the small demo data set, or generate a load-testing database
+#         => python -m src.cli seed
+#         => python -m src.cli seed --patients 100000 --doctors 200 --seed 42 --today 2025-01-06
+#            (the same --seed and --today always give the same rows; --today defaults to the current day)
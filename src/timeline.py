@@ -0,0 +1,102 @@
+from datetime import datetime
+
+from sqlalchemy import text
+
+# Entries per page of `patient timeline`.
+DEFAULT_LIMIT = 20
+# Sorts after every stored timestamp: start from here to include upcoming appointments.
+END_OF_TIME = '9999-12-31'
+
+
+def to_key(moment):
+    # Timestamps compare as text in the storage format (DateTime '%Y-%m-%d %H:%M:%S.%f', Date '%Y-%m-%d').
+    # A record dated D therefore sorts just before the appointments of day D.
+    return moment.strftime('%Y-%m-%d %H:%M:%S.%f')
+
+
+def parse_cursor(value):
+    """
+    Turns --before into a cursor (at, kind, id). Accepts a date, a 'YYYY-MM-DD HH:MM'
+    datetime or the token printed at the end of the previous page ('<at>#<kind>:<id>').
+    """
+    if '#' in value:
+        at, entry = value.rsplit('#', 1)
+        kind, entry_id = entry.split(':')
+        if kind not in ('appointment', 'record'):
+            raise ValueError(f"Unknown timeline entry kind '{kind}'.")
+        return at, kind, int(entry_id)
+    try:
+        return to_key(datetime.strptime(value, '%Y-%m-%d %H:%M')), '', 0
+    except ValueError:
+        pass
+    try:
+        # A bare date sorts before everything stored on that day.
+        return datetime.strptime(value, '%Y-%m-%d').strftime('%Y-%m-%d'), '', 0
+    except ValueError:
+        pass
+    raise ValueError(f"Invalid --before value '{value}'. Use 'YYYY-MM-DD', 'YYYY-MM-DD HH:MM' or a page token.")
+
+
+def format_cursor(cursor):
+    at, kind, entry_id = cursor
+    return f"{at}#{kind}:{entry_id}"
+
+
+_BRANCH_FILTER = """{table}.patient_id = :patient_id AND {at} <= :at
+           AND ({at} < :at OR :kind > '{kind}' OR (:kind = '{kind}' AND {table}.id < :id))"""
+
+
+def _branches(schema):
+    return [f"""
+    SELECT * FROM (
+        SELECT a.appointment_datetime AS at, 'appointment' AS kind, a.id AS id, a.doctor_id AS doctor_id,
+               d.name AS doctor_name, a.status AS status, a.duration_minutes AS duration,
+               a.reason AS summary, NULL AS detail
+        FROM {schema}.appointments AS a
+        LEFT JOIN main.doctors AS d ON d.id = a.doctor_id
+        WHERE {_BRANCH_FILTER.format(table='a', at='a.appointment_datetime', kind='appointment')}
+        ORDER BY a.appointment_datetime DESC, a.id DESC
+        LIMIT :limit
+    )""", f"""
+    SELECT * FROM (
+        SELECT mr.record_date AS at, 'record' AS kind, mr.id AS id, mr.doctor_id AS doctor_id,
+               d.name AS doctor_name, NULL AS status, NULL AS duration,
+               mr.diagnosis AS summary, mr.treatment AS detail
+        FROM {schema}.medical_records AS mr
+        LEFT JOIN main.doctors AS d ON d.id = mr.doctor_id
+        WHERE {_BRANCH_FILTER.format(table='mr', at='mr.record_date', kind='record')}
+        ORDER BY mr.record_date DESC, mr.id DESC
+        LIMIT :limit
+    )"""]
+
+
+def timeline_sql(schemas=('main',)):
+    # Each branch walks its (patient_id, date) index backwards from the cursor and stops after
+    # :limit rows; the outer ORDER BY only merges those short lists. With the archive attached
+    # (archive.reading()) its tables add two more branches.
+    branches = [branch for schema in schemas for branch in _branches(schema)]
+    return "\n    UNION ALL".join(branches) + """
+    ORDER BY at DESC, kind DESC, id DESC
+    LIMIT :limit
+"""
+
+
+_TIMELINE = timeline_sql()
+
+
+def patient_timeline(session, patient_id, cursor=None, limit=DEFAULT_LIMIT, schemas=('main',)):
+    """
+    One page of a patient's appointments and medical records, newest first, starting strictly
+    before `cursor` (at, kind, id) - by default now, so upcoming appointments are left out.
+    Rows have at, kind ('appointment' or 'record'), id, doctor_id, doctor_name, status,
+    duration, summary (reason or diagnosis) and detail (treatment).
+    Returns (rows, next_cursor); next_cursor is None on the last page. `schemas` as in
+    search.search_records().
+    """
+    at, kind, entry_id = cursor or (to_key(datetime.now()), '', 0)
+    rows = session.execute(text(timeline_sql(schemas)), {
+        'patient_id': patient_id, 'at': at, 'kind': kind, 'id': entry_id, 'limit': limit + 1,
+    }).all()
+    if len(rows) > limit:
+        return rows[:limit], (rows[limit - 1].at, rows[limit - 1].kind, rows[limit - 1].id)
+    return rows, None
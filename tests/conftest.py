@@ -0,0 +1,30 @@
+import os
+import tempfile
+
+import pytest
+
+# src/database.py creates its engine from DATABASE_URL the first time something uses it. Point that
+# at a scratch file, so a test that reaches the database without the db_engine fixture never opens
+# the real hospital.db.
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(tempfile.gettempdir(), 'hms_test_import.db')}"
+
+from src import database
+
+
+@pytest.fixture
+def db_engine(tmp_path):
+    """A fresh file-backed database with all tables created, bound to src.database.Session."""
+    engine = database.init_engine(f"sqlite:///{tmp_path / 'hospital.db'}", 'prod')
+    database.Base.metadata.create_all(engine)
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def session(db_engine):
+    session = database.Session()
+    try:
+        yield session
+    finally:
+        session.close()
+
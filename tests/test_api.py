@@ -0,0 +1,99 @@
+from datetime import date, datetime
+
+import pytest
+from sqlalchemy import insert
+
+from src.models import Appointment, AppointmentStatus, Department, Doctor, OutPatient, Patient, PatientType
+
+pytest.importorskip('flask')
+
+from src.api import create_app  # noqa: E402
+
+
+@pytest.fixture
+def client(db_engine):
+    with db_engine.begin() as conn:
+        conn.execute(insert(Department.__table__).values(id=1, name="Cardiology"))
+        conn.execute(insert(Doctor.__table__), [
+            {'id': doctor_id, 'name': f"Dr. {doctor_id}", 'specialization': "Cardiologist" if doctor_id < 3 else "Surgeon",
+             'department_id': 1} for doctor_id in range(1, 6)])
+        conn.execute(insert(Patient.__table__), [
+            {'id': patient_id, 'name': f"Patient {patient_id}", 'date_of_birth': date(1990, 1, 1),
+             'patient_type': PatientType.OUTPATIENT} for patient_id in range(1, 8)])
+        conn.execute(insert(OutPatient.__table__), [{'id': patient_id} for patient_id in range(1, 8)])
+        conn.execute(insert(Appointment.__table__).values(id=1, patient_id=1, doctor_id=1, duration_minutes=30,
+                                                          appointment_datetime=datetime(2030, 1, 7, 10),
+                                                          status=AppointmentStatus.SCHEDULED))
+    return create_app().test_client()
+
+
+def test_lists_are_paged_by_id_and_filterable(client):
+    first = client.get('/api/patients?limit=3').get_json()
+    assert [row['id'] for row in first['items']] == [1, 2, 3]
+    assert first['items'][0]['patient_type'] == 'outpatient' and 'last_visit_date' in first['items'][0]
+    rest = client.get(f"/api/patients?limit=5&after_id={first['next_after_id']}").get_json()
+    assert [row['id'] for row in rest['items']] == [4, 5, 6, 7] and rest['next_after_id'] is None
+    surgeons = client.get('/api/doctors?specialization=Surgeon').get_json()['items']
+    assert [row['id'] for row in surgeons] == [3, 4, 5]
+    assert client.get('/api/patients?limit=0').status_code == 400
+    assert client.get('/api/appointments?status=lost').status_code == 400
+    assert client.get('/api/nurses').status_code == 404
+    assert client.get('/api/doctors/99').get_json() == {'error': "doctors 99 not found."}
+
+
+def test_conditional_get_and_cache(client, db_engine):
+    response = client.get('/api/doctors/1')
+    etag = response.headers['ETag'].strip('"')
+    assert response.get_json()['name'] == "Dr. 1"
+    assert client.get('/api/doctors/1', headers={'If-None-Match': f'"{etag}"'}).status_code == 304
+    # Served from the cache: a write behind the API's back is not seen until the entry expires.
+    with db_engine.begin() as conn:
+        conn.exec_driver_sql("UPDATE doctors SET name = 'Dr. Renamed' WHERE id = 1")
+    assert client.get('/api/doctors/1').get_json()['name'] == "Dr. 1"
+    stats = client.get('/api/health').get_json()['cache']
+    assert stats['hits'] == 2 and stats['misses'] == 1
+
+
+def test_writes_invalidate_cached_responses(client):
+    assert len(client.get('/api/appointments?patient_id=2').get_json()['items']) == 0
+    doctors = client.get('/api/doctors').get_json()
+    created = client.post('/api/appointments', json={'patient_id': 2, 'doctor_id': 2,
+                                                      'appointment_datetime': '2030-01-07 11:00'})
+    assert created.status_code == 201 and created.get_json()['status'] == 'scheduled'
+    assert len(client.get('/api/appointments?patient_id=2').get_json()['items']) == 1
+    # Only responses reading the written tables were dropped.
+    assert client.get('/api/doctors').get_json() == doctors
+    assert client.get('/api/health').get_json()['cache']['invalidations'] == 1
+
+    cancelled = client.patch(f"/api/appointments/{created.get_json()['id']}", json={'status': 'cancelled'})
+    assert cancelled.get_json()['status'] == 'cancelled'
+    assert client.get('/api/appointments?patient_id=2&status=scheduled').get_json()['items'] == []
+
+    patient = client.post('/api/patients', json={'name': "New", 'date_of_birth': '2001-02-03', 'type': 'outpatient'})
+    assert patient.status_code == 201
+    assert client.get(f"/api/patients/{patient.get_json()['id']}").get_json()['date_of_birth'] == '2001-02-03'
+
+
+def test_double_booking_is_refused(client):
+    clash = client.post('/api/appointments', json={'patient_id': 3, 'doctor_id': 1,
+                                                    'appointment_datetime': '2030-01-07 10:15'})
+    assert clash.status_code == 409
+    assert clash.get_json()['next_slot'] == '2030-01-07T10:30:00'
+    assert client.post('/api/appointments', json={'patient_id': 3}).status_code == 400
+    assert client.delete('/api/appointments/1').status_code == 204
+    assert client.get('/api/appointments/1').status_code == 404
+
+
+def test_datetimes_read_from_the_api_can_be_written_back(client):
+    booked = client.get('/api/appointments/1').get_json()['appointment_datetime']
+    assert booked == '2030-01-07T10:00:00'
+    # The same instant for another doctor; then a move onto doctor 1's booking is refused.
+    created = client.post('/api/appointments', json={'patient_id': 2, 'doctor_id': 2, 'appointment_datetime': booked})
+    assert created.status_code == 201 and created.get_json()['appointment_datetime'] == booked
+    moved = client.patch('/api/appointments/1', json={'appointment_datetime': '2030-01-07T11:00:00'})
+    assert moved.get_json()['appointment_datetime'] == '2030-01-07T11:00:00'
+    clash = client.post('/api/appointments', json={'patient_id': 3, 'doctor_id': 1,
+                                                    'appointment_datetime': '2030-01-07T11:15:00'})
+    assert clash.status_code == 409 and clash.get_json()['next_slot'] == '2030-01-07T11:30:00'
+    bad = client.post('/api/appointments', json={'patient_id': 3, 'doctor_id': 1, 'appointment_datetime': '07/01/2030'})
+    assert bad.status_code == 400 and 'ISO 8601' in bad.get_json()['error']
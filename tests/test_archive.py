@@ -0,0 +1,141 @@
+import json
+import os
+from datetime import date, datetime, timedelta
+
+from click.testing import CliRunner
+from sqlalchemy import func, insert, select
+
+from src import database
+from src.archive import archive_path, attached
+from src.cli import cli
+from src.models import Appointment, AppointmentStatus, Doctor, MedicalRecord, OutPatient, Patient, PatientType
+
+START = datetime(2020, 1, 6, 9)
+
+
+def add_history(engine):
+    """
+    Two patients; each week of 2020 a completed appointment and a medical record for patient 1,
+    plus a still-scheduled appointment from 2020 and a cancelled one for patient 2.
+    """
+    with engine.begin() as conn:
+        conn.execute(insert(Doctor.__table__).values(id=1, name="Dr. One"))
+        conn.execute(insert(Patient.__table__), [
+            {'id': i, 'name': f"Patient {i}", 'date_of_birth': date(1990, 1, 1), 'patient_type': PatientType.OUTPATIENT}
+            for i in (1, 2)])
+        conn.execute(insert(OutPatient.__table__), [{'id': 1}, {'id': 2}])
+        conn.execute(insert(Appointment.__table__), [
+            {'patient_id': 1, 'doctor_id': 1, 'appointment_datetime': START + timedelta(weeks=i), 'duration_minutes': 30,
+             'status': AppointmentStatus.COMPLETED, 'reason': f"Visit {i}"} for i in range(52)])
+        conn.execute(insert(Appointment.__table__), [
+            {'patient_id': 2, 'doctor_id': 1, 'appointment_datetime': START, 'status': AppointmentStatus.SCHEDULED},
+            {'patient_id': 2, 'doctor_id': 1, 'appointment_datetime': START, 'status': AppointmentStatus.CANCELLED}])
+        conn.execute(insert(MedicalRecord.__table__), [
+            {'patient_id': 1, 'doctor_id': 1, 'record_date': (START + timedelta(weeks=i)).date(),
+             'diagnosis': "Bronchitis" if i == 0 else "Checkup", 'treatment': "Rest"} for i in range(52)])
+
+
+def count(session, model):
+    return session.scalar(select(func.count()).select_from(model))
+
+
+def invoke(*args):
+    return CliRunner().invoke(cli, list(args)).output
+
+
+def test_archive_moves_history_in_chunks(db_engine, session):
+    add_history(db_engine)
+    # Weeks 0-25 (6 Jan - 29 Jun 2020) are before July.
+    output = invoke('archive', '--before', '2020-07-01', '--dry-run')
+    assert "Dry run: 27 appointments and 26 medical records before 2020-07-01 would move" in output
+    assert not os.path.exists(archive_path(db_engine))
+
+    output = invoke('archive', '--before', '2020-07-01', '--chunk-size', '10')
+    assert "Archived 27 appointments and 26 medical records before 2020-07-01" in output
+    assert "in 6 chunks" in output
+    # The still-scheduled appointment stays in the working set.
+    assert count(session, Appointment) == 52 - 26 + 1
+    assert count(session, MedicalRecord) == 26
+    with db_engine.connect() as conn, attached(conn):
+        assert conn.exec_driver_sql("SELECT count(*) FROM archive.appointments").scalar() == 27
+        assert conn.exec_driver_sql("SELECT count(*) FROM archive.medical_records").scalar() == 26
+    assert "Archived 0 appointments and 0 medical records" in invoke('archive', '--before', '2020-07-01')
+    assert "cannot be in the future" in invoke('archive', '--before', '2999-01-01')
+
+
+def test_reads_include_the_archive_on_request(db_engine, tmp_path):
+    add_history(db_engine)
+    invoke('archive', '--before', '2020-07-01')
+
+    assert "No matching records found." in invoke('patient', 'search-records', 'bronchitis')
+    output = invoke('patient', 'search-records', 'bronchitis', '--include-archive')
+    assert "Patient ID: 1" in output and "(archived)" in output and "[Bronchitis]" in output
+
+    recent = invoke('patient', 'timeline', '1', '--before', '2020-07-01', '--limit', '100')
+    assert "No appointments or medical records found." in recent
+    history = invoke('patient', 'timeline', '1', '--before', '2020-07-01', '--limit', '100', '--include-archive')
+    assert history.count("Appointment ID") == 26 and history.count("Medical record ID") == 26
+    assert "2020-01-06 09:00  Appointment ID 1" in history
+
+    invoke('export', 'table', 'appointments', str(tmp_path / 'hot'))
+    invoke('export', 'table', 'appointments', str(tmp_path / 'all'), '--include-archive', '--shard-rows', '20')
+    assert json.loads((tmp_path / 'hot' / 'manifest.json').read_text())['tables'] == {'appointments': 27}
+    manifest = json.loads((tmp_path / 'all' / 'manifest.json').read_text())
+    assert manifest['tables'] == {'appointments': 54} and manifest['include_archive']
+    ids = [json.loads(line)['id'] for shard in manifest['shards']
+           for line in (tmp_path / 'all' / shard['file']).read_text().splitlines()]
+    assert ids == list(range(1, 55))
+
+
+def test_deleting_a_patient_clears_their_archived_rows(db_engine):
+    add_history(db_engine)
+    invoke('archive', '--before', '2020-07-01')
+    assert "Patient with ID 1 deleted" in invoke('patient', 'delete', '1')
+    with db_engine.connect() as conn, attached(conn):
+        assert conn.exec_driver_sql("SELECT count(*) FROM archive.appointments").scalar() == 1
+        assert conn.exec_driver_sql("SELECT count(*) FROM archive.medical_records").scalar() == 0
+        assert conn.exec_driver_sql(
+            "SELECT count(*) FROM archive.medical_records_fts WHERE medical_records_fts MATCH 'bronchitis'").scalar() == 0
+
+
+def archived_diagnoses(engine):
+    with engine.connect() as conn, attached(conn):
+        return dict(conn.exec_driver_sql("SELECT id, diagnosis FROM archive.medical_records WHERE id > 52").all())
+
+
+def test_archived_ids_are_never_handed_out_again(db_engine, session):
+    add_history(db_engine)
+    session.add(MedicalRecord(patient_id=1, doctor_id=1, record_date=date(2019, 5, 1), diagnosis="Backdated A"))
+    session.commit()
+    assert "Archived 0 appointments and 1 medical records" in invoke('archive', '--before', '2020-01-01')
+    # The id of the archived record is not reused, so the second back-dated record archives too.
+    session.add(MedicalRecord(patient_id=1, doctor_id=1, record_date=date(2019, 6, 1), diagnosis="Backdated B"))
+    session.commit()
+    assert "Archived 0 appointments and 1 medical records" in invoke('archive', '--before', '2020-01-01')
+    assert archived_diagnoses(db_engine) == {53: "Backdated A", 54: "Backdated B"}
+
+    # A different row already archived under an id: the chunk is refused and nothing leaves main.
+    with db_engine.connect() as conn, attached(conn):
+        conn.exec_driver_sql("INSERT INTO archive.medical_records (id, patient_id, doctor_id, diagnosis) "
+                             "VALUES (10, 1, 1, 'Other')")
+        conn.commit()
+    output = invoke('archive', '--before', '2020-07-01')
+    assert "Error archiving:" in output and "nothing was moved" in output
+    assert count(session, MedicalRecord) == 52
+
+
+def test_create_tables_keeps_new_ids_above_archived_ones(db_engine, session):
+    add_history(db_engine)
+    invoke('archive', '--before', '2021-01-01')   # records 1-52, all of them
+    with db_engine.begin() as conn:
+        # medical_records as created before it used AUTOINCREMENT: the next id would be 1 again.
+        sql = conn.exec_driver_sql("SELECT sql FROM sqlite_master WHERE name = 'medical_records'").scalar()
+        conn.exec_driver_sql("DROP TABLE medical_records")
+        conn.exec_driver_sql(sql.replace(" AUTOINCREMENT", ""))
+        conn.exec_driver_sql("DELETE FROM sqlite_sequence WHERE name = 'medical_records'")
+    database.create_tables()
+    record = MedicalRecord(patient_id=1, doctor_id=1, record_date=date(2019, 1, 1), diagnosis="New")
+    session.add(record)
+    session.commit()
+    assert record.id == 53
+    assert "Archived 0 appointments and 1 medical records" in invoke('archive', '--before', '2020-01-01')
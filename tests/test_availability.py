@@ -0,0 +1,112 @@
+from datetime import date, datetime, time
+
+from click.testing import CliRunner
+from sqlalchemy import insert, select
+
+from src.availability import from_bytes, rebuild_all, run_starts, span_bits, weekly_masks
+from src.cli import cli
+from src.models import Appointment, AppointmentStatus, Department, Doctor, DoctorDaySlots, Patient, PatientType
+from src.profiler import QueryProfiler
+
+MONDAY = date(2030, 1, 7)
+
+
+def add_staff(engine, doctors=3):
+    with engine.begin() as conn:
+        conn.execute(insert(Department.__table__), [{'id': 1, 'name': 'Cardiology'}, {'id': 2, 'name': 'Neurology'}])
+        conn.execute(insert(Doctor.__table__), [
+            {'id': i, 'name': f"Dr. {i}", 'specialization': 'Cardiologist', 'department_id': 1} for i in range(1, doctors + 1)
+        ] + [{'id': 900, 'name': "Dr. Neuro", 'specialization': 'Neurologist', 'department_id': 2}])
+        conn.execute(insert(Patient.__table__), [
+            {'id': 1, 'name': "Patient 1", 'date_of_birth': date(1990, 1, 1), 'patient_type': PatientType.OUTPATIENT}])
+
+
+def bitmaps(session):
+    return {(row.doctor_id, row.day): from_bytes(row.busy) for row in session.scalars(select(DoctorDaySlots))}
+
+
+def invoke(*args):
+    return CliRunner().invoke(cli, list(args))
+
+
+def book_any(*args):
+    return invoke('appointment', 'book-any', '--patient-id', '1', *args)
+
+
+def test_masks_and_runs():
+    monday, tuesday = weekly_masks([(0, time(22), time(2))])[:2]
+    assert monday == sum(1 << slot for slot in range(88, 96))
+    assert tuesday == sum(1 << slot for slot in range(0, 8))
+    # 09:10 for 30 minutes touches the 09:00, 09:15 and 09:30 slots.
+    assert list(span_bits(datetime(2030, 1, 7, 9, 10), 30)) == [(MONDAY, 0b111 << 36)]
+    assert run_starts(0b0111_0011, 2) == 0b0011_0001
+    assert run_starts(0b0111_0011, 3) == 0b0001_0000
+
+
+def test_bitmaps_follow_every_orm_write(db_engine, session):
+    add_staff(db_engine)
+    invoke('appointment', 'add', '--patient-id', '1', '--doctor-id', '1', '--datetime', '2030-01-07 09:00', '--duration', '60')
+    invoke('appointment', 'add', '--patient-id', '1', '--doctor-id', '1', '--datetime', '2030-01-07 23:45', '--duration', '30')
+    assert bitmaps(session) == {(1, MONDAY): 0b1111 << 36 | 1 << 95, (1, date(2030, 1, 8)): 1}
+
+    invoke('appointment', 'update', '1', '--doctor-id', '2', '--datetime', '2030-01-08 10:00')
+    assert bitmaps(session) == {(1, MONDAY): 1 << 95, (1, date(2030, 1, 8)): 1, (2, date(2030, 1, 8)): 0b1111 << 40}
+
+    invoke('appointment', 'update', '2', '--status', 'cancelled')
+    invoke('appointment', 'delete', '1')
+    assert bitmaps(session) == {}
+
+    # The incremental result always equals a full rebuild.
+    invoke('appointment', 'add', '--patient-id', '1', '--doctor-id', '3', '--datetime', '2030-01-09 12:00')
+    incremental = bitmaps(session)
+    session.close()
+    assert rebuild_all(db_engine) == 1
+    assert bitmaps(session) == incremental
+
+
+def test_book_any_takes_the_earliest_free_doctor_within_shifts(db_engine, session):
+    add_staff(db_engine)
+    # Doctor 1 starts at 08:00 on Mondays but is booked until 10:00; doctors 2 and 3 keep the default 09:00 start.
+    invoke('doctor', 'add-shift', '1', '--day', 'mon', '--start', '08:00', '--end', '12:00')
+    invoke('appointment', 'add', '--patient-id', '1', '--doctor-id', '1', '--datetime', '2030-01-07 08:00', '--duration', '120')
+    invoke('appointment', 'add', '--patient-id', '1', '--doctor-id', '2', '--datetime', '2030-01-07 09:00')
+
+    first = book_any('--department-id', '1', '--after', '2030-01-07 07:00')
+    assert "booked with Dr. 3 (Doctor ID 3) on 2030-01-07 09:00 (30 min)" in first.output
+    # Doctor 2 is free again at 09:30, doctor 3 now is not; doctor 1 only at 10:00.
+    assert "(Doctor ID 2) on 2030-01-07 09:30" in book_any('--specialization', 'Cardiologist', '--after', '2030-01-07 09:10').output
+    assert "(Doctor ID 900) on 2030-01-07 09:00" in book_any('--department-id', '2', '--after', '2030-01-07 09:00').output
+    # Saturdays are off for everyone without a weekend shift.
+    assert "on 2030-01-14 09:00" in book_any('--department-id', '2', '--after', '2030-01-12 09:00').output
+    assert "Give --department-id" in book_any().output
+
+
+def test_book_any_costs_the_same_for_many_doctors(db_engine):
+    add_staff(db_engine, doctors=200)
+    with QueryProfiler(db_engine) as profiler:
+        assert "booked with" in book_any('--department-id', '1', '--after', '2030-01-07 09:00').output
+    # patient, candidates, shifts, one week of bitmaps, then the booking itself (with its counter
+    # and the patient's summary): none of it per doctor.
+    assert profiler.statement_count <= 13
+    assert not profiler.repeated()
+
+
+def test_book_any_never_double_books_on_stale_bitmaps(db_engine, session):
+    add_staff(db_engine, doctors=1)
+    # Written without the ORM, so no bitmap exists for it.
+    with db_engine.begin() as conn:
+        conn.execute(insert(Appointment.__table__).values(patient_id=1, doctor_id=1, appointment_datetime=datetime(2030, 1, 7, 9),
+                                                          duration_minutes=30, status=AppointmentStatus.SCHEDULED))
+    result = book_any('--department-id', '1', '--after', '2030-01-07 09:00')
+    assert "on 2030-01-07 09:30" in result.output
+    assert bitmaps(session)[1, MONDAY] == 0b11 << 36 | 0b11 << 38
+
+
+def test_deleting_a_doctor_drops_their_bitmaps_in_one_go(db_engine, session):
+    add_staff(db_engine, doctors=1)
+    for hour in range(9, 17):
+        invoke('appointment', 'add', '--patient-id', '1', '--doctor-id', '1', '--datetime', f"2030-01-07 {hour:02d}:00")
+    with QueryProfiler(db_engine) as profiler:
+        assert "deleted" in invoke('doctor', 'delete', '1').output
+    assert bitmaps(session) == {}
+    assert not any('doctor_day_slots' in sql and 'SELECT' in sql for sql, _ in profiler.statements)
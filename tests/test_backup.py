@@ -0,0 +1,133 @@
+import os
+import sqlite3
+import threading
+from datetime import date
+
+from click.testing import CliRunner
+from sqlalchemy import func, insert, select
+
+from src.archive import archive_path
+from src.backup import backup_database, list_snapshots, online_copy, restore_snapshot
+from src.cli import cli
+from src.models import MedicalRecord, Patient, PatientType
+from tests.test_archive import add_history
+
+
+def add_patients(engine, first, count):
+    with engine.begin() as conn:
+        conn.execute(insert(Patient.__table__), [
+            {'id': i, 'name': f"Patient {i}", 'date_of_birth': date(1990, 1, 1), 'contact_info': 'x' * 200,
+             'patient_type': PatientType.OUTPATIENT} for i in range(first, first + count)])
+
+
+def patients_in(path):
+    with sqlite3.connect(path) as conn:
+        return conn.execute("SELECT count(*) FROM patients").fetchone()[0]
+
+
+def test_snapshots_are_incremental_and_restorable(db_engine, tmp_path):
+    dest = str(tmp_path / 'backups')
+    add_patients(db_engine, 1, 2000)
+    first = backup_database(dest, db_engine.url.database, chunk_bytes=16384)
+    # Identical chunks (e.g. empty pages) are stored once even within one snapshot.
+    assert first['new_chunks'] == len({chunk['sha256'] for chunk in first['chunks']}) > 10
+
+    add_patients(db_engine, 2001, 10)
+    second = backup_database(dest, db_engine.url.database, chunk_bytes=16384)
+    # Only the pages the new rows (and the header) touched are stored again.
+    assert 0 < second['new_chunks'] < len(second['chunks']) // 2
+
+    restored = str(tmp_path / 'restored.db')
+    restore_snapshot(dest, first, restored)
+    assert patients_in(restored) == 2000
+    restore_snapshot(dest, second, restored)
+    assert patients_in(restored) == 2010
+
+
+def test_verify_catches_damaged_chunks(db_engine, tmp_path):
+    dest = str(tmp_path / 'backups')
+    add_patients(db_engine, 1, 100)
+    runner = CliRunner()
+    assert "Snapshot" in runner.invoke(cli, ['db', 'backup', dest]).output
+    manifest = list_snapshots(dest)[0]
+    assert f"{manifest['id']}: OK" in runner.invoke(cli, ['db', 'verify', dest, '--integrity']).output
+
+    digest = manifest['chunks'][0]['sha256']
+    with open(os.path.join(dest, 'chunks', digest[:2], digest), 'r+b') as handle:
+        handle.seek(5000)
+        handle.write(b'\x00\xff')
+    output = runner.invoke(cli, ['db', 'verify', dest]).output
+    assert "FAILED" in output and "is damaged" in output
+    restored = tmp_path / 'restored.db'
+    output = runner.invoke(cli, ['db', 'restore', dest, '--to', str(restored), '--yes']).output
+    assert "Error restoring" in output and not restored.exists()
+
+
+def test_keep_prunes_old_snapshots_and_their_chunks(db_engine, tmp_path):
+    dest = str(tmp_path / 'backups')
+    for i in range(3):
+        add_patients(db_engine, 1 + i * 500, 500)
+        backup_database(dest, db_engine.url.database, chunk_bytes=16384, keep=2)
+    snapshots = list_snapshots(dest)
+    assert len(snapshots) == 2
+    used = {chunk['sha256'] for manifest in snapshots for chunk in manifest['chunks']}
+    stored = {name for _, _, names in os.walk(os.path.join(dest, 'chunks')) for name in names}
+    assert stored == used
+
+
+def test_backup_of_a_database_being_written(db_engine, session, tmp_path):
+    add_patients(db_engine, 1, 5000)
+    stop = threading.Event()
+
+    def writer():
+        i = 100000
+        while not stop.is_set():
+            add_patients(db_engine, i, 1)
+            i += 1
+
+    thread = threading.Thread(target=writer)
+    thread.start()
+    try:
+        copy = str(tmp_path / 'copy.db')
+        # Small steps with pauses: writers commit between them, and the copy still completes.
+        online_copy(db_engine.url.database, copy, step_pages=8, sleep=0.001)
+    finally:
+        stop.set()
+        thread.join()
+    with sqlite3.connect(copy) as conn:
+        assert conn.execute("PRAGMA integrity_check").fetchone()[0] == 'ok'
+        assert conn.execute("PRAGMA journal_mode").fetchone()[0] == 'delete'
+    assert 5000 <= patients_in(copy) <= session.scalar(select(func.count()).select_from(Patient))
+
+
+def test_the_archive_is_backed_up_and_restored_with_the_database(db_engine, session, tmp_path):
+    dest = str(tmp_path / 'backups')
+    runner = CliRunner()
+
+    def run(*args):
+        return runner.invoke(cli, list(args)).output
+
+    add_history(db_engine)
+    run('db', 'backup', dest)   # before anything was archived
+    run('archive', '--before', '2020-07-01')
+    assert "+ archive" in run('db', 'backup', dest)
+    before, with_archive = list_snapshots(dest)
+    assert 'archive' not in before and with_archive['archive']['chunks']
+    assert f"{with_archive['id']}: OK" in run('db', 'verify', dest, '--integrity')
+
+    run('archive', '--before', '2021-01-01')
+    assert "restored" in run('db', 'restore', dest, '--snapshot', with_archive['id'], '--yes')
+    assert session.query(MedicalRecord).count() == 26
+    history = run('patient', 'timeline', '1', '--before', '2020-07-01', '--limit', '100', '--include-archive')
+    assert history.count("Medical record ID") == 26
+    assert "(archived)" in run('patient', 'search-records', 'bronchitis', '--include-archive')
+    restored = tmp_path / 'restored.db'
+    run('db', 'restore', dest, '--snapshot', with_archive['id'], '--to', str(restored), '--yes')
+    assert os.path.exists(tmp_path / 'restored_archive.db')
+
+    # The older snapshot has every record in the database itself: the newer archive is moved aside.
+    output = run('db', 'restore', dest, '--snapshot', before['id'], '--yes')
+    assert "moved to" in output and not os.path.exists(archive_path(db_engine))
+    assert session.query(MedicalRecord).count() == 52
+    found = run('patient', 'search-records', 'bronchitis', '--include-archive')
+    assert "[Bronchitis]" in found and "(archived)" not in found
@@ -0,0 +1,36 @@
+import json
+
+from benchmarks.suite import CLI_CASES, DEFAULT_BASELINE, MENU_CASES, compare, missing_from_baseline, run_suite
+
+
+def test_every_case_runs_cleanly_on_a_small_fixture(tmp_path):
+    results = run_suite([60], repeat=2, fixture_dir=str(tmp_path / 'fixtures'))
+    cases = results['results']['60']
+    assert set(cases) == set(CLI_CASES) | {f"menu.{name}" for name in MENU_CASES}
+    failures = {name: result['errors'] for name, result in cases.items() if result['errors']}
+    assert failures == {}
+    # The fixture is cached and reused by the next run.
+    assert list((tmp_path / 'fixtures').iterdir()) == [tmp_path / 'fixtures' / 'hms-60-s42.db']
+
+
+def test_compare_flags_only_slowdowns_beyond_threshold_and_noise_floor():
+    def results(**timings):
+        return {'results': {'1000': {name: {'median_s': seconds} for name, seconds in timings.items()}}}
+
+    baseline = results(a=0.100, b=0.100, c=0.001, d=0.100)
+    current = results(a=0.120, b=0.200, c=0.004, e=5.0)
+    assert compare(current, baseline, threshold=0.25) == [('1000', 'b', 0.100, 0.200)]
+
+
+def test_cases_missing_from_the_baseline_are_reported():
+    baseline = {'results': {'1000': {'a': {'median_s': 0.1}}}}
+    current = {'results': {'1000': {'a': {'median_s': 0.1}, 'b': {'median_s': 0.1}}, '60': {'a': {'median_s': 0.1}}}}
+    assert missing_from_baseline(current, baseline) == [('1000', 'b'), ('60', 'a')]
+
+
+def test_the_stored_baseline_covers_every_case():
+    # A new or changed case comes with a refreshed baseline (run --save-baseline), or it is never checked.
+    with open(DEFAULT_BASELINE, encoding='utf-8') as handle:
+        baseline = json.load(handle)
+    every_case = set(CLI_CASES) | {f"menu.{name}" for name in MENU_CASES}
+    assert {size: set(cases) for size, cases in baseline['results'].items()} == {'1000': every_case, '100000': every_case}
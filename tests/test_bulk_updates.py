@@ -0,0 +1,80 @@
+from datetime import date, datetime, timedelta
+
+from click.testing import CliRunner
+from sqlalchemy import func, insert, select, text
+
+from src.bulk_updates import appointment_filter
+from src.cli import cli
+from src.models import Appointment, AppointmentStatus, Doctor, DoctorDaySlots, Patient, PatientType
+
+START = datetime(2030, 1, 7, 9)
+
+
+def add_appointments(engine, count=100):
+    # Every hour from START, alternating between two doctors; every tenth one cancelled.
+    with engine.begin() as conn:
+        conn.execute(insert(Patient.__table__).values(id=1, name="Patient 1", date_of_birth=date(1990, 1, 1),
+                                                      patient_type=PatientType.OUTPATIENT))
+        conn.execute(insert(Doctor.__table__), [{'id': 1, 'name': "Dr. One"}, {'id': 2, 'name': "Dr. Two"}])
+        if not count:
+            return
+        conn.execute(insert(Appointment.__table__), [
+            {'id': i, 'patient_id': 1, 'doctor_id': 1 + i % 2, 'appointment_datetime': START + timedelta(hours=i),
+             'duration_minutes': 30,
+             'status': AppointmentStatus.CANCELLED if i % 10 == 0 else AppointmentStatus.SCHEDULED}
+            for i in range(1, count + 1)])
+
+
+def statuses(session):
+    return dict(session.execute(select(Appointment.status, func.count()).group_by(Appointment.status)).all())
+
+
+def invoke(*args):
+    return CliRunner().invoke(cli, list(args)).output
+
+
+def test_sweep_completes_appointments_that_are_over(db_engine, session):
+    add_appointments(db_engine)
+    # Appointment 10 is cancelled; 11 starts at START + 11h and is still running at +11h15.
+    before = (START + timedelta(hours=11, minutes=15)).strftime('%Y-%m-%d %H:%M')
+    assert "Dry run: 9 appointments would be set to completed (9 scheduled)." in invoke('appointment', 'sweep', '--before', before, '--dry-run')
+    assert statuses(session) == {AppointmentStatus.SCHEDULED: 90, AppointmentStatus.CANCELLED: 10}
+
+    output = invoke('appointment', 'sweep', '--before', before, '--chunk-size', '4')
+    assert "Updated 9 appointments to completed in 3 chunks" in output
+    assert statuses(session) == {AppointmentStatus.SCHEDULED: 81, AppointmentStatus.COMPLETED: 9, AppointmentStatus.CANCELLED: 10}
+    assert "Updated 0 appointments" in invoke('appointment', 'sweep', '--before', before)
+
+
+def test_bulk_cancel_frees_the_doctors_slots(db_engine, session):
+    add_appointments(db_engine, count=0)
+    invoke('appointment', 'add', '--patient-id', '1', '--doctor-id', '1', '--datetime', '2030-01-07 09:00')
+    invoke('appointment', 'add', '--patient-id', '1', '--doctor-id', '1', '--datetime', '2030-01-08 09:00')
+    assert len(session.scalars(select(DoctorDaySlots)).all()) == 2
+
+    output = invoke('appointment', 'bulk-update', '--set-status', 'cancelled', '--doctor-id', '1',
+                    '--from', '2030-01-07', '--to', '2030-01-08')
+    assert "Updated 1 appointments to cancelled in 1 chunks" in output
+    assert [row.day for row in session.scalars(select(DoctorDaySlots))] == [date(2030, 1, 8)]
+    # The cached schedule was dropped too, so the slot can be booked again.
+    assert "added successfully" in invoke('appointment', 'add', '--patient-id', '1', '--doctor-id', '1',
+                                          '--datetime', '2030-01-07 09:00')
+
+
+def test_bulk_update_filters_and_never_reactivates(db_engine, session):
+    add_appointments(db_engine)
+    output = invoke('appointment', 'bulk-update', '--set-status', 'completed', '--doctor-id', '2', '--dry-run')
+    assert "Dry run: 50 appointments would be set to completed (50 scheduled)." in output
+    invoke('appointment', 'bulk-update', '--set-status', 'completed', '--doctor-id', '2', '--chunk-size', '7')
+    assert statuses(session) == {AppointmentStatus.SCHEDULED: 40, AppointmentStatus.COMPLETED: 50, AppointmentStatus.CANCELLED: 10}
+    assert "Give at least one filter" in invoke('appointment', 'bulk-update', '--set-status', 'cancelled')
+
+
+def test_sweep_walks_the_scheduled_index(db_engine):
+    where, params = appointment_filter(AppointmentStatus.COMPLETED, statuses=[AppointmentStatus.SCHEDULED],
+                                       ended_before=START)
+    with db_engine.connect() as conn:
+        plan = [row[-1] for row in conn.execute(text(
+            f"EXPLAIN QUERY PLAN SELECT id FROM appointments WHERE {where} AND (appointment_datetime, id) > ('', 0) "
+            f"ORDER BY appointment_datetime, id LIMIT 10"), params)]
+    assert any('ix_appointments_scheduled' in step for step in plan), plan
@@ -0,0 +1,104 @@
+from datetime import date, datetime, timedelta
+
+from click.testing import CliRunner
+from sqlalchemy import func, insert, inspect, select
+
+from src import database
+from src.cli import cli
+from src.models import (Appointment, AppointmentStatus, Doctor, DoctorDaySlots, DoctorShift, InPatient, MedicalRecord,
+                        OutPatient, Patient, PatientType)
+from src.profiler import QueryProfiler
+from src.scheduling import schedule_for
+from src.search import search_records
+
+MONDAY = datetime(2030, 1, 7, 9)
+
+
+def add_history(engine, appointments=300):
+    with engine.begin() as conn:
+        conn.execute(insert(Doctor.__table__), [{'id': 1, 'name': "Dr. One"}, {'id': 2, 'name': "Dr. Two"}])
+        conn.execute(insert(Patient.__table__), [
+            {'id': 1, 'name': "Patient 1", 'date_of_birth': date(1990, 1, 1), 'patient_type': PatientType.INPATIENT},
+            {'id': 2, 'name': "Patient 2", 'date_of_birth': date(1990, 1, 1), 'patient_type': PatientType.OUTPATIENT}])
+        conn.execute(insert(InPatient.__table__).values(id=1, room_number="101A"))
+        conn.execute(insert(OutPatient.__table__).values(id=2))
+        conn.execute(insert(DoctorShift.__table__).values(doctor_id=1, weekday=0, start_time=MONDAY.time(),
+                                                         end_time=(MONDAY + timedelta(hours=8)).time()))
+        conn.execute(insert(Appointment.__table__), [
+            {'patient_id': 1 + i % 2, 'doctor_id': 1 + i % 2, 'appointment_datetime': MONDAY + timedelta(days=i),
+             'duration_minutes': 30, 'status': AppointmentStatus.SCHEDULED} for i in range(appointments)])
+        conn.execute(insert(MedicalRecord.__table__), [
+            {'patient_id': 1 + i % 2, 'doctor_id': 1 + i % 2, 'record_date': date(2024, 1, 1), 'diagnosis': "Asthma"}
+            for i in range(appointments)])
+
+
+def counts(session):
+    return {model.__tablename__: session.scalar(select(func.count()).select_from(model))
+            for model in (Appointment, MedicalRecord, DoctorShift, InPatient)}
+
+
+def test_foreign_keys_are_enforced(db_engine):
+    with db_engine.connect() as conn:
+        assert conn.exec_driver_sql("PRAGMA foreign_keys").scalar() == 1
+
+
+def test_doctor_delete_cascades_without_loading_children(db_engine, session):
+    add_history(db_engine)
+    with QueryProfiler(db_engine) as profiler:
+        assert "Doctor ID 1 deleted." in CliRunner().invoke(cli, ['doctor', 'delete', '1']).output
+    # Lookup, the shifts/department links the ORM still checks, and the DELETE: not one per appointment.
+    assert profiler.statement_count <= 6
+    assert counts(session) == {'appointments': 150, 'medical_records': 150, 'doctor_shifts': 0, 'inpatients': 1}
+    # The search index follows the cascade (its triggers fire on cascaded deletes too).
+    assert len(search_records(session, 'asthma', limit=1000)) == 150
+
+
+def test_patient_delete_frees_the_doctors_slots(db_engine, session):
+    add_history(db_engine, appointments=2)
+    # Booked through the ORM, so a bitmap and a cached schedule exist for doctor 1.
+    runner = CliRunner()
+    runner.invoke(cli, ['appointment', 'add', '--patient-id', '1', '--doctor-id', '1', '--datetime', '2030-02-04 10:00'])
+    assert schedule_for(session, 1).bookings
+
+    assert "Patient with ID 1 deleted." in runner.invoke(cli, ['patient', 'delete', '1']).output
+    assert counts(session) == {'appointments': 1, 'medical_records': 1, 'doctor_shifts': 1, 'inpatients': 0}
+    assert session.scalars(select(DoctorDaySlots).where(DoctorDaySlots.doctor_id == 1)).all() == []
+    result = runner.invoke(cli, ['appointment', 'add', '--patient-id', '2', '--doctor-id', '1', '--datetime', '2030-02-04 10:00'])
+    assert "added successfully" in result.output
+
+
+def test_chunked_delete(db_engine, session):
+    add_history(db_engine)
+    runner = CliRunner()
+    runner.invoke(cli, ['appointment', 'add', '--patient-id', '2', '--doctor-id', '2', '--datetime', '2031-02-04 10:00'])
+    output = runner.invoke(cli, ['patient', 'delete', '2', '--chunk-size', '40']).output
+    assert "Removed in chunks: 151 appointments, 150 medical_records." in output
+    assert "Patient with ID 2 deleted." in output
+    assert session.get(Patient, 2) is None
+    assert session.scalars(select(DoctorDaySlots)).all() == []
+
+    output = runner.invoke(cli, ['doctor', 'delete', '1', '--chunk-size', '1000']).output
+    assert "Removed in chunks: 150 appointments, 150 medical_records, 1 doctor_shifts, 0 doctor_day_slots." in output
+    assert counts(session) == {'appointments': 0, 'medical_records': 0, 'doctor_shifts': 0, 'inpatients': 1}
+    assert session.scalars(select(DoctorDaySlots)).all() == []
+
+
+def test_create_tables_adds_cascades_to_existing_tables(tmp_path):
+    engine = database.init_engine(f"sqlite:///{tmp_path / 'old.db'}", 'prod')
+    with engine.begin() as conn:
+        conn.exec_driver_sql("CREATE TABLE doctors (id INTEGER PRIMARY KEY, name VARCHAR NOT NULL, specialization VARCHAR, "
+                             "contact_info VARCHAR, department_id INTEGER)")
+        conn.exec_driver_sql("CREATE TABLE medical_records (id INTEGER PRIMARY KEY, patient_id INTEGER NOT NULL, "
+                             "doctor_id INTEGER NOT NULL REFERENCES doctors (id), record_date DATE, diagnosis VARCHAR, "
+                             "treatment TEXT)")
+        conn.exec_driver_sql("INSERT INTO doctors (id, name) VALUES (1, 'Dr. One')")
+        conn.exec_driver_sql("INSERT INTO medical_records VALUES (1, 1, 1, '2024-01-01', 'Flu', 'Rest')")
+    database.create_tables()
+    foreign_keys = inspect(engine).get_foreign_keys('medical_records')
+    assert {fk['referred_table']: fk['options'].get('ondelete') for fk in foreign_keys} == {'doctors': 'CASCADE',
+                                                                                           'patients': 'CASCADE'}
+    session = database.Session()
+    assert session.get(MedicalRecord, 1).diagnosis == "Flu"
+    assert [r.id for r in search_records(session, 'flu')] == [1]
+    session.close()
+    engine.dispose()
@@ -0,0 +1,53 @@
+import importlib
+import os
+import subprocess
+import sys
+
+from src.cli import LAZY_COMMANDS
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Cumulative `python -X importtime` microseconds allowed for `import src.cli`. It is about 70 ms with
+# click alone; importing SQLAlchemy (what every command module needs) takes ten times that.
+IMPORT_BUDGET_US = 300000
+
+
+def _python(code, tmp_path):
+    env = {**os.environ, 'DATABASE_URL': f"sqlite:///{tmp_path / 'hospital.db'}"}
+    return subprocess.run([sys.executable, *code], cwd=ROOT, env=env, capture_output=True, text=True, check=True)
+
+
+def test_cli_import_stays_within_budget(tmp_path):
+    # Fresh interpreter, so nothing this test session already imported counts as free.
+    result = _python(['-X', 'importtime', '-c', 'import src.cli'], tmp_path)
+    modules = {}
+    for line in result.stderr.splitlines():
+        if line.startswith('import time:') and '|' in line:
+            _, cumulative, name = line.split('|')
+            if cumulative.strip().isdigit():
+                modules[name.strip()] = int(cumulative)
+    assert modules['src.cli'] < IMPORT_BUDGET_US
+    assert not {'sqlalchemy', 'config.settings', 'src.database', 'src.models'} & set(modules)
+
+
+def test_help_lists_every_command_without_importing_them(tmp_path):
+    script = ("import sys; from src.cli import cli; cli.main(['--help'], standalone_mode=False); "
+              "print(sorted(m for m in sys.modules if m.startswith(('sqlalchemy', 'src.'))))")
+    result = _python(['-c', script], tmp_path)
+    for name in LAZY_COMMANDS:
+        assert f"  {name} " in result.stdout
+    assert result.stdout.strip().splitlines()[-1] == "['src.cli']"
+    assert not os.path.exists(tmp_path / 'hospital.db')
+
+
+def test_registered_help_matches_the_commands():
+    for name, (module, attribute, help_text) in LAZY_COMMANDS.items():
+        command = getattr(importlib.import_module(module), attribute)
+        assert command.name == name
+        assert command.help == help_text
+
+
+def test_engine_is_created_on_first_use(tmp_path):
+    script = ("from src import database; assert 'engine' not in vars(database); "
+              "session = database.Session(); print(session.get_bind().url.database); session.close()")
+    result = _python(['-c', script], tmp_path)
+    assert result.stdout.strip() == str(tmp_path / 'hospital.db')
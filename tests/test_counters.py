@@ -0,0 +1,103 @@
+from datetime import date, datetime, timedelta
+
+from click.testing import CliRunner
+from sqlalchemy import insert, select
+
+from src.bulk_updates import appointment_filter, bulk_set_status
+from src.archive import archive_rows
+from src.cascade import delete_with_dependants
+from src.cli import cli
+from src.counters import reconcile
+from src.models import (Appointment, AppointmentStatus, Department, DepartmentCounts, Doctor, DoctorAppointmentCounts,
+                        DoctorRecordCounts, MedicalRecord, OutPatient, Patient)
+from src.profiler import QueryProfiler
+
+MONDAY = datetime(2030, 1, 7, 9)
+
+
+def add_people(session):
+    session.add_all([Department(id=1, name="Cardiology"), Department(id=2, name="Neurology")])
+    session.flush()   # departments and doctors point at each other; the flush cannot order them
+    session.add_all([Doctor(id=i, name=f"Dr. {i}", department_id=1 if i < 3 else 2) for i in (1, 2, 3)])
+    session.add_all([OutPatient(id=i, name=f"Patient {i}", date_of_birth=date(1990, 1, 1)) for i in (1, 2)])
+    session.commit()
+
+
+def stored(session):
+    return {
+        'departments': dict(session.execute(select(DepartmentCounts.department_id, DepartmentCounts.doctors)).all()),
+        'appointments': {(doctor_id, status): n for doctor_id, status, n in session.execute(
+            select(DoctorAppointmentCounts.doctor_id, DoctorAppointmentCounts.status,
+                   DoctorAppointmentCounts.appointments)) if n},
+        'records': {doctor_id: n for doctor_id, n in session.execute(
+            select(DoctorRecordCounts.doctor_id, DoctorRecordCounts.records)) if n},
+    }
+
+
+def test_orm_writes_keep_the_counters_in_step(db_engine, session):
+    add_people(session)
+    session.add_all([Appointment(patient_id=1 + i % 2, doctor_id=1 + i % 3, appointment_datetime=MONDAY + timedelta(days=i))
+                     for i in range(6)])
+    session.add_all([MedicalRecord(patient_id=1, doctor_id=1, diagnosis="Asthma"),
+                     MedicalRecord(patient_id=2, doctor_id=3, diagnosis="Flu")])
+    session.commit()
+    scheduled, completed = AppointmentStatus.SCHEDULED, AppointmentStatus.COMPLETED
+    assert stored(session) == {'departments': {1: 2, 2: 1},
+                               'appointments': {(1, scheduled): 2, (2, scheduled): 2, (3, scheduled): 2},
+                               'records': {1: 1, 3: 1}}
+
+    first = session.get(Appointment, 1)
+    first.status, first.doctor_id = completed, 2
+    session.get(Doctor, 3).department_id = 1
+    session.delete(session.get(Appointment, 2))
+    session.delete(session.get(Patient, 2))   # its appointments and records go by ON DELETE CASCADE
+    session.commit()
+    assert stored(session) == {'departments': {1: 3, 2: 0},
+                               'appointments': {(2, completed): 1, (2, scheduled): 1, (3, scheduled): 1},
+                               'records': {1: 1}}
+    assert reconcile(db_engine) == {'department_counts': 0, 'doctor_appointment_counts': 0, 'doctor_record_counts': 0}
+
+
+def test_core_writes_adjust_the_counters(db_engine, session):
+    add_people(session)
+    with db_engine.begin() as conn:
+        conn.execute(insert(Appointment.__table__), [
+            {'patient_id': 1 + i % 2, 'doctor_id': 1 + i % 3, 'appointment_datetime': MONDAY + timedelta(days=i - 50),
+             'duration_minutes': 30, 'status': AppointmentStatus.SCHEDULED} for i in range(100)])
+        conn.execute(insert(MedicalRecord.__table__), [
+            {'patient_id': 1 + i % 2, 'doctor_id': 1 + i % 3, 'record_date': date(2020, 1, 1) + timedelta(days=i)}
+            for i in range(30)])
+    # Bulk inserts bypass the listeners; reconcile reports and fixes what they left behind.
+    assert reconcile(db_engine) == {'department_counts': 0, 'doctor_appointment_counts': 3, 'doctor_record_counts': 3}
+
+    where, params = appointment_filter(AppointmentStatus.COMPLETED, date_to=MONDAY)
+    bulk_set_status(db_engine, AppointmentStatus.COMPLETED, where, params, chunk_size=7)
+    archive_rows(db_engine, MONDAY - timedelta(days=20), chunk_size=4)
+    delete_with_dependants(session, session.get(Patient, 2), chunk_size=5)
+    before = stored(session)
+    assert reconcile(db_engine) == {'department_counts': 0, 'doctor_appointment_counts': 0, 'doctor_record_counts': 0}
+    assert stored(session) == before
+
+
+def test_overview_reads_counters_not_rows(db_engine, session):
+    add_people(session)
+    session.add_all([Appointment(patient_id=1, doctor_id=1 + i % 3, appointment_datetime=MONDAY + timedelta(days=i))
+                     for i in range(300)])
+    session.add(MedicalRecord(patient_id=1, doctor_id=3, diagnosis="Flu"))
+    session.commit()
+    session.close()
+
+    with QueryProfiler(db_engine, max_statements=3):
+        output = CliRunner().invoke(cli, ['department', 'overview']).output
+    lines = output.splitlines()
+    assert lines[1].split() == ['1', 'Cardiology', 'None', '2', '200', '0', '0', '0']
+    assert lines[2].split() == ['2', 'Neurology', 'None', '1', '100', '0', '0', '1']
+
+    # Without the doctors loaded, the staff count is one primary-key read of the counter.
+    department = session.get(Department, 1)
+    with QueryProfiler(db_engine, max_statements=1):
+        assert department.get_staff_count(session) == 2
+
+    with db_engine.begin() as conn:
+        conn.execute(DepartmentCounts.__table__.update().values(doctors=0))
+    assert CliRunner().invoke(cli, ['db', 'reconcile']).output.splitlines()[0] == "department_counts: 2 counts corrected"
@@ -0,0 +1,33 @@
+import pytest
+from sqlalchemy import text
+
+from src.database import ENGINE_PROFILES, make_engine
+
+
+def test_prod_profile_applies_pragmas_on_connect(tmp_path):
+    engine = make_engine(f"sqlite:///{tmp_path / 'prod.db'}", 'prod')
+    with engine.connect() as conn:
+        assert conn.execute(text("PRAGMA journal_mode")).scalar() == 'wal'
+        assert conn.execute(text("PRAGMA synchronous")).scalar() == 1  # NORMAL
+        assert conn.execute(text("PRAGMA busy_timeout")).scalar() == 5000
+        assert conn.execute(text("PRAGMA temp_store")).scalar() == 2  # MEMORY
+    assert engine.pool.size() == ENGINE_PROFILES['prod']['pool']['pool_size']
+    assert engine.echo is False
+
+
+def test_dev_profile_keeps_sqlite_defaults(tmp_path):
+    engine = make_engine(f"sqlite:///{tmp_path / 'dev.db'}", 'dev')
+    with engine.connect() as conn:
+        assert conn.execute(text("PRAGMA journal_mode")).scalar() == 'delete'
+    assert engine.echo is True
+
+
+def test_memory_database_skips_pool_sizing():
+    engine = make_engine("sqlite://", 'prod')
+    with engine.connect() as conn:
+        assert conn.execute(text("SELECT 1")).scalar() == 1
+
+
+def test_unknown_profile_is_rejected():
+    with pytest.raises(ValueError, match='turbo'):
+        make_engine("sqlite://", 'turbo')
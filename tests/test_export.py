@@ -0,0 +1,45 @@
+import csv
+import gzip
+import json
+
+from click.testing import CliRunner
+
+from src.cli import cli
+from src.seed import seed_database
+
+
+def read_jsonl(path):
+    with open(path, encoding='utf-8') as handle:
+        return [json.loads(line) for line in handle]
+
+
+def test_export_all_jsonl(db_engine, tmp_path):
+    seed_database()
+    out = tmp_path / 'export'
+    result = CliRunner().invoke(cli, ['export', 'all', str(out), '--shard-rows', '2'])
+    assert result.exit_code == 0, result.output
+    assert "patients: 4 rows" in result.output
+
+    manifest = json.loads((out / 'manifest.json').read_text())
+    assert manifest['tables'] == {'patients': 4, 'doctors': 4, 'departments': 3, 'appointments': 4, 'medical_records': 4}
+
+    patients = read_jsonl(out / 'patients' / 'part-00001.jsonl') + read_jsonl(out / 'patients' / 'part-00002.jsonl')
+    alice = next(p for p in patients if p['name'] == 'Alice Johnson')
+    assert alice['patient_type'] == 'inpatient'
+    assert alice['room_number'] == '101A'
+    assert alice['admission_date'] == '2023-10-01'
+    assert alice['last_visit_date'] is None
+
+
+def test_export_table_gzip_csv_in_parallel(db_engine, tmp_path):
+    seed_database()
+    out = tmp_path / 'export'
+    result = CliRunner().invoke(cli, ['export', 'table', 'medical_records', str(out),
+                                      '--format', 'csv', '--compress', 'gzip', '--workers', '2', '--shard-rows', '1'])
+    assert result.exit_code == 0, result.output
+
+    rows = []
+    for shard in sorted((out / 'medical_records').glob('part-*.csv.gz')):
+        with gzip.open(shard, 'rt', encoding='utf-8', newline='') as handle:
+            rows.extend(csv.DictReader(handle))
+    assert sorted(row['diagnosis'] for row in rows) == ['Appendicitis', 'Chest Pain', 'Common Cold', 'Hypertension']
@@ -0,0 +1,65 @@
+from datetime import date
+
+from click.testing import CliRunner
+from sqlalchemy import insert
+
+from src.cli import cli
+from src.models import Doctor, MedicalRecord, Patient, PatientType
+from src.profiler import QueryProfiler
+
+
+def add_patients(engine, count):
+    with engine.begin() as conn:
+        conn.execute(insert(Patient.__table__), [
+            {'id': i, 'name': f"Patient {i}", 'date_of_birth': date(1990, 1, 1), 'patient_type': PatientType.OUTPATIENT}
+            for i in range(1, count + 1)
+        ])
+
+
+def listed_ids(output):
+    return [int(line.split(',')[0].split(':')[1]) for line in output.splitlines() if line.startswith('ID:')]
+
+
+def test_patient_list_keyset_pages(db_engine):
+    add_patients(db_engine, 25)
+    runner = CliRunner()
+
+    first = runner.invoke(cli, ['patient', 'list', '--limit', '10'])
+    assert listed_ids(first.output) == list(range(1, 11))
+    assert '--after-id 10 --limit 10' in first.output
+
+    second = runner.invoke(cli, ['patient', 'list', '--limit', '10', '--after-id', '10'])
+    assert listed_ids(second.output) == list(range(11, 21))
+
+    last = runner.invoke(cli, ['patient', 'list', '--limit', '10', '--after-id', '20'])
+    assert listed_ids(last.output) == list(range(21, 26))
+    assert '--after-id' not in last.output
+
+
+def test_list_records_streams_on_a_single_cursor(db_engine):
+    add_patients(db_engine, 1)
+    with db_engine.begin() as conn:
+        conn.execute(insert(Doctor.__table__).values(id=1, name="Dr. One"))
+        conn.execute(insert(MedicalRecord.__table__), [
+            {'patient_id': 1, 'doctor_id': 1, 'record_date': date(2024, 1, 1), 'diagnosis': f"D{i}", 'treatment': 'T'}
+            for i in range(2500)
+        ])
+    with QueryProfiler(db_engine, max_statements=1):
+        result = CliRunner().invoke(cli, ['patient', 'list-records'])
+    assert result.output.count('Diagnosis:') == 2500
+
+
+def test_empty_listing_messages(db_engine):
+    runner = CliRunner()
+    assert "No doctors found." in runner.invoke(cli, ['doctor', 'list']).output
+    assert "No appointments found." in runner.invoke(cli, ['appointment', 'list', '--limit', '5']).output
+
+
+def test_limit_must_be_positive(db_engine):
+    add_patients(db_engine, 3)
+    runner = CliRunner()
+    for limit in ('0', '-1'):
+        result = runner.invoke(cli, ['patient', 'list', '--limit', limit])
+        assert result.exit_code == 2
+        assert "Invalid value for '--limit'" in result.output
+        assert 'ID:' not in result.output
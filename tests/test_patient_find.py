@@ -0,0 +1,91 @@
+from datetime import date
+
+from click.testing import CliRunner
+from prompt_toolkit.document import Document
+from sqlalchemy import insert
+
+from src.cli import cli
+from src.models import OutPatient, Patient, PatientType
+from src.search import find_patients
+
+PATIENTS = [
+    # id, name, date of birth, contact
+    (1, "John Smith", date(1985, 3, 14), "0712 345 678"),
+    (2, "Johnny Walker", date(1990, 7, 1), "johnny@example.com"),
+    (3, "Mary Johnson", date(1985, 11, 2), "mary.j@example.org"),
+    (4, "John", date(2001, 5, 5), "0799 000 111"),
+    (5, "Albert Smithers", date(1985, 3, 30), None),
+]
+
+
+def add_patients(engine):
+    # Core inserts, like seed/import: the triggers must index them too.
+    with engine.begin() as conn:
+        conn.execute(insert(Patient.__table__), [
+            {'id': i, 'name': name, 'date_of_birth': dob, 'contact_info': contact, 'patient_type': PatientType.OUTPATIENT}
+            for i, name, dob, contact in PATIENTS
+        ])
+        conn.execute(insert(OutPatient.__table__), [{'id': i} for i, *_ in PATIENTS])
+
+
+def ids(rows):
+    return [row.id for row in rows]
+
+
+def test_exact_then_prefix_then_substring(db_engine, session):
+    add_patients(db_engine)
+    # Exact name first, then the query as a whole word, then as the start of a word, then anywhere.
+    assert ids(find_patients(session, 'john')) == [4, 1, 2, 3]
+    assert ids(find_patients(session, 'SMITH')) == [1, 5]
+    assert ids(find_patients(session, 'john', limit=2)) == [4, 1]
+    # Every word has to match, in any field.
+    assert sorted(ids(find_patients(session, 'smith 1985'))) == [1, 5]
+    assert ids(find_patients(session, 'smith 1985-03-14')) == [1]
+    assert ids(find_patients(session, '14/03/1985')) == [1]
+    assert ids(find_patients(session, '0712')) == [1]
+    assert ids(find_patients(session, 'example.org')) == [3]
+    assert find_patients(session, 'nobody') == []
+    assert find_patients(session, '  ') == []
+
+
+def test_short_queries_use_the_name_index(db_engine, session):
+    add_patients(db_engine)
+    assert ids(find_patients(session, 'jo')) == [4, 1, 2]
+    assert ids(find_patients(session, 'Al')) == [5]
+    # A short word next to a long one only narrows the trigram matches.
+    assert ids(find_patients(session, 'john sm')) == [1]
+    assert sorted(ids(find_patients(session, 'john @'))) == [2, 3]
+    assert ids(find_patients(session, '%')) == []
+
+
+def test_index_follows_orm_updates_and_deletes(db_engine, session):
+    add_patients(db_engine)
+    patient = session.get(Patient, 2)
+    patient.name = "Jane Walker"
+    patient.contact_info = "0700 111 222"
+    session.commit()
+    assert ids(find_patients(session, 'johnny')) == []
+    assert ids(find_patients(session, 'jane')) == [2]
+    assert ids(find_patients(session, '111 222')) == [2]
+
+    session.delete(session.get(Patient, 3))
+    session.commit()
+    assert ids(find_patients(session, 'mary')) == []
+
+
+def test_cli_find(db_engine):
+    add_patients(db_engine)
+    runner = CliRunner()
+    result = runner.invoke(cli, ['patient', 'find', 'smith', '--limit', '1'])
+    assert result.output == "ID: 1, Name: John Smith, Type: outpatient, DOB: 1985-03-14, Contact: 0712 345 678\n"
+    assert "No matching patients found." in runner.invoke(cli, ['patient', 'find', 'zzz']).output
+
+
+def test_menu_typeahead_inserts_the_id(db_engine, session):
+    menu = __import__('menu')
+    add_patients(db_engine)
+    completer = menu.PatientCompleter(session)
+    completions = list(completer.get_completions(Document('mary'), None))
+    assert [(c.text, c.start_position, c.display_text) for c in completions] == [('3', -4, "Mary Johnson (1985-11-02)")]
+    # A typed ID needs no suggestions.
+    assert list(completer.get_completions(Document('42'), None)) == []
@@ -0,0 +1,118 @@
+import json
+from datetime import date
+
+import pytest
+from click.testing import CliRunner
+
+from src.cli import cli
+from src.models import InPatient, OutPatient, Patient
+from src import patient_summary
+from src.patient_import import import_patients, validate_row
+
+CSV_ROWS = """name,dob,contact,type,room,admission,discharge,last_visit
+Alice Johnson,1985-03-10,alice@example.com,inpatient,101A,2023-10-01,,
+Bob Williams,1990-07-25,bob@example.com,outpatient,,,,2024-01-15
+,1990-01-01,,outpatient,,,,
+Carol Davis,1970-13-01,carol@example.com,inpatient,203B,2024-01-10,,
+Dan Evans,1970-01-01,,inpatient,7,2024-02-10,2024-02-01,
+Erin Ford,2000-05-20,erin@example.com,outpatient,,,,
+"""
+
+
+def test_validate_row_reports_the_problem():
+    with pytest.raises(ValueError, match="type must be"):
+        validate_row({'name': 'X', 'dob': '2000-01-01', 'type': 'visitor'})
+    with pytest.raises(ValueError, match="invalid dob"):
+        validate_row({'name': 'X', 'dob': '01/02/2000', 'type': 'outpatient'})
+
+
+def test_csv_import_with_rejects(db_engine, session, tmp_path):
+    source = tmp_path / 'patients.csv'
+    source.write_text(CSV_ROWS)
+
+    result = CliRunner().invoke(cli, ['patient', 'import', str(source), '--batch-size', '2'])
+    assert result.exit_code == 0, result.output
+    assert "Imported 3 patients" in result.output
+    assert "3 rows rejected" in result.output
+
+    alice = session.query(Patient).filter_by(name='Alice Johnson').one()
+    assert isinstance(alice, InPatient)
+    assert alice.room_number == '101A'
+    assert alice.admission_date == date(2023, 10, 1)
+    bob = session.query(Patient).filter_by(name='Bob Williams').one()
+    assert isinstance(bob, OutPatient)
+    assert bob.last_visit_date == date(2024, 1, 15)
+
+    rejects = [json.loads(line) for line in (tmp_path / 'patients.csv.rejected.jsonl').read_text().splitlines()]
+    assert [(r['line'], r['error']) for r in rejects] == [
+        (4, "name is required"),
+        (5, "invalid dob date '1970-13-01' (expected YYYY-MM-DD)"),
+        (6, "discharge date is before admission date"),
+    ]
+
+
+def test_jsonl_import_resumes_from_checkpoint(db_engine, session, tmp_path):
+    source = tmp_path / 'patients.jsonl'
+    source.write_text("\n".join(
+        json.dumps({'name': f"Patient {i}", 'dob': '1990-01-01', 'type': 'outpatient'}) for i in range(10)
+    ) + "\n")
+
+    def crash_after_first_batch(state):
+        raise RuntimeError("power cut")
+
+    with pytest.raises(RuntimeError):
+        import_patients(db_engine, str(source), batch_size=4, progress=crash_after_first_batch)
+    assert session.query(Patient).count() == 4
+
+    state = import_patients(db_engine, str(source), batch_size=4)
+    assert state['imported_this_run'] == 6
+    assert state['rows_done'] == 10
+    assert [p.name for p in session.query(Patient).order_by(Patient.id)] == [f"Patient {i}" for i in range(10)]
+
+    # Running again after completion is a no-op; --restart would start over.
+    assert import_patients(db_engine, str(source), batch_size=4)['imported_this_run'] == 0
+
+
+def test_a_batch_and_its_checkpoint_commit_together(db_engine, session, tmp_path, monkeypatch):
+    source = tmp_path / 'patients.jsonl'
+    source.write_text("\n".join(
+        json.dumps({'name': f"Patient {i}", 'dob': '1990-01-01' if i % 3 else 'soon', 'type': 'outpatient'})
+        for i in range(8)
+    ) + "\n")
+
+    # The second batch is written but its transaction never commits.
+    calls = []
+    refresh = patient_summary.refresh
+
+    def crash_in_second_batch(conn, patient_ids):
+        calls.append(patient_ids)
+        if len(calls) == 2:
+            raise RuntimeError("power cut")
+        refresh(conn, patient_ids)
+
+    monkeypatch.setattr(patient_summary, 'refresh', crash_in_second_batch)
+    with pytest.raises(RuntimeError):
+        import_patients(db_engine, str(source), batch_size=4)
+    assert session.query(Patient).count() == 2
+    monkeypatch.undo()
+
+    state = import_patients(db_engine, str(source), batch_size=4)
+    assert (state['rows_done'], state['imported'], state['rejected']) == (8, 5, 3)
+    assert [p.name for p in session.query(Patient).order_by(Patient.id)] == [
+        f"Patient {i}" for i in range(8) if i % 3]
+    rejects = [json.loads(line)['line'] for line in (tmp_path / 'patients.jsonl.rejected.jsonl').read_text().splitlines()]
+    assert rejects == [1, 4, 7]
+
+
+def test_a_new_file_at_the_same_path_is_imported_from_the_start(db_engine, session, tmp_path):
+    source = tmp_path / 'daily.csv'
+    source.write_text("name,dob,type\nAnn,1990-01-01,outpatient\n,1990-01-01,outpatient\n")
+    assert import_patients(db_engine, str(source))['imported_this_run'] == 1
+    assert import_patients(db_engine, str(source))['imported_this_run'] == 0   # same file: nothing left
+
+    # The next day's file replaces it under the same name.
+    source.write_text("name,dob,type\nBen,1991-02-02,outpatient\nCid,1992-03-03,outpatient\nDee,1993-04-04,outpatient\n")
+    state = import_patients(db_engine, str(source))
+    assert (state['imported_this_run'], state['rows_done'], state['rejected']) == (3, 3, 0)
+    assert [p.name for p in session.query(Patient).order_by(Patient.id)] == ['Ann', 'Ben', 'Cid', 'Dee']
+    assert not (tmp_path / 'daily.csv.rejected.jsonl').exists()   # the old file's reject went with it
@@ -0,0 +1,107 @@
+from datetime import date, datetime, timedelta
+
+from click.testing import CliRunner
+from sqlalchemy import insert, select
+
+from src.archive import archive_rows
+from src.bulk_updates import appointment_filter, bulk_set_status
+from src.cascade import delete_with_dependants
+from src.cli import cli
+from src.models import (Appointment, AppointmentStatus, Department, Doctor, InPatient, MedicalRecord, OutPatient,
+                        PatientSummary)
+from src.patient_summary import rebuild
+from src.profiler import QueryProfiler
+
+MONDAY = datetime(2030, 1, 7, 9)
+
+
+def add_people(session):
+    session.add(Department(id=1, name="Cardiology"))
+    session.flush()
+    session.add_all([Doctor(id=1, name="Dr. One", department_id=1), Doctor(id=2, name="Dr. Two", department_id=1)])
+    session.add_all([InPatient(id=1, name="Ann", date_of_birth=date(1980, 1, 1), room_number="101A",
+                               admission_date=date(2029, 12, 30)),
+                     OutPatient(id=2, name="Bob", date_of_birth=date(1990, 1, 1))])
+    session.commit()
+
+
+def summaries(session):
+    table = PatientSummary.__table__
+    return {row.patient_id: tuple(row) for row in session.execute(select(table).order_by(table.c.patient_id))}
+
+
+def rebuilt(engine, session):
+    # What a full rebuild computes, for comparison with the incrementally kept rows.
+    session.commit()
+    with engine.begin() as conn:
+        rebuild(conn)
+    return summaries(session)
+
+
+def show(patient_id):
+    return CliRunner().invoke(cli, ['patient', 'show', str(patient_id)]).output
+
+
+def test_orm_writes_keep_the_summary_in_step(db_engine, session):
+    add_people(session)
+    assert "Visits: 0 (last: None)" in show(2)
+    completed, scheduled = AppointmentStatus.COMPLETED, AppointmentStatus.SCHEDULED
+    session.add_all([
+        Appointment(id=1, patient_id=1, doctor_id=1, appointment_datetime=MONDAY - timedelta(days=7), status=completed),
+        Appointment(id=2, patient_id=1, doctor_id=2, appointment_datetime=MONDAY + timedelta(days=1), status=scheduled),
+        Appointment(id=3, patient_id=1, doctor_id=1, appointment_datetime=MONDAY, status=scheduled),
+        MedicalRecord(id=1, patient_id=1, doctor_id=1, record_date=date(2029, 12, 1), diagnosis="Asthma"),
+        MedicalRecord(id=2, patient_id=1, doctor_id=2, record_date=date(2029, 12, 20), diagnosis="Flu"),
+    ])
+    session.commit()
+
+    with QueryProfiler(db_engine, max_statements=1):
+        output = show(1)
+    assert "Inpatient stay: open since 2029-12-30, room 101A" in output
+    assert "Visits: 1 (last: 2029-12-31 09:00)" in output
+    assert "Next appointment: 2030-01-07 09:00 with Dr. One (Appointment ID 3)" in output
+    assert "Latest diagnosis: Flu on 2029-12-20 (Record ID 2)" in output
+
+    session.get(Appointment, 3).status = completed
+    session.get(MedicalRecord, 2).patient_id = 2
+    session.get(InPatient, 1).discharge_date = date(2030, 1, 10)
+    session.commit()
+    output = show(1)
+    assert "Inpatient stay" not in output and "Visits: 2 (last: 2030-01-07 09:00)" in output
+    assert "Next appointment: 2030-01-08 09:00 with Dr. Two (Appointment ID 2)" in output
+    assert "Latest diagnosis: Asthma" in output and "Latest diagnosis: Flu" in show(2)
+
+    session.delete(session.get(Doctor, 2))   # appointment 2 and record 2 go by ON DELETE CASCADE
+    session.commit()
+    assert "Next appointment: None" in show(1) and "Latest diagnosis: None" in show(2)
+    before = summaries(session)
+    assert rebuilt(db_engine, session) == before
+
+
+def test_core_writes_refresh_the_summaries(db_engine, session, tmp_path):
+    add_people(session)
+    with db_engine.begin() as conn:
+        conn.execute(insert(Appointment.__table__), [
+            {'patient_id': 1 + i % 2, 'doctor_id': 1 + i % 2, 'appointment_datetime': MONDAY + timedelta(days=i - 50),
+             'duration_minutes': 30, 'status': AppointmentStatus.SCHEDULED} for i in range(100)])
+        conn.execute(insert(MedicalRecord.__table__), [
+            {'patient_id': 1 + i % 2, 'doctor_id': 1 + i % 2, 'record_date': date(2029, 1, 1) + timedelta(days=i),
+             'diagnosis': f"Diagnosis {i}"} for i in range(30)])
+    before = rebuilt(db_engine, session)
+
+    where, params = appointment_filter(AppointmentStatus.COMPLETED, date_to=MONDAY)
+    bulk_set_status(db_engine, AppointmentStatus.COMPLETED, where, params, chunk_size=7)
+    current = summaries(session)
+    assert current != before
+    assert rebuilt(db_engine, session) == current
+
+    archive_rows(db_engine, MONDAY - timedelta(days=20), chunk_size=4)
+    delete_with_dependants(session, session.get(Doctor, 2), chunk_size=5)
+    after = summaries(session)
+    assert after[2][1:] == (0,) + (None,) * 9   # every row of Bob's was with Dr. Two
+    assert rebuilt(db_engine, session) == after
+
+    (tmp_path / 'patients.csv').write_text("name,dob,type,room,admission\n"
+                                           "Cy,1970-05-05,inpatient,202B,2030-01-02\n")
+    assert CliRunner().invoke(cli, ['patient', 'import', str(tmp_path / 'patients.csv')]).exit_code == 0
+    assert "Inpatient stay: open since 2030-01-02, room 202B" in show(3)
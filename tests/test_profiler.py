@@ -0,0 +1,42 @@
+import pytest
+from click.testing import CliRunner
+from sqlalchemy import text
+
+from src.cli import cli
+from src.profiler import QueryBudgetExceeded, QueryProfiler, fingerprint
+
+
+def test_fingerprint_ignores_literal_values():
+    assert fingerprint("SELECT name FROM departments WHERE id = 3") == \
+        fingerprint("SELECT name FROM departments\n WHERE id = 42")
+    assert fingerprint("SELECT * FROM patients WHERE name = 'Bob' AND id IN (?, ?, ?)") == \
+        "SELECT * FROM patients WHERE name = ? AND id IN (?)"
+
+
+def test_repeated_statements_are_flagged(db_engine):
+    with QueryProfiler(db_engine) as profiler:
+        with db_engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
+            for department_id in range(10):
+                conn.execute(text("SELECT name FROM departments WHERE id = :id"), {'id': department_id})
+    assert profiler.statement_count == 11
+    assert profiler.repeated() == [("SELECT name FROM departments WHERE id = ?", 10)]
+    assert [tuple(parameters) for parameters in profiler.parameters[-2:]] == [(8,), (9,)]
+    assert "Possible N+1" in profiler.summary()
+    assert profiler.percentile(50) <= profiler.percentile(95) <= max(s for _, s in profiler.statements)
+
+
+def test_budget_exceeded_fails(db_engine):
+    with pytest.raises(QueryBudgetExceeded, match="at most 1 statements, got 2"):
+        with QueryProfiler(db_engine, max_statements=1):
+            with db_engine.connect() as conn:
+                conn.execute(text("SELECT 1"))
+                conn.execute(text("SELECT 2"))
+
+
+def test_cli_profile_flag_prints_summary(db_engine):
+    result = CliRunner().invoke(cli, ['--profile', 'doctor', 'list'])
+    assert result.exit_code == 0
+    assert "No doctors found." in result.output
+    assert "--- SQL profile ---" in result.output
+    assert "Statements: 1" in result.output
@@ -0,0 +1,88 @@
+# Listing commands must cost a constant number of statements, however many rows there are.
+from datetime import date, datetime, timedelta
+
+import pytest
+from click.testing import CliRunner
+from sqlalchemy import insert
+
+from src import database
+from src.cli import cli
+from src.models import (Appointment, AppointmentStatus, Department, Doctor, InPatient, MedicalRecord,
+                        OutPatient, Patient, PatientType)
+from src.profiler import QueryProfiler
+
+ROWS = 10_000
+DEPARTMENTS = 100
+
+
+@pytest.fixture(scope='module')
+def big_db(tmp_path_factory):
+    engine = database.init_engine(f"sqlite:///{tmp_path_factory.mktemp('n_plus_one') / 'hospital.db'}", 'prod')
+    database.Base.metadata.create_all(engine)
+    with engine.begin() as conn:
+        conn.execute(insert(Department.__table__), [
+            {'id': i, 'name': f"Department {i}", 'specialty': f"Specialty {i % 10}"} for i in range(1, DEPARTMENTS + 1)
+        ])
+        conn.execute(insert(Doctor.__table__), [
+            {'id': i, 'name': f"Dr. {i}", 'specialization': f"Specialty {i % 10}", 'department_id': 1 + i % DEPARTMENTS}
+            for i in range(1, ROWS + 1)
+        ])
+        conn.execute(Department.__table__.update().values(head_doctor_id=Department.__table__.c.id))
+        conn.execute(insert(Patient.__table__), [
+            {'id': i, 'name': f"Patient {i}", 'date_of_birth': date(1980, 1, 1),
+             'patient_type': PatientType.INPATIENT if i % 2 else PatientType.OUTPATIENT}
+            for i in range(1, ROWS + 1)
+        ])
+        conn.execute(insert(InPatient.__table__), [{'id': i, 'room_number': str(i)} for i in range(1, ROWS + 1, 2)])
+        conn.execute(insert(OutPatient.__table__), [{'id': i} for i in range(2, ROWS + 1, 2)])
+        start = datetime(2025, 1, 1, 9, 0)
+        conn.execute(insert(Appointment.__table__), [
+            {'patient_id': i, 'doctor_id': 1 + i % ROWS, 'appointment_datetime': start + timedelta(minutes=30 * i),
+             'reason': 'Checkup', 'status': AppointmentStatus.SCHEDULED}
+            for i in range(1, ROWS + 1)
+        ])
+        conn.execute(insert(MedicalRecord.__table__), [
+            {'patient_id': i, 'doctor_id': 1 + i % ROWS, 'record_date': date(2024, 1, 1),
+             'diagnosis': 'Common Cold', 'treatment': 'Rest and fluids'}
+            for i in range(1, ROWS + 1)
+        ])
+    yield engine
+    engine.dispose()
+
+
+@pytest.mark.parametrize('args, expected', [
+    (['doctor', 'list'], 1),
+    (['doctor', 'filter', 'Specialty 3'], 1),
+    (['department', 'list'], 1),
+    (['department', 'show', '1'], 2),
+    (['department', 'staff-list', '1'], 2),
+    (['department', 'list-dept-specialty-doctors', '1'], 2),
+    (['patient', 'list'], 1),
+    (['patient', 'list-records'], 1),
+    (['appointment', 'list'], 1),
+    (['appointment', 'list', '--doctor-id', '5'], 1),
+    (['appointment', 'list', '--with-names'], 1),
+])
+def test_cli_statement_count(big_db, args, expected):
+    with QueryProfiler(big_db, max_statements=expected) as profiler:
+        result = CliRunner().invoke(cli, args)
+    assert result.exit_code == 0, result.output
+    assert 'Error' not in result.output
+    assert profiler.statement_count == expected
+
+
+def test_appointment_list_with_names_shows_names(big_db):
+    result = CliRunner().invoke(cli, ['appointment', 'list', '--with-names', '--patient-id', '7'])
+    assert "Patient: Patient 7 (ID 7)" in result.output
+    assert "Doctor: Dr. 8 (ID 8)" in result.output
+
+
+@pytest.mark.parametrize('func', [
+    'list_patients', 'list_doctors', 'list_departments', 'list_appointments', 'list_medical_records',
+])
+def test_menu_statement_count(big_db, capsys, func):
+    menu = pytest.importorskip('menu')
+    with QueryProfiler(big_db, max_statements=1) as profiler:
+        getattr(menu, func)()
+    assert '❌' not in capsys.readouterr().out
+    assert profiler.statement_count == 1
@@ -0,0 +1,88 @@
+# Hot queries must be answered from an index. EXPLAIN QUERY PLAN reports a full
+# table scan as "SCAN <table>"; any such line here means an index is missing.
+from datetime import date, datetime
+
+import pytest
+from click.testing import CliRunner
+from sqlalchemy import select
+
+from src.cli import cli
+from src.models import Appointment, Doctor, DoctorDaySlots, DoctorShift, MedicalRecord, Patient
+from src.profiler import QueryProfiler
+from src.seed import seed_database
+
+
+def plan_scans(conn, statement, parameters):
+    rows = conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters).all()
+    details = [row[-1] for row in rows]
+    return [d for d in details if d.startswith('SCAN ') and d != 'SCAN CONSTANT ROW'], details
+
+
+@pytest.fixture
+def seeded(db_engine):
+    seed_database()
+    return db_engine
+
+
+def captured_statements(engine, args):
+    with QueryProfiler(engine) as profiler:
+        result = CliRunner().invoke(cli, args)
+    assert result.exit_code == 0, result.output
+    assert 'Error' not in result.output, result.output
+    return [(sql, parameters) for (sql, _), parameters in zip(profiler.statements, profiler.parameters)]
+
+
+@pytest.mark.parametrize('args', [
+    ['appointment', 'list', '--doctor-id', '1'],
+    ['appointment', 'list', '--patient-id', '1', '--with-names'],
+    ['doctor', 'filter', 'Cardiologist'],
+    ['department', 'show', '1'],
+    ['department', 'staff-list', '1'],
+    ['department', 'list-dept-specialty-doctors', '1'],
+    ['patient', 'list', '--after-id', '2', '--limit', '10'],
+    ['patient', 'list-records', '--after-id', '2', '--limit', '10'],
+    ['patient', 'find', 'Al'],
+    ['patient', 'list-records', '--patient-id', '1'],
+])
+def test_command_queries_use_indexes(seeded, args):
+    statements = captured_statements(seeded, args)
+    assert statements
+    with seeded.connect() as conn:
+        for statement, parameters in statements:
+            scans, details = plan_scans(conn, statement, parameters)
+            assert not scans, f"{statement}\n{details}"
+
+
+HOT_QUERIES = {
+    'doctor agenda': select(Appointment).where(
+        Appointment.doctor_id == 1,
+        Appointment.appointment_datetime >= datetime(2025, 1, 1),
+        Appointment.appointment_datetime < datetime(2025, 1, 8),
+    ).order_by(Appointment.appointment_datetime),
+    'patient appointments': select(Appointment).where(Appointment.patient_id == 1)
+        .order_by(Appointment.appointment_datetime.desc()),
+    'appointments on a day': select(Appointment).where(
+        Appointment.appointment_datetime >= datetime(2025, 1, 1),
+        Appointment.appointment_datetime < datetime(2025, 1, 2),
+    ),
+    'patient history': select(MedicalRecord).where(MedicalRecord.patient_id == 1)
+        .order_by(MedicalRecord.record_date.desc()),
+    'doctor records': select(MedicalRecord).where(MedicalRecord.doctor_id == 1,
+                                                  MedicalRecord.record_date >= date(2024, 1, 1)),
+    'department staff': select(Doctor).where(Doctor.department_id == 1),
+    'specialists': select(Doctor).where(Doctor.specialization == 'Surgeon'),
+    'patient by name': select(Patient.id).where(Patient.name == 'Alice Johnson'),
+    'department busy bitmaps': select(DoctorDaySlots.busy).join(Doctor, Doctor.id == DoctorDaySlots.doctor_id)
+        .where(Doctor.department_id == 1, DoctorDaySlots.day >= date(2025, 1, 1), DoctorDaySlots.day < date(2025, 1, 8)),
+    'department shifts': select(DoctorShift).join(Doctor, Doctor.id == DoctorShift.doctor_id)
+        .where(Doctor.specialization == 'Surgeon'),
+}
+
+
+@pytest.mark.parametrize('name', HOT_QUERIES)
+def test_hot_queries_use_indexes(seeded, name):
+    with seeded.connect() as conn:
+        compiled = HOT_QUERIES[name].compile(seeded)
+        # The plan does not depend on the bound values, only on their positions.
+        scans, details = plan_scans(conn, str(compiled), (None,) * len(compiled.positiontup))
+    assert not scans, f"{name}: {details}"
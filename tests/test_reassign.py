@@ -0,0 +1,86 @@
+from datetime import date, datetime, timedelta
+
+from click.testing import CliRunner
+from sqlalchemy import func, insert, select
+
+from src.cli import cli
+from src.models import (Appointment, AppointmentStatus, Department, Doctor, DoctorDaySlots, Patient, PatientType)
+from src.profiler import QueryProfiler
+
+MONDAY = datetime(2030, 1, 7, 10)
+
+
+def add_department(engine, leaving=10, busy=()):
+    """
+    Doctor 1 is leaving with `leaving` appointments (Mondays 10:00); doctors 2 and 3 are fellow
+    cardiologists, 4 is a surgeon of the same department and 5 a cardiologist elsewhere.
+    Doctor 2 already has four appointments that week; `busy` adds (doctor_id, start) bookings.
+    """
+    with engine.begin() as conn:
+        conn.execute(insert(Department.__table__), [{'id': 1, 'name': "Cardiology"}, {'id': 2, 'name': "Other"}])
+        conn.execute(insert(Doctor.__table__), [
+            {'id': 1, 'name': "Dr. Leaving", 'specialization': "Cardiologist", 'department_id': 1},
+            {'id': 2, 'name': "Dr. Busy", 'specialization': "Cardiologist", 'department_id': 1},
+            {'id': 3, 'name': "Dr. Free", 'specialization': "Cardiologist", 'department_id': 1},
+            {'id': 4, 'name': "Dr. Surgeon", 'specialization': "Surgeon", 'department_id': 1},
+            {'id': 5, 'name': "Dr. Elsewhere", 'specialization': "Cardiologist", 'department_id': 2}])
+        conn.execute(insert(Patient.__table__).values(id=1, name="Patient 1", date_of_birth=date(1990, 1, 1),
+                                                      patient_type=PatientType.OUTPATIENT))
+        bookings = ([(1, MONDAY + timedelta(weeks=i)) for i in range(leaving)]
+                    + [(2, MONDAY + timedelta(days=1, hours=i)) for i in range(4)] + list(busy))
+        conn.execute(insert(Appointment.__table__), [
+            {'patient_id': 1, 'doctor_id': doctor_id, 'appointment_datetime': start, 'duration_minutes': 30,
+             'status': AppointmentStatus.SCHEDULED} for doctor_id, start in bookings])
+
+
+def doctors_of(session):
+    return dict(session.execute(select(Appointment.doctor_id, func.count()).group_by(Appointment.doctor_id)).all())
+
+
+def invoke(*args):
+    return CliRunner().invoke(cli, list(args)).output
+
+
+def test_reassign_balances_the_load(db_engine, session):
+    add_department(db_engine)
+    output = invoke('doctor', 'reassign', '1', '--after', '2030-01-01 00:00')
+    assert "10 appointments of Dr. Leaving (Doctor ID 1) reassigned:" in output
+    assert "Dr. Busy (Doctor ID 2): +3 appointments, 210 min booked" in output
+    assert "Dr. Free (Doctor ID 3): +7 appointments, 210 min booked" in output
+    assert doctors_of(session) == {2: 7, 3: 7}
+
+
+def test_reassign_never_double_books_or_leaves_working_hours(db_engine, session):
+    evening = MONDAY.replace(hour=20) + timedelta(weeks=20)
+    add_department(db_engine, leaving=2, busy=[(2, MONDAY), (3, MONDAY + timedelta(minutes=15)),
+                                               (3, MONDAY + timedelta(weeks=1)), (1, evening)])
+    output = invoke('doctor', 'reassign', '1', '--after', '2030-01-01 00:00')
+    assert "2 appointments could not be placed" in output
+    assert "Appointment ID 1 on 2030-01-07 10:00" in output
+    assert "on 2030-05-27 20:00" in output
+    # The second Monday: doctor 3 is booked then, so doctor 2 takes it despite the higher load.
+    moved = session.scalars(select(Appointment.doctor_id).where(Appointment.id == 2)).one()
+    assert moved == 2
+    assert doctors_of(session)[1] == 2
+
+
+def test_reassign_dry_run_and_slot_bitmaps(db_engine, session):
+    add_department(db_engine, leaving=3)
+    assert "3 appointments of Dr. Leaving (Doctor ID 1) would be reassigned:" in invoke(
+        'doctor', 'reassign', '1', '--after', '2030-01-01 00:00', '--dry-run')
+    assert doctors_of(session) == {1: 3, 2: 4}
+
+    invoke('doctor', 'reassign', '1', '--after', '2030-01-01 00:00')
+    assert session.scalars(select(DoctorDaySlots.doctor_id).distinct()).all() == [3]
+    assert "Next free slot for doctor 3: 2030-01-07 10:30" in invoke(
+        'appointment', 'next-slot', '--doctor-id', '3', '--after', '2030-01-07 10:00')
+    assert "has no scheduled appointments" in invoke('doctor', 'reassign', '1', '--after', '2030-01-01 00:00')
+
+
+def test_reassign_is_batched(db_engine):
+    add_department(db_engine, leaving=500)
+    with QueryProfiler(db_engine) as profiler:
+        assert "500 appointments" in invoke('doctor', 'reassign', '1', '--after', '2030-01-01 00:00')
+    # Lookups, one schedule load per colleague, one UPDATE and one bitmap rebuild per doctor,
+    # then the counters and the patients' summaries.
+    assert profiler.statement_count <= 21
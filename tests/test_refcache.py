@@ -0,0 +1,74 @@
+from sqlalchemy import insert, update
+
+from src import database
+from src.models import Department, Doctor
+from src.profiler import QueryProfiler
+from src.refcache import ReferenceCache, cached_all, reference_cache
+
+
+def add_staff(engine):
+    with engine.begin() as conn:
+        conn.execute(insert(Department.__table__), [{'id': 1, 'name': "Cardiology"}, {'id': 2, 'name': "Neurology"}])
+        conn.execute(insert(Doctor.__table__), [{'id': i, 'name': f"Dr. {i}", 'department_id': 1} for i in (1, 2, 3)])
+
+
+def lookup(model, row_id, max_statements):
+    session = database.Session()
+    try:
+        with QueryProfiler(session.get_bind(), max_statements=max_statements):
+            obj = model.find_by_id(session, row_id)
+        return obj.name if obj is not None else None
+    finally:
+        session.close()
+
+
+def test_lookups_are_served_from_the_cache_until_a_commit_changes_the_row(db_engine):
+    add_staff(db_engine)
+    hits = reference_cache.hits
+    assert lookup(Doctor, 1, max_statements=1) == "Dr. 1"
+    assert lookup(Doctor, 1, max_statements=0) == "Dr. 1"
+    assert reference_cache.hits == hits + 1
+
+    # The cached copy is an ordinary persistent object in the new session: changes to it are saved.
+    session = database.Session()
+    doctor = Doctor.find_by_id(session, 1)
+    doctor.name = "Dr. Renamed"
+    assert lookup(Doctor, 1, max_statements=0) == "Dr. 1"   # not committed yet
+    session.commit()
+    session.close()
+    assert lookup(Doctor, 1, max_statements=1) == "Dr. Renamed"
+    assert lookup(Doctor, 2, max_statements=1) == "Dr. 2"
+    assert lookup(Doctor, 99, max_statements=1) is None
+    assert lookup(Doctor, 99, max_statements=1) is None     # misses are not cached
+
+
+def test_core_writes_evict_the_whole_table(db_engine):
+    add_staff(db_engine)
+    assert lookup(Department, 2, max_statements=1) == "Neurology"
+    with db_engine.begin() as conn:
+        conn.execute(update(Department.__table__).where(Department.__table__.c.id == 2).values(name="Neurosurgery"))
+    assert lookup(Department, 2, max_statements=1) == "Neurosurgery"
+
+
+def test_pick_lists_follow_inserts_and_ignore_rollbacks(db_engine, session):
+    add_staff(db_engine)
+    assert [d.name for d in cached_all(session, Department)] == ["Cardiology", "Neurology"]
+    session.add(Department(name="Oncology"))
+    session.flush()
+    session.rollback()
+    with QueryProfiler(db_engine, max_statements=0):
+        assert [d.name for d in cached_all(session, Department)] == ["Cardiology", "Neurology"]
+    Department.create(session, "Oncology")
+    assert [d.name for d in cached_all(session, Department)] == ["Cardiology", "Neurology", "Oncology"]
+
+
+def test_entries_expire_and_the_cache_stays_bounded():
+    cache = ReferenceCache(max_entries=2, ttl=0)
+    cache.put(('db', 'Doctor', 1), 'one')
+    assert cache.get(('db', 'Doctor', 1)) is None
+    assert cache.stats()['expirations'] == 1
+    cache.ttl = 60
+    for row_id in (1, 2, 3):
+        cache.put(('db', 'Doctor', row_id), row_id)
+    assert cache.get(('db', 'Doctor', 1)) is None and cache.get(('db', 'Doctor', 3)) == 3
+    assert cache.stats()['entries'] == 2
@@ -0,0 +1,127 @@
+from datetime import date
+
+import pytest
+from click.testing import CliRunner
+from sqlalchemy import insert, text
+
+from src.cli import cli
+from src.models import Department, InPatient, Patient, PatientType, Room
+from src.profiler import QueryProfiler
+from src.rooms import STAY_INDEX, RoomFull, check_admission, rebuild_stay_index
+
+
+def run(*args):
+    return CliRunner().invoke(cli, list(args)).output
+
+
+def indexed(session):
+    return session.execute(text(f"SELECT id, room_lo, day_lo, day_hi FROM {STAY_INDEX} ORDER BY id")).all()
+
+
+def test_admissions_into_a_full_room_are_refused(db_engine, session):
+    session.add(Department(id=1, name="Cardiology"))
+    session.commit()
+    assert "registered with 1 bed(s)" in run('inpatient', 'add-room', '300', '--department-id', '1')
+    admit = ('patient', 'add', '--name', "Ann", '--dob', '1990-01-01', '--contact', "ann@example.com",
+             '--type', 'inpatient', '--room', '300')
+    assert "added successfully" in run(*admit, '--admission', '2030-01-01', '--discharge', '2030-01-05')
+    # The bed is free again on the discharge day.
+    refused = run(*admit, '--admission', '2030-01-04', '--discharge', '2030-01-09')
+    assert "Room 300 has 1 bed and is full on 2030-01-04 (inpatient ID 1)." in refused
+    assert "added successfully" in run(*admit, '--admission', '2030-01-05', '--discharge', '2030-01-10')
+    assert "is full on 2030-01-05 (inpatient ID 2)" in run('patient', 'update', '1', '--discharge', '2030-01-07')
+    assert "Room 300 has a free bed" in run('inpatient', 'check', '300', '--from', '2029-12-01', '--to', '2030-01-01')
+    assert "Room 301 is not registered." in run('inpatient', 'check', '301', '--from', '2030-01-01')
+
+    # With two beds the stays may overlap; a third stay on a day both use is refused.
+    assert "2 bed(s)" in run('inpatient', 'update-room', '300', '--beds', '2')
+    assert "updated successfully" in run('patient', 'update', '1', '--discharge', '2030-01-07')
+    with QueryProfiler(db_engine, max_statements=3):
+        refused = run('inpatient', 'check', '300', '--from', '2029-12-20', '--to', '2030-02-01')
+    assert "is full on 2030-01-05 (inpatient IDs 1, 2)" in refused
+    assert "Room 300: 1 of 2 beds free" in run('inpatient', 'free-rooms', '--on', '2030-01-03')
+    assert "Room 300: 2/2 beds occupied" in run('inpatient', 'rooms', '--on', '2030-01-06', '--department-id', '1')
+    assert "No free beds on 2030-01-06." in run('inpatient', 'free-rooms', '--on', '2030-01-06')
+
+
+def test_triggers_keep_the_index_in_step(db_engine, session):
+    with db_engine.begin() as conn:
+        conn.execute(insert(Patient.__table__), [
+            {'id': i, 'name': f"Patient {i}", 'date_of_birth': date(1990, 1, 1), 'patient_type': PatientType.INPATIENT}
+            for i in (1, 2, 3)])
+        conn.execute(insert(InPatient.__table__), [
+            {'id': 1, 'room_number': '101', 'admission_date': date(2030, 1, 1), 'discharge_date': date(2030, 1, 3)},
+            {'id': 2, 'room_number': '102', 'admission_date': date(2030, 1, 2), 'discharge_date': None},
+            {'id': 3, 'room_number': '102', 'admission_date': None, 'discharge_date': None}])
+    assert indexed(session) == []   # no room is registered yet
+    assert run('inpatient', 'register-rooms', '--beds', '2') == "2 room(s) registered.\n"
+    rooms = {room.number: room.id for room in session.query(Room)}
+    first, last = date(2030, 1, 1).toordinal() + 1721424, date(2030, 1, 2).toordinal() + 1721424
+    assert indexed(session) == [(1, rooms['101'], first, last), (2, rooms['102'], last, 2 ** 31 - 1)]
+
+    session.get(InPatient, 2).room_number = '101'
+    session.get(InPatient, 3).admission_date = date(2030, 1, 2)
+    session.delete(session.get(Patient, 1))
+    session.get(Room, rooms['102']).number = '103'
+    session.commit()
+    assert indexed(session) == [(2, rooms['101'], last, 2 ** 31 - 1)]
+    before = indexed(session)
+    with db_engine.begin() as conn:
+        assert rebuild_stay_index(conn) == 1
+    assert indexed(session) == before
+
+
+def test_api_answers_409_for_a_full_room(db_engine, session):
+    pytest.importorskip('flask')
+    from src.api import create_app
+
+    session.add(Room(number='7', beds=1))
+    session.commit()
+    client = create_app().test_client()
+    stay = {'name': "Ann", 'date_of_birth': '1990-01-01', 'type': 'inpatient', 'room_number': '7',
+            'admission_date': '2030-01-01'}
+    assert client.post('/api/patients', json=stay).status_code == 201
+    clash = client.post('/api/patients', json={**stay, 'admission_date': '2030-02-01'})
+    assert clash.status_code == 409 and clash.get_json()['occupants'] == [1]
+    # Without an admission date the open stay starts today and runs into the first one.
+    undated = {key: value for key, value in stay.items() if key != 'admission_date'}
+    assert client.post('/api/patients', json=undated).status_code == 409
+
+
+def test_a_stay_without_an_admission_date_is_checked_from_today(db_engine, session, capsys, monkeypatch):
+    session.add(Room(number='300', beds=1))
+    session.commit()
+    admit = ('patient', 'add', '--name', "Ann", '--dob', '1990-01-01', '--contact', "ann@example.com",
+             '--type', 'inpatient', '--room', '300', '--admission', '', '--discharge', '')
+    assert "added successfully" in run(*admit)
+    assert "Room 300 has 1 bed and is full on" in run(*admit)
+    with pytest.raises(RoomFull):
+        check_admission(session, '300', None)
+    assert "Room 300: 1/1 beds occupied" in run('inpatient', 'rooms')
+
+    # The menu runs the same check, for new stays and for changed ones.
+    menu = __import__('menu')
+
+    class Answers:
+        def __init__(self, *answers):
+            self.answers = list(answers)
+
+        def __getattr__(self, prompt):
+            return lambda **kwargs: self
+
+        def execute(self):
+            return self.answers.pop(0)
+
+    session.add(Room(number='301', beds=1))
+    session.commit()
+    monkeypatch.setattr(menu, 'inquirer', Answers("Ben", "1991-01-01", "", "inpatient 🏨", 300, "", ""))
+    menu.add_patient()
+    assert "Room 300 has 1 bed and is full on" in capsys.readouterr().out
+    monkeypatch.setattr(menu, 'inquirer', Answers("Ben", "1991-01-01", "", "inpatient 🏨", 301, "", ""))
+    menu.add_patient()
+    assert "added successfully" in capsys.readouterr().out
+    monkeypatch.setattr(menu, 'pick_patient', lambda message: 2)
+    monkeypatch.setattr(menu, 'inquirer', Answers("", "", "", "300", "", ""))
+    menu.update_patient()
+    assert "Room 300 has 1 bed and is full on" in capsys.readouterr().out
+    assert session.get(InPatient, 2).room_number == '301'
@@ -0,0 +1,131 @@
+from datetime import date, datetime, timedelta
+
+from click.testing import CliRunner
+from sqlalchemy import insert, inspect
+
+from src import database
+from src.cli import cli
+from src.models import Appointment, AppointmentStatus, Doctor, Patient, PatientType
+from src.profiler import QueryProfiler
+from src.scheduling import DoctorSchedule, schedule_for
+
+
+def add_people(engine):
+    with engine.begin() as conn:
+        conn.execute(insert(Patient.__table__), [
+            {'id': 1, 'name': "Patient 1", 'date_of_birth': date(1990, 1, 1), 'patient_type': PatientType.OUTPATIENT}])
+        conn.execute(insert(Doctor.__table__), [{'id': 1, 'name': "Dr. One", 'specialization': 'GP'}])
+
+
+def add_appointments(engine, *bookings):
+    with engine.begin() as conn:
+        conn.execute(insert(Appointment.__table__), [
+            {'patient_id': 1, 'doctor_id': 1, 'appointment_datetime': start, 'duration_minutes': minutes,
+             'status': status} for start, minutes, status in bookings])
+
+
+def book(*args):
+    return CliRunner().invoke(cli, ['appointment', 'add', '--patient-id', '1', '--doctor-id', '1', *args])
+
+
+def test_add_refuses_overlaps_and_suggests_the_next_slot(db_engine):
+    add_people(db_engine)
+    assert "added successfully" in book('--datetime', '2030-01-07 09:00', '--duration', '60').output
+
+    clash = book('--datetime', '2030-01-07 09:30')
+    assert "Cannot book: Doctor 1 is already booked from 2030-01-07 09:00 to 10:00" in clash.output
+    assert "Next free slot for doctor 1: 2030-01-07 10:00" in clash.output
+
+    # Back-to-back is fine, and so is a slot held by a cancelled appointment.
+    add_appointments(db_engine, (datetime(2030, 1, 7, 11), 30, AppointmentStatus.CANCELLED))
+    assert "added successfully" in book('--datetime', '2030-01-07 10:00').output
+    assert "added successfully" in book('--datetime', '2030-01-07 11:00').output
+    assert database.Session().query(Appointment).count() == 4
+
+
+def test_update_checks_the_new_time(db_engine):
+    add_people(db_engine)
+    add_appointments(db_engine, (datetime(2030, 1, 7, 9), 30, AppointmentStatus.SCHEDULED),
+                     (datetime(2030, 1, 7, 10), 30, AppointmentStatus.SCHEDULED))
+    runner = CliRunner()
+    moved = runner.invoke(cli, ['appointment', 'update', '2', '--datetime', '2030-01-07 09:15'])
+    assert "Cannot update: Doctor 1 is already booked" in moved.output
+    assert "updated successfully" in runner.invoke(cli, ['appointment', 'update', '2', '--duration', '90']).output
+    # The appointment never conflicts with itself.
+    assert "updated successfully" in runner.invoke(cli, ['appointment', 'update', '1', '--datetime', '2030-01-07 08:45']).output
+
+
+def test_next_slot_skips_short_gaps_and_booked_out_days(db_engine):
+    add_people(db_engine)
+    monday = datetime(2030, 1, 7)
+    # Monday 09:00 to Wednesday 09:00 booked solid, then a 15-minute gap, then one more hour.
+    solid = [(monday + timedelta(hours=9, minutes=30 * i), 30, AppointmentStatus.SCHEDULED) for i in range(96)]
+    add_appointments(db_engine, *solid, (monday + timedelta(days=2, hours=9, minutes=15), 60, AppointmentStatus.SCHEDULED))
+
+    result = CliRunner().invoke(cli, ['appointment', 'next-slot', '--doctor-id', '1', '--after', '2030-01-07 10:10'])
+    assert "Next free slot for doctor 1: 2030-01-09 10:15 (30 min)" in result.output
+    short = CliRunner().invoke(cli, ['appointment', 'next-slot', '--doctor-id', '1', '--after', '2030-01-07 10:10',
+                                     '--duration', '15'])
+    assert "2030-01-09 09:00" in short.output
+
+
+def test_next_slot_loads_more_days_only_when_needed(db_engine):
+    add_people(db_engine)
+    start = datetime(2030, 1, 1)
+    # Ten fully booked days: longer than the first search window.
+    add_appointments(db_engine, *[(start + timedelta(minutes=60 * i), 60, AppointmentStatus.SCHEDULED) for i in range(240)])
+    session = database.Session()
+    schedule = DoctorSchedule(1)
+    assert schedule.next_slot(session, start, 30) == start + timedelta(days=10)
+    assert len(schedule.blocks()) == 1
+    assert schedule.next_slot(session, start, 30, within_days=5) is None
+    session.close()
+
+
+def test_next_slot_keeps_to_working_hours(db_engine):
+    add_people(db_engine)
+    friday = datetime(2030, 1, 11)
+    add_appointments(db_engine, *[(friday + timedelta(hours=9, minutes=30 * i), 30, AppointmentStatus.SCHEDULED)
+                                  for i in range(16)])
+    runner = CliRunner()
+
+    def next_slot(after, *args):
+        return runner.invoke(cli, ['appointment', 'next-slot', '--doctor-id', '1', '--after', after, *args]).output
+
+    # Friday is booked until 17:00, the end of the default hours: the next slot is on Monday, not Friday evening.
+    assert "Next free slot for doctor 1: 2030-01-14 09:00" in next_slot('2030-01-11 09:00')
+    assert "2030-01-14 09:00" in next_slot('2030-01-13 02:00')
+    # An hour from Thursday 16:30 would run past 17:00.
+    assert "2030-01-14 09:00" in next_slot('2030-01-10 16:30', '--duration', '60')
+    assert "Next free slot for doctor 1: 2030-01-14 09:00" in book('--datetime', '2030-01-11 16:45').output
+
+    runner.invoke(cli, ['doctor', 'add-shift', '1', '--day', 'sat', '--start', '09:00', '--end', '13:00'])
+    assert "2030-01-12 09:00" in next_slot('2030-01-11 09:00')
+
+
+def test_booking_cost_does_not_grow_with_history(db_engine):
+    add_people(db_engine)
+    history = datetime(2020, 1, 1)
+    add_appointments(db_engine, *[(history + timedelta(hours=8 * i), 30, AppointmentStatus.COMPLETED) for i in range(8000)])
+
+    with QueryProfiler(db_engine) as profiler:
+        assert "added successfully" in book('--datetime', '2030-06-03 09:00').output
+    # Patient and doctor lookups, the one-window schedule read, the INSERT, its day's slot bitmap,
+    # the doctor's appointment counter and the patient's summary.
+    assert profiler.statement_count <= 10
+    session = database.Session()
+    assert len(schedule_for(session, 1).bookings) <= 3
+    session.close()
+
+
+def test_create_tables_adds_new_columns_to_existing_tables(tmp_path):
+    engine = database.init_engine(f"sqlite:///{tmp_path / 'old.db'}", 'prod')
+    with engine.begin() as conn:
+        conn.exec_driver_sql("CREATE TABLE appointments (id INTEGER PRIMARY KEY, patient_id INTEGER NOT NULL, "
+                             "doctor_id INTEGER NOT NULL, appointment_datetime DATETIME NOT NULL, reason VARCHAR, status VARCHAR)")
+        conn.exec_driver_sql("INSERT INTO appointments VALUES (1, 1, 1, '2024-01-01 09:00:00.000000', NULL, 'SCHEDULED')")
+    database.create_tables()
+    assert 'duration_minutes' in {column['name'] for column in inspect(engine).get_columns('appointments')}
+    with engine.connect() as conn:
+        assert conn.exec_driver_sql("SELECT duration_minutes FROM appointments").scalar() == 30
+    engine.dispose()
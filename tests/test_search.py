@@ -0,0 +1,94 @@
+from datetime import date
+
+from click.testing import CliRunner
+from sqlalchemy import insert
+
+from src import database
+from src.cli import cli
+from src.models import Department, Doctor, MedicalRecord, Patient, PatientType
+from src.search import rebuild_search_index, search_records, to_match_query
+
+RECORDS = [
+    # patient, doctor, date, diagnosis, treatment
+    (1, 1, date(2024, 1, 10), "Hypertension", "Medication adjustment, recheck blood pressure"),
+    (1, 2, date(2024, 6, 1), "Chest pain", "ECG normal; hypertension follow-up advised"),
+    (2, 1, date(2023, 3, 5), "Asthma", "Inhaled corticosteroids"),
+    (3, 2, date(2024, 2, 2), "Fractured wrist", "Cast for six weeks"),
+]
+
+
+def add_records(engine):
+    # Core inserts, like seed/import: the triggers must index them too.
+    with engine.begin() as conn:
+        conn.execute(insert(Patient.__table__), [
+            {'id': i, 'name': f"Patient {i}", 'date_of_birth': date(1990, 1, 1), 'patient_type': PatientType.OUTPATIENT}
+            for i in (1, 2, 3)])
+        conn.execute(insert(Doctor.__table__), [{'id': i, 'name': f"Dr. {i}"} for i in (1, 2)])
+        conn.execute(insert(MedicalRecord.__table__), [
+            {'patient_id': p, 'doctor_id': d, 'record_date': when, 'diagnosis': diagnosis, 'treatment': treatment}
+            for p, d, when, diagnosis, treatment in RECORDS
+        ])
+
+
+def ids(rows):
+    return [row.id for row in rows]
+
+
+def test_ranking_prefix_and_filters(db_engine, session):
+    add_records(db_engine)
+    # A diagnosis hit outranks the same word in the treatment notes.
+    assert ids(search_records(session, 'hypertension')) == [1, 2]
+    assert ids(search_records(session, 'hyper*')) == [1, 2]
+    assert ids(search_records(session, 'hyper')) == []
+    assert ids(search_records(session, 'hypertension', patient_id=1, doctor_id=2)) == [2]
+    assert ids(search_records(session, 'hypertension', date_from=date(2024, 3, 1))) == [2]
+    assert ids(search_records(session, 'hypertension', date_to=date(2024, 3, 1))) == [1]
+    assert sorted(ids(search_records(session, 'asthma OR wrist', raw=True))) == [3, 4]
+    assert search_records(session, 'six weeks')[0].treatment == "Cast for [six] [weeks]"
+
+
+def test_user_input_cannot_break_the_query_syntax():
+    assert to_match_query('chest pa*') == '"chest" "pa"*'
+    assert to_match_query('covid-19 "O\'Brien') == '"covid-19" "O\'Brien"'
+    assert to_match_query('   ') == ''
+
+
+def test_index_follows_orm_updates_and_deletes(db_engine, session):
+    add_records(db_engine)
+    record = session.get(MedicalRecord, 3)
+    record.diagnosis = "Bronchitis"
+    session.commit()
+    assert ids(search_records(session, 'asthma')) == []
+    assert ids(search_records(session, 'bronchitis')) == [3]
+
+    session.delete(session.get(MedicalRecord, 4))
+    session.commit()
+    assert ids(search_records(session, 'wrist')) == []
+
+
+def test_cli_search_and_rebuild(db_engine):
+    add_records(db_engine)
+    runner = CliRunner()
+    result = runner.invoke(cli, ['patient', 'search-records', 'chest', '--patient-id', '1'])
+    assert "ID: 2, Patient ID: 1, Doctor ID: 2, Date: 2024-06-01" in result.output
+    assert "Diagnosis: [Chest] pain" in result.output
+    assert "No matching records found." in runner.invoke(cli, ['patient', 'search-records', 'migraine']).output
+
+    # Wipe the index behind the app's back; rebuild brings every record back.
+    with db_engine.begin() as conn:
+        conn.exec_driver_sql("INSERT INTO medical_records_fts(medical_records_fts) VALUES ('delete-all')")
+    assert "No matching records found." in runner.invoke(cli, ['patient', 'search-records', 'chest']).output
+    assert "Search index rebuilt for 4 medical records and 3 patients." in runner.invoke(cli, ['patient', 'rebuild-search-index']).output
+    assert "ID: 2," in runner.invoke(cli, ['patient', 'search-records', 'chest']).output
+
+
+def test_existing_records_are_indexed_when_the_index_is_created(tmp_path):
+    engine = database.init_engine(f"sqlite:///{tmp_path / 'old.db'}", 'prod')
+    for model in (Department, Patient, Doctor, MedicalRecord):
+        model.__table__.create(engine)
+    add_records(engine)
+    database.create_tables()
+    session = database.Session()
+    assert ids(search_records(session, 'asthma')) == [3]
+    session.close()
+    engine.dispose()
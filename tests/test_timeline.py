@@ -0,0 +1,92 @@
+from datetime import date, datetime
+
+from click.testing import CliRunner
+from sqlalchemy import insert, text
+
+from src.cli import cli
+from src.models import Appointment, AppointmentStatus, Doctor, MedicalRecord, Patient, PatientType
+from src.profiler import QueryProfiler
+from src.timeline import _TIMELINE, parse_cursor, patient_timeline
+
+
+def add_history(engine):
+    with engine.begin() as conn:
+        conn.execute(insert(Patient.__table__), [
+            {'id': i, 'name': f"Patient {i}", 'date_of_birth': date(1990, 1, 1), 'patient_type': PatientType.OUTPATIENT}
+            for i in (1, 2)])
+        conn.execute(insert(Doctor.__table__), [{'id': 1, 'name': "Dr. One", 'specialization': 'GP'},
+                                                {'id': 2, 'name': "Dr. Two", 'specialization': 'Cardiologist'}])
+        conn.execute(insert(Appointment.__table__), [
+            {'id': 1, 'patient_id': 1, 'doctor_id': 1, 'appointment_datetime': datetime(2024, 1, 10, 9), 'duration_minutes': 30,
+             'reason': "Checkup", 'status': AppointmentStatus.COMPLETED},
+            {'id': 2, 'patient_id': 1, 'doctor_id': 2, 'appointment_datetime': datetime(2024, 3, 5, 10, 30), 'duration_minutes': 45,
+             'reason': "Chest pain", 'status': AppointmentStatus.COMPLETED},
+            {'id': 3, 'patient_id': 1, 'doctor_id': 2, 'appointment_datetime': datetime(2999, 1, 1, 9), 'duration_minutes': 30,
+             'reason': "Follow-up", 'status': AppointmentStatus.SCHEDULED},
+            {'id': 4, 'patient_id': 2, 'doctor_id': 1, 'appointment_datetime': datetime(2024, 2, 1, 9), 'duration_minutes': 30,
+             'reason': "Other patient", 'status': AppointmentStatus.COMPLETED},
+        ])
+        conn.execute(insert(MedicalRecord.__table__), [
+            {'id': 1, 'patient_id': 1, 'doctor_id': 1, 'record_date': date(2024, 1, 10), 'diagnosis': "Flu", 'treatment': "Rest"},
+            {'id': 2, 'patient_id': 1, 'doctor_id': 2, 'record_date': date(2024, 3, 5), 'diagnosis': "Angina", 'treatment': "Nitrates"},
+            {'id': 3, 'patient_id': 2, 'doctor_id': 1, 'record_date': date(2024, 2, 1), 'diagnosis': "Other", 'treatment': "None"},
+        ])
+
+
+def entries(rows):
+    return [(row.kind, row.id) for row in rows]
+
+
+def test_merged_newest_first_and_paged_backwards(db_engine, session):
+    add_history(db_engine)
+    rows, cursor = patient_timeline(session, 1)
+    # The upcoming appointment is left out; a record sorts just before that day's appointments.
+    assert entries(rows) == [('appointment', 2), ('record', 2), ('appointment', 1), ('record', 1)]
+    assert cursor is None
+    assert rows[0].doctor_name == "Dr. Two"
+
+    pages, cursor = [], parse_cursor('9999-12-31')
+    while True:
+        rows, cursor = patient_timeline(session, 1, cursor, limit=2)
+        pages.append(entries(rows))
+        if cursor is None:
+            break
+    assert pages == [[('appointment', 3), ('appointment', 2)], [('record', 2), ('appointment', 1)], [('record', 1)]]
+    assert entries(patient_timeline(session, 1, parse_cursor('2024-03-05'))[0]) == [('appointment', 1), ('record', 1)]
+    assert entries(patient_timeline(session, 1, parse_cursor('2024-03-05 10:00'))[0])[0] == ('record', 2)
+
+
+def test_one_indexed_statement_per_page(db_engine, session):
+    add_history(db_engine)
+    with QueryProfiler(db_engine) as profiler:
+        patient_timeline(session, 1, limit=1)
+    assert profiler.statement_count == 1
+    with db_engine.connect() as conn:
+        plan = [row[-1] for row in conn.execute(text(f"EXPLAIN QUERY PLAN {_TIMELINE}"),
+                                                 {'patient_id': 1, 'at': '2025', 'kind': '', 'id': 0, 'limit': 2})]
+    assert any('USING INDEX ix_appointments_patient_datetime' in step for step in plan)
+    assert any('USING INDEX ix_medical_records_patient_date' in step for step in plan)
+    assert not any(step.startswith(('SCAN a', 'SCAN mr')) for step in plan)
+
+
+def test_cli_timeline_pages(db_engine):
+    add_history(db_engine)
+    runner = CliRunner()
+    first = runner.invoke(cli, ['patient', 'timeline', '1', '--upcoming', '--limit', '2']).output
+    assert first.splitlines() == [
+        "2999-01-01 09:00  Appointment ID 3 with Dr. Two (Doctor ID 2), 30 min, scheduled: Follow-up",
+        "2024-03-05 10:30  Appointment ID 2 with Dr. Two (Doctor ID 2), 45 min, completed: Chest pain",
+        "-- More entries available: use --before '2024-03-05 10:30:00.000000#appointment:2' for the next page.",
+    ]
+    second = runner.invoke(cli, ['patient', 'timeline', '1', '--limit', '2', '--before',
+                                 '2024-03-05 10:30:00.000000#appointment:2']).output
+    assert "2024-03-05        Medical record ID 2 by Dr. Two (Doctor ID 2): Angina - Nitrates" in second
+    assert "Other" not in second
+    assert "Patient with ID 9 not found." in runner.invoke(cli, ['patient', 'timeline', '9']).output
+    assert "Invalid --before value" in runner.invoke(cli, ['patient', 'timeline', '1', '--before', 'soon']).output
+
+
+def test_list_records_filters_by_patient(db_engine):
+    add_history(db_engine)
+    output = CliRunner().invoke(cli, ['patient', 'list-records', '--patient-id', '2']).output
+    assert output == "ID: 3, Patient ID: 2, Diagnosis: Other, Treatment: None, Date: 2024-02-01\n"